@@ -0,0 +1,176 @@
+"""
+Микробенчмарк маршрутизации запросов (_analyze_request_type)
+
+Сравнивает прежнюю реализацию (последовательные any() по спискам ключевых слов)
+с IntentRouter и проверяет, что обе дают одинаковый результат.
+
+Запуск: python chatbot/benchmarks/intent_routing.py
+"""
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from models.conversation import UserContext
+from core.intent_router import INTENT_RULES, IntentRouter
+
+
+def legacy_analyze_request_type(message: str, context: UserContext) -> str:
+    """Прежняя реализация: последовательные any() по спискам ключевых слов"""
+    message_lower = message.lower()
+    current_view = context.session_data.get('current_view', '')
+    current_level = context.session_data.get('current_level', '')
+
+    # Запросы вида "где я нахожусь?", "что за экран?"
+    where_triggers = [
+        "где я", "где нахожусь", "где это я", "какой это экран",
+        "что за экран", "что за страница", "на каком экране",
+        "на какой странице", "где сейчас нахожусь", "что это за страница"
+    ]
+    if any(tr in message_lower for tr in where_triggers):
+        return "where_am_i"
+
+
+    # Анализ в зависимости от текущего экрана
+    if current_view == 'badge-level' and current_level:
+        # На экране уровня значка - фокус на конкретном уровне
+        if any(word in message_lower for word in [
+            "что это за значок", "что за значок", "объясни", "расскажи", "что такое",
+            "как получить", "критерии", "подтверждение", "что нужно", "что это"
+        ]):
+            return "badge_level_explanation"
+        elif any(word in message_lower for word in ["идеи", "примеры", "варианты"]):
+            return "creative_ideas"
+
+    elif current_view == 'badge':
+        # На экране значка - фокус на значке
+        if any(word in message_lower for word in [
+            "что это за значок", "что за значок", "объясни", "расскажи", "что такое",
+            "как получить", "что это"
+        ]):
+            return "badge_explanation"
+        elif any(word in message_lower for word in ["идеи", "примеры", "варианты"]):
+            return "creative_ideas"
+        elif any(word in message_lower for word in ["уровни", "ступени", "базовый", "продвинутый", "экспертный"]):
+            return "badge_levels_explanation"
+
+    elif current_view == 'category':
+        # На экране категории - фокус на категории
+        if any(word in message_lower for word in ["объясни", "расскажи", "что такое"]):
+            return "category_info"
+        elif any(word in message_lower for word in ["рекомендуй", "посоветуй", "что выбрать"]):
+            return "recommendations"
+        elif any(word in message_lower for word in ["философия", "зачем", "почему", "смысл"]):
+            return "philosophy"
+
+    elif current_view == 'intro':
+        # На главной странице - философия значков
+        if any(word in message_lower for word in ["где я", "что это", "философия", "принципы", "зачем", "почему", "смысл", "награды", "награда", "нарады", "медали", "медаль", "ачивки", "ачивка"]):
+            return "philosophy"
+        elif any(word in message_lower for word in ["категории", "значки", "сколько", "список"]):
+            return "category_info"
+
+    elif current_view == 'introduction':
+        # На экране введения - общая информация
+        if any(word in message_lower for word in ["подробнее", "больше", "расскажи"]):
+            return "category_info"
+
+    # Общие ключевые слова для всех экранов
+    if any(word in message_lower for word in [
+        "что это за значок", "что за значок", "объясни", "расскажи", "что такое", "как получить", "что это"
+    ]):
+        if context.current_badge:
+            return "badge_explanation"
+        elif context.current_category:
+            return "category_info"
+
+    if any(word in message_lower for word in ["идеи", "как сделать", "примеры", "варианты"]):
+        return "creative_ideas"
+
+    if any(word in message_lower for word in ["рекомендуй", "посоветуй", "что выбрать", "подходящий"]):
+        return "recommendations"
+
+    if any(word in message_lower for word in ["философия", "зачем", "почему", "смысл"]):
+        return "philosophy"
+
+    # Специальная обработка для вопросов про ИИ
+    if any(word in message_lower for word in ["ии", "искусственный интеллект", "нейросети", "нейро", "ai"]):
+        return "general"
+
+    return "general"
+
+
+# Правила в том виде, какой повторяет прежняя реализация: до выделения
+# вопросов о составе категории (category_list) из category_info
+LEGACY_RULES = tuple(
+    rule._replace(intent="category_info") if rule.intent == "category_list" else rule
+    for rule in INTENT_RULES
+    if not (rule.intent == "category_list" and rule.view == "category")
+)
+
+
+MESSAGES = [
+    "привет!",
+    "где я сейчас нахожусь?",
+    "расскажи про этот значок подробнее",
+    "какие есть идеи, как его получить?",
+    "что нужно для этого уровня, какие критерии?",
+    "посоветуй что выбрать новичку",
+    "зачем вообще нужны значки, это же просто награды?",
+    "сколько всего категорий и значков в списке?",
+    "мне нравится рисовать и играть в футбол, а ещё я люблю музыку и походы с друзьями",
+]
+
+CONTEXTS = [
+    UserContext(user_id="bench"),
+    UserContext(user_id="bench", current_category="7", session_data={"current_view": "category"}),
+    UserContext(user_id="bench", current_category="7", current_badge="7.1", session_data={"current_view": "badge"}),
+    UserContext(user_id="bench", current_category="7", current_badge="7.1",
+                session_data={"current_view": "badge-level", "current_level": "2"}),
+    UserContext(user_id="bench", session_data={"current_view": "intro"}),
+]
+
+
+def route(router: IntentRouter, message: str, context: UserContext) -> str:
+    """То же, что ResponseGenerator._analyze_request_type"""
+    context_flags = (
+        bool(context.session_data.get('current_level', '')),
+        bool(context.current_badge),
+        bool(context.current_category)
+    )
+    return router.route(message, context.session_data.get('current_view', ''), context_flags)
+
+
+def measure(func, cases, repeat: int) -> float:
+    """Среднее время одного вызова в микросекундах"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for message, context in cases:
+            func(message, context)
+    return (time.perf_counter() - start) / (repeat * len(cases)) * 1e6
+
+
+def main():
+    router = IntentRouter(LEGACY_RULES)
+    cases = [(message, context) for message in MESSAGES for context in CONTEXTS]
+
+    mismatches = [
+        (message, context.session_data, legacy_analyze_request_type(message, context), route(router, message, context))
+        for message, context in cases
+        if legacy_analyze_request_type(message, context) != route(router, message, context)
+    ]
+    for mismatch in mismatches:
+        print("MISMATCH:", mismatch)
+
+    repeat = 2000
+    before = measure(legacy_analyze_request_type, cases, repeat)
+    after = measure(lambda message, context: route(router, message, context), cases, repeat)
+    print(f"Сообщений: {len(cases)}, повторов: {repeat}")
+    print(f"До (any() по спискам): {before:.2f} мкс/сообщение")
+    print(f"После (IntentRouter):  {after:.2f} мкс/сообщение")
+    print(f"Ускорение: {before / after:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
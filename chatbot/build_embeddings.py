@@ -0,0 +1,35 @@
+"""
+Офлайн-сборка эмбеддингов значков: матрица float16 в .npz
+
+Запуск (после изменений в public/ai-data или смены модели):
+    python chatbot/build_embeddings.py
+"""
+import argparse
+import sys
+from pathlib import Path
+
+# Добавляем путь к модулям
+sys.path.append(str(Path(__file__).parent))
+
+import config
+from core.data_loader_new import DataLoaderNew
+from core.embeddings import create_embedding_model, embedding_source_hash, write_embeddings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сборка эмбеддингов значков")
+    parser.add_argument("--source", default=str(config.AI_DATA_PATH), help="Папка ai-data")
+    parser.add_argument("--output", default=str(config.EMBEDDINGS_PATH), help="Файл эмбеддингов (.npz)")
+    parser.add_argument("--model", default=config.EMBEDDING_MODEL, help="Модель эмбеддингов")
+    args = parser.parse_args()
+
+    data_loader = DataLoaderNew(use_ai_data=True, ai_data_path=args.source)
+    badges = data_loader.get_all_badges()
+    model = create_embedding_model(args.model)
+    size = write_embeddings(args.output, badges, model)
+    print(f"Эмбеддинги {model.name} собраны: {len(badges)} значков x {model.dim}, {size} байт -> {args.output}")
+    print(f"Хэш текстов значков: {embedding_source_hash(badges)}")
+
+
+if __name__ == "__main__":
+    main()
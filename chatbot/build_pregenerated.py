@@ -0,0 +1,104 @@
+"""
+Офлайн-генерация готовых ответов о значках: объяснения, идеи и обзоры уровней
+для каждого уровня пользователя и группы интересов
+
+Запуск (после изменений в public/ai-data или в промптах):
+    python chatbot/build_pregenerated.py              # через OpenAI Batch API
+    python chatbot/build_pregenerated.py --stub       # локальная заглушка без API
+
+Перегенерируются только значки, данные которых изменились, ответы по прежним
+промптам или полученные другим способом (заглушкой вместо пакета и наоборот)
+и недостающие ответы. Бот отдаёт заглушки, только если PREGENERATED_ALLOW_STUB=1.
+"""
+import argparse
+import sys
+from pathlib import Path
+
+# Добавляем путь к модулям
+sys.path.append(str(Path(__file__).parent))
+
+import config
+from core.data_loader_new import DataLoaderNew
+from core.pregenerated import (
+    GENERATOR_BATCH,
+    GENERATOR_STUB,
+    INTEREST_BUCKETS,
+    default_kinds,
+    merge_answers,
+    pregeneration_requests,
+    prompt_fingerprint,
+    read_answers,
+    run_batch,
+    run_stub,
+    write_answers
+)
+from core.context_manager import USER_LEVELS
+from core.prompt_assembly import ContextAssembler, get_token_counter
+
+
+def _split(value: str):
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Офлайн-генерация ответов о значках")
+    parser.add_argument("--source", default=str(config.AI_DATA_PATH), help="Папка ai-data")
+    parser.add_argument("--output", default=str(config.PREGENERATED_PATH), help="Файл готовых ответов")
+    parser.add_argument(
+        "--kinds",
+        default=",".join(default_kinds(config.LOCAL_ANSWER_INTENTS)),
+        help="Виды ответов через запятую (по умолчанию без тех, на что бот отвечает по шаблону)"
+    )
+    parser.add_argument("--levels", default=",".join(USER_LEVELS), help="Уровни пользователя через запятую")
+    parser.add_argument("--buckets", default=",".join(INTEREST_BUCKETS), help="Группы интересов через запятую")
+    parser.add_argument("--model", default=config.OPENAI_MODEL, help="Модель")
+    parser.add_argument("--stub", action="store_true", help="Не обращаться к API, собрать ответы из данных значков")
+    parser.add_argument("--poll", type=float, default=30.0, help="Интервал проверки пакета (сек)")
+    parser.add_argument("--full", action="store_true", help="Сгенерировать всё заново")
+    args = parser.parse_args()
+
+    data_loader = DataLoaderNew(use_ai_data=True, ai_data_path=args.source)
+    badges = data_loader.get_all_badges()
+    existing = None if args.full else read_answers(args.output)
+    generator = GENERATOR_STUB if args.stub else GENERATOR_BATCH
+    fingerprint = prompt_fingerprint(args.model)
+    assembler = ContextAssembler(get_token_counter(args.model), budget=config.PROMPT_KNOWLEDGE_TOKENS)
+    requests = pregeneration_requests(
+        badges,
+        assembler,
+        data_loader.get_badge_source_hash,
+        kinds=_split(args.kinds),
+        user_levels=_split(args.levels),
+        buckets=_split(args.buckets),
+        existing=existing,
+        generator=generator,
+        fingerprint=fingerprint
+    )
+    print(f"Значков: {len(badges)}, запросов к модели: {len(requests)}")
+
+    if not requests:
+        texts = {}
+    elif args.stub:
+        texts = run_stub(requests, {badge.id: badge for badge in badges})
+    else:
+        from openai import OpenAI
+        client = OpenAI(api_key=config.OPENAI_API_KEY, base_url=config.OPENAI_BASE_URLS[0])
+        texts = run_batch(client, requests, args.model, poll_interval=args.poll)
+
+    data = merge_answers(
+        existing,
+        badges,
+        requests,
+        texts,
+        data_loader.get_badge_source_hash,
+        model=args.model,
+        generator=generator,
+        fingerprint=fingerprint
+    )
+    write_answers(data, args.output)
+    total = sum(len(entry['answers']) for entry in data['badges'].values())
+    print(f"Готовые ответы собраны: {len(texts)} новых, всего {total} -> {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+"""
+Сборка снимка базы знаний: public/ai-data -> один JSON-файл и упакованное хранилище значков
+
+Запуск (после любых изменений в public/ai-data):
+    python chatbot/build_snapshot.py
+"""
+import argparse
+import sys
+from pathlib import Path
+
+# Добавляем путь к модулям
+sys.path.append(str(Path(__file__).parent))
+
+import config
+from core.badge_store import build_badge_pack
+from core.snapshot import build_snapshot, write_snapshot
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сборка снимка ai-data в один файл")
+    parser.add_argument("--source", default=str(config.AI_DATA_PATH), help="Папка ai-data")
+    parser.add_argument("--output", default=str(config.AI_DATA_SNAPSHOT_PATH), help="Файл снимка")
+    parser.add_argument("--pack", default=str(config.AI_DATA_BADGE_PACK_PATH), help="Файл хранилища значков (пусто — не собирать)")
+    args = parser.parse_args()
+
+    snapshot = build_snapshot(args.source)
+    write_snapshot(snapshot, args.output)
+    print(
+        f"Снимок v{snapshot['version']} собран: {len(snapshot['categories'])} категорий, "
+        f"{len(snapshot['badges'])} файлов значков -> {args.output}"
+    )
+    if args.pack:
+        pack = build_badge_pack(snapshot, args.pack)
+        print(f"Хранилище значков собрано: {pack['badges']} значков, {pack['bytes']} байт -> {args.pack}")
+    print(f"Хэш исходников: {snapshot['sourceHash']}")
+
+
+if __name__ == "__main__":
+    main()
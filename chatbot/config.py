@@ -8,12 +8,84 @@ from pathlib import Path
 BASE_DIR = Path(__file__).parent
 DATA_PATH = BASE_DIR.parent / "ai-data"
 STORAGE_PATH = BASE_DIR / "storage"
+AI_DATA_PATH = BASE_DIR.parent / "public" / "ai-data"
+# Снимок ai-data в одном файле (собирается build_snapshot.py); если файла нет — читаем папку
+AI_DATA_SNAPSHOT_PATH = Path(os.getenv("AI_DATA_SNAPSHOT", str(BASE_DIR / "ai_data_snapshot.json")))
+# Упакованное хранилище значков для mmap (собирается вместе со снимком); если файл есть — используется вместо снимка
+AI_DATA_BADGE_PACK_PATH = Path(os.getenv("AI_DATA_BADGE_PACK", str(BASE_DIR / "ai_data_badges.pack")))
+# Готовые ответы о значках рядом с ai_data_complete.json (собираются build_pregenerated.py;
+# если файла нет — всё генерируется вживую)
+PREGENERATED_PATH = Path(os.getenv("PREGENERATED_PATH", str(BASE_DIR.parent / "ai_data_pregenerated.json")))
+# Отдавать ответы-заглушки (build_pregenerated.py --stub) — только для разработки
+PREGENERATED_ALLOW_STUB = os.getenv("PREGENERATED_ALLOW_STUB", "0") == "1"
+# Эмбеддинги значков (собираются build_embeddings.py; если файла нет — строятся при запуске)
+EMBEDDINGS_PATH = Path(os.getenv("EMBEDDINGS_PATH", str(BASE_DIR / "ai_data_embeddings.npz")))
+# "hashing" (без внешних пакетов) или "sentence-transformers:<модель>"
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "hashing")
+# Количество кластеров IVF (0 — полный перебор)
+EMBEDDING_IVF_LISTS = int(os.getenv("EMBEDDING_IVF_LISTS", "0"))
 
 # OpenAI настройки
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 OPENAI_MODEL = "gpt-4o-mini"
 OPENAI_MAX_TOKENS = 1000
 OPENAI_TEMPERATURE = 0.7
+# Адреса API через запятую в порядке приоритета (как PROXY_URLS в openai_proxy.py)
+OPENAI_BASE_URLS = [url.strip() for url in os.getenv("OPENAI_BASE_URLS", "https://api.openai-proxy.com/v1").split(",") if url.strip()]
+# Дедлайн запроса вместе с повторами и таймаут соединения (сек)
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "30"))
+OPENAI_CONNECT_TIMEOUT = float(os.getenv("OPENAI_CONNECT_TIMEOUT", "5"))
+# Повторы при 429/5xx/ошибках сети: количество и задержки (сек, экспонента с джиттером)
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "2"))
+OPENAI_RETRY_BASE_DELAY = float(os.getenv("OPENAI_RETRY_BASE_DELAY", "0.5"))
+OPENAI_RETRY_MAX_DELAY = float(os.getenv("OPENAI_RETRY_MAX_DELAY", "4"))
+# Дублировать запрос на следующий адрес, если ответа нет столько секунд (0 — не дублировать)
+OPENAI_HEDGE_DELAY = float(os.getenv("OPENAI_HEDGE_DELAY", "0"))
+# Пул соединений
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "100"))
+OPENAI_MAX_KEEPALIVE = int(os.getenv("OPENAI_MAX_KEEPALIVE", "20"))
+# Выключатель: ошибок подряд до отключения адреса и время отключения (сек)
+OPENAI_CIRCUIT_FAILURES = int(os.getenv("OPENAI_CIRCUIT_FAILURES", "5"))
+OPENAI_CIRCUIT_RESET = float(os.getenv("OPENAI_CIRCUIT_RESET", "30"))
+# Бюджет знаний о значках и категориях в промпте (токены; считаются tiktoken или оценкой)
+PROMPT_KNOWLEDGE_TOKENS = int(os.getenv("PROMPT_KNOWLEDGE_TOKENS", "900"))
+# Бюджет дословной истории диалога в промпте; более ранние сообщения сжимаются в краткое содержание
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "1500"))
+SUMMARY_MAX_TOKENS = int(os.getenv("SUMMARY_MAX_TOKENS", "300"))
+# Содержание дописывается пачкой: когда вне окна накопилось столько сообщений
+# или столько токенов (по умолчанию половина бюджета истории)
+SUMMARY_BATCH_MESSAGES = int(os.getenv("SUMMARY_BATCH_MESSAGES", "6"))
+SUMMARY_BATCH_TOKENS = int(os.getenv("SUMMARY_BATCH_TOKENS", str(HISTORY_TOKEN_BUDGET // 2)))
+# Типы запросов, на которые бот отвечает по шаблонам из данных, без модели
+# (через запятую; пусто — всё через модель, кроме «где я»)
+LOCAL_ANSWER_INTENTS = [
+    intent.strip()
+    for intent in os.getenv("LOCAL_ANSWER_INTENTS", "category_list,badge_levels_explanation,badge_level_explanation").split(",")
+    if intent.strip()
+]
+
+# Кэш ответов модели (пустой путь — хранить только в памяти)
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "512"))
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", str(6 * 3600)))
+RESPONSE_CACHE_PATH = os.getenv("RESPONSE_CACHE_PATH", "")
+# Сколько последних ответов загрузить с диска в память при прогреве (0 — не загружать)
+WARMUP_RESPONSE_CACHE = int(os.getenv("WARMUP_RESPONSE_CACHE", str(RESPONSE_CACHE_MAX_ENTRIES)))
+
+# Хранилище контекстов и диалогов: "file" (JSON-файлы) или "sqlite"
+# (при WORKERS > 1 всегда "sqlite" — база общая для всех процессов)
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "file")
+# Пустой путь — sessions.db рядом с JSON-файлами
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", "")
+
+# Отложенная запись контекстов и диалогов: интервал сброса на диск (сек)
+PERSIST_FLUSH_INTERVAL = float(os.getenv("PERSIST_FLUSH_INTERVAL", "2.0"))
+
+# Сессии пользователей в памяти: лимиты и вытеснение по простою (сек)
+SESSION_CACHE_MAX_ENTRIES = int(os.getenv("SESSION_CACHE_MAX_ENTRIES", "1000"))
+SESSION_CACHE_MAX_BYTES = int(os.getenv("SESSION_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+SESSION_IDLE_TTL = float(os.getenv("SESSION_IDLE_TTL", "3600"))
+# Срок хранения неактивных пользователей в днях (0 — не удалять)
+SESSION_RETENTION_DAYS = int(os.getenv("SESSION_RETENTION_DAYS", "0"))
 
 # Настройки бота
 BOT_NAME = "НейроВалюша"
@@ -23,6 +95,9 @@ BOT_VERSION = "1.0.0"
 HOST = "0.0.0.0"
 PORT = 8000
 DEBUG = True
+# Количество процессов сервера: данные значков загружаются один раз до fork
+# и остаются общими (copy-on-write); сессии хранятся в общей SQLite
+WORKERS = int(os.getenv("WORKERS", "1"))
 
 # Создаем папку для хранения если её нет
 STORAGE_PATH.mkdir(exist_ok=True)
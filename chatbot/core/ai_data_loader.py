@@ -9,17 +9,27 @@ from pathlib import Path
 import logging
 
 from models.badge import Badge, BadgeLevel, Category, BadgeData
+from .badge_store import BadgePack, build_badge
+from .search_index import SearchIndex
+from .snapshot import file_sha256, read_snapshot, source_hash
 
 
 class AIDataLoader:
     """Загрузчик данных значков из ai-data структуры"""
     
-    def __init__(self, base_path: str = None):
+    def __init__(self, base_path: str = None, snapshot_path: str = None, pack_path: str = None):
         """
         Инициализация загрузчика
         
         Args:
             base_path: Путь к папке ai-data
+            snapshot_path: Путь к снимку ai-data (build_snapshot.py); если задан и
+                существует, все данные читаются из него одним обращением к диску
+            pack_path: Путь к упакованному хранилищу значков (build_snapshot.py); если задан
+                и существует, используется вместо снимка, тяжёлые поля читаются из mmap
+        
+        Снимок и хранилище используются, только если собраны из текущего
+        содержимого папки (совпадает sourceHash), иначе данные читаются из папки.
         """
         if base_path is None:
             # Автоматически определяем путь к ai-data
@@ -44,9 +54,11 @@ class AIDataLoader:
         
         # Кэши для оптимизации
         self._master_index: Optional[Dict] = None
+        self._category_info_by_id: Dict[str, Dict] = {}
         self._categories_cache: Dict[str, Category] = {}
         self._badges_cache: Dict[str, Badge] = {}
         self._category_introductions_cache: Dict[str, str] = {}
+        self._search_index: Optional[SearchIndex] = None
         
         # Статистика загрузки
         self._load_stats = {
@@ -55,6 +67,110 @@ class AIDataLoader:
             'badge_loads': 0,
             'introduction_loads': 0
         }
+        
+        # Режим снимка: исходные данные всех файлов в памяти, индексы по ID
+        self.snapshot_path = Path(snapshot_path) if snapshot_path else None
+        self._snapshot: Optional[Dict] = None
+        self._level_badge_ids: Dict[str, str] = {}
+        self.pack_path = Path(pack_path) if pack_path else None
+        self._pack: Optional[BadgePack] = None
+        if self.pack_path is not None and self.pack_path.exists():
+            self._load_pack()
+        elif self.snapshot_path is not None:
+            if self.snapshot_path.exists():
+                self._load_snapshot()
+            else:
+                self.logger.warning(f"⚠️ Снимок ai-data не найден ({self.snapshot_path}), читаем папку {self.base_path}")
+        if self.snapshot_info is not None and not self._source_matches():
+            self._drop_compiled()
+    
+    def _source_matches(self) -> bool:
+        """Собраны ли снимок или хранилище из текущего содержимого папки ai-data"""
+        info = self.snapshot_info
+        try:
+            current = source_hash(self.base_path)
+        except (OSError, ValueError) as e:
+            # Папки может не быть рядом с собранными данными — тогда проверять не с чем
+            self.logger.warning(f"⚠️ Не удалось проверить актуальность снимка по папке {self.base_path}: {e}")
+            return True
+        if current == info['sourceHash']:
+            return True
+        self.logger.warning(
+            f"⚠️ Папка {self.base_path} изменилась после сборки снимка ({info['builtAt']}), "
+            f"читаем папку; пересоберите снимок: python chatbot/build_snapshot.py"
+        )
+        return False
+    
+    def _drop_compiled(self):
+        """Отказывается от снимка и хранилища: дальше данные читаются из папки"""
+        if self._pack is not None:
+            self._pack.close()
+        self._pack = None
+        self._snapshot = None
+        self._master_index = None
+        self._category_info_by_id = {}
+        self._level_badge_ids = {}
+    
+    def _load_snapshot(self):
+        """Загружает снимок и строит индексы категорий, значков и уровней"""
+        self._snapshot = read_snapshot(self.snapshot_path)
+        self._master_index = self._snapshot['masterIndex']
+        self._load_stats['master_index_loads'] += 1
+        self._category_info_by_id = {c['id']: c for c in self._master_index.get('categories', [])}
+        self._level_badge_ids = {
+            level['id']: badge_id
+            for badge_id, record in self._snapshot['badges'].items()
+            for level in record['data'].get('levels', [])
+        }
+        self.logger.info(
+            f"✅ Снимок ai-data загружен: {len(self._category_info_by_id)} категорий, "
+            f"{len(self._snapshot['badges'])} значков (собран {self._snapshot.get('builtAt')})"
+        )
+    
+    def _load_pack(self):
+        """Открывает упакованное хранилище значков и строит индексы категорий и уровней"""
+        self._pack = BadgePack(self.pack_path)
+        self._master_index = self._pack.master_index
+        self._load_stats['master_index_loads'] += 1
+        self._category_info_by_id = {c['id']: c for c in self._master_index.get('categories', [])}
+        self._level_badge_ids = self._pack.level_badge_ids()
+        self.logger.info(
+            f"✅ Хранилище значков открыто: {len(self._category_info_by_id)} категорий, "
+            f"{self._pack.stats()['badges']} значков (собрано {self._pack.built_at})"
+        )
+    
+    @property
+    def snapshot_info(self) -> Optional[Dict]:
+        """Версия и хэш загруженного снимка или хранилища (None — данные читаются из папки)"""
+        if self._pack is not None:
+            return {
+                'version': self._pack.version,
+                'builtAt': self._pack.built_at,
+                'sourceHash': self._pack.source_hash
+            }
+        if self._snapshot is None:
+            return None
+        return {
+            'version': self._snapshot['version'],
+            'builtAt': self._snapshot.get('builtAt'),
+            'sourceHash': self._snapshot['sourceHash']
+        }
+    
+    def get_badge_source_hash(self, badge_id: str) -> Optional[str]:
+        """Хэш исходного файла значка N.X.json (None — значка нет)"""
+        if self._pack is not None:
+            return self._pack.badge_source_hash(badge_id)
+        if self._snapshot is not None:
+            record = self._snapshot['badges'].get(badge_id)
+            return record['sourceHash'] if record else None
+        category_info = self.get_category_info(badge_id.split('.')[0])
+        if not category_info:
+            return None
+        badge_path = self.base_path / category_info['path'] / f"{badge_id}.json"
+        try:
+            return file_sha256(badge_path.read_bytes())
+        except OSError:
+            return None
     
     def get_master_index(self) -> Dict:
         """Загружает MASTER_INDEX.json"""
@@ -76,11 +192,45 @@ class AIDataLoader:
     
     def get_category_info(self, category_id: str) -> Optional[Dict]:
         """Получает информацию о категории из MASTER_INDEX"""
-        master_index = self.get_master_index()
-        for category in master_index.get('categories', []):
-            if category['id'] == category_id:
-                return category
-        return None
+        if not self._category_info_by_id:
+            master_index = self.get_master_index()
+            self._category_info_by_id = {c['id']: c for c in master_index.get('categories', [])}
+        return self._category_info_by_id.get(category_id)
+    
+    def _read_category_index(self, category_id: str, category_info: Dict) -> Dict:
+        """Читает index.json категории (из хранилища, снимка или файла)"""
+        if self._pack is not None:
+            return self._pack.category_index(category_id)
+        if self._snapshot is not None:
+            return self._snapshot['categories'][category_id]['index']
+        category_path = self.base_path / category_info['path'] / "index.json"
+        with open(category_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    
+    def _read_badge(self, badge_id: str, category_info: Dict) -> Optional[Dict]:
+        """Читает данные значка (из снимка или файла); None — значка нет"""
+        if self._snapshot is not None:
+            record = self._snapshot['badges'].get(badge_id)
+            return record['data'] if record else None
+        badge_path = self.base_path / category_info['path'] / f"{badge_id}.json"
+        if not badge_path.exists():
+            self.logger.warning(f"⚠️ Файл значка не найден: {badge_path}")
+            return None
+        with open(badge_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    
+    def _read_introduction(self, category_id: str, category_info: Dict) -> Optional[str]:
+        """Читает introduction.md категории (из хранилища, снимка или файла)"""
+        if self._pack is not None:
+            return self._pack.category_introduction(category_id)
+        if self._snapshot is not None:
+            category = self._snapshot['categories'].get(category_id)
+            return category['introduction'] if category else None
+        introduction_path = self.base_path / category_info['path'] / "introduction.md"
+        if not introduction_path.exists():
+            return None
+        with open(introduction_path, 'r', encoding='utf-8') as f:
+            return f.read()
     
     def get_category(self, category_id: str) -> Optional[Category]:
         """Загружает категорию с её значками"""
@@ -94,9 +244,7 @@ class AIDataLoader:
                 return None
             
             # Загружаем index.json категории
-            category_path = self.base_path / category_info['path'] / "index.json"
-            with open(category_path, 'r', encoding='utf-8') as f:
-                category_data = json.load(f)
+            category_data = self._read_category_index(category_id, category_info)
             
             # Загружаем introduction.md если есть
             introduction = self.get_category_introduction(category_id)
@@ -141,42 +289,17 @@ class AIDataLoader:
             if not category_info:
                 return None
             
-            # Загружаем файл значка
-            badge_path = self.base_path / category_info['path'] / f"{badge_id}.json"
-            if not badge_path.exists():
-                self.logger.warning(f"⚠️ Файл значка не найден: {badge_path}")
-                return None
-            
-            with open(badge_path, 'r', encoding='utf-8') as f:
-                badge_data = json.load(f)
-            
-            # Создаем уровни значка
-            levels = []
-            for level_data in badge_data.get('levels', []):
-                level = BadgeLevel(
-                    id=level_data['id'],
-                    level=level_data['level'],
-                    title=level_data['title'],
-                    emoji=level_data['emoji'],
-                    criteria=level_data.get('criteria', ''),
-                    confirmation=level_data.get('confirmation', '')
-                )
-                levels.append(level)
-            
-            # Создаем объект Badge
-            badge = Badge(
-                id=badge_data['id'],
-                title=badge_data['title'],
-                emoji=badge_data['emoji'],
-                categoryId=badge_data['categoryId'],
-                description=badge_data.get('description', ''),
-                nameExplanation=badge_data.get('nameExplanation'),
-                skillTips=badge_data.get('skillTips'),
-                examples=badge_data.get('examples'),
-                philosophy=badge_data.get('philosophy'),
-                howToBecome=badge_data.get('howToBecome'),
-                levels=levels
-            )
+            if self._pack is not None:
+                # Значок уже проверен при сборке хранилища, тяжёлые поля остаются в mmap
+                badge = self._pack.get_badge(badge_id)
+                if badge is None:
+                    return None
+            else:
+                # Загружаем файл значка
+                badge_data = self._read_badge(badge_id, category_info)
+                if badge_data is None:
+                    return None
+                badge = build_badge(badge_data)
             
             self._badges_cache[badge_id] = badge
             self._load_stats['badge_loads'] += 1
@@ -187,6 +310,17 @@ class AIDataLoader:
             self.logger.error(f"❌ Ошибка загрузки значка {badge_id}: {e}")
             return None
     
+    def get_badge_level(self, level_id: str) -> Optional[BadgeLevel]:
+        """Получает уровень значка по его ID (например, 1.1.2)"""
+        badge_id = self._level_badge_ids.get(level_id) or '.'.join(level_id.split('.')[:2])
+        badge = self.get_badge(badge_id)
+        if not badge:
+            return None
+        for level in badge.levels:
+            if level.id == level_id:
+                return level
+        return None
+    
     def get_category_introduction(self, category_id: str) -> Optional[str]:
         """Загружает introduction.md категории"""
         if category_id in self._category_introductions_cache:
@@ -197,13 +331,10 @@ class AIDataLoader:
             if not category_info:
                 return None
             
-            introduction_path = self.base_path / category_info['path'] / "introduction.md"
-            if not introduction_path.exists():
+            introduction = self._read_introduction(category_id, category_info)
+            if introduction is None:
                 return None
             
-            with open(introduction_path, 'r', encoding='utf-8') as f:
-                introduction = f.read()
-            
             self._category_introductions_cache[category_id] = introduction
             self._load_stats['introduction_loads'] += 1
             
@@ -213,32 +344,22 @@ class AIDataLoader:
             self.logger.error(f"❌ Ошибка загрузки introduction для категории {category_id}: {e}")
             return None
     
-    def search_badges(self, query: str) -> List[Badge]:
-        """Поиск значков по запросу"""
-        query_lower = query.lower()
-        results = []
-        
-        # Сначала ищем в кэше
-        for badge in self._badges_cache.values():
-            if (query_lower in badge.title.lower() or
-                query_lower in badge.description.lower() or
-                (badge.skillTips and query_lower in badge.skillTips.lower())):
-                results.append(badge)
-        
-        # Если недостаточно результатов, загружаем категории
-        if len(results) < 5:
-            master_index = self.get_master_index()
-            for category_info in master_index.get('categories', []):
+    def get_search_index(self) -> SearchIndex:
+        """Получает полнотекстовый индекс значков (при первом вызове загружает все категории)"""
+        if self._search_index is None:
+            categories = []
+            for category_info in self.get_all_categories():
                 category = self.get_category(category_info['id'])
                 if category:
-                    for badge in category.badges:
-                        if badge not in results:
-                            if (query_lower in badge.title.lower() or
-                                query_lower in badge.description.lower() or
-                                (badge.skillTips and query_lower in badge.skillTips.lower())):
-                                results.append(badge)
-        
-        return results[:10]  # Возвращаем максимум 10 результатов
+                    categories.append(category)
+            badges = [badge for category in categories for badge in category.badges]
+            self._search_index = SearchIndex(categories, badges)
+            self.logger.info(f"🔎 Поисковый индекс построен: {self._search_index.stats()}")
+        return self._search_index
+    
+    def search_badges(self, query: str) -> List[Badge]:
+        """Поиск значков по запросу (по убыванию релевантности)"""
+        return [hit.badge for hit in self.get_search_index().search(query, limit=10)]
     
     def search_categories(self, query: str) -> List[Dict]:
         """Поиск категорий по запросу"""
@@ -272,6 +393,8 @@ class AIDataLoader:
         """Получает статистику загрузки"""
         return {
             **self._load_stats,
+            'snapshot': self.snapshot_info,
+            'badge_pack': self._pack.stats() if self._pack is not None else None,
             'cached_categories': len(self._categories_cache),
             'cached_badges': len(self._badges_cache),
             'cached_introductions': len(self._category_introductions_cache)
@@ -282,6 +405,7 @@ class AIDataLoader:
         self._categories_cache.clear()
         self._badges_cache.clear()
         self._category_introductions_cache.clear()
+        self._search_index = None
         self.logger.info("🧹 Кэш очищен")
     
     def preload_category(self, category_id: str):
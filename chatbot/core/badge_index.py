@@ -0,0 +1,117 @@
+"""
+Предпостроенный индекс для распознавания значков и категорий в сообщениях
+Строится один раз при загрузке данных вместо перебора всех значков на каждое сообщение
+"""
+import re
+from typing import Dict, List, Optional, Tuple
+
+from models.badge import Badge, BadgeLevel, Category
+from .text_matcher import AhoCorasick
+
+
+_CATEGORY = 0
+_BADGE = 1
+
+# Формы упоминания по номеру: "категория 7", "значка 1.2"
+CATEGORY_ID_PREFIXES = ("категория ", "категории ")
+BADGE_ID_PREFIXES = ("значок ", "значка ")
+
+_QUOTES_RE = re.compile(r'["\'`«»„“”‘’‚‹›]')
+
+
+def normalize_title(title: str) -> str:
+    """
+    Нормализует название для поиска: регистр, ё→е, кавычки и пробелы
+
+    Args:
+        title: Исходное название
+
+    Returns:
+        Ключ для сравнения названий
+    """
+    title = _QUOTES_RE.sub('', title.casefold().replace('ё', 'е'))
+    return ' '.join(title.split())
+
+
+class BadgeIndex:
+    """
+    Индекс названий, эмодзи и номеров значков и категорий
+
+    Названия и номера ищутся в сообщении в нижнем регистре, эмодзи — в исходном
+    сообщении (у части значков вместо эмодзи записано слово "Значок").
+    При нескольких совпадениях побеждает первая по порядку категория/значок.
+    """
+
+    def __init__(self, categories: List[Category], badges: List[Badge]):
+        """
+        Построение индекса
+
+        Args:
+            categories: Категории в порядке приоритета
+            badges: Значки в порядке приоритета
+        """
+        self.categories = categories
+        self.badges = badges
+        # Автомат по тексту в нижнем регистре, обрамлённому пробелами
+        self._text_matcher = AhoCorasick()
+        # Автомат по исходному тексту (эмодзи)
+        self._emoji_matcher = AhoCorasick()
+
+        for position, category in enumerate(categories):
+            self._add_entity(_CATEGORY, position, category.title, category.emoji, category.id, CATEGORY_ID_PREFIXES)
+        for position, badge in enumerate(badges):
+            self._add_entity(_BADGE, position, badge.title, badge.emoji, badge.id, BADGE_ID_PREFIXES)
+
+        self._text_matcher.build()
+        self._emoji_matcher.build()
+
+        # Нормализованные названия; при совпадении побеждает первый по порядку
+        self._badges_by_title: Dict[str, Badge] = {}
+        self._levels_by_title: Dict[str, BadgeLevel] = {}
+        for badge in badges:
+            self._badges_by_title.setdefault(normalize_title(badge.title), badge)
+            for level in badge.levels:
+                self._levels_by_title.setdefault(normalize_title(level.title), level)
+
+    def _add_entity(self, kind: int, position: int, title: str, emoji: str, entity_id: str, id_prefixes: Tuple[str, ...]):
+        # Название как отдельное слово (или всё сообщение целиком)
+        self._text_matcher.add(f" {title.lower()} ", (kind, position, False))
+        for prefix in id_prefixes:
+            # Номер не должен быть началом другого номера: "категория 1" != "категория 12"
+            self._text_matcher.add(f"{prefix}{entity_id}", (kind, position, True))
+        self._emoji_matcher.add(emoji, (kind, position, False))
+
+    def detect(self, message: str) -> Tuple[Optional[Category], Optional[Badge]]:
+        """
+        Находит категорию и значок, упомянутые в сообщении
+
+        Args:
+            message: Сообщение пользователя
+
+        Returns:
+            Первая упомянутая категория и первый упомянутый значок (или None)
+        """
+        best = [len(self.categories), len(self.badges)]
+
+        padded = f" {message.lower()} "
+        for _, end, (kind, position, needs_boundary) in self._text_matcher.iter_matches(padded):
+            if needs_boundary and padded[end].isdigit():
+                continue
+            if position < best[kind]:
+                best[kind] = position
+
+        for _, _, (kind, position, _) in self._emoji_matcher.iter_matches(message):
+            if position < best[kind]:
+                best[kind] = position
+
+        category = self.categories[best[_CATEGORY]] if best[_CATEGORY] < len(self.categories) else None
+        badge = self.badges[best[_BADGE]] if best[_BADGE] < len(self.badges) else None
+        return category, badge
+
+    def badge_by_title(self, title: str) -> Optional[Badge]:
+        """Находит значок по названию (без учёта регистра, ё, кавычек и лишних пробелов)"""
+        return self._badges_by_title.get(normalize_title(title))
+
+    def level_by_title(self, title: str) -> Optional[BadgeLevel]:
+        """Находит уровень значка по его названию"""
+        return self._levels_by_title.get(normalize_title(title))
@@ -0,0 +1,259 @@
+"""
+Упакованное хранилище значков с отображением в память (mmap)
+Длинные текстовые поля лежат в файле и декодируются только при обращении,
+поэтому несколько процессов бота делят одну копию данных в страничном кэше ОС
+"""
+import json
+import mmap
+import struct
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple, Union
+
+from pydantic import PrivateAttr, model_serializer
+
+from models.badge import Badge, BadgeLevel
+
+PACK_MAGIC = b"AIBPACK\0"
+PACK_VERSION = 1
+# Заголовок: сигнатура, версия, смещение и длина индекса
+_HEADER = struct.Struct("<8sIQQ")
+
+# Поля значка, которые хранятся в файле и не держатся в памяти
+HEAVY_FIELDS = ("nameExplanation", "skillTips", "examples", "philosophy", "howToBecome", "levels")
+
+# Участок файла: (смещение, длина)
+Span = Tuple[int, int]
+
+
+def build_badge(badge_data: Dict[str, Any]) -> Badge:
+    """
+    Создаёт проверенный значок из данных файла N.X.json
+
+    Args:
+        badge_data: Данные значка из ai-data
+
+    Returns:
+        Значок
+    """
+    levels = [
+        BadgeLevel(
+            id=level_data['id'],
+            level=level_data['level'],
+            title=level_data['title'],
+            emoji=level_data['emoji'],
+            criteria=level_data.get('criteria', ''),
+            confirmation=level_data.get('confirmation', '')
+        )
+        for level_data in badge_data.get('levels', [])
+    ]
+    return Badge(
+        id=badge_data['id'],
+        title=badge_data['title'],
+        emoji=badge_data['emoji'],
+        categoryId=badge_data['categoryId'],
+        description=badge_data.get('description', ''),
+        nameExplanation=badge_data.get('nameExplanation'),
+        skillTips=badge_data.get('skillTips'),
+        examples=badge_data.get('examples'),
+        philosophy=badge_data.get('philosophy'),
+        howToBecome=badge_data.get('howToBecome'),
+        levels=levels
+    )
+
+
+def _encode(value: Any) -> bytes:
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def build_badge_pack(snapshot: Dict[str, Any], output_path: Union[str, Path]) -> Dict[str, int]:
+    """
+    Записывает упакованное хранилище из снимка ai-data (core.snapshot.build_snapshot)
+
+    Формат: заголовок, блок с JSON-значениями тяжёлых полей и в конце JSON-индекс
+    (мастер-индекс, категории, лёгкие поля значков и смещения тяжёлых полей).
+    Значки проверяются при сборке, поэтому при чтении повторная проверка не нужна.
+
+    Args:
+        snapshot: Данные снимка
+        output_path: Путь к файлу хранилища
+
+    Returns:
+        Количество упакованных значков и размер файла в байтах
+    """
+    output_path = Path(output_path)
+    tmp_path = output_path.with_name(output_path.name + ".tmp")
+    badges = {}
+    categories = {}
+
+    with open(tmp_path, 'wb') as f:
+        f.write(b"\0" * _HEADER.size)
+        offset = _HEADER.size
+
+        def put(value: Any) -> Optional[Span]:
+            nonlocal offset
+            if value is None:
+                return None
+            blob = _encode(value)
+            f.write(blob)
+            span = (offset, len(blob))
+            offset += len(blob)
+            return span
+
+        for category_id, category in snapshot['categories'].items():
+            categories[category_id] = {
+                'index': category['index'],
+                'introduction': put(category['introduction'])
+            }
+
+        for badge_id, record in snapshot['badges'].items():
+            badge = build_badge(record['data']).model_dump()
+            badges[badge_id] = {
+                'light': {k: v for k, v in badge.items() if k not in HEAVY_FIELDS},
+                'heavy': {field: put(badge[field]) for field in HEAVY_FIELDS},
+                'levelIds': [level['id'] for level in badge['levels']],
+                'sourceHash': record['sourceHash']
+            }
+
+        index = _encode({
+            'builtAt': snapshot['builtAt'],
+            'sourceHash': snapshot['sourceHash'],
+            'masterIndex': snapshot['masterIndex'],
+            'categories': categories,
+            'badges': badges
+        })
+        f.write(index)
+        f.seek(0)
+        f.write(_HEADER.pack(PACK_MAGIC, PACK_VERSION, offset, len(index)))
+
+    tmp_path.replace(output_path)
+    return {'badges': len(badges), 'bytes': offset + len(index)}
+
+
+class LazyBadge(Badge):
+    """
+    Значок из упакованного хранилища
+
+    Лёгкие поля хранятся в объекте, тяжёлые (HEAVY_FIELDS) читаются из mmap
+    при каждом обращении и не задерживаются в памяти процесса. Исключение —
+    уровни: их читают почти все запросы о значке (и индексы всё равно держат
+    объекты уровней), поэтому они декодируются один раз и остаются в объекте.
+    """
+    _pack: Any = PrivateAttr(None)
+    _spans: Dict[str, Optional[Span]] = PrivateAttr(default_factory=dict)
+
+    def __getattr__(self, name: str) -> Any:
+        if name in HEAVY_FIELDS:
+            span = self._spans.get(name)
+            value = self._pack.read_value(span) if span else None
+            if name == "levels":
+                levels = [BadgeLevel.model_construct(**level) for level in value or []]
+                # Дальше атрибут находится в __dict__, и __getattr__ не вызывается
+                self.__dict__[name] = levels
+                return levels
+            return value
+        return super().__getattr__(name)
+
+    @model_serializer(mode='wrap')
+    def _serialize_heavy_fields(self, handler):
+        # Сериализатор pydantic читает только __dict__, тяжёлые поля добавляем сами
+        data = handler(self)
+        for name in HEAVY_FIELDS:
+            value = getattr(self, name)
+            data[name] = [level.model_dump() for level in value] if name == "levels" else value
+        return {name: data[name] for name in type(self).model_fields if name in data}
+
+
+class BadgePack:
+    """Упакованное хранилище значков, открытое только для чтения"""
+
+    def __init__(self, pack_path: Union[str, Path]):
+        """
+        Открывает файл хранилища
+
+        Args:
+            pack_path: Путь к файлу (build_snapshot.py)
+
+        Raises:
+            ValueError: Файл не является хранилищем поддерживаемой версии
+        """
+        self.pack_path = Path(pack_path)
+        self._file = open(self.pack_path, 'rb')
+        try:
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, version, index_offset, index_length = _HEADER.unpack_from(self._mm, 0)
+            if magic != PACK_MAGIC or version != PACK_VERSION:
+                raise ValueError(f"Неподдерживаемое хранилище значков: {self.pack_path} (v{version})")
+            index = json.loads(self._mm[index_offset:index_offset + index_length])
+        except Exception:
+            self.close()
+            raise
+
+        self.version = version
+        self.built_at = index['builtAt']
+        self.source_hash = index['sourceHash']
+        self.master_index: Dict = index['masterIndex']
+        self._categories: Dict[str, Dict] = index['categories']
+        self._badges: Dict[str, Dict] = index['badges']
+        self._heavy_reads = 0
+
+    def __contains__(self, badge_id: str) -> bool:
+        return badge_id in self._badges
+
+    def read_value(self, span: Span) -> Any:
+        """Декодирует значение из участка файла"""
+        offset, length = span
+        self._heavy_reads += 1
+        return json.loads(self._mm[offset:offset + length])
+
+    def get_badge(self, badge_id: str) -> Optional[LazyBadge]:
+        """Создаёт значок с ленивыми тяжёлыми полями (None — значка нет)"""
+        record = self._badges.get(badge_id)
+        if record is None:
+            return None
+        badge = LazyBadge.model_construct(**record['light'])
+        # model_construct заполнил тяжёлые поля значениями по умолчанию — убираем их
+        for name in HEAVY_FIELDS:
+            badge.__dict__.pop(name, None)
+        badge._pack = self
+        badge._spans = record['heavy']
+        return badge
+
+    def badge_source_hash(self, badge_id: str) -> Optional[str]:
+        """Хэш исходного файла значка"""
+        record = self._badges.get(badge_id)
+        return record['sourceHash'] if record else None
+
+    def level_badge_ids(self) -> Dict[str, str]:
+        """ID уровня -> ID значка, в котором он описан"""
+        return {
+            level_id: badge_id
+            for badge_id, record in self._badges.items()
+            for level_id in record['levelIds']
+        }
+
+    def category_index(self, category_id: str) -> Dict:
+        """index.json категории"""
+        return self._categories[category_id]['index']
+
+    def category_introduction(self, category_id: str) -> Optional[str]:
+        """introduction.md категории (None — нет категории или введения)"""
+        category = self._categories.get(category_id)
+        if not category or not category['introduction']:
+            return None
+        return self.read_value(category['introduction'])
+
+    def stats(self) -> Dict:
+        """Размер файла и число чтений тяжёлых полей"""
+        return {
+            'path': str(self.pack_path),
+            'bytes': len(self._mm) if not self._mm.closed else 0,
+            'badges': len(self._badges),
+            'heavy_reads': self._heavy_reads
+        }
+
+    def close(self):
+        """Закрывает отображение и файл"""
+        mm = getattr(self, '_mm', None)
+        if mm is not None and not mm.closed:
+            mm.close()
+        self._file.close()
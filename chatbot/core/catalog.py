@@ -0,0 +1,185 @@
+"""
+Каталог значков для API поиска и рекомендаций
+Карточки значков и фасеты считаются заранее, ответы помечаются ETag
+"""
+import hashlib
+import json
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from models.badge import Badge, Category
+from .embeddings import SemanticIndex
+from .search_index import SearchHit, SearchIndex, highlight, iter_terms
+
+# Длина фрагмента описания в результатах поиска
+SNIPPET_LENGTH = 160
+
+# Смысловой поиск: сколько ближайших значков рассматривать и минимальная близость
+SEMANTIC_SEARCH_LIMIT = 50
+SEMANTIC_MIN_SIMILARITY = 0.05
+
+
+def make_etag(*parts: Any) -> str:
+    """
+    Строит ETag ответа по версии данных и параметрам запроса
+
+    Args:
+        parts: Всё, от чего зависит тело ответа
+
+    Returns:
+        Слабый ETag в кавычках
+    """
+    payload = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str)
+    return f'W/"{hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Проверяет заголовок If-None-Match"""
+    if not if_none_match:
+        return False
+    candidates = {tag.strip() for tag in if_none_match.split(",")}
+    # Сравнение слабое: W/"x" и "x" совпадают
+    return "*" in candidates or etag in candidates or etag[2:] in candidates
+
+
+class BadgeCatalog:
+    """
+    Карточки значков, поиск с фасетами и пагинацией
+
+    Данные каталога неизменны, пока не перестроен поисковый индекс, поэтому
+    ETag ответа зависит только от отпечатка индекса и параметров запроса.
+    """
+
+    def __init__(
+        self,
+        categories: List[Category],
+        search_index: SearchIndex,
+        semantic_index: Optional[SemanticIndex] = None
+    ):
+        """
+        Построение каталога
+
+        Args:
+            categories: Все категории
+            search_index: Поисковый индекс по тем же значкам
+            semantic_index: Эмбеддинги значков для смыслового поиска (необязательно)
+        """
+        self.search_index = search_index
+        self.semantic_index = semantic_index
+        self.version = search_index.fingerprint
+        if semantic_index is not None:
+            self.version = f"{self.version}:{semantic_index.model.name}"
+        self._badges = {badge.id: badge for badge in search_index.badges}
+        self._categories = {category.id: category for category in categories}
+        # Карточки в порядке документов индекса
+        self._cards: Dict[str, Dict[str, Any]] = {}
+        self._levels_count: Dict[str, int] = {}
+        for badge in search_index.badges:
+            levels_count = len(badge.levels)
+            self._levels_count[badge.id] = levels_count
+            self._cards[badge.id] = self._make_card(badge, levels_count)
+
+    def _make_card(self, badge: Badge, levels_count: int) -> Dict[str, Any]:
+        category = self._categories.get(badge.categoryId)
+        return {
+            "id": badge.id,
+            "title": badge.title,
+            "emoji": badge.emoji,
+            "category_id": badge.categoryId,
+            "category_title": category.title if category else None,
+            "description": badge.description,
+            "levels_count": levels_count
+        }
+
+    def card(self, badge_id: str) -> Optional[Dict[str, Any]]:
+        """Карточка значка (None — значка нет в каталоге)"""
+        return self._cards.get(badge_id)
+
+    def levels_count(self, badge_id: str) -> int:
+        """Количество уровней значка без декодирования уровней"""
+        return self._levels_count.get(badge_id, 0)
+
+    def _semantic_hits(self, query: str) -> List[SearchHit]:
+        # Слова запроса подсвечиваются так же, как в полнотекстовом поиске
+        terms = frozenset(term for _, _, term in iter_terms(query))
+        return [
+            SearchHit(self._badges[badge_id], similarity, terms)
+            for badge_id, similarity in self.semantic_index.search(query, k=SEMANTIC_SEARCH_LIMIT)
+            if similarity >= SEMANTIC_MIN_SIMILARITY and badge_id in self._badges
+        ]
+
+    def search(
+        self,
+        query: str,
+        page: int = 1,
+        per_page: int = 10,
+        category_id: Optional[str] = None,
+        levels_count: Optional[int] = None,
+        mode: str = "text"
+    ) -> Dict[str, Any]:
+        """
+        Поиск значков с фасетами, подсветкой и пагинацией
+
+        Args:
+            query: Текст запроса
+            page: Номер страницы (с 1)
+            per_page: Результатов на странице
+            category_id: Фильтр по категории
+            levels_count: Фильтр по количеству уровней
+            mode: "text" — полнотекстовый поиск, "semantic" — по эмбеддингам
+                (без семантического индекса выполняется полнотекстовый)
+
+        Returns:
+            Тело ответа /search
+        """
+        if mode == "semantic" and self.semantic_index is not None:
+            hits = self._semantic_hits(query)
+        else:
+            mode = "text"
+            hits = self.search_index.search(query, limit=None)
+
+        # Фасеты считаются по всем найденным значкам, до фильтров
+        category_counts = Counter(hit.badge.categoryId for hit in hits)
+        levels_counts = Counter(self.levels_count(hit.badge.id) for hit in hits)
+
+        if category_id is not None:
+            hits = [hit for hit in hits if hit.badge.categoryId == category_id]
+        if levels_count is not None:
+            hits = [hit for hit in hits if self.levels_count(hit.badge.id) == levels_count]
+
+        start = (page - 1) * per_page
+        results = []
+        for hit in hits[start:start + per_page]:
+            badge = hit.badge
+            results.append({
+                **self._cards[badge.id],
+                "score": round(hit.score, 4),
+                "highlight": {
+                    "title": highlight(badge.title, hit.terms),
+                    "description": highlight(badge.description, hit.terms, SNIPPET_LENGTH)
+                }
+            })
+
+        return {
+            "query": query,
+            "mode": mode,
+            "total": len(hits),
+            "page": page,
+            "per_page": per_page,
+            "pages": (len(hits) + per_page - 1) // per_page,
+            "results": results,
+            "facets": {
+                "categories": [
+                    {
+                        "id": cid,
+                        "title": self._categories[cid].title if cid in self._categories else None,
+                        "count": count
+                    }
+                    for cid, count in sorted(category_counts.items(), key=lambda item: (-item[1], item[0]))
+                ],
+                "levels_count": [
+                    {"levels_count": value, "count": count}
+                    for value, count in sorted(levels_counts.items())
+                ]
+            }
+        }
@@ -2,51 +2,149 @@
 Система управления контекстом пользователя
 """
 from typing import Dict, Optional, List, Any
-from datetime import datetime, timedelta
-import json
-import os
+from datetime import datetime
+import asyncio
+import time
 
 from models.conversation import UserContext, Conversation, Message
 from core.data_loader import DataLoader
+from core.persistence import WriteBehindWriter
+from core.embeddings import SemanticIndex
+from core.recommender import BadgeRecommender
+from core.session_cache import SessionCache
+from core.storage import CONTEXT, CONVERSATION, FileStorage, StorageBackend, conversation_id_for
+
+# Интересы, которые распознаются в сообщениях, и их ключевые слова
+INTEREST_KEYWORDS = {
+    "творчество": ["творчество", "рисование", "музыка", "танцы", "театр"],
+    "спорт": ["спорт", "бег", "футбол", "плавание", "фитнес"],
+    "наука": ["наука", "эксперименты", "математика", "физика", "химия"],
+    "природа": ["природа", "экология", "животные", "растения", "лес"],
+    "технологии": ["технологии", "программирование", "роботы", "компьютеры"],
+    "общение": ["общение", "дружба", "команда", "лидерство", "помощь"]
+}
+
+# Уровни пользователя, которые распознаются в сообщениях
+USER_LEVELS = ("beginner", "advanced", "expert")
+
+
+class UserSession:
+    """Данные пользователя в памяти: контекст и (подгружаемый по требованию) диалог"""
+    
+    __slots__ = ('context', 'conversation', 'version')
+    
+    def __init__(self, context: UserContext, conversation: Optional[Conversation] = None, version: float = 0.0):
+        self.context = context
+        self.conversation = conversation
+        # Версия данных в хранилище, с которой загружена сессия (для общего хранилища)
+        self.version = version
+    
+    def estimate_size(self) -> int:
+        """Грубая оценка занимаемой памяти в байтах"""
+        size = 1024 + 64 * len(self.context.session_data) + 32 * len(self.context.interests)
+        if self.conversation is not None:
+            for message in self.conversation.messages:
+                # Строки с кириллицей занимают по 2 байта на символ
+                size += 256 + 2 * len(message.content)
+            size += 2 * len(self.conversation.summary)
+        return size
 
 
 class ContextManager:
     """Менеджер контекста пользователей"""
     
-    def __init__(self, data_loader: DataLoader, storage_path: str = "chatbot/storage"):
+    def __init__(
+        self,
+        data_loader: DataLoader,
+        storage_path: str = "chatbot/storage",
+        storage: Optional[StorageBackend] = None,
+        flush_interval: float = 2.0,
+        session_cache: Optional[SessionCache] = None,
+        semantic_index: Optional[SemanticIndex] = None,
+        shared_storage: bool = False
+    ):
         """
         Инициализация менеджера контекста
         
         Args:
             data_loader: Загрузчик данных значков
-            storage_path: Путь для сохранения контекста
+            storage_path: Путь для сохранения контекста (если хранилище не передано)
+            storage: Хранилище контекстов и диалогов
+            flush_interval: Интервал отложенной записи в хранилище (сек)
+            session_cache: Кэш сессий в памяти (если не указан, создаётся с настройками по умолчанию)
+            semantic_index: Эмбеддинги значков для сопоставления интересов по смыслу
+            shared_storage: Хранилище общее для нескольких процессов: изменения пишутся
+                сразу, а сессия в памяти перечитывается, если её изменил другой процесс
+                (проверяется в refresh_session, раз в запрос)
         """
         self.data_loader = data_loader
         self.storage_path = storage_path
-        self._contexts: Dict[str, UserContext] = {}
-        self._conversations: Dict[str, Conversation] = {}
-        
-        # Создаем папку для хранения если её нет
-        os.makedirs(storage_path, exist_ok=True)
-        
-        # Загружаем сохраненные контексты
-        self._load_contexts()
-        
-        # Загружаем сохраненные диалоги
-        self._load_conversations()
+        self.storage = storage or FileStorage(storage_path)
+        # Отложенная запись: запускается и останавливается владельцем (lifespan)
+        self.writer = WriteBehindWriter(self.storage, flush_interval=flush_interval)
+        # Пользователи подгружаются из хранилища при первом обращении и вытесняются при простое
+        self.sessions = session_cache or SessionCache()
+        self.sessions.on_evict = self._on_session_evicted
+        # Признаки значков для рекомендаций (данные значков не меняются во время работы)
+        self._recommender: Optional[BadgeRecommender] = None
+        self.semantic_index = semantic_index
+        self.shared_storage = shared_storage
+        self._reloads = 0
+    
+    def _load(self, key, loader):
+        """Берёт ещё не записанный объект из очереди записи, иначе читает хранилище"""
+        pending = self.writer.pending(key)
+        return pending if pending is not None else loader(key[1])
+    
+    async def refresh_session(self, user_id: str):
+        """
+        С общим хранилищем перечитывает сессию, если её изменил другой процесс
+
+        Вызывается один раз в начале обработки запроса: версия читается из
+        хранилища в отдельном потоке, остальные обращения к сессии в этом
+        запросе хранилище не проверяют.
+
+        Args:
+            user_id: ID пользователя
+        """
+        if not self.shared_storage:
+            return
+        version = await asyncio.to_thread(self.storage.version, user_id)
+        session = self.sessions.get(user_id)
+        if session is not None and version > session.version:
+            # Пользователь обращался к другому процессу — берём его данные из хранилища
+            self.sessions.pop(user_id)
+            self._reloads += 1
+            session = None
+        if session is None:
+            self._get_session(user_id).version = version
+
+    def _get_session(self, user_id: str) -> UserSession:
+        """Получает сессию пользователя из памяти или хранилища"""
+        session = self.sessions.get(user_id)
+        if session is None:
+            context = self._load((CONTEXT, user_id), self.storage.load_context)
+            if context is None:
+                context = UserContext(
+                    user_id=user_id,
+                    current_category=None,
+                    current_badge=None,
+                    level="beginner"
+                )
+            session = UserSession(context)
+            self.sessions.put(user_id, session, session.estimate_size())
+        return session
+    
+    def _on_session_evicted(self, user_id: str, session: UserSession, reason: str):
+        """Вытесненная сессия остаётся в очереди записи — сбрасываем её, не дожидаясь таймера"""
+        if self.writer.pending((CONTEXT, user_id)) or self.writer.pending((CONVERSATION, user_id)):
+            self.writer.request_flush()
     
     def get_user_context(self, user_id: str) -> UserContext:
         """Получает контекст пользователя"""
-        if user_id not in self._contexts:
-            self._contexts[user_id] = UserContext(
-                user_id=user_id,
-                current_category=None,
-                current_badge=None,
-                level="beginner"
-            )
-        return self._contexts[user_id]
+        return self._get_session(user_id).context
     
-    def update_user_context(
+    async def update_user_context(
         self,
         user_id: str,
         current_category: Optional[str] = None,
@@ -84,11 +182,11 @@ class ContextManager:
         context.session_data.update(kwargs)
         
         # Сохраняем контекст
-        self._save_context(context)
+        await self._save_context(context)
         
         return context
     
-    def detect_context_from_message(self, user_id: str, message: str) -> UserContext:
+    async def detect_context_from_message(self, user_id: str, message: str) -> UserContext:
         """
         Определяет контекст из сообщения пользователя
         
@@ -103,49 +201,24 @@ class ContextManager:
         message_lower = message.lower()
         
         
-        # Поиск упоминаний категорий (только если не установлена из веб-контекста)
-        if not context.current_category:
-            categories = self.data_loader.get_all_categories()
-            for category in categories:
-                # Более точный поиск - ищем полное название категории или точные упоминания
-                category_title_lower = category.title.lower()
-                if (category_title_lower == message_lower or  # Точное совпадение
-                    f" {category_title_lower} " in f" {message_lower} " or  # Категория как отдельное слово
-                    category.emoji in message or
-                    f"категория {category.id}" in message_lower or
-                    f"категории {category.id}" in message_lower):
-                    context.current_category = category.id
-                    context.current_badge = None  # Сбрасываем значок при смене категории
-                    break
-        
-        # Поиск упоминаний значков (только если не установлен из веб-контекста)
-        if not context.current_badge:
-            all_badges = self.data_loader.get_all_badges()
-            for badge in all_badges:
-                # Более точный поиск - ищем полное название значка или точные упоминания
-                badge_title_lower = badge.title.lower()
-                if (badge_title_lower == message_lower or  # Точное совпадение
-                    f" {badge_title_lower} " in f" {message_lower} " or  # Значок как отдельное слово
-                    badge.emoji in message or
-                    f"значок {badge.id}" in message_lower or
-                    f"значка {badge.id}" in message_lower):
-                    context.current_badge = badge.id
-                    if not context.current_category:  # Устанавливаем категорию только если не установлена
-                        context.current_category = badge.categoryId
-                    break
+        # Поиск упоминаний категорий и значков по предпостроенному индексу
+        if not context.current_category or not context.current_badge:
+            category, badge = self.data_loader.get_badge_index().detect(message)
+            
+            # Категория — только если не установлена из веб-контекста
+            if not context.current_category and category:
+                context.current_category = category.id
+                context.current_badge = None  # Сбрасываем значок при смене категории
+            
+            # Значок — только если не установлен из веб-контекста
+            if not context.current_badge and badge:
+                context.current_badge = badge.id
+                if not context.current_category:  # Устанавливаем категорию только если не установлена
+                    context.current_category = badge.categoryId
         
         # Определение интересов по ключевым словам
-        interest_keywords = {
-            "творчество": ["творчество", "рисование", "музыка", "танцы", "театр"],
-            "спорт": ["спорт", "бег", "футбол", "плавание", "фитнес"],
-            "наука": ["наука", "эксперименты", "математика", "физика", "химия"],
-            "природа": ["природа", "экология", "животные", "растения", "лес"],
-            "технологии": ["технологии", "программирование", "роботы", "компьютеры"],
-            "общение": ["общение", "дружба", "команда", "лидерство", "помощь"]
-        }
-        
         detected_interests = []
-        for interest, keywords in interest_keywords.items():
+        for interest, keywords in INTEREST_KEYWORDS.items():
             if any(keyword in message_lower for keyword in keywords):
                 if interest not in context.interests:
                     detected_interests.append(interest)
@@ -163,7 +236,7 @@ class ContextManager:
             context.level = "expert"
         
         # Сохраняем обновленный контекст
-        self._save_context(context)
+        await self._save_context(context)
         
         
         return context
@@ -231,95 +304,69 @@ class ContextManager:
         Returns:
             Список рекомендаций
         """
-        context = self.get_user_context(user_id)
-        recommendations = []
-        
-        # Получаем все значки
-        all_categories = self.data_loader.get_all_categories()
-        
-        for category in all_categories:
-            for badge in category.badges:
-                score = self._calculate_badge_score(badge, context)
-                if score > 0:
-                    recommendations.append({
-                        "badge": badge,
-                        "category": category,
-                        "score": score,
-                        "reason": self._get_recommendation_reason(badge, context)
-                    })
-        
-        # Сортируем по релевантности
-        recommendations.sort(key=lambda x: x["score"], reverse=True)
-        
-        return recommendations[:limit]
+        return self._get_recommender().recommend(self.get_user_context(user_id), limit=limit)
     
-    def _calculate_badge_score(self, badge, context: UserContext) -> float:
-        """Вычисляет релевантность значка для пользователя"""
-        score = 0.0
-        
-        # Базовый балл
-        score += 1.0
-        
-        # Бонус за соответствие интересам
-        if context.interests:
-            badge_text = f"{badge.title} {badge.description}".lower()
-            for interest in context.interests:
-                if interest.lower() in badge_text:
-                    score += 2.0
-        
-        # Бонус за текущую категорию
-        if context.current_category and badge.categoryId == context.current_category:
-            score += 1.5
-        
-        # Бонус за уровень сложности
-        if context.level == "beginner" and len(badge.levels) <= 2:
-            score += 1.0
-        elif context.level == "advanced" and len(badge.levels) >= 3:
-            score += 1.0
-        
-        return score
-    
-    def _get_recommendation_reason(self, badge, context: UserContext) -> str:
-        """Получает причину рекомендации значка"""
-        reasons = []
-        
-        if context.interests:
-            badge_text = f"{badge.title} {badge.description}".lower()
-            for interest in context.interests:
-                if interest.lower() in badge_text:
-                    reasons.append(f"соответствует вашему интересу к {interest}")
-        
-        if context.current_category and badge.categoryId == context.current_category:
-            reasons.append("из вашей текущей категории")
-        
-        if context.level == "beginner" and len(badge.levels) <= 2:
-            reasons.append("подходит для начинающих")
-        elif context.level == "advanced" and len(badge.levels) >= 3:
-            reasons.append("подходит для продвинутых")
+    def get_batch_recommendations(self, user_ids: List[str], limit: int = 5) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Получает рекомендации сразу для нескольких пользователей
         
-        return ", ".join(reasons) if reasons else "может быть интересен"
+        Args:
+            user_ids: ID пользователей
+            limit: Максимальное количество рекомендаций на пользователя
+            
+        Returns:
+            ID пользователя -> список рекомендаций
+        """
+        contexts = [self.get_user_context(user_id) for user_id in user_ids]
+        results = self._get_recommender().recommend_many(contexts, limit=limit)
+        return dict(zip(user_ids, results))
+    
+    def preload_recommender(self):
+        """Строит матрицу признаков значков заранее, а не при первом запросе рекомендаций"""
+        self._get_recommender()
+    
+    def _get_recommender(self) -> BadgeRecommender:
+        """Матрица признаков значков строится при первом запросе рекомендаций"""
+        if self._recommender is None:
+            self._recommender = BadgeRecommender(self.data_loader.get_all_categories(), self.semantic_index)
+        return self._recommender
     
-    def _save_context(self, context: UserContext):
-        """Сохраняет контекст пользователя"""
-        file_path = os.path.join(self.storage_path, f"context_{context.user_id}.json")
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(context.dict(), f, ensure_ascii=False, indent=2, default=str)
+    async def _save_context(self, context: UserContext):
+        """Помечает контекст пользователя к сохранению"""
+        self.writer.mark_dirty((CONTEXT, context.user_id), context)
+        await self._write_through(context.user_id)
     
-    def _load_contexts(self):
-        """Загружает сохраненные контексты"""
-        if not os.path.exists(self.storage_path):
+    async def _write_through(self, user_id: str):
+        """С общим хранилищем изменения пользователя записываются сразу, чтобы их увидели другие процессы"""
+        if not self.shared_storage:
             return
-        
-        for filename in os.listdir(self.storage_path):
-            if filename.startswith("context_") and filename.endswith(".json"):
-                file_path = os.path.join(self.storage_path, filename)
-                try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        data = json.load(f)
-                    context = UserContext(**data)
-                    self._contexts[context.user_id] = context
-                except Exception as e:
-                    print(f"Ошибка загрузки контекста {filename}: {e}")
+        # Время записи задаём сами: оно и есть новая версия сессии, перечитывать её не нужно
+        touched_at = time.time()
+        failed = await self.writer.flush_keys([(CONTEXT, user_id), (CONVERSATION, user_id)], touched_at)
+        session = self.sessions.get(user_id)
+        if session is not None and not failed:
+            session.version = touched_at
+    
+    def stats(self) -> Dict[str, Any]:
+        """Режим хранилища и перечитывания сессий, изменённых другими процессами"""
+        return {
+            "shared_storage": self.shared_storage,
+            "reloads": self._reloads
+        }
+    
+    def _get_conversation(self, user_id: str) -> Conversation:
+        """Получает диалог пользователя из памяти, хранилища или создаёт новый"""
+        session = self._get_session(user_id)
+        if session.conversation is None:
+            conversation = self._load((CONVERSATION, user_id), self.storage.load_conversation)
+            if conversation is None:
+                conversation = Conversation(
+                    conversation_id=conversation_id_for(user_id),
+                    user_context=session.context
+                )
+            session.conversation = conversation
+            self.sessions.resize(user_id, session.estimate_size())
+        return session.conversation
     
     def get_conversation_history(self, user_id: str) -> List[Message]:
         """
@@ -331,15 +378,35 @@ class ContextManager:
         Returns:
             Список сообщений из истории
         """
-        if user_id not in self._conversations:
-            self._conversations[user_id] = Conversation(
-                conversation_id=f"conv_{user_id}",
-                user_context=self.get_user_context(user_id)
-            )
+        return self._get_conversation(user_id).messages
+    
+    def get_conversation(self, user_id: str) -> Conversation:
+        """
+        Получает диалог пользователя (сообщения и краткое содержание)
         
-        return self._conversations[user_id].messages
+        Args:
+            user_id: ID пользователя
+            
+        Returns:
+            Диалог
+        """
+        return self._get_conversation(user_id)
     
-    def add_message_to_history(self, user_id: str, message: Message):
+    async def update_conversation_summary(self, user_id: str, summary: str, summary_until: datetime):
+        """
+        Сохраняет краткое содержание ранних сообщений диалога
+        
+        Args:
+            user_id: ID пользователя
+            summary: Новое краткое содержание
+            summary_until: Время последнего сообщения, вошедшего в содержание
+        """
+        conversation = self._get_conversation(user_id)
+        conversation.summary = summary
+        conversation.summary_until = summary_until
+        await self._save_conversation(user_id, conversation)
+    
+    async def add_message_to_history(self, user_id: str, message: Message):
         """
         Добавляет сообщение в историю пользователя
         
@@ -347,13 +414,7 @@ class ContextManager:
             user_id: ID пользователя
             message: Сообщение для добавления
         """
-        if user_id not in self._conversations:
-            self._conversations[user_id] = Conversation(
-                conversation_id=f"conv_{user_id}",
-                user_context=self.get_user_context(user_id)
-            )
-        
-        conversation = self._conversations[user_id]
+        conversation = self._get_conversation(user_id)
         conversation.messages.append(message)
         conversation.updated_at = datetime.now()
         
@@ -362,42 +423,40 @@ class ContextManager:
             conversation.messages = conversation.messages[-20:]
         
         # Сохраняем историю
-        self._save_conversation(conversation)
+        await self._save_conversation(user_id, conversation)
     
-    def _save_conversation(self, conversation: Conversation):
-        """Сохраняет историю диалога"""
-        file_path = os.path.join(self.storage_path, f"conversation_{conversation.conversation_id}.json")
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(conversation.dict(), f, ensure_ascii=False, indent=2, default=str)
+    async def _save_conversation(self, user_id: str, conversation: Conversation):
+        """Помечает историю диалога к сохранению"""
+        self.writer.mark_dirty((CONVERSATION, user_id), conversation)
+        session = self.sessions.get(user_id)
+        if session is not None:
+            self.sessions.resize(user_id, session.estimate_size())
+        await self._write_through(user_id)
     
-    def _load_conversations(self):
-        """Загружает сохраненные диалоги"""
-        if not os.path.exists(self.storage_path):
-            return
+    def clear_old_contexts(self, days: int = 30) -> Dict[str, int]:
+        """
+        Удаляет контексты и диалоги пользователей, неактивных дольше days дней
         
-        for filename in os.listdir(self.storage_path):
-            if filename.startswith("conversation_") and filename.endswith(".json"):
-                file_path = os.path.join(self.storage_path, filename)
-                try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        data = json.load(f)
-                    conversation = Conversation(**data)
-                    # Извлекаем user_id из conversation_id
-                    user_id = conversation.conversation_id.replace("conv_", "")
-                    self._conversations[user_id] = conversation
-                except Exception as e:
-                    print(f"Ошибка загрузки диалога {filename}: {e}")
-    
-    def clear_old_contexts(self, days: int = 30):
-        """Очищает старые контексты"""
-        cutoff_date = datetime.now() - timedelta(days=days)
-        
-        for user_id, context in list(self._contexts.items()):
-            # Здесь можно добавить логику очистки старых контекстов
-            # Пока просто удаляем неактивные
-            pass
+        Args:
+            days: Срок хранения в днях
+            
+        Returns:
+            Сколько пользователей удалено из памяти и из хранилища
+        """
+        cutoff = time.time() - days * 24 * 3600
+        
+        purged = self.sessions.purge_older_than(cutoff)
+        for user_id in purged:
+            # Устаревшие данные не должны вернуться в хранилище при следующем сбросе
+            self.writer.discard((CONTEXT, user_id))
+            self.writer.discard((CONVERSATION, user_id))
+        
+        return {
+            "memory": len(purged),
+            "storage": self.storage.purge_older_than(cutoff)
+        }
     
-    def update_web_context(self, user_id: str, web_context):
+    async def update_web_context(self, user_id: str, web_context):
         """
         Обновляет контекст пользователя на основе веб-интерфейса
         
@@ -438,7 +497,7 @@ class ContextManager:
         context.session_data['current_level_badge_title'] = web_context.current_level_badge_title
         
         # Сохраняем обновленный контекст
-        self._save_context(context)
+        await self._save_context(context)
         
         print(f"🔄 Обновлен контекст для пользователя {user_id}:")
         print(f"   📱 Экран: {web_context.current_view}")
@@ -0,0 +1,186 @@
+"""
+Скользящее краткое содержание диалога
+В промпт идут последние сообщения в пределах бюджета токенов, а вышедшие
+из этого окна сжимаются в краткое содержание, которое хранится в Conversation
+"""
+import logging
+from typing import Dict, List, Optional, Set
+
+from models.conversation import Conversation, Message
+from core.openai_client import OpenAIClient
+from core.prompt_assembly import TokenCounter
+
+logger = logging.getLogger(__name__)
+
+# Заголовок секции с кратким содержанием в контексте промпта
+SUMMARY_HEADER = "## Краткое содержание разговора"
+# Реплика в новых сообщениях для содержания обрезается до стольких токенов
+TRANSCRIPT_MESSAGE_TOKENS = 300
+# Не больше стольких сообщений в окне (как и прежнее ограничение истории)
+MAX_WINDOW_MESSAGES = 10
+# Содержание дописывается, когда вне окна накопилось столько новых сообщений
+SUMMARY_BATCH_MESSAGES = 6
+
+_ROLE_NAMES = {"user": "Пользователь", "assistant": "Бот"}
+
+
+class ConversationSummarizer:
+    """
+    Окно истории по бюджету токенов и инкрементальное краткое содержание
+
+    Окно набирается с конца диалога, пока хватает бюджета (последнее сообщение
+    входит всегда). Сообщения старше окна, ещё не учтённые в содержании
+    (новее Conversation.summary_until), дописываются в содержание одним
+    запросом к модели — не на каждом ходе, а пачкой, когда их накопилось
+    batch_messages или batch_tokens токенов. До этого окно просто сдвигается,
+    и последние вышедшие из него реплики в промпт не попадают.
+    """
+
+    def __init__(
+        self,
+        openai_client: OpenAIClient,
+        counter: TokenCounter,
+        history_budget: int = 1500,
+        summary_max_tokens: int = 300,
+        batch_messages: int = SUMMARY_BATCH_MESSAGES,
+        batch_tokens: Optional[int] = None
+    ):
+        """
+        Args:
+            openai_client: Клиент OpenAI для составления содержания
+            counter: Счётчик токенов
+            history_budget: Бюджет сообщений истории в промпте (токены)
+            summary_max_tokens: Максимальная длина содержания (токены)
+            batch_messages: Сколько сообщений вне окна копить до обновления содержания
+            batch_tokens: Сколько токенов вне окна копить до обновления (по умолчанию половина history_budget)
+        """
+        self.openai_client = openai_client
+        self.counter = counter
+        self.history_budget = history_budget
+        self.summary_max_tokens = summary_max_tokens
+        self.batch_messages = batch_messages
+        self.batch_tokens = history_budget // 2 if batch_tokens is None else batch_tokens
+        # Пользователи, для которых содержание уже обновляется
+        self._in_progress: Set[str] = set()
+        self._updates = 0
+        self._skipped = 0
+        self._deferred = 0
+        self._errors = 0
+
+    def window_start(self, messages: List[Message]) -> int:
+        """
+        Индекс первого сообщения, которое идёт в промпт дословно
+
+        Args:
+            messages: Сообщения диалога
+
+        Returns:
+            Начало окна (len(messages) — сообщений нет)
+        """
+        start = len(messages)
+        used = 0
+        while start > 0 and len(messages) - start < MAX_WINDOW_MESSAGES:
+            cost = self._message_tokens(messages[start - 1])
+            if used + cost > self.history_budget and start < len(messages):
+                break
+            used += cost
+            start -= 1
+        return start
+
+    def window(self, messages: List[Message]) -> List[Message]:
+        """Сообщения, которые идут в промпт дословно"""
+        return messages[self.window_start(messages):]
+
+    def summary_section(self, conversation: Conversation) -> str:
+        """Секция контекста с кратким содержанием (пусто — содержания нет)"""
+        if not conversation.summary:
+            return ""
+        return f"{SUMMARY_HEADER}\n{conversation.summary}"
+
+    def pending(self, conversation: Conversation) -> List[Message]:
+        """Сообщения вне окна, ещё не вошедшие в краткое содержание"""
+        messages = conversation.messages[:self.window_start(conversation.messages)]
+        if conversation.summary_until is None:
+            return messages
+        return [message for message in messages if message.timestamp > conversation.summary_until]
+
+    def _message_tokens(self, message: Message) -> int:
+        # Как в window_start: текст и служебные токены сообщения
+        return self.counter.count(message.content) + 4
+
+    def batch_ready(self, pending: List[Message]) -> bool:
+        """Накопилось ли вне окна достаточно сообщений, чтобы обновить содержание"""
+        if not pending:
+            return False
+        if len(pending) >= self.batch_messages:
+            return True
+        return sum(self._message_tokens(message) for message in pending) >= self.batch_tokens
+
+    def _transcript(self, messages: List[Message]) -> str:
+        return "\n".join(
+            f"{_ROLE_NAMES.get(message.role, message.role)}: "
+            f"{self.counter.truncate(message.content, TRANSCRIPT_MESSAGE_TOKENS)}"
+            for message in messages
+        )
+
+    async def update(self, context_manager, user_id: str) -> bool:
+        """
+        Дописывает в краткое содержание сообщения, вышедшие из окна
+
+        Вызывается в фоне после каждого ответа, но к модели обращается, только
+        когда таких сообщений накопилась пачка (batch_ready). Ошибки модели
+        только логируются, прежнее содержание при этом сохраняется.
+
+        Args:
+            context_manager: Менеджер контекста (ContextManager)
+            user_id: ID пользователя
+
+        Returns:
+            Обновлено ли содержание
+        """
+        if user_id in self._in_progress:
+            self._skipped += 1
+            return False
+        await context_manager.refresh_session(user_id)
+        conversation = context_manager.get_conversation(user_id)
+        pending = self.pending(conversation)
+        if not self.batch_ready(pending):
+            if pending:
+                self._deferred += 1
+            return False
+
+        self._in_progress.add(user_id)
+        try:
+            summary = await self.openai_client.summarize_conversation(
+                conversation.summary,
+                self._transcript(pending),
+                max_tokens=self.summary_max_tokens
+            )
+        except Exception as e:
+            self._errors += 1
+            logger.warning(f"⚠️ Не удалось обновить краткое содержание диалога {user_id}: {e}")
+            return False
+        finally:
+            self._in_progress.discard(user_id)
+
+        if not summary:
+            return False
+        # Модель могла ответить длиннее просимого — держим содержание в бюджете
+        summary = self.counter.truncate(summary, self.summary_max_tokens)
+        await context_manager.update_conversation_summary(user_id, summary, pending[-1].timestamp)
+        self._updates += 1
+        return True
+
+    def stats(self) -> Dict:
+        """Счётчики обновлений краткого содержания"""
+        return {
+            "history_budget": self.history_budget,
+            "summary_max_tokens": self.summary_max_tokens,
+            "batch_messages": self.batch_messages,
+            "batch_tokens": self.batch_tokens,
+            "updates": self._updates,
+            "skipped": self._skipped,
+            # Ходы, когда вне окна были новые сообщения, но пачка ещё не набралась
+            "deferred": self._deferred,
+            "errors": self._errors
+        }
@@ -7,6 +7,8 @@ from typing import Dict, List, Optional
 from pathlib import Path
 
 from models.badge import Badge, BadgeLevel, Category, BadgeData
+from .badge_index import BadgeIndex
+from .search_index import SearchIndex
 
 
 class DataLoader:
@@ -23,6 +25,8 @@ class DataLoader:
         self._badge_data: Optional[BadgeData] = None
         self._categories_cache: Dict[str, Category] = {}
         self._badges_cache: Dict[str, Badge] = {}
+        self._badge_index: Optional[BadgeIndex] = None
+        self._search_index: Optional[SearchIndex] = None
     
     def load_all_data(self) -> BadgeData:
         """Загружает все данные значков из perfect_parsed_data.json"""
@@ -146,21 +150,8 @@ class DataLoader:
         return self._badge_data.categories
     
     def search_badges(self, query: str) -> List[Badge]:
-        """Поиск значков по запросу"""
-        if not self._badges_cache:
-            self.load_all_data()
-        
-        query_lower = query.lower()
-        results = []
-        
-        for badge in self._badges_cache.values():
-            # Поиск по названию, описанию и советам
-            if (query_lower in badge.title.lower() or
-                query_lower in badge.description.lower() or
-                (badge.skillTips and query_lower in badge.skillTips.lower())):
-                results.append(badge)
-        
-        return results
+        """Поиск значков по запросу (по убыванию релевантности)"""
+        return [hit.badge for hit in self.get_search_index().search(query, limit=None)]
     
     def get_badges_by_category(self, category_id: str) -> List[Badge]:
         """Получает все значки категории"""
@@ -188,4 +179,24 @@ class DataLoader:
         all_badges = []
         for category in self._badge_data.categories:
             all_badges.extend(category.badges)
-        return all_badges
\ No newline at end of file
+        return all_badges
+    
+    def get_badge_index(self) -> BadgeIndex:
+        """Получает индекс для распознавания значков и категорий в сообщениях"""
+        if self._badge_index is None:
+            self._badge_index = BadgeIndex(self.get_all_categories(), self.get_all_badges())
+        return self._badge_index
+    
+    def get_search_index(self) -> SearchIndex:
+        """Получает полнотекстовый индекс значков"""
+        if self._search_index is None:
+            self._search_index = SearchIndex(self.get_all_categories(), self.get_all_badges())
+        return self._search_index
+    
+    def get_badge_by_title(self, title: str) -> Optional[Badge]:
+        """Получает значок по названию"""
+        return self.get_badge_index().badge_by_title(title)
+    
+    def get_level_by_title(self, title: str) -> Optional[BadgeLevel]:
+        """Получает уровень значка по его названию"""
+        return self.get_badge_index().level_by_title(title)
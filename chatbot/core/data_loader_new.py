@@ -9,23 +9,39 @@ from pathlib import Path
 
 from models.badge import Badge, BadgeLevel, Category, BadgeData
 from .ai_data_loader import AIDataLoader
+from .badge_index import BadgeIndex
+from .catalog import BadgeCatalog
+from .embeddings import SemanticIndex
+from .search_index import SearchIndex
 
 
 class DataLoaderNew:
     """Обновленный загрузчик данных с поддержкой ai-data структуры"""
     
-    def __init__(self, use_ai_data: bool = True, ai_data_path: str = None):
+    def __init__(
+        self,
+        use_ai_data: bool = True,
+        ai_data_path: str = None,
+        snapshot_path: str = None,
+        pack_path: str = None
+    ):
         """
         Инициализация загрузчика
         
         Args:
             use_ai_data: Использовать ли новую ai-data структуру
             ai_data_path: Путь к папке ai-data
+            snapshot_path: Путь к снимку ai-data (читается вместо папки, если существует)
+            pack_path: Путь к упакованному хранилищу значков (читается вместо снимка, если существует)
         """
         self.use_ai_data = use_ai_data
+        self._all_badges: Optional[List[Badge]] = None
+        self._badge_index: Optional[BadgeIndex] = None
+        self._catalog: Optional[BadgeCatalog] = None
+        self.semantic_index: Optional[SemanticIndex] = None
         
         if use_ai_data:
-            self.ai_loader = AIDataLoader(ai_data_path)
+            self.ai_loader = AIDataLoader(ai_data_path, snapshot_path=snapshot_path, pack_path=pack_path)
             self._badge_data: Optional[BadgeData] = None
         else:
             # Fallback на старый DataLoader если нужно
@@ -114,13 +130,53 @@ class DataLoaderNew:
     def get_all_badges(self) -> List[Badge]:
         """Получает все значки из всех категорий"""
         if self.use_ai_data:
-            all_badges = []
-            for category in self.get_all_categories():
-                all_badges.extend(category.badges)
-            return all_badges
+            if self._all_badges is None:
+                all_badges = []
+                for category in self.get_all_categories():
+                    all_badges.extend(category.badges)
+                self._all_badges = all_badges
+            return self._all_badges
         else:
             return self.legacy_loader.get_all_badges()
     
+    def get_badge_index(self) -> BadgeIndex:
+        """Получает индекс для распознавания значков и категорий в сообщениях"""
+        if self._badge_index is None:
+            self._badge_index = BadgeIndex(self.get_all_categories(), self.get_all_badges())
+        return self._badge_index
+    
+    def get_search_index(self) -> SearchIndex:
+        """Получает полнотекстовый индекс значков"""
+        if self.use_ai_data:
+            return self.ai_loader.get_search_index()
+        else:
+            return self.legacy_loader.get_search_index()
+    
+    def get_catalog(self) -> BadgeCatalog:
+        """Получает каталог значков для API поиска"""
+        if self._catalog is None:
+            self._catalog = BadgeCatalog(self.get_all_categories(), self.get_search_index(), self.semantic_index)
+        return self._catalog
+    
+    def attach_semantic_index(self, semantic_index: Optional[SemanticIndex]):
+        """Подключает эмбеддинги значков к каталогу (смысловой поиск)"""
+        self.semantic_index = semantic_index
+        self._catalog = None
+    
+    def get_badge_source_hash(self, badge_id: str) -> Optional[str]:
+        """Хэш исходного файла значка (None — значка нет или данные не из ai-data)"""
+        if self.use_ai_data:
+            return self.ai_loader.get_badge_source_hash(badge_id)
+        return None
+    
+    def get_badge_by_title(self, title: str) -> Optional[Badge]:
+        """Получает значок по названию"""
+        return self.get_badge_index().badge_by_title(title)
+    
+    def get_level_by_title(self, title: str) -> Optional[BadgeLevel]:
+        """Получает уровень значка по его названию"""
+        return self.get_badge_index().level_by_title(title)
+    
     def get_stats(self) -> Dict:
         """Получает статистику загрузки"""
         if self.use_ai_data:
@@ -133,8 +189,23 @@ class DataLoaderNew:
         if self.use_ai_data:
             self.ai_loader.preload_popular_categories()
     
+    def preload_all_categories(self) -> int:
+        """
+        Загружает все категории и строит индексы значков
+        
+        Returns:
+            Количество значков
+        """
+        badges = self.get_all_badges()
+        self.get_badge_index()
+        self.get_search_index()
+        return len(badges)
+    
     def clear_cache(self):
         """Очищает кэш"""
         if self.use_ai_data:
             self.ai_loader.clear_cache()
             self._badge_data = None
+        self._all_badges = None
+        self._badge_index = None
+        self._catalog = None
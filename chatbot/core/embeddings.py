@@ -0,0 +1,356 @@
+"""
+Векторные представления значков и локальный поиск ближайших соседей
+Эмбеддинги строятся офлайн (build_embeddings.py) и хранятся матрицей float16;
+поиск — полным перебором или по инвертированным спискам кластеров (IVF)
+"""
+import hashlib
+import logging
+import math
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from models.badge import Badge
+from .search_index import iter_terms
+
+logger = logging.getLogger(__name__)
+
+EMBEDDINGS_FORMAT = "badge-embeddings"
+EMBEDDINGS_VERSION = 1
+
+# Длина префикса слова, общего для однокоренных слов (признак HashingEmbedding)
+PREFIX_LENGTH = 5
+
+
+class EmbeddingModel(ABC):
+    """Интерфейс локальной модели эмбеддингов"""
+
+    name: str = ""
+    dim: int = 0
+
+    @abstractmethod
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        """
+        Векторы текстов
+
+        Args:
+            texts: Тексты
+
+        Returns:
+            Матрица (тексты x dim) float32 с единичными строками
+        """
+
+
+class HashingEmbedding(EmbeddingModel):
+    """
+    Детерминированные эмбеддинги на хэшировании признаков
+
+    Признаки — основы слов (как в поисковом индексе) и их первые буквы, чтобы
+    однокоренные слова ("спорт", "спортивный") давали близкие векторы. Не требует
+    обучения и внешних пакетов, одинаков во всех процессах; заменяет настоящую
+    модель в тестах и офлайн.
+    """
+
+    def __init__(self, dim: int = 512):
+        """
+        Args:
+            dim: Размерность вектора
+        """
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def _slot(self, feature: str) -> Tuple[int, float]:
+        # blake2b, а не hash(): встроенный хэш строк меняется от запуска к запуску
+        digest = hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest()
+        value = int.from_bytes(digest, 'little')
+        return value % self.dim, 1.0 if (value >> 63) & 1 else -1.0
+
+    def _features(self, text: str) -> Dict[str, float]:
+        counts: Dict[str, float] = {}
+        for _, _, term in iter_terms(text):
+            for key in (f"w:{term}", f"p:{term[:PREFIX_LENGTH]}"):
+                counts[key] = counts.get(key, 0.0) + 1.0
+        return counts
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature, count in self._features(text).items():
+                slot, sign = self._slot(feature)
+                vectors[row, slot] += sign * (1.0 + math.log(count))
+        return _normalize(vectors)
+
+
+class SentenceTransformerEmbedding(EmbeddingModel):
+    """Локальная модель sentence-transformers (пакет не входит в обязательные зависимости)"""
+
+    def __init__(self, model_name: str):
+        """
+        Args:
+            model_name: Имя или путь модели sentence-transformers
+
+        Raises:
+            ImportError: Пакет sentence-transformers не установлен
+        """
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError as e:
+            raise ImportError("Для модели эмбеддингов установите sentence-transformers") from e
+        self._model = SentenceTransformer(model_name)
+        self.dim = self._model.get_sentence_embedding_dimension()
+        self.name = f"sentence-transformers:{model_name}"
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        vectors = self._model.encode(list(texts), convert_to_numpy=True, show_progress_bar=False)
+        return _normalize(vectors.astype(np.float32))
+
+
+def create_embedding_model(spec: str) -> EmbeddingModel:
+    """
+    Создаёт модель по описанию из конфигурации
+
+    Args:
+        spec: "hashing", "hashing-<dim>" или "sentence-transformers:<модель>"
+
+    Returns:
+        Модель эмбеддингов
+    """
+    if spec == "hashing":
+        return HashingEmbedding()
+    if spec.startswith("hashing-"):
+        return HashingEmbedding(int(spec[len("hashing-"):]))
+    if spec.startswith("sentence-transformers:"):
+        return SentenceTransformerEmbedding(spec[len("sentence-transformers:"):])
+    raise ValueError(f"Неизвестная модель эмбеддингов: {spec}")
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def badge_text(badge: Badge) -> str:
+    """Текст значка для эмбеддинга: название, описание, советы и уровни"""
+    levels = badge.levels
+    parts = [
+        badge.title,
+        badge.description or "",
+        badge.skillTips or "",
+        " ".join(level.title for level in levels),
+        " ".join(str(level.criteria) for level in levels),
+    ]
+    return "\n".join(part for part in parts if part)
+
+
+def embedding_source_hash(badges: Sequence[Badge]) -> str:
+    """
+    Хэш текстов значков, из которых строятся векторы
+
+    Меняется при любой правке названия, описания, советов или уровней значка,
+    поэтому по нему видно, что эмбеддинги в файле устарели.
+    """
+    digest = hashlib.sha256()
+    for badge in sorted(badges, key=lambda badge: badge.id):
+        digest.update(f"{badge.id}\0{badge_text(badge)}\0".encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _kmeans(vectors: np.ndarray, clusters: int, iterations: int = 20, seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """Сферический k-means: центроиды и номер кластера каждого вектора"""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), size=clusters, replace=False)].copy()
+    assignment = np.zeros(len(vectors), dtype=np.int32)
+    for _ in range(iterations):
+        assignment = np.argmax(vectors @ centroids.T, axis=1).astype(np.int32)
+        for cluster in range(clusters):
+            members = vectors[assignment == cluster]
+            if len(members):
+                centroids[cluster] = members.sum(axis=0)
+        centroids = _normalize(centroids)
+    return centroids, assignment
+
+
+class VectorIndex:
+    """
+    Индекс ближайших соседей по косинусной близости
+
+    Векторы хранятся на диске в float16, в памяти — в float32 для быстрого
+    умножения. При nlist > 0 векторы раскладываются по кластерам k-means,
+    и запрос просматривает только nprobe ближайших кластеров (IVF).
+    """
+
+    def __init__(self, ids: Sequence[str], vectors: np.ndarray, nlist: int = 0, nprobe: int = 4):
+        """
+        Args:
+            ids: ID значков в порядке строк матрицы
+            vectors: Матрица (значки x dim) с единичными строками
+            nlist: Количество кластеров IVF (0 — полный перебор)
+            nprobe: Сколько кластеров просматривать при поиске
+        """
+        self.ids = list(ids)
+        self.vectors = np.asarray(vectors, dtype=np.float32)
+        self._rows = {badge_id: row for row, badge_id in enumerate(self.ids)}
+        self.nprobe = nprobe
+        self.centroids: Optional[np.ndarray] = None
+        self._lists: List[np.ndarray] = []
+        nlist = min(nlist, len(self.ids))
+        if nlist > 1:
+            self.centroids, assignment = _kmeans(self.vectors, nlist)
+            self._lists = [np.flatnonzero(assignment == cluster) for cluster in range(nlist)]
+
+    def row(self, badge_id: str) -> Optional[int]:
+        """Строка матрицы для значка"""
+        return self._rows.get(badge_id)
+
+    def similarities(self, query: np.ndarray) -> np.ndarray:
+        """Косинусная близость запроса ко всем значкам (полный перебор)"""
+        return self.vectors @ query
+
+    def search(self, query: np.ndarray, k: int = 10, nprobe: Optional[int] = None) -> List[Tuple[str, float]]:
+        """
+        Ближайшие значки к вектору запроса
+
+        Args:
+            query: Вектор запроса с единичной нормой
+            k: Количество результатов
+            nprobe: Переопределение количества просматриваемых кластеров
+
+        Returns:
+            Пары (ID значка, близость) по убыванию близости
+        """
+        if self.centroids is None:
+            rows = np.arange(len(self.ids))
+        else:
+            probes = min(nprobe or self.nprobe, len(self._lists))
+            nearest = np.argpartition(-(self.centroids @ query), probes - 1)[:probes]
+            rows = np.concatenate([self._lists[cluster] for cluster in nearest])
+        scores = self.vectors[rows] @ query
+        if k < len(rows):
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(len(rows))
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [(self.ids[rows[i]], float(scores[i])) for i in top]
+
+
+class SemanticIndex:
+    """Модель эмбеддингов вместе с индексом векторов значков"""
+
+    def __init__(self, model: EmbeddingModel, index: VectorIndex, source_hash: str = ""):
+        self.model = model
+        self.index = index
+        # Хэш текстов значков, по которым построены векторы (embedding_source_hash)
+        self.source_hash = source_hash
+
+    def embed_query(self, text: str) -> np.ndarray:
+        """Вектор текста запроса"""
+        return self.model.embed([text])[0]
+
+    def search(self, text: str, k: int = 10) -> List[Tuple[str, float]]:
+        """Значки, ближайшие по смыслу к тексту"""
+        return self.index.search(self.embed_query(text), k)
+
+    def similarities(self, text: str) -> np.ndarray:
+        """Близость текста ко всем значкам в порядке index.ids"""
+        return self.index.similarities(self.embed_query(text))
+
+    @classmethod
+    def build(cls, badges: Sequence[Badge], model: EmbeddingModel, nlist: int = 0) -> "SemanticIndex":
+        """Строит эмбеддинги значков в памяти"""
+        vectors = model.embed([badge_text(badge) for badge in badges])
+        # Как при загрузке с диска: векторы проходят через float16
+        vectors = _normalize(vectors.astype(np.float16).astype(np.float32))
+        return cls(
+            model,
+            VectorIndex([badge.id for badge in badges], vectors, nlist=nlist),
+            source_hash=embedding_source_hash(badges)
+        )
+
+    @classmethod
+    def load(cls, path: Union[str, Path], model: EmbeddingModel, nlist: int = 0) -> "SemanticIndex":
+        """
+        Загружает эмбеддинги, собранные build_embeddings.py
+
+        Raises:
+            ValueError: Файл другого формата или собран другой моделью
+        """
+        with np.load(path, allow_pickle=False) as data:
+            fmt = str(data['format'])
+            version = int(data['version'])
+            model_name = str(data['model'])
+            source_hash = str(data['sourceHash']) if 'sourceHash' in data.files else ""
+            ids = [str(badge_id) for badge_id in data['ids']]
+            vectors = data['vectors']
+        if fmt != EMBEDDINGS_FORMAT or version != EMBEDDINGS_VERSION:
+            raise ValueError(f"Неподдерживаемый файл эмбеддингов: {fmt} v{version}")
+        if model_name != model.name:
+            raise ValueError(f"Эмбеддинги собраны моделью {model_name}, а настроена {model.name}")
+        vectors = _normalize(vectors.astype(np.float32))
+        return cls(model, VectorIndex(ids, vectors, nlist=nlist), source_hash=source_hash)
+
+
+def load_or_build_semantic_index(
+    path: Optional[Union[str, Path]],
+    badges: Sequence[Badge],
+    model: EmbeddingModel,
+    nlist: int = 0,
+    source_hash: Optional[str] = None
+) -> SemanticIndex:
+    """
+    Загружает эмбеддинги из файла, а если файла нет или он не подходит — строит в памяти
+
+    Args:
+        path: Файл build_embeddings.py (None — сразу строить)
+        badges: Текущие значки
+        model: Настроенная модель эмбеддингов
+        nlist: Количество кластеров IVF
+        source_hash: Хэш текущих текстов значков (None — посчитать по badges)
+
+    Returns:
+        Семантический индекс
+    """
+    if path is not None and Path(path).exists():
+        if source_hash is None:
+            source_hash = embedding_source_hash(badges)
+        try:
+            semantic_index = SemanticIndex.load(path, model, nlist=nlist)
+            if semantic_index.source_hash == source_hash:
+                return semantic_index
+            logger.warning(f"⚠️ Эмбеддинги {path} собраны по другим данным значков, строим заново")
+        except (ValueError, KeyError, OSError) as e:
+            logger.warning(f"⚠️ Эмбеддинги {path} не загружены: {e}")
+    return SemanticIndex.build(badges, model, nlist=nlist)
+
+
+def write_embeddings(path: Union[str, Path], badges: Sequence[Badge], model: EmbeddingModel) -> int:
+    """
+    Строит эмбеддинги значков и записывает их в .npz (матрица float16)
+
+    Вместе с матрицей записывается embedding_source_hash значков: при загрузке
+    он сравнивается с хэшем текущих данных.
+
+    Args:
+        path: Файл результата
+        badges: Значки
+        model: Модель эмбеддингов
+
+    Returns:
+        Размер матрицы в байтах
+    """
+    vectors = model.embed([badge_text(badge) for badge in badges]).astype(np.float16)
+    path = Path(path)
+    tmp_path = path.with_name(path.name + ".tmp.npz")
+    np.savez(
+        tmp_path,
+        format=np.array(EMBEDDINGS_FORMAT),
+        version=np.array(EMBEDDINGS_VERSION),
+        model=np.array(model.name),
+        sourceHash=np.array(embedding_source_hash(badges)),
+        ids=np.array([badge.id for badge in badges]),
+        vectors=vectors
+    )
+    tmp_path.replace(path)
+    return vectors.nbytes
@@ -0,0 +1,180 @@
+"""
+Определение типа запроса по ключевым словам
+Правила заданы таблицей и компилируются в одно регулярное выражение
+"""
+import re
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+
+class IntentRule(NamedTuple):
+    """Правило маршрутизации: тип запроса, ключевые слова и условия"""
+    intent: str
+    keywords: Tuple[str, ...]
+    # Экран, на котором действует правило (None — на любом)
+    view: Optional[str] = None
+    # Поля контекста из CONTEXT_FIELDS, которые должны быть заполнены
+    requires: Tuple[str, ...] = ()
+
+
+# Поля контекста, от которых зависят правила (порядок флагов в IntentRouter.route)
+CONTEXT_FIELDS = ("current_level", "current_badge", "current_category")
+
+
+# Общие наборы ключевых слов
+EXPLAIN_BADGE = ("что это за значок", "что за значок", "объясни", "расскажи", "что такое", "как получить", "что это")
+IDEAS = ("идеи", "примеры", "варианты")
+RECOMMEND = ("рекомендуй", "посоветуй", "что выбрать")
+PHILOSOPHY = ("философия", "зачем", "почему", "смысл")
+# Вопросы о составе категории или Путеводителя: ответ целиком есть в данных
+CATEGORY_LIST = ("список", "сколько", "какие значки", "какие есть значки", "перечисли")
+
+# Правила в порядке приоритета: побеждает первое подходящее
+INTENT_RULES: Tuple[IntentRule, ...] = (
+    # Запросы вида "где я нахожусь?", "что за экран?"
+    IntentRule("where_am_i", (
+        "где я", "где нахожусь", "где это я", "какой это экран",
+        "что за экран", "что за страница", "на каком экране",
+        "на какой странице", "где сейчас нахожусь", "что это за страница"
+    )),
+
+    # На экране уровня значка - фокус на конкретном уровне
+    IntentRule("badge_level_explanation", (
+        "что это за значок", "что за значок", "объясни", "расскажи", "что такое",
+        "как получить", "критерии", "подтверждение", "что нужно", "что это"
+    ), view="badge-level", requires=("current_level",)),
+    IntentRule("creative_ideas", IDEAS, view="badge-level", requires=("current_level",)),
+
+    # На экране значка - фокус на значке
+    IntentRule("badge_explanation", EXPLAIN_BADGE, view="badge"),
+    IntentRule("creative_ideas", IDEAS, view="badge"),
+    IntentRule("badge_levels_explanation", (
+        "уровни", "ступени", "базовый", "продвинутый", "экспертный"
+    ), view="badge"),
+
+    # На экране категории - фокус на категории
+    IntentRule("category_list", CATEGORY_LIST, view="category"),
+    IntentRule("category_info", ("объясни", "расскажи", "что такое"), view="category"),
+    IntentRule("recommendations", RECOMMEND, view="category"),
+    IntentRule("philosophy", PHILOSOPHY, view="category"),
+
+    # На главной странице - философия значков
+    IntentRule("philosophy", (
+        "где я", "что это", "философия", "принципы", "зачем", "почему", "смысл",
+        "награды", "награда", "нарады", "медали", "медаль", "ачивки", "ачивка"
+    ), view="intro"),
+    IntentRule("category_list", ("категории", "значки", "сколько", "список"), view="intro"),
+
+    # На экране введения - общая информация
+    IntentRule("category_info", ("подробнее", "больше", "расскажи"), view="introduction"),
+
+    # Общие ключевые слова для всех экранов
+    IntentRule("badge_explanation", EXPLAIN_BADGE, requires=("current_badge",)),
+    IntentRule("category_info", EXPLAIN_BADGE, requires=("current_category",)),
+    IntentRule("creative_ideas", ("идеи", "как сделать", "примеры", "варианты")),
+    IntentRule("recommendations", RECOMMEND + ("подходящий",)),
+    IntentRule("philosophy", PHILOSOPHY),
+)
+
+DEFAULT_INTENT = "general"
+
+
+def _trie_pattern(words: Iterable[str]) -> str:
+    """Строит регулярное выражение-префиксное дерево: на каждой позиции проверяется одна ветка"""
+    trie: Dict = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[''] = True
+
+    def emit(node: Dict) -> str:
+        branches = [re.escape(ch) + emit(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ''
+        is_end = '' in node
+        body = branches[0] if len(branches) == 1 and not is_end else "(?:" + "|".join(branches) + ")"
+        return body + ("?" if is_end else "")
+
+    return emit(trie)
+
+
+class IntentRouter:
+    """
+    Маршрутизатор запросов по таблице правил
+
+    Все ключевые слова ищутся одним проходом по сообщению; правила, которые
+    они включают, и правила, применимые на экране, хранятся битовыми масками.
+    """
+
+    def __init__(self, rules: Iterable[IntentRule] = INTENT_RULES, default: str = DEFAULT_INTENT):
+        """
+        Компиляция правил
+
+        Args:
+            rules: Правила в порядке приоритета
+            default: Тип запроса, если ни одно правило не подошло
+        """
+        self.rules: List[IntentRule] = list(rules)
+        self.default = default
+        self._views = {rule.view for rule in self.rules if rule.view is not None}
+
+        keywords = sorted({kw for rule in self.rules for kw in rule.keywords})
+        # Совпадение съедает один символ, а слово целиком ищется заглядыванием вперёд —
+        # так находятся и перекрывающиеся слова, а класс первых букв даёт быстрый пропуск
+        first_chars = "".join(sorted({re.escape(kw[0]) for kw in keywords}))
+        self._pattern = re.compile(f"[{first_chars}](?<=(?=({_trie_pattern(keywords)})).)")
+
+        # Для каждого слова — битовая маска правил, которые оно включает. На позиции
+        # находится самое длинное слово, поэтому учитываем и вложенные в него слова
+        rule_masks = {kw: 0 for kw in keywords}
+        for index, rule in enumerate(self.rules):
+            for kw in rule.keywords:
+                rule_masks[kw] |= 1 << index
+        self._keyword_masks: Dict[str, int] = {}
+        for kw in keywords:
+            mask = 0
+            for other in keywords:
+                if other in kw:
+                    mask |= rule_masks[other]
+            self._keyword_masks[kw] = mask
+
+        # Маски правил, применимых на экране при заполненных полях контекста
+        self._applicable: Dict[Tuple[Optional[str], Tuple[bool, ...]], int] = {}
+
+    def _applicable_mask(self, current_view: Optional[str], context_flags: Tuple[bool, ...]) -> int:
+        key = (current_view, context_flags)
+        mask = self._applicable.get(key)
+        if mask is None:
+            filled = {name for name, flag in zip(CONTEXT_FIELDS, context_flags) if flag}
+            mask = 0
+            for index, rule in enumerate(self.rules):
+                if (rule.view is None or rule.view == current_view) and filled.issuperset(rule.requires):
+                    mask |= 1 << index
+            self._applicable[key] = mask
+        return mask
+
+    def route(self, message: str, current_view: Optional[str] = None, context_flags: Tuple[bool, ...] = ()) -> str:
+        """
+        Определяет тип запроса
+
+        Args:
+            message: Сообщение пользователя
+            current_view: Текущий экран
+            context_flags: Заполнены ли поля контекста, в порядке CONTEXT_FIELDS
+
+        Returns:
+            Тип запроса
+        """
+        matched = 0
+        for kw in self._pattern.findall(message.lower()):
+            matched |= self._keyword_masks[kw]
+        if not matched:
+            return self.default
+
+        if current_view not in self._views:
+            current_view = None
+        matched &= self._applicable_mask(current_view, context_flags)
+        if not matched:
+            return self.default
+        # Младший бит — первое по порядку подходящее правило
+        return self.rules[(matched & -matched).bit_length() - 1].intent
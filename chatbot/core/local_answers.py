@@ -0,0 +1,195 @@
+"""
+Ответы без обращения к модели
+Запросы, ответ на которые целиком следует из данных Путеводителя (где я,
+значки категории, уровни и критерии, сколько значков), собираются по шаблонам
+"""
+import re
+from collections import Counter
+from typing import Dict, Iterable, Optional, Tuple
+
+from models.badge import Badge, BadgeLevel, Category
+from models.conversation import UserContext
+from core.data_loader_new import DataLoaderNew
+from core.prompt_assembly import TokenCounter
+from prompts.system_prompt import VIEW_NAMES
+
+# Типы запросов, на которые по умолчанию отвечаем по шаблонам
+DEFAULT_LOCAL_INTENTS = ("category_list", "badge_levels_explanation", "badge_level_explanation")
+
+# Длина введения категории и способов подтверждения в списке уровней (токены)
+INTRODUCTION_TOKENS = 120
+CONFIRMATION_TOKENS = 80
+
+_PLURAL_BADGES = ("значок", "значка", "значков")
+_PLURAL_CATEGORIES = ("категория", "категории", "категорий")
+_PLURAL_LEVELS = ("уровень", "уровня", "уровней")
+
+_MARKUP_RE = re.compile(r'[*_`]+')
+# Предложения вида «Она включает 40 значков»: в введениях число устарело, его показываем по данным
+_BADGE_COUNT_RE = re.compile(r'\s*[^.!?\n]*\d+\s+\w*знач(?:к|ок)[^.!?\n]*[.!?]?')
+
+
+def plural(count: int, forms: Tuple[str, str, str]) -> str:
+    """Число со словом в нужной форме: 1 значок, 2 значка, 5 значков"""
+    if count % 10 == 1 and count % 100 != 11:
+        form = forms[0]
+    elif 2 <= count % 10 <= 4 and not 12 <= count % 100 <= 14:
+        form = forms[1]
+    else:
+        form = forms[2]
+    return f"{count} {form}"
+
+
+def _plain_text(text: str) -> str:
+    """Текст введения без заголовков, цитат, разделителей, разметки и чисел значков"""
+    lines = [
+        line.strip() for line in text.splitlines()
+        if line.strip() and not line.lstrip().startswith(('#', '>', '---'))
+    ]
+    return _BADGE_COUNT_RE.sub('', _MARKUP_RE.sub('', " ".join(lines))).strip()
+
+
+class LocalAnswerEngine:
+    """
+    Шаблонные ответы по данным DataLoaderNew
+
+    Ответ готов за миллисекунды и не тратит токенов. На «где я» бот отвечает
+    так всегда; остальные типы запросов — только перечисленные в intents,
+    для прочих ResponseGenerator обращается к модели.
+    """
+
+    def __init__(
+        self,
+        data_loader: DataLoaderNew,
+        counter: TokenCounter,
+        intents: Iterable[str] = DEFAULT_LOCAL_INTENTS
+    ):
+        """
+        Args:
+            data_loader: Загрузчик данных значков
+            counter: Счётчик токенов (для обрезки длинных текстов)
+            intents: Типы запросов, на которые отвечать без модели
+        """
+        self.data_loader = data_loader
+        self.counter = counter
+        self.intents = frozenset(intents)
+        self._answers: Counter = Counter()
+
+    def handles(self, intent: str) -> bool:
+        """Отвечать ли на этот тип запроса по шаблону"""
+        return intent in self.intents
+
+    def where_am_i(self, context: UserContext) -> str:
+        """Где пользователь находится, по данным веб-контекста"""
+        self._answers["where_am_i"] += 1
+        current_view = context.session_data.get('current_view') or 'chat'
+        view_human = VIEW_NAMES.get(current_view, current_view)
+
+        parts = [f"Сейчас ты на экране: {view_human}."]
+
+        if context.current_category:
+            cat = self.data_loader.get_category(context.current_category)
+            if cat:
+                parts.append(f"Категория: {cat.emoji} {cat.title}.")
+
+        if context.current_badge:
+            badge = self.data_loader.get_badge(context.current_badge)
+            if badge:
+                parts.append(f"Значок: {badge.emoji} {badge.title}.")
+
+        cur_level = context.session_data.get('current_level')
+        cur_level_title = context.session_data.get('current_level_badge_title')
+        if cur_level:
+            lvl_line = f"Уровень: {cur_level}"
+            if cur_level_title:
+                lvl_line += f" — {cur_level_title}"
+            parts.append(lvl_line + ".")
+
+        # Дружелюбная подсказка по действиям
+        tips = []
+        if current_view in ('intro', 'about-camp'):
+            tips.append("Могу кратко рассказать о системе значков или показать категории.")
+        if context.current_category and current_view in ('category', 'categories'):
+            tips.append("Могу объяснить философию категории или предложить подходящие значки.")
+        if context.current_badge and current_view in ('badge', 'badge-level'):
+            tips.append("Могу объяснить значок, уровни или предложить идеи, как его получить.")
+        if current_view == 'registration-form':
+            tips.append("Могу помочь заполнить важные поля анкеты.")
+
+        if tips:
+            parts.append("Подсказка: " + " ".join(tips))
+
+        return "\n".join(parts)
+
+    def catalog_overview(self) -> str:
+        """Сколько в Путеводителе категорий и значков"""
+        self._answers["catalog_overview"] += 1
+        categories = self.data_loader.get_all_categories()
+        total = sum(len(category.badges) for category in categories)
+        lines = [
+            f"В Путеводителе {plural(len(categories), _PLURAL_CATEGORIES)} "
+            f"и {plural(total, _PLURAL_BADGES)} 🗺️"
+        ]
+        lines.extend(
+            f"• {category.emoji} {category.title} — {plural(len(category.badges), _PLURAL_BADGES)}"
+            for category in categories
+        )
+        lines.append("Выбери категорию — расскажу, какие в ней значки 😊")
+        return "\n".join(lines)
+
+    def category_info(self, category: Category) -> str:
+        """Введение в категорию и список её значков"""
+        self._answers["category_info"] += 1
+        lines = [f"{category.emoji} {category.title} — {plural(len(category.badges), _PLURAL_BADGES)}."]
+        introduction = _plain_text(category.introduction or "")
+        if introduction:
+            lines.append(self.counter.truncate(introduction, INTRODUCTION_TOKENS))
+        if category.badges:
+            lines.append("")
+            lines.append("Значки категории:")
+            lines.extend(f"• {badge.emoji} {badge.title}" for badge in category.badges)
+            lines.append("")
+            lines.append("Выбери значок — объясню, что он развивает и как его получить ✨")
+        return "\n".join(lines)
+
+    def badge_levels(self, badge: Badge) -> str:
+        """Все уровни значка с критериями и способами подтверждения"""
+        self._answers["badge_levels_explanation"] += 1
+        lines = [f"У значка {badge.emoji} {badge.title} {plural(len(badge.levels), _PLURAL_LEVELS)}:"]
+        for level in badge.levels:
+            lines.append("")
+            lines.append(self._level_text(level, confirmation_tokens=CONFIRMATION_TOKENS))
+        lines.append("")
+        lines.append("Выбери уровень на экране — подскажу, с чего начать 💪")
+        return "\n".join(lines)
+
+    def badge_level(self, badge: Badge, level: BadgeLevel, level_title: Optional[str] = None) -> str:
+        """Критерии и способы подтверждения одного уровня"""
+        self._answers["badge_level_explanation"] += 1
+        return "\n".join([
+            f"Значок {badge.emoji} {badge.title}:",
+            self._level_text(level, title=level_title),
+            "",
+            "Удачи — у тебя всё получится! 🚀"
+        ])
+
+    def _level_text(
+        self,
+        level: BadgeLevel,
+        title: Optional[str] = None,
+        confirmation_tokens: Optional[int] = None
+    ) -> str:
+        confirmation = level.confirmation.strip()
+        if confirmation_tokens is not None:
+            confirmation = self.counter.truncate(confirmation, confirmation_tokens)
+        parts = [f"{level.emoji} {level.level} — {title or level.title}", level.criteria.strip()]
+        if confirmation:
+            parts.append(f"Как подтвердить:\n{confirmation}")
+        return "\n".join(parts)
+
+    def stats(self) -> Dict:
+        """Сколько ответов собрано по шаблонам, по типам запросов"""
+        return {
+            "intents": sorted(self.intents),
+            "answers": dict(self._answers)
+        }
@@ -2,111 +2,337 @@
 Интеграция с OpenAI API
 """
 import os
+import json
+import hashlib
 import logging
-from typing import List, Dict, Any, Optional
-from openai import OpenAI
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Callable, Iterator, List, Dict, Any, Optional, Sequence
 from dotenv import load_dotenv
 
 from models.conversation import Message, UserContext
-from prompts.system_prompt import get_system_prompt_with_context
+from core.response_cache import ResponseCache
+from core.transport import ResilientTransport
+from core.single_flight import SingleFlight
+from core.prompt_assembly import get_token_counter, report_messages
+from prompts.system_prompt import (
+    CONVERSATION_SUMMARY_SYSTEM_PROMPT,
+    get_context_section,
+    get_conversation_summary_prompt,
+    get_static_system_prompt
+)
 
 logger = logging.getLogger(__name__)
 
 # Загружаем переменные окружения
 load_dotenv()
 
+# Получатель дельт ответа модели для потоковой выдачи (/chat/stream).
+# Задаётся на время генерации одного ответа, поэтому не пересекается между запросами.
+_delta_sink: ContextVar[Optional[Callable[[str], None]]] = ContextVar("openai_delta_sink", default=None)
+
+
+@contextmanager
+def stream_deltas(sink: Callable[[str], None]) -> Iterator[None]:
+    """
+    Включает потоковую генерацию для вызовов OpenAIClient в текущем контексте
+    
+    Args:
+        sink: Функция, получающая каждую текстовую дельту модели
+    """
+    token = _delta_sink.set(sink)
+    try:
+        yield
+    finally:
+        _delta_sink.reset(token)
+
+
+# Ответ при недоступности модели (подробности ошибки пишутся только в лог)
+FALLBACK_ANSWER = "Извини, у меня сейчас не получается ответить 😔 Попробуй ещё раз через минутку!"
+
+# Заголовок сообщения со справкой о значках и категориях
+KNOWLEDGE_HEADER = "## Справка из Путеводителя"
+
+
+def build_prompt_messages(
+    history: Sequence[Dict[str, str]],
+    knowledge: str = "",
+    context_section: str = ""
+) -> List[Dict[str, str]]:
+    """
+    Собирает сообщения запроса к модели в каноническом порядке
+    
+    Сначала статическая часть системного промпта (байт в байт одинаковая для всех
+    запросов, поэтому провайдер кэширует её как общий префикс), затем справка
+    о значке, затем меняющийся контекст пользователя и история диалога.
+    
+    Args:
+        history: Сообщения диалога в формате API (последнее — запрос пользователя)
+        knowledge: Справка о значке или категории
+        context_section: Контекст пользователя
+        
+    Returns:
+        Сообщения в формате API
+    """
+    api_messages = [{"role": "system", "content": get_static_system_prompt()}]
+    if knowledge:
+        api_messages.append({"role": "system", "content": f"{KNOWLEDGE_HEADER}\n{knowledge}"})
+    if context_section:
+        api_messages.append({"role": "system", "content": context_section})
+    api_messages.extend(history)
+    return api_messages
+
+
+def build_request_messages(
+    messages: Sequence[Message],
+    context_section: str = "",
+    knowledge: str = ""
+) -> List[Dict[str, str]]:
+    """
+    Сообщения запроса generate_response (их же отправляет офлайн-предгенерация)
+    
+    Args:
+        messages: История сообщений (в запрос идут последние 10)
+        context_section: Секция контекста (get_context_section): уровень, интересы,
+            экран, категория и значок пользователя
+        knowledge: Справка о значке или категории
+        
+    Returns:
+        Сообщения в формате API
+    """
+    history = [{"role": message.role, "content": message.content} for message in messages[-10:]]
+    return build_prompt_messages(history, knowledge, context_section)
+
+
+@lru_cache(maxsize=8)
+def _prefix_hash(prefix: str) -> str:
+    return hashlib.sha256(prefix.encode('utf-8')).hexdigest()[:16]
+
 
 class OpenAIClient:
     """Клиент для работы с OpenAI API"""
     
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        response_cache: Optional[ResponseCache] = None,
+        transport_options: Optional[Dict[str, Any]] = None
+    ):
         """
         Инициализация клиента
         
         Args:
             api_key: API ключ OpenAI (если не указан, берется из .env)
+            response_cache: Кэш готовых ответов (если не указан, создаётся в памяти)
+            transport_options: Параметры ResilientTransport (адреса, дедлайн, повторы, выключатель)
         """
         self.api_key = api_key or os.getenv("OPENAI_API_KEY")
         if not self.api_key:
             raise ValueError("Не указан OPENAI_API_KEY")
         
-        # Инициализируем OpenAI клиент с прокси для обхода региональных ограничений
-        self.client = OpenAI(
-            api_key=self.api_key,
-            base_url="https://api.openai-proxy.com/v1"  # Публичный прокси
-        )
+        # Асинхронные клиенты на общем пуле соединений, с повторами и выключателями,
+        # чтобы ожидание ответа модели не блокировало event loop uvicorn
+        self.transport = ResilientTransport(self.api_key, **(transport_options or {}))
         self.model = "gpt-4o-mini"  # Используем GPT-4o mini как указано в требованиях
+        self.response_cache = response_cache or ResponseCache()
+        self.token_counter = get_token_counter(self.model)
+        # Одинаковые одновременные запросы (отряд нажал одну подсказку) идут к модели один раз
+        self.single_flight = SingleFlight()
+        # Использование кэша промптов провайдера (usage.prompt_tokens_details.cached_tokens):
+        # запросы с персоной и запросы краткого содержания считаются отдельно —
+        # у них разные префиксы, и вторые не должны портить долю кэша первых
+        self._prompt_usage: Dict[str, Dict[str, int]] = {
+            kind: {"requests": 0, "prompt_tokens": 0, "cached_tokens": 0}
+            for kind in ("chat", "summary")
+        }
+        self._prefix_hashes: Dict[str, int] = {}
+    
+    def _record_usage(self, api_messages: List[Dict[str, str]], usage: Any):
+        """Учитывает префикс запроса и сколько токенов промпта провайдер взял из кэша"""
+        prefix = api_messages[0]["content"]
+        if prefix == CONVERSATION_SUMMARY_SYSTEM_PROMPT:
+            counters = self._prompt_usage["summary"]
+        else:
+            counters = self._prompt_usage["chat"]
+            prefix_hash = _prefix_hash(prefix)
+            self._prefix_hashes[prefix_hash] = self._prefix_hashes.get(prefix_hash, 0) + 1
+        counters["requests"] += 1
+        if usage is None:
+            return
+        counters["prompt_tokens"] += getattr(usage, "prompt_tokens", 0) or 0
+        details = getattr(usage, "prompt_tokens_details", None)
+        counters["cached_tokens"] += (getattr(details, "cached_tokens", 0) or 0) if details else 0
+    
+    def prompt_cache_stats(self) -> Dict[str, Any]:
+        """Хэш статического префикса и доля токенов промпта из кэша провайдера"""
+        static_prompt = get_static_system_prompt()
+        usage = {
+            kind: dict(
+                counters,
+                cached_ratio=(
+                    round(counters["cached_tokens"] / counters["prompt_tokens"], 4)
+                    if counters["prompt_tokens"] else 0.0
+                )
+            )
+            for kind, counters in self._prompt_usage.items()
+        }
+        return {
+            "prefix_hash": _prefix_hash(static_prompt),
+            "prefix_tokens": self.token_counter.count(static_prompt),
+            # Больше одного варианта — префикс где-то собирается иначе
+            "prefix_variants": dict(self._prefix_hashes),
+            # Запросы с персоной (ответы пользователям)
+            **usage["chat"],
+            # Обновление краткого содержания диалога
+            "summary": usage["summary"]
+        }
+    
+    async def _create_completion(
+        self,
+        api_messages: List[Dict[str, str]],
+        max_tokens: int,
+        temperature: float
+    ) -> str:
+        """
+        Выполняет запрос к chat.completions без блокировки event loop
+        
+        Если включён stream_deltas, ответ запрашивается потоком и дельты
+        передаются получателю; возвращается всё равно полный текст.
+        Одновременные запросы с одинаковыми сообщениями и параметрами
+        объединяются: к модели уходит один, остальные ждут его ответ.
+        
+        Args:
+            api_messages: Сообщения в формате API
+            max_tokens: Максимальное количество токенов
+            temperature: Температура генерации
+            
+        Returns:
+            Текст ответа модели
+        """
+        report_messages(api_messages, self.token_counter)
+        sink = _delta_sink.get()
+        key = hashlib.sha256(json.dumps(
+            [self.model, max_tokens, temperature, api_messages], ensure_ascii=False
+        ).encode('utf-8')).hexdigest()
+        content, shared = await self.single_flight.do(
+            key, lambda: self._request_completion(api_messages, max_tokens, temperature, sink)
+        )
+        if shared and sink is not None and content:
+            # Дельты чужого запроса ушли его получателю — этому отдаём текст целиком
+            sink(content)
+        return content
+    
+    async def _request_completion(
+        self,
+        api_messages: List[Dict[str, str]],
+        max_tokens: int,
+        temperature: float,
+        sink: Optional[Callable[[str], None]]
+    ) -> str:
+        """Один запрос к модели (потоком, если задан получатель дельт)"""
+        if sink is None:
+            response = await self.transport.request(lambda client: client.chat.completions.create(
+                model=self.model,
+                messages=api_messages,
+                max_tokens=max_tokens,
+                temperature=temperature
+            ))
+            self._record_usage(api_messages, getattr(response, "usage", None))
+            return (response.choices[0].message.content or "").strip()
+        
+        # Потоковый режим: отдаём дельты получателю по мере генерации.
+        # Повторяется только установка потока: после первой дельты повтор уже невозможен
+        stream = await self.transport.request(lambda client: client.chat.completions.create(
+            model=self.model,
+            messages=api_messages,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            stream=True,
+            stream_options={"include_usage": True}
+        ))
+        parts = []
+        usage = None
+        async for chunk in stream:
+            # Последний чанк несёт usage без choices
+            usage = getattr(chunk, "usage", None) or usage
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                parts.append(delta)
+                sink(delta)
+        self._record_usage(api_messages, usage)
+        return "".join(parts).strip()
     
-    def generate_response(
+    async def generate_response(
         self,
         messages: List[Message],
-        system_prompt: str,
-        user_context: Optional[UserContext] = None,
+        context_section: str = "",
         max_tokens: int = 1000,
-        temperature: float = 0.7
+        temperature: float = 0.7,
+        cache_key: Optional[str] = None,
+        knowledge: str = ""
     ) -> str:
         """
         Генерирует ответ от бота
         
         Args:
             messages: История сообщений
-            system_prompt: Системный промпт
-            user_context: Контекст пользователя
+            context_section: Секция контекста системного промпта (get_context_section)
             max_tokens: Максимальное количество токенов
             temperature: Температура генерации
+            cache_key: Ключ кэша ответов (см. make_cache_key); None — не кэшировать
+            knowledge: Справка о значке или категории для ответа
             
         Returns:
             Ответ бота
         """
-        # Формируем сообщения для API
-        api_messages = [{"role": "system", "content": system_prompt}]
-        
-        # Добавляем контекст пользователя если есть
-        if user_context:
-            context_info = self._format_user_context(user_context)
-            api_messages.append({"role": "system", "content": f"Контекст пользователя: {context_info}"})
+        if cache_key:
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                return cached
         
-        # Добавляем историю сообщений
-        for message in messages[-10:]:  # Ограничиваем историю последними 10 сообщениями
-            api_messages.append({
-                "role": message.role,
-                "content": message.content
-            })
+        api_messages = build_request_messages(messages, context_section, knowledge)
         
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=api_messages,
-                max_tokens=max_tokens,
-                temperature=temperature
-            )
-            
-            return response.choices[0].message.content.strip()
+            content = await self._create_completion(api_messages, max_tokens, temperature)
+            if cache_key:
+                self.response_cache.set(cache_key, content)
+            return content
         
         except Exception as e:
-            logger.error(f"Ошибка OpenAI API: {e}")
-            return f"Извините, произошла ошибка при генерации ответа: {str(e)}"
+            # Текст ошибки остаётся в логе, пользователь получает дружелюбный ответ
+            logger.error(f"Ошибка OpenAI API: {type(e).__name__}: {e}")
+            return FALLBACK_ANSWER
     
-    def _format_user_context(self, context: UserContext) -> str:
-        """Форматирует контекст пользователя для промпта"""
-        context_parts = []
-        
-        if context.current_category:
-            context_parts.append(f"Текущая категория: {context.current_category}")
-        
-        if context.current_badge:
-            context_parts.append(f"Текущий значок: {context.current_badge}")
-        
-        if context.interests:
-            context_parts.append(f"Интересы: {', '.join(context.interests)}")
+    async def summarize_conversation(self, summary: str, transcript: str, max_tokens: int = 300) -> str:
+        """
+        Обновляет краткое содержание диалога новыми репликами
         
-        if context.level:
-            context_parts.append(f"Уровень: {context.level}")
+        В отличие от generate_response, ошибки API не превращаются в текст ответа,
+        чтобы сообщение об ошибке не попало в содержание.
         
-        return "; ".join(context_parts)
+        Args:
+            summary: Текущее краткое содержание
+            transcript: Новые реплики
+            max_tokens: Максимальная длина содержания в токенах
+            
+        Returns:
+            Новое краткое содержание
+        """
+        prompt = get_conversation_summary_prompt(summary, transcript, max_words=max_tokens // 2)
+        return await self._create_completion(
+            [
+                {"role": "system", "content": CONVERSATION_SUMMARY_SYSTEM_PROMPT},
+                {"role": "user", "content": prompt}
+            ],
+            max_tokens=max_tokens,
+            temperature=0.2
+        )
     
     
-    def generate_creative_ideas(
+    async def generate_creative_ideas(
         self,
         badge_id: str,
         badge_info: str,
@@ -124,10 +350,7 @@ class OpenAIClient:
             Список креативных идей
         """
         prompt = f"""
-        Пользователь интересуется значком: {badge_id}
-        
-        Информация о значке:
-        {badge_info}
+        Пользователь интересуется значком: {badge_id} (информация о нём — в справке).
         
         Сгенерируй 3-5 креативных и практических идей для получения этого значка.
         Идеи должны быть:
@@ -143,25 +366,26 @@ class OpenAIClient:
             prompt += f"\n\nИнтересы пользователя: {', '.join(user_context.interests)}"
         
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[{"role": "user", "content": prompt}],
+            content = await self._create_completion(
+                build_prompt_messages([{"role": "user", "content": prompt}], knowledge=badge_info),
                 max_tokens=500,
                 temperature=0.8
             )
             
             # Разбиваем ответ на отдельные идеи
-            ideas = response.choices[0].message.content.strip().split('\n')
+            ideas = content.split('\n')
             return [idea.strip() for idea in ideas if idea.strip()]
         
         except Exception as e:
-            return [f"Извините, не удалось сгенерировать идеи: {str(e)}"]
+            logger.error(f"Ошибка OpenAI API (идеи): {type(e).__name__}: {e}")
+            return [FALLBACK_ANSWER]
     
-    def explain_philosophy(
+    async def explain_philosophy(
         self,
         category_id: str,
         category_info: str,
-        user_context: Optional[UserContext] = None
+        user_context: Optional[UserContext] = None,
+        cache_key: Optional[str] = None
     ) -> str:
         """
         Объясняет философию категории простыми словами
@@ -170,15 +394,18 @@ class OpenAIClient:
             category_id: ID категории
             category_info: Информация о категории
             user_context: Контекст пользователя
+            cache_key: Ключ кэша ответов (см. make_cache_key); None — не кэшировать
             
         Returns:
             Объяснение философии
         """
-        prompt = f"""
-        Объясни философию категории {category_id} простыми и понятными словами.
+        if cache_key:
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                return cached
         
-        Информация о категории:
-        {category_info}
+        prompt = f"""
+        Объясни философию категории {category_id} простыми и понятными словами, опираясь на справку о ней.
         
         Объяснение должно быть:
         - Понятным для детей и подростков
@@ -191,24 +418,26 @@ class OpenAIClient:
         """
         
         try:
-            # Формируем системный промпт с контекстом пользователя (без жёстких ограничений длины)
-            sys_prompt = get_system_prompt_with_context(
+            # Тот же порядок сообщений, что и в generate_response: префикс, справка, контекст
+            context_section = get_context_section(
                 current_category=(category_id if category_id and category_id != 'intro' else None),
                 user_level=(user_context.level if user_context else None),
                 user_interests=(user_context.interests if user_context else None)
             )
 
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": sys_prompt},
-                    {"role": "user", "content": prompt}
-                ],
+            content = await self._create_completion(
+                build_prompt_messages(
+                    [{"role": "user", "content": prompt}],
+                    knowledge=category_info,
+                    context_section=context_section
+                ),
                 max_tokens=500,
                 temperature=0.6
             )
-            
-            return response.choices[0].message.content.strip()
+            if cache_key:
+                self.response_cache.set(cache_key, content)
+            return content
         
         except Exception as e:
-            return f"Извините, не удалось объяснить философию: {str(e)}"
+            logger.error(f"Ошибка OpenAI API (философия): {type(e).__name__}: {e}")
+            return FALLBACK_ANSWER
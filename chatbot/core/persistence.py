@@ -0,0 +1,146 @@
+"""
+Отложенная (write-behind) запись состояния на диск
+Изменения копятся в памяти и сбрасываются пачкой по таймеру и при остановке
+"""
+import asyncio
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from pydantic import BaseModel
+
+from .storage import RecordKey, StorageBackend
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindWriter:
+    """
+    Копит "грязные" объекты и сбрасывает их на диск пачкой
+
+    Повторные изменения одной записи до сброса схлопываются в одну запись.
+    При аварийной остановке теряется не больше flush_interval секунд изменений.
+    """
+
+    def __init__(self, storage: StorageBackend, flush_interval: float = 2.0):
+        """
+        Инициализация
+
+        Args:
+            storage: Хранилище, в которое сбрасываются записи
+            flush_interval: Интервал сброса на диск в секундах
+        """
+        self.storage = storage
+        self.flush_interval = flush_interval
+        # Ключ записи -> объект, который сериализуется в момент сброса
+        self._dirty: Dict[RecordKey, BaseModel] = {}
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._stats = {
+            'marked': 0,
+            'coalesced': 0,
+            'flushes': 0,
+            'records_written': 0,
+            'errors': 0
+        }
+
+    def mark_dirty(self, key: RecordKey, model: BaseModel):
+        """
+        Помечает запись к сохранению
+
+        Args:
+            key: Ключ записи (вид, user_id)
+            model: Объект (контекст или диалог), сериализуется при сбросе
+        """
+        self._stats['marked'] += 1
+        if key in self._dirty:
+            self._stats['coalesced'] += 1
+        self._dirty[key] = model
+
+    def pending(self, key: RecordKey) -> Optional[BaseModel]:
+        """Возвращает объект, ещё не записанный в хранилище (или None)"""
+        return self._dirty.get(key)
+
+    def discard(self, key: RecordKey):
+        """Отменяет запись (например, данные удалены)"""
+        self._dirty.pop(key, None)
+
+    def request_flush(self):
+        """Запускает внеочередной сброс, не дожидаясь таймера"""
+        try:
+            asyncio.get_running_loop().create_task(self.flush())
+        except RuntimeError:
+            # Нет event loop — запись произойдёт при следующем сбросе
+            pass
+
+    def start(self):
+        """Запускает периодический сброс (нужен работающий event loop)"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Останавливает периодический сброс и записывает всё накопленное"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Ошибка отложенной записи: {e}")
+
+    async def flush(self):
+        """Записывает все накопленные изменения"""
+        async with self._flush_lock:
+            if not self._dirty:
+                return
+            dirty, self._dirty = self._dirty, {}
+            await self._write(dirty)
+
+    async def flush_keys(self, keys: Iterable[RecordKey], touched_at: Optional[float] = None) -> List[RecordKey]:
+        """
+        Записывает накопленные изменения только указанных записей
+
+        Args:
+            keys: Ключи записей (остальные ждут общего сброса)
+            touched_at: Время записи для хранилища (см. StorageBackend.save_batch)
+
+        Returns:
+            Ключи записей, которые сохранить не удалось
+        """
+        async with self._flush_lock:
+            dirty = {key: self._dirty.pop(key) for key in keys if key in self._dirty}
+            if not dirty:
+                return []
+            return await self._write(dirty, touched_at)
+
+    async def _write(self, dirty: Dict[RecordKey, BaseModel], touched_at: Optional[float] = None) -> List[RecordKey]:
+        """Записывает пачку, снятую с очереди; не записанное возвращает в очередь (под _flush_lock)"""
+        # Снимки делаем в event loop, пока объекты никто не меняет
+        batch: List[Tuple[RecordKey, Dict[str, Any]]] = [
+            (key, model.dict()) for key, model in dirty.items()
+        ]
+
+        failed = await asyncio.to_thread(self.storage.save_batch, batch, touched_at)
+        for key in failed:
+            # Не затираем более свежее изменение, пришедшее во время записи
+            self._dirty.setdefault(key, dirty[key])
+        self._stats['flushes'] += 1
+        self._stats['records_written'] += len(batch) - len(failed)
+        self._stats['errors'] += len(failed)
+        return failed
+
+    def stats(self) -> Dict:
+        """Счётчики записи"""
+        return {
+            **self._stats,
+            'pending': len(self._dirty),
+            'flush_interval': self.flush_interval
+        }
@@ -0,0 +1,118 @@
+"""
+Запуск нескольких процессов uvicorn с общими данными (pre-fork)
+Данные значков загружаются один раз в родительском процессе и после fork
+остаются общими страницами памяти (copy-on-write); все процессы принимают
+соединения с одного сокета
+"""
+import gc
+import logging
+import os
+import random
+import signal
+import socket
+import time
+from typing import Callable, Dict
+
+import uvicorn
+
+logger = logging.getLogger(__name__)
+
+# Пауза перед перезапуском упавшего процесса (сек), чтобы не уйти в цикл перезапусков
+RESPAWN_DELAY = 1.0
+
+
+def _bind(host: str, port: int, backlog: int = 2048) -> socket.socket:
+    """Общий слушающий сокет, который наследуют все процессы"""
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _run_worker(app, sock: socket.socket, log_level: str):
+    """Тело дочернего процесса: свой event loop и свой uvicorn на общем сокете"""
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    # После fork у всех процессов одинаковое состояние генератора (джиттер повторов)
+    random.seed()
+    server = uvicorn.Server(uvicorn.Config(app, log_level=log_level))
+    server.run(sockets=[sock])
+
+
+def serve(app, host: str, port: int, workers: int, preload: Callable[[], None], log_level: str = "info"):
+    """
+    Запускает workers процессов uvicorn после общей предзагрузки
+
+    Процессы, завершившиеся сами по себе, перезапускаются; SIGTERM или SIGINT
+    родителю передаётся всем процессам как SIGTERM (мягкая остановка).
+
+    Args:
+        app: ASGI-приложение (его lifespan выполняется в каждом процессе)
+        host: Адрес
+        port: Порт
+        workers: Количество процессов
+        preload: Загрузка данных, общих для всех процессов (выполняется до fork)
+        log_level: Уровень логов uvicorn
+    """
+    if not hasattr(os, "fork"):
+        # Windows: fork нет, работаем одним процессом
+        logger.warning(f"os.fork недоступен, вместо {workers} процессов запускается один")
+        preload()
+        uvicorn.run(app, host=host, port=port, log_level=log_level)
+        return
+
+    preload()
+    # Всё загруженное — в постоянное поколение: сборщик мусора в процессах
+    # не будет трогать эти объекты и копировать их страницы
+    gc.collect()
+    gc.freeze()
+
+    sock = _bind(host, port)
+    children: Dict[int, int] = {}
+    stopping = False
+
+    def spawn(index: int):
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                _run_worker(app, sock, log_level)
+            except BaseException:
+                logger.exception(f"Процесс {index} завершился с ошибкой")
+                code = 1
+            finally:
+                os._exit(code)
+        children[pid] = index
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for index in range(workers):
+        spawn(index)
+    print(f"Zapushheno processov: {workers} (pid {', '.join(str(pid) for pid in children)})")
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        index = children.pop(pid, None)
+        if index is None or stopping:
+            continue
+        print(f"Process {pid} zavershilsja (kod {os.waitstatus_to_exitcode(status)}), perezapusk...")
+        time.sleep(RESPAWN_DELAY)
+        if not stopping:
+            spawn(index)
+    sock.close()
@@ -0,0 +1,487 @@
+"""
+Заранее сгенерированные ответы о значках
+Объяснения значков, идеи для их получения и обзоры уровней генерируются офлайн
+(build_pregenerated.py) для каждого уровня пользователя и группы интересов и
+хранятся в одном JSON-файле рядом с ai_data_complete.json. Ответы значка
+действительны, пока не изменились его данные и промпты: для каждого значка в
+файле хранятся хэш исходного файла значка N.X.json, отпечаток промптов и
+способ генерации (пакет к модели или заглушка).
+"""
+import hashlib
+import json
+import logging
+import time
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+from models.badge import Badge
+from models.conversation import Message, UserContext
+from core.context_manager import INTEREST_KEYWORDS, USER_LEVELS
+from core.openai_client import build_request_messages
+from core.prompt_assembly import ContextAssembler
+from prompts.system_prompt import (
+    get_badge_explanation_prompt,
+    get_context_section,
+    get_creative_ideas_prompt,
+    get_system_prompt_fingerprint
+)
+
+logger = logging.getLogger(__name__)
+
+PREGENERATED_FORMAT = "pregenerated-answers"
+PREGENERATED_VERSION = 2
+
+# Виды ответов и параметры генерации (как в ResponseGenerator)
+KIND_PARAMS = {
+    "explanation": {"max_tokens": 800, "temperature": 0.65},
+    "ideas": {"max_tokens": 700, "temperature": 0.75},
+    "levels": {"max_tokens": 900, "temperature": 0.65},
+}
+KINDS = tuple(KIND_PARAMS)
+# Тип запроса (IntentRouter), на который отвечает каждый вид
+KIND_INTENTS = {
+    "explanation": "badge_explanation",
+    "ideas": "creative_ideas",
+    "levels": "badge_levels_explanation",
+}
+
+# Запрос обзора уровней (уровни передаются в справке)
+LEVELS_PROMPT = "Объясни все уровни значка '{title}' (уровни — в справке)."
+
+# Способы генерации: пакет к модели или заглушка из данных значка (только для разработки)
+GENERATOR_BATCH = "batch"
+GENERATOR_STUB = "stub"
+
+# Группа для пользователей без распознанных интересов
+GENERAL_BUCKET = "general"
+INTEREST_BUCKETS = tuple(INTEREST_KEYWORDS) + (GENERAL_BUCKET,)
+
+# Экран, от лица которого генерируются ответы
+PREGENERATED_VIEW = "badge"
+
+
+# ID значка -> хэш его исходного файла (DataLoaderNew.get_badge_source_hash)
+SourceHash = Callable[[str], Optional[str]]
+
+
+def prompt_fingerprint(model: str) -> str:
+    """
+    Отпечаток всего, что кроме данных значка определяет ответ: системного
+    промпта (с фактами), шаблонов запросов, порядка сообщений запроса,
+    параметров генерации и модели
+    """
+    return _prompt_fingerprint(get_system_prompt_fingerprint(), model)
+
+
+@lru_cache(maxsize=8)
+def _prompt_fingerprint(system_fingerprint: str, model: str) -> str:
+    payload = json.dumps([
+        system_fingerprint,
+        model,
+        KIND_PARAMS,
+        get_badge_explanation_prompt("{title}"),
+        get_creative_ideas_prompt("{title}", "{context}"),
+        LEVELS_PROMPT,
+        build_request_messages([Message(role="user", content="{prompt}", metadata={})], "{context}", "{knowledge}")
+    ], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+
+def default_kinds(local_intents: Iterable[str]) -> Tuple[str, ...]:
+    """
+    Виды ответов, которые имеет смысл генерировать
+
+    Запросы, на которые бот отвечает по шаблону (LOCAL_ANSWER_INTENTS), до
+    готовых ответов не доходят — генерировать их незачем.
+    """
+    local_intents = set(local_intents)
+    return tuple(kind for kind in KINDS if KIND_INTENTS[kind] not in local_intents)
+
+
+def _reusable_answers(entry: Dict[str, Any], source_hash: Optional[str], generator: str, fingerprint: str) -> Dict[str, str]:
+    """Ответы записи значка, если они сгенерированы по тем же данным, промптам и тем же способом"""
+    if (
+        source_hash is None
+        or entry.get('sourceHash') != source_hash
+        or entry.get('generator') != generator
+        or entry.get('promptFingerprint') != fingerprint
+    ):
+        return {}
+    return entry.get('answers', {})
+
+
+def interest_bucket(interests: Sequence[str]) -> str:
+    """Группа интересов пользователя: первый по алфавиту известный интерес"""
+    known = sorted(interest for interest in interests if interest in INTEREST_KEYWORDS)
+    return known[0] if known else GENERAL_BUCKET
+
+
+def answer_key(kind: str, user_level: str, bucket: str) -> str:
+    """Ключ ответа внутри значка"""
+    return f"{kind}|{user_level}|{bucket}"
+
+
+class PregenerationRequest(NamedTuple):
+    """Один запрос офлайн-генерации"""
+    custom_id: str
+    badge_id: str
+    key: str
+    messages: List[Dict[str, str]]
+    max_tokens: int
+    temperature: float
+
+
+def _badge_prompt(kind: str, badge: Badge, context: UserContext, assembler: ContextAssembler):
+    """Промпт, секция контекста и справка — так же, как при генерации ответа вживую"""
+    title = f"{badge.emoji} {badge.title}"
+    if kind == "explanation":
+        prompt = get_badge_explanation_prompt(title)
+        knowledge = assembler.badge_context(badge)
+    elif kind == "ideas":
+        prompt = get_creative_ideas_prompt(title, f"Интересы: {', '.join(context.interests)}, Уровень: {context.level}")
+        knowledge = assembler.badge_context(badge)
+    else:
+        prompt = LEVELS_PROMPT.format(title=title)
+        knowledge = assembler.levels_context(badge)
+    context_section = get_context_section(
+        current_badge=badge.title,
+        user_level=context.level,
+        user_interests=context.interests,
+        current_view=PREGENERATED_VIEW
+    )
+    return prompt, context_section, knowledge
+
+
+def pregeneration_requests(
+    badges: Iterable[Badge],
+    assembler: ContextAssembler,
+    source_hash: SourceHash,
+    kinds: Sequence[str] = KINDS,
+    user_levels: Sequence[str] = USER_LEVELS,
+    buckets: Sequence[str] = INTEREST_BUCKETS,
+    existing: Optional[Dict[str, Any]] = None,
+    generator: str = GENERATOR_BATCH,
+    fingerprint: str = ""
+) -> List[PregenerationRequest]:
+    """
+    Запросы для всех сочетаний значка, вида ответа, уровня и группы интересов
+
+    Args:
+        badges: Значки
+        assembler: Сборка справки о значке
+        source_hash: Хэш исходного файла значка по его ID
+        kinds: Виды ответов
+        user_levels: Уровни пользователя
+        buckets: Группы интересов
+        existing: Прежний файл ответов: актуальные ответы из него не запрашиваются
+        generator: Способ генерации (ответы, полученные другим способом, запрашиваются заново)
+        fingerprint: Отпечаток промптов (prompt_fingerprint)
+
+    Returns:
+        Запросы к модели
+    """
+    previous = (existing or {}).get('badges', {})
+    requests = []
+    for badge in badges:
+        done = _reusable_answers(previous.get(badge.id) or {}, source_hash(badge.id), generator, fingerprint)
+        for kind in kinds:
+            # У безуровневого значка обзор уровней не нужен
+            if kind == "levels" and not badge.levels:
+                continue
+            for user_level in user_levels:
+                for bucket in buckets:
+                    key = answer_key(kind, user_level, bucket)
+                    if key in done:
+                        continue
+                    context = UserContext(
+                        user_id="pregenerated",
+                        current_badge=badge.id,
+                        level=user_level,
+                        interests=[] if bucket == GENERAL_BUCKET else [bucket],
+                        session_data={"current_view": PREGENERATED_VIEW}
+                    )
+                    prompt, context_section, knowledge = _badge_prompt(kind, badge, context, assembler)
+                    requests.append(PregenerationRequest(
+                        custom_id=f"{badge.id}|{key}",
+                        badge_id=badge.id,
+                        key=key,
+                        messages=build_request_messages(
+                            [Message(role="user", content=prompt, metadata={})],
+                            context_section,
+                            knowledge
+                        ),
+                        **KIND_PARAMS[kind]
+                    ))
+    return requests
+
+
+def run_batch(
+    client,
+    requests: Sequence[PregenerationRequest],
+    model: str,
+    poll_interval: float = 30.0,
+    progress: Callable[[str], None] = print
+) -> Dict[str, str]:
+    """
+    Выполняет запросы через OpenAI Batch API и дожидается результата
+
+    Args:
+        client: Синхронный клиент openai.OpenAI
+        requests: Запросы
+        model: Модель
+        poll_interval: Интервал проверки статуса пакета (сек)
+        progress: Куда писать ход выполнения
+
+    Returns:
+        custom_id -> текст ответа (запросы с ошибкой пропускаются)
+    """
+    lines = [
+        json.dumps({
+            "custom_id": request.custom_id,
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": {
+                "model": model,
+                "messages": request.messages,
+                "max_tokens": request.max_tokens,
+                "temperature": request.temperature
+            }
+        }, ensure_ascii=False)
+        for request in requests
+    ]
+    batch_file = client.files.create(
+        file=("pregenerated.jsonl", "\n".join(lines).encode('utf-8')),
+        purpose="batch"
+    )
+    batch = client.batches.create(
+        input_file_id=batch_file.id,
+        endpoint="/v1/chat/completions",
+        completion_window="24h"
+    )
+    progress(f"Пакет {batch.id}: {len(requests)} запросов")
+    while batch.status not in ("completed", "failed", "expired", "cancelled"):
+        time.sleep(poll_interval)
+        batch = client.batches.retrieve(batch.id)
+        counts = batch.request_counts
+        progress(f"Пакет {batch.id}: {batch.status}, готово {counts.completed if counts else 0}/{len(requests)}")
+    if batch.status != "completed" or not batch.output_file_id:
+        raise RuntimeError(f"Пакет {batch.id} не выполнен: {batch.status}")
+
+    texts = {}
+    for line in client.files.content(batch.output_file_id).text.splitlines():
+        if not line.strip():
+            continue
+        result = json.loads(line)
+        response = result.get('response') or {}
+        if response.get('status_code') != 200:
+            continue
+        content = response['body']['choices'][0]['message'].get('content') or ""
+        if content.strip():
+            texts[result['custom_id']] = content.strip()
+    return texts
+
+
+def run_stub(requests: Sequence[PregenerationRequest], badges: Dict[str, Badge]) -> Dict[str, str]:
+    """
+    Локальная заглушка без обращения к API: ответы собираются из данных значка
+
+    Нужна для проверки конвейера и разработки без ключа.
+    """
+    texts = {}
+    for request in requests:
+        badge = badges[request.badge_id]
+        kind = request.key.split("|", 1)[0]
+        if kind == "explanation":
+            parts = [f"{badge.emoji} {badge.title}", badge.description, badge.nameExplanation or ""]
+        elif kind == "ideas":
+            examples = badge.examples if isinstance(badge.examples, list) else [badge.examples or ""]
+            parts = [f"💡 Идеи для значка {badge.title}:", *examples, badge.skillTips or ""]
+        else:
+            parts = [f"Уровни значка {badge.title}:"] + [
+                f"{level.emoji} {level.level} — {level.title}" for level in badge.levels
+            ]
+        texts[request.custom_id] = "\n".join(part.strip() for part in parts if part and part.strip())
+    return texts
+
+
+def merge_answers(
+    existing: Optional[Dict[str, Any]],
+    badges: Sequence[Badge],
+    requests: Sequence[PregenerationRequest],
+    texts: Dict[str, str],
+    source_hash: SourceHash,
+    model: str,
+    generator: str,
+    fingerprint: str
+) -> Dict[str, Any]:
+    """
+    Новый файл ответов: актуальные прежние ответы и только что сгенерированные
+
+    Ответы удалённых значков, значков с изменившимися данными, ответы по
+    прежним промптам и полученные другим способом отбрасываются.
+    """
+    previous = (existing or {}).get('badges', {})
+    answers: Dict[str, Dict[str, Any]] = {}
+    for badge in badges:
+        badge_hash = source_hash(badge.id)
+        answers[badge.id] = {
+            'sourceHash': badge_hash,
+            'generator': generator,
+            'promptFingerprint': fingerprint,
+            'answers': dict(_reusable_answers(previous.get(badge.id) or {}, badge_hash, generator, fingerprint))
+        }
+    for request in requests:
+        text = texts.get(request.custom_id)
+        if text:
+            answers[request.badge_id]['answers'][request.key] = text
+    return {
+        'format': PREGENERATED_FORMAT,
+        'version': PREGENERATED_VERSION,
+        'builtAt': datetime.now().isoformat(timespec='seconds'),
+        'model': model,
+        'badges': answers
+    }
+
+
+def read_answers(path: Union[str, Path]) -> Optional[Dict[str, Any]]:
+    """Читает файл ответов (None — файла нет или он другого формата)"""
+    path = Path(path)
+    if not path.exists():
+        return None
+    data = json.loads(path.read_text(encoding='utf-8'))
+    if data.get('format') != PREGENERATED_FORMAT or data.get('version') != PREGENERATED_VERSION:
+        return None
+    return data
+
+
+def write_answers(data: Dict[str, Any], output_path: Union[str, Path]):
+    """Записывает файл ответов (через временный файл)"""
+    output_path = Path(output_path)
+    tmp_path = output_path.with_name(output_path.name + ".tmp")
+    tmp_path.write_text(json.dumps(data, ensure_ascii=False, indent=1), encoding='utf-8')
+    tmp_path.replace(output_path)
+
+
+class PregeneratedAnswers:
+    """
+    Готовые ответы о значках из файла build_pregenerated.py
+
+    Актуальность ответов значка проверяется при первом обращении к нему:
+    ответы не отдаются, если изменился исходный файл значка или промпты
+    (включая модель). Ответы-заглушки (build_pregenerated.py --stub) — это склеенные
+    данные значка, а не ответы модели, поэтому они отдаются только с allow_stub.
+    """
+
+    def __init__(
+        self,
+        data: Optional[Dict[str, Any]] = None,
+        source_hash: Optional[SourceHash] = None,
+        model: str = "gpt-4o-mini",
+        allow_stub: bool = False
+    ):
+        """
+        Args:
+            data: Содержимое файла ответов (None — ответов нет)
+            source_hash: Хэш исходного файла значка по его ID (None — ответы не проверить и не отдавать)
+            model: Модель, которой бот отвечает вживую
+            allow_stub: Отдавать ответы-заглушки (только для разработки)
+        """
+        self._badges: Dict[str, Dict[str, Any]] = (data or {}).get('badges', {})
+        self.source_hash = source_hash
+        self.model = model
+        self.allow_stub = allow_stub
+        # (ID значка, отпечаток промптов) -> актуальны ли ответы
+        self._fresh: Dict[Tuple[str, str], bool] = {}
+        self._hits = 0
+        self._misses = 0
+        self._stale = 0
+
+    @classmethod
+    def load(
+        cls,
+        path: Optional[Union[str, Path]],
+        source_hash: Optional[SourceHash] = None,
+        model: str = "gpt-4o-mini",
+        allow_stub: bool = False
+    ) -> "PregeneratedAnswers":
+        """Загружает ответы из файла; если файла нет или он повреждён — пустой набор"""
+        if not path:
+            return cls(source_hash=source_hash, model=model, allow_stub=allow_stub)
+        try:
+            data = read_answers(path)
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️ Готовые ответы {path} не загружены: {e}")
+            data = None
+        answers = cls(data, source_hash=source_hash, model=model, allow_stub=allow_stub)
+        stubs = sum(1 for entry in answers._badges.values() if entry.get('generator') != GENERATOR_BATCH)
+        if stubs and not allow_stub:
+            logger.warning(f"⚠️ В {path} есть ответы-заглушки ({stubs} значков): они не используются")
+        return answers
+
+    def _is_fresh(self, badge: Badge) -> bool:
+        fingerprint = prompt_fingerprint(self.model)
+        fresh = self._fresh.get((badge.id, fingerprint))
+        if fresh is None:
+            entry = self._badges[badge.id]
+            fresh = (
+                (entry.get('generator') == GENERATOR_BATCH or self.allow_stub)
+                and entry.get('promptFingerprint') == fingerprint
+                and self.source_hash is not None
+                and entry.get('sourceHash') == self.source_hash(badge.id)
+            )
+            self._fresh[(badge.id, fingerprint)] = fresh
+        return fresh
+
+    def validate(self, badges: Iterable[Badge]) -> int:
+        """
+        Проверяет актуальность ответов значков заранее, а не при первом обращении
+
+        Args:
+            badges: Значки Путеводителя
+
+        Returns:
+            Количество значков с актуальными ответами
+        """
+        return sum(1 for badge in badges if badge.id in self._badges and self._is_fresh(badge))
+
+    def get(self, kind: str, badge: Badge, context: UserContext) -> Optional[str]:
+        """
+        Готовый ответ для значка под уровень и интересы пользователя
+
+        Args:
+            kind: "explanation", "ideas" или "levels"
+            badge: Значок
+            context: Контекст пользователя
+
+        Returns:
+            Текст ответа (None — ответа нет или он устарел)
+        """
+        if badge.id not in self._badges:
+            self._misses += 1
+            return None
+        if not self._is_fresh(badge):
+            self._stale += 1
+            return None
+        answers = self._badges[badge.id].get('answers', {})
+        bucket = interest_bucket(context.interests)
+        text = answers.get(answer_key(kind, context.level, bucket))
+        if text is None and bucket != GENERAL_BUCKET:
+            text = answers.get(answer_key(kind, context.level, GENERAL_BUCKET))
+        if text is None:
+            self._misses += 1
+            return None
+        self._hits += 1
+        return text
+
+    def stats(self) -> Dict[str, Any]:
+        """Размер набора и попадания"""
+        return {
+            "badges": len(self._badges),
+            "answers": sum(len(entry.get('answers', {})) for entry in self._badges.values()),
+            "model": self.model,
+            "hits": self._hits,
+            "misses": self._misses,
+            "stale": self._stale
+        }
@@ -0,0 +1,443 @@
+"""
+Сборка знаний о значках для промпта с бюджетом токенов
+Поля значка и уровней режутся на фрагменты, фрагменты ранжируются по близости
+к сообщению пользователя и набираются в промпт, пока не исчерпан бюджет
+"""
+import math
+import re
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Dict, Iterator, List, NamedTuple, Optional, Sequence
+
+from models.badge import Badge, BadgeLevel, Category
+from .search_index import iter_terms
+
+# Бюджет знаний о значке в промпте по умолчанию (токены)
+DEFAULT_KNOWLEDGE_BUDGET = 900
+# Фрагмент не длиннее стольких токенов: длинные поля режутся по абзацам и предложениям
+MAX_CHUNK_TOKENS = 160
+# Остаток бюджета, ради которого последний фрагмент обрезается, а не пропускается
+MIN_TAIL_TOKENS = 40
+
+# Поля значка: подпись в промпте и базовый приоритет (описание идёт первым всегда)
+BADGE_FIELDS = (
+    ('description', 'Описание', 3.0),
+    ('howToBecome', 'Как получить', 1.5),
+    ('skillTips', 'Советы', 1.4),
+    ('nameExplanation', 'Объяснение названия', 1.0),
+    ('examples', 'Примеры', 1.0),
+    ('philosophy', 'Философия', 0.8),
+)
+LEVEL_PRIORITY = 1.3
+# Бонус уровня, открытого у пользователя на экране
+CURRENT_LEVEL_BONUS = 2.0
+# Вес совпадения с сообщением относительно базового приоритета
+RELEVANCE_WEIGHT = 2.0
+
+_PARAGRAPH_RE = re.compile(r"\n\s*\n|\n(?=\s*[-•*\d])")
+_SENTENCE_RE = re.compile(r"(?<=[.!?…])\s+")
+# Эвристика без tiktoken: слова, числа и отдельные прочие символы
+_TOKEN_PIECE_RE = re.compile(r"[a-zA-Z]+|\d+|[а-яА-ЯёЁ]+|\S")
+
+
+class TokenCounter:
+    """
+    Подсчёт токенов локальным токенизатором
+
+    Если установлен tiktoken — используется кодировка модели, иначе оценка:
+    кириллическое слово ~3 буквы на токен, латинское ~4, прочие символы по одному.
+    Оценка немного завышена, чтобы бюджет не превышался.
+    """
+
+    def __init__(self, model: str = "gpt-4o-mini"):
+        """
+        Args:
+            model: Модель, для которой считаются токены
+        """
+        self.model = model
+        self._encoding = None
+        try:
+            import tiktoken
+            try:
+                self._encoding = tiktoken.encoding_for_model(model)
+            except KeyError:
+                self._encoding = tiktoken.get_encoding("o200k_base")
+            self.backend = f"tiktoken:{self._encoding.name}"
+        except ImportError:
+            self.backend = "heuristic"
+        # Статичные части промпта считаются повторно на каждом запросе
+        self.count = lru_cache(maxsize=1024)(self._count)
+
+    def _count(self, text: str) -> int:
+        if not text:
+            return 0
+        if self._encoding is not None:
+            return len(self._encoding.encode(text, disallowed_special=()))
+        tokens = 0
+        for piece in _TOKEN_PIECE_RE.findall(text):
+            if piece[0].isascii() and piece[0].isalpha():
+                tokens += math.ceil(len(piece) / 4)
+            elif piece[0].isdigit():
+                tokens += math.ceil(len(piece) / 3)
+            elif piece[0].isalpha():
+                tokens += math.ceil(len(piece) / 3)
+            else:
+                tokens += 1
+        return tokens
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """
+        Обрезает текст до бюджета по границе предложения (или слова)
+
+        Args:
+            text: Текст
+            max_tokens: Бюджет в токенах
+
+        Returns:
+            Текст целиком, если помещается, иначе начало с многоточием
+        """
+        if max_tokens <= 0:
+            return ""
+        if self.count(text) <= max_tokens:
+            return text
+        kept = []
+        used = self.count("…")
+        for sentence in _SENTENCE_RE.split(text.strip()):
+            cost = self.count(sentence) + 1
+            if used + cost > max_tokens:
+                if not kept:
+                    # Первое предложение длиннее бюджета: режем по словам
+                    kept = self._truncate_words(sentence, max_tokens - used)
+                break
+            kept.append(sentence)
+            used += cost
+        result = " ".join(kept).rstrip(" ,;:—-")
+        return f"{result}…" if result else ""
+
+    def _truncate_words(self, sentence: str, max_tokens: int) -> List[str]:
+        words = []
+        used = 0
+        for word in sentence.split():
+            cost = self.count(word) + 1
+            if used + cost > max_tokens:
+                break
+            words.append(word)
+            used += cost
+        return [" ".join(words)] if words else []
+
+
+_default_counter: Optional[TokenCounter] = None
+
+
+def get_token_counter(model: str = "gpt-4o-mini") -> TokenCounter:
+    """Общий счётчик токенов процесса (создаётся при первом обращении)"""
+    global _default_counter
+    if _default_counter is None or _default_counter.model != model:
+        _default_counter = TokenCounter(model)
+    return _default_counter
+
+
+class PromptReport:
+    """Стоимость секций одного промпта в токенах"""
+
+    def __init__(self):
+        self.sections: Dict[str, int] = defaultdict(int)
+
+    def add(self, section: str, tokens: int):
+        """Добавляет токены секции"""
+        self.sections[section] += tokens
+
+    @property
+    def sent(self) -> bool:
+        """Был ли запрос к модели (ответ из кэша считает только знания)"""
+        return 'message' in self.sections
+
+    def as_dict(self) -> Dict[str, int]:
+        """Секции и итог (секция knowledge входит в system_context)"""
+        data = dict(self.sections)
+        data['total'] = sum(tokens for section, tokens in data.items() if section != 'knowledge')
+        return data
+
+
+# Отчёт текущего ответа: задаётся на время генерации, как получатель дельт в openai_client
+_current_report: ContextVar[Optional[PromptReport]] = ContextVar("prompt_report", default=None)
+
+
+@contextmanager
+def collect_prompt_report() -> Iterator[PromptReport]:
+    """Собирает стоимость секций промптов, отправленных в текущем контексте"""
+    report = PromptReport()
+    token = _current_report.set(report)
+    try:
+        yield report
+    finally:
+        _current_report.reset(token)
+
+
+def report_section(section: str, tokens: int):
+    """Записывает стоимость секции в отчёт текущего ответа (если он собирается)"""
+    report = _current_report.get()
+    if report is not None:
+        report.add(section, tokens)
+
+
+def report_messages(api_messages: Sequence[Dict[str, str]], counter: TokenCounter):
+    """
+    Раскладывает сообщения запроса к модели по секциям отчёта
+
+    Порядок сообщений — как в openai_client.build_prompt_messages: статическая
+    часть системного промпта, справка и контекст, история, запрос пользователя.
+
+    Args:
+        api_messages: Сообщения в формате API
+        counter: Счётчик токенов
+    """
+    if _current_report.get() is None or not api_messages:
+        return
+    *history, last = api_messages
+    for index, message in enumerate(history):
+        content = message['content']
+        if message['role'] != 'system':
+            report_section('history', counter.count(content))
+        elif index == 0:
+            report_section('system_prompt', counter.count(content))
+        else:
+            report_section('system_context', counter.count(content))
+    report_section('message', counter.count(last['content']))
+
+
+class PromptStats:
+    """Накопленная стоимость секций промптов для /metrics"""
+
+    def __init__(self):
+        self.requests = 0
+        self._totals: Dict[str, int] = defaultdict(int)
+
+    def add(self, report: PromptReport):
+        """Учитывает отчёт одного ответа (ответы без обращения к модели пропускаются)"""
+        if not report.sent:
+            return
+        self.requests += 1
+        for section, tokens in report.as_dict().items():
+            self._totals[section] += tokens
+
+    def stats(self) -> Dict:
+        """Средняя стоимость секций на ответ"""
+        return {
+            'requests': self.requests,
+            'avg_tokens': {
+                section: round(tokens / self.requests, 1)
+                for section, tokens in sorted(self._totals.items())
+            } if self.requests else {}
+        }
+
+
+class Chunk(NamedTuple):
+    """Фрагмент знаний для промпта"""
+    position: int
+    label: str
+    text: str
+    priority: float
+    tokens: int
+
+
+class ContextAssembler:
+    """
+    Подбор фрагментов о значках и категориях под бюджет токенов
+
+    Фрагменты оцениваются базовым приоритетом поля и совпадением основ слов
+    с сообщением (с весом IDF по фрагментам значка), набираются жадно
+    и выводятся в исходном порядке полей. Без сообщения (ответы, которые
+    кэшируются по значку) порядок задаёт только приоритет полей.
+    """
+
+    def __init__(self, counter: Optional[TokenCounter] = None, budget: int = DEFAULT_KNOWLEDGE_BUDGET):
+        """
+        Args:
+            counter: Счётчик токенов (по умолчанию общий)
+            budget: Бюджет знаний в токенах по умолчанию
+        """
+        self.counter = counter or get_token_counter()
+        self.budget = budget
+        self.stats = PromptStats()
+
+    def _split(self, text: str) -> List[str]:
+        """Делит длинный текст на части не длиннее MAX_CHUNK_TOKENS"""
+        text = text.strip()
+        if self.counter.count(text) <= MAX_CHUNK_TOKENS:
+            return [text] if text else []
+        parts: List[str] = []
+        for paragraph in _PARAGRAPH_RE.split(text):
+            paragraph = paragraph.strip()
+            if not paragraph:
+                continue
+            if self.counter.count(paragraph) > MAX_CHUNK_TOKENS:
+                parts.extend(self._pack_sentences(_SENTENCE_RE.split(paragraph)))
+            elif parts and self.counter.count(f"{parts[-1]}\n{paragraph}") <= MAX_CHUNK_TOKENS:
+                parts[-1] = f"{parts[-1]}\n{paragraph}"
+            else:
+                parts.append(paragraph)
+        return parts
+
+    def _pack_sentences(self, sentences: List[str]) -> List[str]:
+        parts: List[str] = []
+        for sentence in sentences:
+            if parts and self.counter.count(f"{parts[-1]} {sentence}") <= MAX_CHUNK_TOKENS:
+                parts[-1] = f"{parts[-1]} {sentence}"
+            else:
+                parts.append(self.counter.truncate(sentence, MAX_CHUNK_TOKENS))
+        return parts
+
+    def _chunks(self, label: str, text: str, priority: float, position: int) -> List[Chunk]:
+        return [
+            Chunk(position + i / 100, label, part, priority, self.counter.count(part))
+            for i, part in enumerate(self._split(text))
+        ]
+
+    def _level_text(self, level: BadgeLevel) -> str:
+        # Критерии и подтверждение обрезаются по отдельности, чтобы не потерять подтверждение
+        criteria = self.counter.truncate(str(level.criteria), MAX_CHUNK_TOKENS)
+        confirmation = self.counter.truncate(str(level.confirmation), MAX_CHUNK_TOKENS // 2)
+        return f"{level.emoji} {level.title} ({level.level}): {criteria}\nПодтверждение: {confirmation}"
+
+    def _level_chunks(self, levels: List[BadgeLevel], current_level: Optional[str], position: int) -> List[Chunk]:
+        chunks = []
+        for i, level in enumerate(levels):
+            priority = LEVEL_PRIORITY + (CURRENT_LEVEL_BONUS if current_level and level.level == current_level else 0.0)
+            text = self._level_text(level)
+            chunks.append(Chunk(position + i, "Уровни", text, priority, self.counter.count(text)))
+        return chunks
+
+    def _select(self, chunks: List[Chunk], query: str, budget: int) -> List[Chunk]:
+        """Жадно набирает лучшие фрагменты в бюджет; возвращает их в исходном порядке"""
+        query_terms = {term for _, _, term in iter_terms(query)} if query else set()
+        scores = {}
+        if query_terms:
+            chunk_terms = [{term for _, _, term in iter_terms(chunk.text)} for chunk in chunks]
+            idf = {
+                term: math.log(1 + len(chunks) / (1 + sum(term in terms for terms in chunk_terms)))
+                for term in query_terms
+            }
+            total = sum(idf.values()) or 1.0
+            for chunk, terms in zip(chunks, chunk_terms):
+                relevance = sum(idf[term] for term in query_terms & terms) / total
+                scores[chunk.position] = chunk.priority + RELEVANCE_WEIGHT * relevance
+        ranked = sorted(chunks, key=lambda chunk: (-scores.get(chunk.position, chunk.priority), chunk.position))
+
+        selected = []
+        remaining = budget
+        for chunk in ranked:
+            # Подпись поля и перенос строки тоже стоят токенов
+            overhead = self.counter.count(f"{chunk.label}:") + 1
+            cost = chunk.tokens + overhead
+            if cost <= remaining:
+                selected.append(chunk)
+                remaining -= cost
+            elif remaining >= MIN_TAIL_TOKENS:
+                text = self.counter.truncate(chunk.text, remaining - overhead)
+                if text:
+                    selected.append(chunk._replace(text=text, tokens=self.counter.count(text)))
+                remaining = 0
+            if remaining < MIN_TAIL_TOKENS:
+                break
+        return sorted(selected, key=lambda chunk: chunk.position)
+
+    @staticmethod
+    def _render(chunks: List[Chunk]) -> List[str]:
+        """Блоки промпта: фрагменты одного поля под общей подписью"""
+        blocks: List[List[str]] = []
+        label = None
+        for chunk in chunks:
+            if chunk.label != label:
+                label = chunk.label
+                blocks.append([f"{label}:"] if label == "Уровни" else [f"{label}: {chunk.text}"])
+                if label != "Уровни":
+                    continue
+            blocks[-1].append(f"- {chunk.text}" if label == "Уровни" else chunk.text)
+        return ["\n".join(block) for block in blocks]
+
+    def _finish(self, text: str) -> str:
+        report_section('knowledge', self.counter.count(text))
+        return text
+
+    def badge_context(
+        self,
+        badge: Badge,
+        query: str = "",
+        budget: Optional[int] = None,
+        current_level: Optional[str] = None,
+        include_levels: bool = True
+    ) -> str:
+        """
+        Знания о значке для промпта
+
+        Args:
+            badge: Значок
+            query: Сообщение пользователя (пусто — только приоритет полей)
+            budget: Бюджет в токенах (None — бюджет по умолчанию)
+            current_level: Уровень, открытый у пользователя (получает бонус)
+            include_levels: Добавлять ли уровни значка
+
+        Returns:
+            Текст со значком и подобранными фрагментами
+        """
+        budget = self.budget if budget is None else budget
+        header = f"{badge.emoji} {badge.title}"
+        chunks: List[Chunk] = []
+        for position, (field, label, priority) in enumerate(BADGE_FIELDS):
+            value = getattr(badge, field)
+            if isinstance(value, list):
+                value = "\n".join(value)
+            if value:
+                chunks.extend(self._chunks(label, value, priority, position * 100))
+        if include_levels:
+            chunks.extend(self._level_chunks(badge.levels, current_level, len(BADGE_FIELDS) * 100))
+        selected = self._select(chunks, query, budget - self.counter.count(header))
+        return self._finish("\n\n".join([header] + self._render(selected)))
+
+    def levels_context(
+        self,
+        badge: Badge,
+        query: str = "",
+        budget: Optional[int] = None,
+        current_level: Optional[str] = None
+    ) -> str:
+        """Критерии и подтверждение уровней значка под бюджет (текущий уровень в приоритете)"""
+        budget = self.budget if budget is None else budget
+        selected = self._select(self._level_chunks(badge.levels, current_level, 0), query, budget)
+        return self._finish("\n".join(f"- {chunk.text}" for chunk in selected))
+
+    def category_context(self, category: Category, query: str = "", budget: Optional[int] = None) -> str:
+        """
+        Знания о категории: введение или, если его нет, описания значков категории
+
+        Args:
+            category: Категория
+            query: Сообщение пользователя (пусто — значки в порядке категории)
+            budget: Бюджет в токенах (None — бюджет по умолчанию)
+
+        Returns:
+            Текст для промпта
+        """
+        budget = self.budget if budget is None else budget
+        if category.introduction:
+            chunks = self._chunks("Введение", category.introduction, 1.0, 0)
+            selected = self._select(chunks, query, budget)
+            return self._finish("\n".join(chunk.text for chunk in selected))
+        badges = category.badges or []
+        header = f"В категории {category.title} всего значков: {len(badges)}. Примеры значков:"
+        chunks = [
+            Chunk(i, "", text, 1.0, self.counter.count(text))
+            for i, text in enumerate(
+                self.counter.truncate(f"{badge.emoji} {badge.title}: {badge.description}", MAX_CHUNK_TOKENS // 2)
+                for badge in badges
+            )
+        ]
+        selected = self._select(chunks, query, budget - self.counter.count(header))
+        return self._finish("\n".join([header] + [f"- {chunk.text}" for chunk in selected]))
+
+    def fit(self, text: str, budget: Optional[int] = None) -> str:
+        """Обрезает произвольный текст знаний до бюджета по границе предложения"""
+        return self._finish(self.counter.truncate(text, self.budget if budget is None else budget))
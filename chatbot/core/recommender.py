@@ -0,0 +1,209 @@
+"""
+Векторизованный подбор рекомендаций значков
+Признаки значков собраны в матрицу NumPy, оценка — произведение матрицы на вектор пользователя
+"""
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from models.badge import Badge, Category
+from models.conversation import UserContext
+from .embeddings import SemanticIndex
+
+# Веса признаков (как в прежнем построчном подсчёте)
+BASE_SCORE = 1.0
+INTEREST_WEIGHT = 2.0
+CATEGORY_WEIGHT = 1.5
+LEVEL_WEIGHT = 1.0
+
+# Сколько столбцов интересов держать в памяти
+MAX_INTEREST_COLUMNS = 4096
+
+
+class BadgeRecommender:
+    """
+    Рекомендации значков по контексту пользователя
+
+    Матрица признаков: базовый столбец, one-hot категории, флаги «до 2 уровней»
+    и «от 3 уровней». Совпадения с интересами (подстрока в названии и описании)
+    считаются один раз на интерес и кэшируются столбцами. Если задан
+    семантический индекс, интерес совпадает и с semantic_top_k ближайшими
+    по смыслу значками (с близостью не ниже semantic_min_similarity).
+    """
+
+    def __init__(
+        self,
+        categories: List[Category],
+        semantic_index: Optional[SemanticIndex] = None,
+        semantic_top_k: int = 5,
+        semantic_min_similarity: float = 0.1
+    ):
+        """
+        Построение матрицы признаков
+
+        Args:
+            categories: Категории со значками в порядке приоритета при равной оценке
+            semantic_index: Эмбеддинги значков (None — только совпадение подстроки)
+            semantic_top_k: Сколько ближайших значков считать совпавшими с интересом
+            semantic_min_similarity: Минимальная косинусная близость совпадения
+        """
+        self.entries: List[Tuple[Category, Badge]] = [
+            (category, badge) for category in categories for badge in category.badges
+        ]
+        self._texts = [f"{badge.title} {badge.description}".lower() for _, badge in self.entries]
+
+        category_ids = sorted({badge.categoryId for _, badge in self.entries})
+        self._category_column = {category_id: 1 + i for i, category_id in enumerate(category_ids)}
+        self._beginner_column = 1 + len(category_ids)
+        self._advanced_column = self._beginner_column + 1
+
+        levels_count = np.array([len(badge.levels) for _, badge in self.entries], dtype=np.int32)
+        features = np.zeros((len(self.entries), self._advanced_column + 1), dtype=np.float64)
+        features[:, 0] = 1.0
+        for row, (_, badge) in enumerate(self.entries):
+            features[row, self._category_column[badge.categoryId]] = 1.0
+        features[:, self._beginner_column] = levels_count <= 2
+        features[:, self._advanced_column] = levels_count >= 3
+        self.features = features
+
+        # Интерес (в нижнем регистре) -> столбец совпадений с текстами значков
+        self._interest_columns: Dict[str, np.ndarray] = {}
+
+        self.semantic_index = semantic_index
+        self.semantic_top_k = semantic_top_k
+        self.semantic_min_similarity = semantic_min_similarity
+        if semantic_index is not None:
+            rows = [semantic_index.index.row(badge.id) for _, badge in self.entries]
+            self._semantic_rows = np.array([-1 if row is None else row for row in rows], dtype=np.intp)
+
+    def _interest_column(self, interest: str) -> np.ndarray:
+        column = self._interest_columns.get(interest)
+        if column is None:
+            if len(self._interest_columns) >= MAX_INTEREST_COLUMNS:
+                self._interest_columns.pop(next(iter(self._interest_columns)))
+            column = np.fromiter((interest in text for text in self._texts), dtype=bool, count=len(self._texts))
+            if self.semantic_index is not None:
+                column |= self._semantic_column(interest)
+            self._interest_columns[interest] = column
+        return column
+
+    def _semantic_column(self, interest: str) -> np.ndarray:
+        similarities = self.semantic_index.similarities(interest)
+        known = self._semantic_rows >= 0
+        scores = np.where(known, similarities[self._semantic_rows], -np.inf)
+        limit = min(self.semantic_top_k, len(scores))
+        if limit <= 0:
+            return np.zeros(len(scores), dtype=bool)
+        threshold = np.partition(scores, len(scores) - limit)[len(scores) - limit]
+        return scores >= max(threshold, self.semantic_min_similarity)
+
+    def _user_vector(self, context: UserContext) -> np.ndarray:
+        weights = np.zeros(self.features.shape[1], dtype=np.float64)
+        weights[0] = BASE_SCORE
+        column = self._category_column.get(context.current_category) if context.current_category else None
+        if column is not None:
+            weights[column] = CATEGORY_WEIGHT
+        if context.level == "beginner":
+            weights[self._beginner_column] = LEVEL_WEIGHT
+        elif context.level == "advanced":
+            weights[self._advanced_column] = LEVEL_WEIGHT
+        return weights
+
+    def _interest_hits(self, context: UserContext) -> List[Tuple[str, np.ndarray]]:
+        # Повторяющийся интерес учитывается столько раз, сколько указан
+        return [(interest, self._interest_column(interest.lower())) for interest in context.interests]
+
+    def score(self, context: UserContext) -> np.ndarray:
+        """Оценки всех значков для пользователя"""
+        scores = self.features @ self._user_vector(context)
+        for _, hits in self._interest_hits(context):
+            scores += INTEREST_WEIGHT * hits
+        return scores
+
+    def score_many(self, contexts: Sequence[UserContext]) -> np.ndarray:
+        """
+        Оценки всех значков для нескольких пользователей одним умножением матриц
+
+        Returns:
+            Матрица (значки x пользователи)
+        """
+        users = np.stack([self._user_vector(context) for context in contexts], axis=1)
+        scores = self.features @ users
+        interests = sorted({interest.lower() for context in contexts for interest in context.interests})
+        if interests:
+            position = {interest: i for i, interest in enumerate(interests)}
+            hits = np.stack([self._interest_column(interest) for interest in interests], axis=1).astype(np.float64)
+            counts = np.zeros((len(interests), len(contexts)), dtype=np.float64)
+            for user, context in enumerate(contexts):
+                for interest in context.interests:
+                    counts[position[interest.lower()], user] += 1
+            scores += INTEREST_WEIGHT * (hits @ counts)
+        return scores
+
+    @staticmethod
+    def top_k(scores: np.ndarray, limit: int) -> np.ndarray:
+        """
+        Индексы limit лучших значков по убыванию оценки; при равенстве — в исходном порядке
+
+        Args:
+            scores: Оценки значков
+            limit: Количество
+
+        Returns:
+            Индексы строк матрицы
+        """
+        count = len(scores)
+        if limit <= 0 or count == 0:
+            return np.empty(0, dtype=np.intp)
+        if limit < count:
+            candidates = np.argpartition(-scores, limit - 1)[:limit]
+            threshold = scores[candidates].min()
+            # argpartition не устойчив: значки с пограничной оценкой добираем по порядку
+            above = np.flatnonzero(scores > threshold)
+            ties = np.flatnonzero(scores == threshold)[:limit - len(above)]
+            candidates = np.concatenate([above, ties])
+        else:
+            candidates = np.arange(count)
+        return candidates[np.lexsort((candidates, -scores[candidates]))]
+
+    def _reason(self, row: int, context: UserContext) -> str:
+        reasons = [
+            f"соответствует вашему интересу к {interest}"
+            for interest, hits in self._interest_hits(context) if hits[row]
+        ]
+        column = self._category_column.get(context.current_category) if context.current_category else None
+        if column is not None and self.features[row, column]:
+            reasons.append("из вашей текущей категории")
+        if context.level == "beginner" and self.features[row, self._beginner_column]:
+            reasons.append("подходит для начинающих")
+        elif context.level == "advanced" and self.features[row, self._advanced_column]:
+            reasons.append("подходит для продвинутых")
+        return ", ".join(reasons) if reasons else "может быть интересен"
+
+    def _results(self, scores: np.ndarray, context: UserContext, limit: int) -> List[Dict]:
+        results = []
+        for row in self.top_k(scores, limit):
+            category, badge = self.entries[row]
+            results.append({
+                "badge": badge,
+                "category": category,
+                "score": float(scores[row]),
+                "reason": self._reason(row, context)
+            })
+        return results
+
+    def recommend(self, context: UserContext, limit: int = 5) -> List[Dict]:
+        """
+        Рекомендации для одного пользователя
+
+        Returns:
+            Список {"badge", "category", "score", "reason"} по убыванию оценки
+        """
+        return self._results(self.score(context), context, limit)
+
+    def recommend_many(self, contexts: Sequence[UserContext], limit: int = 5) -> List[List[Dict]]:
+        """Рекомендации для нескольких пользователей (оценки считаются одной пачкой)"""
+        if not contexts:
+            return []
+        scores = self.score_many(contexts)
+        return [self._results(scores[:, user], context, limit) for user, context in enumerate(contexts)]
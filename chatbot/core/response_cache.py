@@ -0,0 +1,203 @@
+"""
+Кэш ответов модели для повторяющихся запросов
+Одинаковые объяснения значков, категорий и философии переиспользуются между пользователями
+"""
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def make_cache_key(
+    system_prompt_hash: str,
+    request_type: str,
+    subject_id: Optional[str] = None,
+    user_level: Optional[str] = None,
+    interests: Optional[Iterable[str]] = None,
+    model: str = ""
+) -> str:
+    """
+    Строит нормализованный отпечаток запроса
+
+    Args:
+        system_prompt_hash: Хэш статической части системного промпта
+        request_type: Тип запроса (badge_explanation, category_info, philosophy...)
+        subject_id: ID значка или категории
+        user_level: Уровень пользователя
+        interests: Интересы пользователя (порядок не важен)
+        model: Модель, которой сгенерирован ответ
+
+    Returns:
+        Ключ кэша
+    """
+    normalized_interests = sorted({i.strip().lower() for i in interests or [] if i and i.strip()})
+    fingerprint = json.dumps(
+        [system_prompt_hash, request_type, subject_id or "", (user_level or "").lower(), normalized_interests, model],
+        ensure_ascii=False,
+        separators=(",", ":")
+    )
+    return hashlib.sha256(fingerprint.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    LRU-кэш ответов с TTL и необязательным хранилищем на диске (SQLite)
+
+    Очередь LRU и соединение с базой защищены блокировкой: кэш заполняется
+    при прогреве из отдельного потока, пока запросы уже обслуживаются.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 512,
+        ttl_seconds: float = 6 * 3600,
+        disk_path: Optional[str] = None
+    ):
+        """
+        Инициализация кэша
+
+        Args:
+            max_entries: Максимальное количество ответов в памяти
+            ttl_seconds: Время жизни ответа
+            disk_path: Путь к файлу SQLite для хранения между перезапусками (None — только память)
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'disk_hits': 0,
+            'stores': 0,
+            'evictions': 0,
+            'expirations': 0
+        }
+
+        self._db: Optional[sqlite3.Connection] = None
+        if disk_path:
+            Path(disk_path).parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(disk_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, created_at REAL NOT NULL, response TEXT NOT NULL)"
+            )
+            self._db.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        """Возвращает ответ из кэша или None"""
+        with self._lock:
+            return self._get(key)
+
+    def _get(self, key: str) -> Optional[str]:
+        now = time.time()
+        entry = self._entries.get(key)
+        if entry is not None:
+            created_at, response = entry
+            if now - created_at <= self.ttl_seconds:
+                self._entries.move_to_end(key)
+                self._stats['hits'] += 1
+                return response
+            del self._entries[key]
+            self._stats['expirations'] += 1
+
+        if self._db is not None:
+            row = self._db.execute(
+                "SELECT created_at, response FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None:
+                created_at, response = row
+                if now - created_at <= self.ttl_seconds:
+                    self._remember(key, created_at, response)
+                    self._stats['hits'] += 1
+                    self._stats['disk_hits'] += 1
+                    return response
+                self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._db.commit()
+                self._stats['expirations'] += 1
+
+        self._stats['misses'] += 1
+        return None
+
+    def set(self, key: str, response: str):
+        """Сохраняет ответ в кэш"""
+        if not response:
+            return
+        created_at = time.time()
+        with self._lock:
+            self._remember(key, created_at, response)
+            self._stats['stores'] += 1
+
+            if self._db is not None:
+                try:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO responses (key, created_at, response) VALUES (?, ?, ?)",
+                        (key, created_at, response)
+                    )
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    logger.warning(f"Не удалось сохранить ответ в дисковый кэш: {e}")
+
+    def _remember(self, key: str, created_at: float, response: str):
+        # Вызывается под self._lock
+        self._entries[key] = (created_at, response)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats['evictions'] += 1
+
+    def prime(self, limit: Optional[int] = None) -> int:
+        """
+        Загружает в память последние ответы с диска
+
+        Args:
+            limit: Сколько ответов загрузить (None — сколько помещается в памяти)
+
+        Returns:
+            Количество загруженных ответов
+        """
+        if self._db is None:
+            return 0
+        limit = self.max_entries if limit is None else min(limit, self.max_entries)
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT key, created_at, response FROM responses WHERE created_at >= ? "
+                "ORDER BY created_at DESC LIMIT ?",
+                (time.time() - self.ttl_seconds, limit)
+            ).fetchall()
+            loaded = 0
+            # От старых к новым, чтобы самые свежие оказались последними в очереди вытеснения
+            for key, created_at, response in reversed(rows):
+                if key not in self._entries:
+                    self._remember(key, created_at, response)
+                    loaded += 1
+        return loaded
+
+    def clear(self):
+        """Очищает кэш в памяти и на диске"""
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM responses")
+                self._db.commit()
+
+    def stats(self) -> Dict:
+        """Счётчики попаданий и промахов"""
+        with self._lock:
+            stats = dict(self._stats)
+            entries = len(self._entries)
+        lookups = stats['hits'] + stats['misses']
+        return {
+            **stats,
+            'entries': entries,
+            'hit_rate': round(stats['hits'] / lookups, 4) if lookups else 0.0,
+            'disk': self._db is not None
+        }
@@ -1,20 +1,31 @@
 """
 Генератор персонализированных ответов
 """
-from typing import List
+import asyncio
+from typing import Any, AsyncIterator, Dict, List, Optional
 from datetime import datetime
 
 from models.conversation import Message, UserContext, ChatResponse
-from models.badge import Badge
-from core.openai_client import OpenAIClient
+from core.openai_client import OpenAIClient, stream_deltas
 from core.data_loader import DataLoader
 from core.context_manager import ContextManager
+from core.text_processing import IncrementalTextProcessor, clean_markdown, postprocess_response
+from core.response_cache import make_cache_key
+from core.intent_router import IntentRouter
+from core.prompt_assembly import ContextAssembler, collect_prompt_report, get_token_counter
+from core.conversation_summary import ConversationSummarizer
+from core.local_answers import LocalAnswerEngine
+from core.pregenerated import PregeneratedAnswers
 from prompts.system_prompt import (
-    get_system_prompt_with_context,
+    get_context_section,
+    get_system_prompt_fingerprint,
     get_badge_explanation_prompt,
     get_creative_ideas_prompt
 )
 
+# Длина введения категории в контекстной справке (токены)
+INTRODUCTION_TOKENS = 80
+
 
 class ResponseGenerator:
     """Генератор ответов чат-бота"""
@@ -23,7 +34,11 @@ class ResponseGenerator:
         self,
         openai_client: OpenAIClient,
         data_loader: DataLoader,
-        context_manager: ContextManager
+        context_manager: ContextManager,
+        context_assembler: Optional[ContextAssembler] = None,
+        summarizer: Optional[ConversationSummarizer] = None,
+        local_answers: Optional[LocalAnswerEngine] = None,
+        pregenerated: Optional[PregeneratedAnswers] = None
     ):
         """
         Инициализация генератора ответов
@@ -32,12 +47,21 @@ class ResponseGenerator:
             openai_client: Клиент OpenAI
             data_loader: Загрузчик данных
             context_manager: Менеджер контекста
+            context_assembler: Сборка знаний для промпта (по умолчанию бюджет DEFAULT_KNOWLEDGE_BUDGET)
+            summarizer: Окно истории и краткое содержание диалога (по умолчанию бюджеты по умолчанию)
+            local_answers: Шаблонные ответы без модели (по умолчанию для DEFAULT_LOCAL_INTENTS)
+            pregenerated: Готовые ответы о значках (по умолчанию нет)
         """
         self.openai_client = openai_client
         self.data_loader = data_loader
         self.context_manager = context_manager
+        self.intent_router = IntentRouter()
+        self.context_assembler = context_assembler or ContextAssembler(get_token_counter(openai_client.model))
+        self.summarizer = summarizer or ConversationSummarizer(openai_client, self.context_assembler.counter)
+        self.local_answers = local_answers or LocalAnswerEngine(data_loader, self.context_assembler.counter)
+        self.pregenerated = pregenerated or PregeneratedAnswers()
     
-    def generate_response(
+    async def generate_response(
         self,
         user_message: str,
         user_id: str,
@@ -58,7 +82,7 @@ class ResponseGenerator:
         user_context = self.context_manager.get_user_context(user_id)
         
         # Дополняем контекст на основе сообщения (не перезаписываем веб-контекст)
-        self.context_manager.detect_context_from_message(user_id, user_message)
+        await self.context_manager.detect_context_from_message(user_id, user_message)
         
         # Получаем обновленный контекст после анализа сообщения
         user_context = self.context_manager.get_user_context(user_id)
@@ -66,25 +90,27 @@ class ResponseGenerator:
         # Определяем тип запроса
         request_type = self._analyze_request_type(user_message, user_context)
         
-        # Генерируем ответ в зависимости от типа запроса
-        if request_type == "badge_explanation":
-            response = self._generate_badge_explanation(user_message, user_context)
-        elif request_type == "badge_level_explanation":
-            response = self._generate_badge_level_explanation(user_message, user_context)
-        elif request_type == "badge_levels_explanation":
-            response = self._generate_badge_levels_explanation(user_message, user_context)
-        elif request_type == "creative_ideas":
-            response = self._generate_creative_ideas(user_message, user_context)
-        elif request_type == "recommendations":
-            response = self._generate_recommendations(user_message, user_context)
-        elif request_type == "category_info":
-            response = self._generate_category_info(user_message, user_context)
-        elif request_type == "philosophy":
-            response = self._generate_philosophy_explanation(user_message, user_context)
-        elif request_type == "where_am_i":
-            response = self._generate_where_am_i(user_context)
-        else:
-            response = self._generate_general_response(user_message, user_context, conversation_history)
+        # Генерируем ответ в зависимости от типа запроса, собирая стоимость секций промпта
+        with collect_prompt_report() as prompt_report:
+            if request_type == "badge_explanation":
+                response = await self._generate_badge_explanation(user_message, user_context)
+            elif request_type == "badge_level_explanation":
+                response = await self._generate_badge_level_explanation(user_message, user_context)
+            elif request_type == "badge_levels_explanation":
+                response = await self._generate_badge_levels_explanation(user_message, user_context)
+            elif request_type == "creative_ideas":
+                response = await self._generate_creative_ideas(user_message, user_context)
+            elif request_type == "recommendations":
+                response = await self._generate_recommendations(user_message, user_context)
+            elif request_type in ("category_info", "category_list"):
+                response = await self._generate_category_info(user_message, user_context, request_type)
+            elif request_type == "philosophy":
+                response = await self._generate_philosophy_explanation(user_message, user_context)
+            elif request_type == "where_am_i":
+                response = await self._generate_where_am_i(user_context)
+            else:
+                response = await self._generate_general_response(user_message, user_context, conversation_history)
+        self.context_assembler.stats.add(prompt_report)
         
         # Очищаем ответ от markdown форматирования
         response = self._clean_markdown(response)
@@ -100,147 +126,105 @@ class ResponseGenerator:
             context_updates=user_context,
             metadata={
                 "request_type": request_type,
-                "timestamp": datetime.now().isoformat()
+                "timestamp": datetime.now().isoformat(),
+                "prompt_tokens": prompt_report.as_dict() if prompt_report.sent else None
             }
         )
     
+    async def stream_response(
+        self,
+        user_message: str,
+        user_id: str,
+        conversation_history: List[Message]
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Генерирует ответ потоком событий для /chat/stream
+        
+        Дельты модели проходят через IncrementalTextProcessor, поэтому склейка
+        всех "delta" совпадает с ответом generate_response. Если итоговый ответ
+        получен не из потока (ошибка, ответ без LLM), он приходит одним куском
+        или событием "replace".
+        
+        Args:
+            user_message: Сообщение пользователя
+            user_id: ID пользователя
+            conversation_history: История диалога
+            
+        Yields:
+            {"type": "delta" | "replace", "content": str} и в конце {"type": "done", "response": ChatResponse}
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+        with stream_deltas(queue.put_nowait):
+            task = asyncio.create_task(
+                self.generate_response(user_message, user_id, conversation_history)
+            )
+        task.add_done_callback(lambda _: queue.put_nowait(None))
+        
+        processor = IncrementalTextProcessor()
+        streamed: List[str] = []
+        try:
+            while (delta := await queue.get()) is not None:
+                text = processor.feed(delta)
+                if text:
+                    streamed.append(text)
+                    yield {"type": "delta", "content": text}
+            response = await task
+        finally:
+            # Клиент отключился — незачем дожидаться генерации
+            if not task.done():
+                task.cancel()
+        
+        text = processor.finish()
+        if text:
+            streamed.append(text)
+            yield {"type": "delta", "content": text}
+        
+        streamed_text = "".join(streamed)
+        if streamed_text != response.response:
+            event_type = "replace" if streamed_text else "delta"
+            yield {"type": event_type, "content": response.response}
+        
+        yield {"type": "done", "response": response}
+    
     def _analyze_request_type(self, message: str, context: UserContext) -> str:
         """Анализирует тип запроса пользователя с учетом контекста экрана"""
-        message_lower = message.lower()
         current_view = context.session_data.get('current_view', '')
-        current_level = context.session_data.get('current_level', '')
-
-        # Запросы вида "где я нахожусь?", "что за экран?"
-        where_triggers = [
-            "где я", "где нахожусь", "где это я", "какой это экран",
-            "что за экран", "что за страница", "на каком экране",
-            "на какой странице", "где сейчас нахожусь", "что это за страница"
-        ]
-        if any(tr in message_lower for tr in where_triggers):
-            return "where_am_i"
-
-        
-        # Анализ в зависимости от текущего экрана
-        if current_view == 'badge-level' and current_level:
-            # На экране уровня значка - фокус на конкретном уровне
-            if any(word in message_lower for word in [
-                "что это за значок", "что за значок", "объясни", "расскажи", "что такое",
-                "как получить", "критерии", "подтверждение", "что нужно", "что это"
-            ]):
-                return "badge_level_explanation"
-            elif any(word in message_lower for word in ["идеи", "примеры", "варианты"]):
-                return "creative_ideas"
-        
-        elif current_view == 'badge':
-            # На экране значка - фокус на значке
-            if any(word in message_lower for word in [
-                "что это за значок", "что за значок", "объясни", "расскажи", "что такое",
-                "как получить", "что это"
-            ]):
-                return "badge_explanation"
-            elif any(word in message_lower for word in ["идеи", "примеры", "варианты"]):
-                return "creative_ideas"
-            elif any(word in message_lower for word in ["уровни", "ступени", "базовый", "продвинутый", "экспертный"]):
-                return "badge_levels_explanation"
-        
-        elif current_view == 'category':
-            # На экране категории - фокус на категории
-            if any(word in message_lower for word in ["объясни", "расскажи", "что такое"]):
-                return "category_info"
-            elif any(word in message_lower for word in ["рекомендуй", "посоветуй", "что выбрать"]):
-                return "recommendations"
-            elif any(word in message_lower for word in ["философия", "зачем", "почему", "смысл"]):
-                return "philosophy"
-        
-        elif current_view == 'intro':
-            # На главной странице - философия значков
-            if any(word in message_lower for word in ["где я", "что это", "философия", "принципы", "зачем", "почему", "смысл", "награды", "награда", "нарады", "медали", "медаль", "ачивки", "ачивка"]):
-                return "philosophy"
-            elif any(word in message_lower for word in ["категории", "значки", "сколько", "список"]):
-                return "category_info"
-        
-        elif current_view == 'introduction':
-            # На экране введения - общая информация
-            if any(word in message_lower for word in ["подробнее", "больше", "расскажи"]):
-                return "category_info"
-        
-        # Общие ключевые слова для всех экранов
-        if any(word in message_lower for word in [
-            "что это за значок", "что за значок", "объясни", "расскажи", "что такое", "как получить", "что это"
-        ]):
-            if context.current_badge:
-                return "badge_explanation"
-            elif context.current_category:
-                return "category_info"
-        
-        if any(word in message_lower for word in ["идеи", "как сделать", "примеры", "варианты"]):
-            return "creative_ideas"
-        
-        if any(word in message_lower for word in ["рекомендуй", "посоветуй", "что выбрать", "подходящий"]):
-            return "recommendations"
-        
-        if any(word in message_lower for word in ["философия", "зачем", "почему", "смысл"]):
-            return "philosophy"
-        
-        # Специальная обработка для вопросов про ИИ
-        if any(word in message_lower for word in ["ии", "искусственный интеллект", "нейросети", "нейро", "ai"]):
-            return "general"
-        
-        return "general"
+        context_flags = (
+            bool(context.session_data.get('current_level', '')),
+            bool(context.current_badge),
+            bool(context.current_category)
+        )
+        return self.intent_router.route(message, current_view, context_flags)
 
-    def _generate_where_am_i(self, context: UserContext) -> str:
+    async def _generate_where_am_i(self, context: UserContext) -> str:
         """Отвечает, где пользователь находится, по данным веб-контекста."""
-        view_names = {
-            'intro': 'Главная страница',
-            'categories': 'Список категорий',
-            'category': 'Категория значков',
-            'badge': 'Страница значка',
-            'badge-level': 'Уровень значка',
-            'introduction': 'Введение в путеводитель',
-            'additional-material': 'Дополнительные материалы',
-            'about-camp': 'Информация о лагере',
-            'registration-form': 'Форма регистрации'
-        }
-        current_view = context.session_data.get('current_view') or 'chat'
-        view_human = view_names.get(current_view, current_view)
-
-        parts = [f"Сейчас ты на экране: {view_human}."]
-
-        if context.current_category:
-            cat = self.data_loader.get_category(context.current_category)
-            if cat:
-                parts.append(f"Категория: {cat.emoji} {cat.title}.")
-
-        if context.current_badge:
-            badge = self.data_loader.get_badge(context.current_badge)
-            if badge:
-                parts.append(f"Значок: {badge.emoji} {badge.title}.")
-
-        cur_level = context.session_data.get('current_level')
-        cur_level_title = context.session_data.get('current_level_badge_title')
-        if cur_level:
-            lvl_line = f"Уровень: {cur_level}"
-            if cur_level_title:
-                lvl_line += f" — {cur_level_title}"
-            parts.append(lvl_line + ".")
-
-        # Дружелюбная подсказка по действиям
-        tips = []
-        if current_view in ('intro', 'about-camp'):
-            tips.append("Могу кратко рассказать о системе значков или показать категории.")
-        if context.current_category and current_view in ('category', 'categories'):
-            tips.append("Могу объяснить философию категории или предложить подходящие значки.")
-        if context.current_badge and current_view in ('badge', 'badge-level'):
-            tips.append("Могу объяснить значок, уровни или предложить идеи, как его получить.")
-        if current_view == 'registration-form':
-            tips.append("Могу помочь заполнить важные поля анкеты.")
+        return self.local_answers.where_am_i(context)
+    
+    def _cache_key(self, request_type: str, subject_id: str, context: UserContext) -> str:
+        """
+        Ключ кэша для ответа, который зависит только от данных и профиля пользователя
 
-        if tips:
-            parts.append("Подсказка: " + " ".join(tips))
+        Args:
+            request_type: Тип запроса
+            subject_id: ID значка или категории
+            context: Контекст пользователя
 
-        return "\n".join(parts)
+        Returns:
+            Ключ кэша ответов
+        """
+        # Экран и уровень попадают в системный промпт, поэтому входят в ключ
+        view = context.session_data.get('current_view') or ''
+        level = context.session_data.get('current_level') or ''
+        return make_cache_key(
+            get_system_prompt_fingerprint(),
+            request_type,
+            f"{subject_id}|{view}|{level}",
+            context.level,
+            context.interests,
+            self.openai_client.model
+        )
     
-    def _generate_badge_explanation(self, message: str, context: UserContext) -> str:
+    async def _generate_badge_explanation(self, message: str, context: UserContext) -> str:
         """Генерирует объяснение значка"""
         if not context.current_badge:
             return "Сначала выбери конкретный значок на экране — и я кратко объясню его смысл и как его получить 😊"
@@ -254,20 +238,21 @@ class ResponseGenerator:
             web_badge = context.session_data.get('web_badge') or {}
             title = (web_badge.get('title') or '').strip()
             if title:
-                for b in self.data_loader.get_all_badges():
-                    if b.title.strip().lower() == title.lower():
-                        badge = b
-                        break
+                badge = self.data_loader.get_badge_by_title(title)
         if not badge:
             return "Не нашла такой значок. Попробуй выбрать его из списка значков на экране."
         
-        # Формируем информацию о значке
-        badge_info = self._format_badge_info(badge)
+        pregenerated = self.pregenerated.get("explanation", badge, context)
+        if pregenerated:
+            return pregenerated
+        
+        # Формируем информацию о значке (ответ кэшируется по значку, поэтому без учёта сообщения)
+        badge_info = self.context_assembler.badge_context(badge)
         
         # Генерируем объяснение
-        prompt = get_badge_explanation_prompt(badge_info)
+        prompt = get_badge_explanation_prompt(f"{badge.emoji} {badge.title}")
         
-        sys_prompt = get_system_prompt_with_context(
+        context_section = get_context_section(
             current_badge=badge.title,
             user_level=context.level,
             user_interests=context.interests,
@@ -275,15 +260,16 @@ class ResponseGenerator:
             current_level=context.session_data.get('current_level'),
             current_level_badge_title=context.session_data.get('current_level_badge_title')
         )
-        return self.openai_client.generate_response(
+        return await self.openai_client.generate_response(
             messages=[Message(role="user", content=prompt, metadata={})],
-            system_prompt=sys_prompt,
-            user_context=context,
+            context_section=context_section,
             max_tokens=800,
-            temperature=0.65
+            temperature=0.65,
+            cache_key=self._cache_key("badge_explanation", badge.id, context),
+            knowledge=badge_info
         )
     
-    def _generate_creative_ideas(self, message: str, context: UserContext) -> str:
+    async def _generate_creative_ideas(self, message: str, context: UserContext) -> str:
         """Генерирует креативные идеи"""
         if not context.current_badge:
             return "Чтобы предложить идеи, выбери конкретный значок — и я подкину 3–5 подходящих вариантов! 💡"
@@ -296,21 +282,26 @@ class ResponseGenerator:
             web_badge = context.session_data.get('web_badge') or {}
             title = (web_badge.get('title') or '').strip()
             if title:
-                for b in self.data_loader.get_all_badges():
-                    if b.title.strip().lower() == title.lower():
-                        badge = b
-                        break
+                badge = self.data_loader.get_badge_by_title(title)
         if not badge:
             return "Не нашла такой значок. Выбери его из списка, и я подскажу идеи."
         
-        # Формируем информацию о значке
-        badge_info = self._format_badge_info(badge)
+        pregenerated = self.pregenerated.get("ideas", badge, context)
+        if pregenerated:
+            return pregenerated
+        
+        # Формируем информацию о значке: фрагменты, ближе всего к сообщению
+        badge_info = self.context_assembler.badge_context(
+            badge,
+            query=message,
+            current_level=context.session_data.get('current_level')
+        )
         user_context_str = f"Интересы: {', '.join(context.interests)}, Уровень: {context.level}"
         
         # Генерируем идеи
-        prompt = get_creative_ideas_prompt(badge_info, user_context_str)
+        prompt = get_creative_ideas_prompt(f"{badge.emoji} {badge.title}", user_context_str)
         
-        sys_prompt = get_system_prompt_with_context(
+        context_section = get_context_section(
             current_badge=badge.title,
             user_level=context.level,
             user_interests=context.interests,
@@ -318,15 +309,15 @@ class ResponseGenerator:
             current_level=context.session_data.get('current_level'),
             current_level_badge_title=context.session_data.get('current_level_badge_title')
         )
-        return self.openai_client.generate_response(
+        return await self.openai_client.generate_response(
             messages=[Message(role="user", content=prompt, metadata={})],
-            system_prompt=sys_prompt,
-            user_context=context,
+            context_section=context_section,
             max_tokens=700,
-            temperature=0.75
+            temperature=0.75,
+            knowledge=badge_info
         )
     
-    def _generate_badge_level_explanation(self, message: str, context: UserContext) -> str:
+    async def _generate_badge_level_explanation(self, message: str, context: UserContext) -> str:
         """Генерирует объяснение конкретного уровня значка"""
         if not context.current_badge:
             return "Сначала выбери значок — тогда расскажу про уровни и критерии."
@@ -339,10 +330,12 @@ class ResponseGenerator:
             web_badge = context.session_data.get('web_badge') or {}
             title = (web_badge.get('title') or '').strip()
             if title:
-                for b in self.data_loader.get_all_badges():
-                    if b.title.strip().lower() == title.lower():
-                        badge = b
-                        break
+                badge = self.data_loader.get_badge_by_title(title)
+                if not badge:
+                    # На экране уровня в веб-контексте может быть название уровня
+                    level = self.data_loader.get_level_by_title(title)
+                    if level:
+                        badge = self.data_loader.get_badge('.'.join(level.id.split('.')[:2]))
         if not badge:
             return "Похоже, такого значка нет. Выбери его из списка на экране."
         
@@ -356,14 +349,26 @@ class ResponseGenerator:
             if level.level == current_level:
                 level_info = level
                 break
+        if not level_info:
+            # Фоллбек по названию уровня из веб-контекста
+            level_badge_title = context.session_data.get('current_level_badge_title') or ''
+            level = self.data_loader.get_level_by_title(level_badge_title) if level_badge_title else None
+            if level and level.id.startswith(f"{badge.id}."):
+                level_info = level
         
         if not level_info:
             return f"Не удалось найти уровень ‘{current_level}’ у значка ‘{badge.title}’. Выбери доступный уровень на экране."
         
-        # Используем AI для генерации объяснения уровня
         level_badge_title = context.session_data.get('current_level_badge_title') or level_info.title
-        prompt = f"Объясни значок '{level_badge_title}' ({current_level} уровень). Критерии: {level_info.criteria}. Способы подтверждения: {level_info.confirmation}"
-        sys_prompt = get_system_prompt_with_context(
+        if self.local_answers.handles("badge_level_explanation"):
+            return self.local_answers.badge_level(badge, level_info, level_badge_title)
+        
+        # Используем AI для генерации объяснения уровня
+        level_text = self.context_assembler.fit(
+            f"Критерии: {level_info.criteria}\nСпособы подтверждения: {level_info.confirmation}"
+        )
+        prompt = f"Объясни значок '{level_badge_title}' ({current_level} уровень): критерии и способы подтверждения — в справке."
+        context_section = get_context_section(
             current_badge=level_badge_title,
             user_level=context.level,
             user_interests=context.interests,
@@ -371,15 +376,15 @@ class ResponseGenerator:
             current_level=context.session_data.get('current_level'),
             current_level_badge_title=context.session_data.get('current_level_badge_title') or ''
         )
-        return self.openai_client.generate_response(
+        return await self.openai_client.generate_response(
             messages=[Message(role="user", content=prompt, metadata={})],
-            system_prompt=sys_prompt,
-            user_context=context,
+            context_section=context_section,
             max_tokens=800,
-            temperature=0.65
+            temperature=0.65,
+            knowledge=level_text
         )
     
-    def _generate_badge_levels_explanation(self, message: str, context: UserContext) -> str:
+    async def _generate_badge_levels_explanation(self, message: str, context: UserContext) -> str:
         """Генерирует объяснение всех уровней значка"""
         if not context.current_badge:
             return "Чтобы показать уровни — выбери значок."
@@ -392,34 +397,29 @@ class ResponseGenerator:
             web_badge = context.session_data.get('web_badge') or {}
             title = (web_badge.get('title') or '').strip()
             if title:
-                for b in self.data_loader.get_all_badges():
-                    if b.title.strip().lower() == title.lower():
-                        badge = b
-                        break
+                badge = self.data_loader.get_badge_by_title(title)
         if not badge:
             return "Не нашла такой значок. Выбери его в списке — и покажу уровни."
         
         if not badge.levels:
             return f"У значка {badge.title} уровней нет — он безуровневый."
         
-        # Используем AI для генерации объяснения всех уровней
-        levels_data = []
-        for level in badge.levels:
-            levels_data.append({
-                "level": level.level,
-                "title": level.title,
-                "emoji": level.emoji,
-                "criteria": level.criteria,
-                "confirmation": level.confirmation
-            })
-        
-        # Формируем промпт с информацией о всех уровнях
-        levels_text = ""
-        for level in levels_data:
-            levels_text += f"\n{level['level']} уровень: {level['emoji']} {level['title']}\nКритерии: {level['criteria']}\nПодтверждение: {level['confirmation']}\n"
-        
-        prompt = f"Объясни все уровни значка '{badge.emoji} {badge.title}':{levels_text}"
-        sys_prompt = get_system_prompt_with_context(
+        if self.local_answers.handles("badge_levels_explanation"):
+            return self.local_answers.badge_levels(badge)
+        
+        pregenerated = self.pregenerated.get("levels", badge, context)
+        if pregenerated:
+            return pregenerated
+        
+        # Формируем промпт с уровнями: при нехватке бюджета в приоритете текущий уровень и совпадения с сообщением
+        levels_text = self.context_assembler.levels_context(
+            badge,
+            query=message,
+            current_level=context.session_data.get('current_level')
+        )
+        
+        prompt = f"Объясни все уровни значка '{badge.emoji} {badge.title}' (уровни — в справке)."
+        context_section = get_context_section(
             current_badge=badge.title,
             user_level=context.level,
             user_interests=context.interests,
@@ -427,23 +427,23 @@ class ResponseGenerator:
             current_level=context.session_data.get('current_level'),
             current_level_badge_title=context.session_data.get('current_level_badge_title') or ''
         )
-        return self.openai_client.generate_response(
+        return await self.openai_client.generate_response(
             messages=[Message(role="user", content=prompt, metadata={})],
-            system_prompt=sys_prompt,
-            user_context=context,
+            context_section=context_section,
             max_tokens=900,
-            temperature=0.65
+            temperature=0.65,
+            knowledge=levels_text
         )
     
-    def _generate_recommendations(self, message: str, context: UserContext) -> str:
+    async def _generate_recommendations(self, message: str, context: UserContext) -> str:
         """Генерирует рекомендации значков"""
         # Получаем персонализированные рекомендации
         recommendations = self.context_manager.get_personalized_recommendations(context.user_id, limit=5)
         
         if not recommendations:
-            return self.openai_client.generate_response(
+            return await self.openai_client.generate_response(
                 messages=[Message(role="user", content="Пользователь просит рекомендации, но у нас нет данных для персонализации", metadata={})],
-                system_prompt=get_system_prompt_with_context(
+                context_section=get_context_section(
                     user_level=context.level,
                     user_interests=context.interests,
                     current_view=context.session_data.get('current_view', ''),
@@ -452,57 +452,61 @@ class ResponseGenerator:
                 )
             )
         
-        # Используем AI для генерации персонализированных рекомендаций
-        recommendations_data = []
-        for rec in recommendations[:5]:
-            badge = rec["badge"]
-            recommendations_data.append({
-                "title": badge.title,
-                "emoji": badge.emoji,
-                "description": badge.description,
-                "reason": rec["reason"]
-            })
-        
-        # Формируем промпт с рекомендациями
+        # Формируем промпт с рекомендациями: бюджет знаний делится поровну между значками
+        recommendations = recommendations[:5]
+        description_budget = self.context_assembler.budget // len(recommendations)
         recommendations_text = ""
-        for rec in recommendations_data:
-            recommendations_text += f"\n{rec['emoji']} {rec['title']}: {rec['description']}\nПричина рекомендации: {rec['reason']}\n"
+        for rec in recommendations:
+            badge = rec["badge"]
+            description = self.context_assembler.fit(badge.description, description_budget)
+            recommendations_text += f"\n{badge.emoji} {badge.title}: {description}\nПричина рекомендации: {rec['reason']}\n"
         
-        prompt = f"Дай персонализированные рекомендации значков на основе интересов пользователя:{recommendations_text}"
-        return self.openai_client.generate_response(
+        prompt = "Дай персонализированные рекомендации значков из справки на основе интересов пользователя."
+        return await self.openai_client.generate_response(
             messages=[Message(role="user", content=prompt, metadata={})],
-            system_prompt=get_system_prompt_with_context(
+            context_section=get_context_section(
                 user_level=context.level,
                 user_interests=context.interests,
                 current_view=context.session_data.get('current_view') or '',
                 current_level=context.session_data.get('current_level'),
                 current_level_badge_title=context.session_data.get('current_level_badge_title') or ''
-            )
+            ),
+            knowledge=recommendations_text.strip()
         )
     
-    def _generate_category_info(self, message: str, context: UserContext) -> str:
-        """Генерирует краткую информацию о категории"""
+    async def _generate_category_info(
+        self,
+        message: str,
+        context: UserContext,
+        request_type: str = "category_info"
+    ) -> str:
+        """
+        Генерирует краткую информацию о категории
+
+        На вопросы о составе (category_list) хватает данных, на просьбы объяснить
+        категорию (category_info) нужен рассказ модели — по шаблону каждый тип
+        отвечается, только если входит в LOCAL_ANSWER_INTENTS.
+        """
+        local = self.local_answers.handles(request_type)
         if not context.current_category:
+            # Без выбранной категории («сколько значков?», «список категорий») — обзор Путеводителя
+            if local:
+                return self.local_answers.catalog_overview()
             return "Выбери категорию на экране — и я кратко объясню её философию и содержание."
         
         category = self.data_loader.get_category(context.current_category)
         if not category:
             return "Похоже, такая категория отсутствует. Выбери её из списка."
         
+        if local:
+            return self.local_answers.category_info(category)
+        
         # Используем AI для генерации ответа о категории
-        # Если нет введения, формируем контекст из данных значков категории
-        if category.introduction:
-            cat_context = category.introduction
-        else:
-            badges = category.badges or []
-            sample = badges[:5]
-            items = "\n".join([f"- {b.emoji} {b.title}: {b.description[:140]}" for b in sample])
-            cat_context = (
-                f"В категории {category.title} всего значков: {len(badges)}. "
-                f"Примеры значков:\n{items}\n"
-            )
-        prompt = f"Объясни категорию '{category.emoji} {category.title}': {cat_context}"
-        sys_prompt = get_system_prompt_with_context(
+        # Введение или (если его нет) описания значков категории в пределах бюджета;
+        # ответ кэшируется по категории, поэтому без учёта сообщения
+        cat_context = self.context_assembler.category_context(category)
+        prompt = f"Объясни категорию '{category.emoji} {category.title}', опираясь на справку о ней."
+        context_section = get_context_section(
             current_category=category.id,
             user_level=context.level,
             user_interests=context.interests,
@@ -510,33 +514,36 @@ class ResponseGenerator:
             current_level=context.session_data.get('current_level'),
             current_level_badge_title=context.session_data.get('current_level_badge_title') or ''
         )
-        return self.openai_client.generate_response(
+        return await self.openai_client.generate_response(
             messages=[Message(role="user", content=prompt, metadata={})],
-            system_prompt=sys_prompt,
-            user_context=context,
+            context_section=context_section,
             max_tokens=700,
-            temperature=0.65
+            temperature=0.65,
+            cache_key=self._cache_key("category_info", category.id, context),
+            knowledge=cat_context
         )
     
-    def _generate_philosophy_explanation(self, message: str, context: UserContext) -> str:
+    async def _generate_philosophy_explanation(self, message: str, context: UserContext) -> str:
         """Генерирует объяснение философии"""
         current_view = context.session_data.get('current_view', '')
         
         if current_view == 'intro':
             # На главной странице - используем AI для ответа на философские вопросы
-            return self.openai_client.explain_philosophy(
+            return await self.openai_client.explain_philosophy(
                 "intro",
                 "философия системы значков Реального Лагеря",
-                context
+                context,
+                cache_key=self._cache_key("philosophy", "intro", context)
             )
         
         elif context.current_category:
             category = self.data_loader.get_category(context.current_category)
             if category:
-                return self.openai_client.explain_philosophy(
+                return await self.openai_client.explain_philosophy(
                     category.id,
-                    category.introduction or category.title,
-                    context
+                    self.context_assembler.fit(category.introduction) if category.introduction else category.title,
+                    context,
+                    cache_key=self._cache_key("philosophy", category.id, context)
                 )
         
         # Общая философия системы значков
@@ -558,15 +565,15 @@ class ResponseGenerator:
 О какой категории или значке хочешь узнать больше? 😊
 """
     
-    def _generate_general_response(
+    async def _generate_general_response(
         self,
         message: str,
         context: UserContext,
         conversation_history: List[Message]
     ) -> str:
         """Генерирует краткий общий ответ"""
-        # Формируем системный промпт с контекстом
-        system_prompt = get_system_prompt_with_context(
+        # Формируем секцию контекста (статическая часть системного промпта добавляется клиентом)
+        context_section = get_context_section(
             current_category=context.current_category or "",
             current_badge=context.current_badge or "",
             user_level=context.level,
@@ -580,41 +587,19 @@ class ResponseGenerator:
         # Не добавляем подробное описание значков/категорий в общий ответ,
         # чтобы бот не уводил разговор, если пользователь не спрашивал
         
-        return self.openai_client.generate_response(
-            messages=conversation_history,
-            system_prompt=system_prompt,
-            user_context=context
+        # Ранние сообщения идут кратким содержанием, дословно — только окно в пределах бюджета
+        summary_section = self.summarizer.summary_section(self.context_manager.get_conversation(context.user_id))
+        if summary_section:
+            context_section = f"{context_section}\n\n{summary_section}" if context_section else summary_section
+        
+        return await self.openai_client.generate_response(
+            messages=self.summarizer.window(conversation_history),
+            context_section=context_section
         )
     
-    def _format_badge_info(self, badge: Badge) -> str:
-        """Форматирует информацию о значке"""
-        info_parts = [
-            f"**{badge.emoji} {badge.title}**",
-            f"Описание: {badge.description}"
-        ]
-        
-        if badge.nameExplanation:
-            info_parts.append(f"Объяснение названия: {badge.nameExplanation}")
-        
-        if badge.skillTips:
-            info_parts.append(f"Советы: {badge.skillTips}")
-        
-        if badge.examples:
-            info_parts.append(f"Примеры: {badge.examples}")
-        
-        if badge.philosophy:
-            info_parts.append(f"Философия: {badge.philosophy}")
-        
-        if badge.howToBecome:
-            info_parts.append(f"Как получить: {badge.howToBecome}")
-        
-        # Добавляем информацию об уровнях
-        if badge.levels:
-            info_parts.append("\n**Уровни:**")
-            for level in badge.levels:
-                info_parts.append(f"- {level.emoji} {level.title}: {level.criteria[:100]}...")
-        
-        return "\n\n".join(info_parts)
+    async def update_conversation_summary(self, user_id: str) -> bool:
+        """Дописывает в краткое содержание сообщения, вышедшие из окна истории (вызывается в фоне)"""
+        return await self.summarizer.update(self.context_manager, user_id)
     
     def _get_contextual_info(self, context: UserContext) -> str:
         """Получает контекстную информацию"""
@@ -651,7 +636,8 @@ class ResponseGenerator:
             if category:
                 info_parts.append(f"Текущая категория: {category.emoji} {category.title}")
                 if category.introduction:
-                    info_parts.append(f"О категории: {category.introduction[:200]}...")
+                    introduction = self.context_assembler.counter.truncate(category.introduction, INTRODUCTION_TOKENS)
+                    info_parts.append(f"О категории: {introduction}")
         
         return "\n".join(info_parts)
     
@@ -688,50 +674,8 @@ class ResponseGenerator:
     
     def _clean_markdown(self, text: str) -> str:
         """Очищает текст от markdown форматирования"""
-        import re
-        
-        # Удаляем **жирный текст**
-        text = re.sub(r'\*\*(.*?)\*\*', r'\1', text)
-        
-        # Удаляем *курсив*
-        text = re.sub(r'\*(.*?)\*', r'\1', text)
-        
-        # Удаляем ### заголовки
-        text = re.sub(r'^###\s*', '', text, flags=re.MULTILINE)
-        
-        # Удаляем ## заголовки
-        text = re.sub(r'^##\s*', '', text, flags=re.MULTILINE)
-        
-        # Удаляем # заголовки
-        text = re.sub(r'^#\s*', '', text, flags=re.MULTILINE)
-        
-        # Удаляем `код`
-        text = re.sub(r'`(.*?)`', r'\1', text)
-        
-        # Удаляем лишние переносы строк
-        text = re.sub(r'\n\s*\n\s*\n', '\n\n', text)
-        
-        return text.strip()
+        return clean_markdown(text)
 
     def _postprocess_response(self, text: str) -> str:
         """Постобработка ответа: мягкая нормализация эмодзи и переносов, без жёсткого урезания."""
-        if not text:
-            return text
-        import re
-
-        # Убираем повторяющиеся одинаковые эмодзи подряд (2+ -> 1)
-        text = re.sub(r'([✨💡🎉🚀😄👍💫💪🔥🧠😌🤩😎🤗🤔🥰🥹😅💋🐱])\1+', r'\1', text)
-
-        # Мягкая отсечка очень длинных простыней (оставляем простор для развёрнутых ответов)
-        max_len = 2500
-        if len(text) > max_len:
-            snippet = text[:max_len]
-            pivot = max(snippet.rfind('.'), snippet.rfind('!'), snippet.rfind('?'), snippet.rfind('\n'))
-            if pivot > 200:
-                text = snippet[:pivot+1]
-            else:
-                text = snippet + '…'
-
-        # Нормализуем лишние пустые строки
-        text = re.sub(r'\n{3,}', '\n\n', text)
-        return text.strip()
+        return postprocess_response(text)
@@ -0,0 +1,353 @@
+"""
+Полнотекстовый поиск по значкам
+Инвертированный индекс по всем полям значков и уровней, ранжирование BM25F,
+поиск по префиксу и с опечатками; индекс строится один раз при загрузке данных
+"""
+import hashlib
+import heapq
+import html
+import math
+import re
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Dict, FrozenSet, Iterator, List, NamedTuple, Optional, Tuple
+
+from models.badge import Badge, Category
+
+# Слово: буквы и цифры; номера вида 1.2.3 — одним словом
+_WORD_RE = re.compile(r"\d+(?:\.\d+)*|[0-9a-zа-я]+")
+
+# Окончания для облегчённого стемминга (длинные проверяются первыми)
+_ENDINGS = tuple(sorted((
+    # прилагательные и причастия
+    "ими", "ыми", "его", "ого", "ему", "ому", "ее", "ие", "ые", "ое", "ей", "ий", "ый", "ой",
+    "ем", "им", "ым", "ом", "их", "ых", "ую", "юю", "ая", "яя", "ою", "ею",
+    "ющий", "ющая", "ющее", "ющие", "вший", "вшая", "вшие", "енный", "енная", "енное", "енные",
+    # глаголы
+    "ать", "ять", "ить", "еть", "уть", "ешь", "ете", "ишь", "ите", "ет", "ит", "ут", "ют",
+    "ат", "ят", "ала", "яла", "ила", "ела", "али", "яли", "или", "ели", "ал", "ял", "ил", "ел",
+    "ть", "ла", "ли", "ло",
+    # существительные
+    "ами", "ями", "ах", "ях", "ам", "ям", "ов", "ев", "ью", "ья", "ье", "ия", "ию", "ии",
+    "ость", "ости", "ение", "ения", "ению", "ением", "ении", "ание", "ания", "анию", "анием", "ании",
+    "а", "я", "о", "е", "и", "ы", "у", "ю", "ь", "й",
+), key=len, reverse=True))
+_REFLEXIVE = ("ся", "сь")
+_MIN_STEM = 3
+
+# Служебные слова, которые не индексируются и не ищутся
+STOP_WORDS = frozenset((
+    "а", "в", "во", "и", "к", "ко", "о", "об", "с", "со", "у", "я", "на", "по", "за", "из", "от", "до",
+    "не", "ни", "но", "да", "же", "ли", "бы", "то", "как", "что", "это", "для", "про", "при", "или",
+    "его", "ее", "её", "их", "он", "она", "они", "оно", "мы", "вы", "ты", "мне", "меня", "так", "уже",
+    "все", "всё", "был", "была", "были", "быть", "есть", "где", "там", "тут", "чтобы", "если",
+))
+
+# Поля документа и их веса
+FIELD_BOOSTS: Dict[str, float] = {
+    'title': 3.0,
+    'levels': 2.0,
+    'category': 1.5,
+    'description': 1.2,
+    'nameExplanation': 1.0,
+    'skillTips': 0.8,
+    'examples': 0.7,
+    'philosophy': 0.6,
+    'howToBecome': 0.6,
+    'criteria': 0.5,
+}
+
+# Коэффициенты совпадения слова запроса с термином индекса
+EXACT_MATCH = 1.0
+PREFIX_MATCH = 0.8
+TYPO_MATCH = 0.6
+
+
+def fold(text: str) -> str:
+    """Нижний регистр и ё→е"""
+    return text.casefold().replace('ё', 'е')
+
+
+def stem(word: str) -> str:
+    """
+    Облегчённый стемминг русского слова: отбрасывает возвратную частицу и окончание
+
+    Args:
+        word: Слово в нижнем регистре
+
+    Returns:
+        Основа слова (не короче _MIN_STEM букв)
+    """
+    if len(word) <= _MIN_STEM or not word.isalpha():
+        return word
+    for suffix in _REFLEXIVE:
+        if word.endswith(suffix) and len(word) - len(suffix) >= _MIN_STEM:
+            word = word[:-len(suffix)]
+            break
+    for ending in _ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= _MIN_STEM:
+            return word[:-len(ending)]
+    return word
+
+
+def iter_terms(text: str) -> Iterator[Tuple[int, int, str]]:
+    """
+    Разбивает текст на термины индекса
+
+    Args:
+        text: Исходный текст
+
+    Yields:
+        (начало, конец, термин) — позиции слова в исходном тексте и его основа
+    """
+    # casefold и замена ё не меняют длину русского и латинского текста
+    folded = fold(text)
+    if len(folded) != len(text):
+        folded = text.lower().replace('ё', 'е')
+    for match in _WORD_RE.finditer(folded):
+        word = match.group()
+        if word not in STOP_WORDS:
+            yield match.start(), match.end(), stem(word)
+
+
+def _deletes(term: str) -> List[str]:
+    """Варианты термина без одной буквы"""
+    return [term[:i] + term[i + 1:] for i in range(len(term))]
+
+
+def _edit_distance(a: str, b: str, limit: int) -> int:
+    """Расстояние Дамерау-Левенштейна (с перестановкой соседних букв), не больше limit + 1"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if previous2 is not None and i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+def _document_fields(badge: Badge, category: Optional[Category]) -> Dict[str, str]:
+    """Тексты полей документа значка"""
+    examples = badge.examples
+    if isinstance(examples, list):
+        examples = "\n".join(examples)
+    levels = badge.levels
+    return {
+        'title': f"{badge.title} {badge.id}",
+        'levels': " ".join(level.title for level in levels),
+        'category': category.title if category else "",
+        'description': badge.description or "",
+        'nameExplanation': badge.nameExplanation or "",
+        'skillTips': badge.skillTips or "",
+        'examples': examples or "",
+        'philosophy': badge.philosophy or "",
+        'howToBecome': badge.howToBecome or "",
+        'criteria': " ".join(f"{level.criteria} {level.confirmation}" for level in levels),
+    }
+
+
+def highlight(text: str, terms: FrozenSet[str], max_length: Optional[int] = None) -> str:
+    """
+    Подсвечивает в тексте слова, совпавшие с запросом
+
+    Args:
+        text: Исходный текст
+        terms: Термины индекса из SearchHit.terms
+        max_length: Обрезать до фрагмента такой длины вокруг первого совпадения
+
+    Returns:
+        HTML-экранированный текст, совпавшие слова обёрнуты в <mark>
+    """
+    spans = [(start, end) for start, end, term in iter_terms(text) if term in terms]
+    begin, finish = 0, len(text)
+    if max_length is not None and len(text) > max_length:
+        center = spans[0][0] if spans else 0
+        begin = max(0, min(center - max_length // 4, len(text) - max_length))
+        finish = begin + max_length
+    parts = ["…" if begin > 0 else ""]
+    position = begin
+    for start, end in spans:
+        if start < begin or end > finish:
+            continue
+        parts.append(html.escape(text[position:start]))
+        parts.append(f"<mark>{html.escape(text[start:end])}</mark>")
+        position = end
+    parts.append(html.escape(text[position:finish]))
+    if finish < len(text):
+        parts.append("…")
+    return "".join(parts)
+
+
+class SearchHit(NamedTuple):
+    """Результат поиска"""
+    badge: Badge
+    score: float
+    # Термины индекса, совпавшие со словами запроса (для подсветки)
+    terms: FrozenSet[str]
+
+
+class SearchIndex:
+    """
+    Инвертированный индекс значков с ранжированием BM25F
+
+    Вклад термина в оценку документа (idf и нормализация длины полей) считается
+    при построении, поэтому запрос — это сложение готовых весов из списков вхождений.
+    Последнее слово запроса ищется и как префикс (поиск по мере ввода), слова,
+    которых нет в словаре, — с опечаткой (1 правка, для длинных слов — 2).
+    """
+
+    def __init__(self, categories: List[Category], badges: List[Badge], k1: float = 1.2, b: float = 0.75):
+        """
+        Построение индекса
+
+        Args:
+            categories: Категории (для поля с названием категории)
+            badges: Значки в порядке приоритета при равной оценке
+            k1: Насыщение частоты термина
+            b: Степень нормализации по длине поля
+        """
+        self.badges = badges
+        categories_by_id = {category.id: category for category in categories}
+        # Отпечаток проиндексированных текстов: меняется вместе с данными (для ETag)
+        digest = hashlib.sha256()
+
+        # Частоты терминов по полям и длины полей
+        field_tfs: List[Dict[str, Dict[str, int]]] = []
+        field_lengths: Dict[str, float] = defaultdict(float)
+        for badge in badges:
+            fields = {}
+            for field, text in _document_fields(badge, categories_by_id.get(badge.categoryId)).items():
+                digest.update(f"{badge.id}\0{field}\0{text}\0".encode('utf-8'))
+                tf: Dict[str, int] = defaultdict(int)
+                for _, _, term in iter_terms(text):
+                    tf[term] += 1
+                fields[field] = tf
+                field_lengths[field] += sum(tf.values())
+            field_tfs.append(fields)
+        self.fingerprint = digest.hexdigest()
+        average_lengths = {field: (total / len(badges) if badges else 0) or 1.0 for field, total in field_lengths.items()}
+
+        # BM25F: взвешенная по полям и нормализованная частота термина в документе
+        weighted_tfs: Dict[str, Dict[int, float]] = defaultdict(dict)
+        for doc_id, fields in enumerate(field_tfs):
+            for field, tf in fields.items():
+                length = sum(tf.values())
+                norm = 1 - b + b * length / average_lengths[field]
+                boost = FIELD_BOOSTS[field]
+                for term, count in tf.items():
+                    postings = weighted_tfs[term]
+                    postings[doc_id] = postings.get(doc_id, 0.0) + boost * count / norm
+
+        documents = len(badges)
+        self._postings: Dict[str, Dict[int, float]] = {}
+        for term, postings in weighted_tfs.items():
+            idf = math.log(1 + (documents - len(postings) + 0.5) / (len(postings) + 0.5))
+            self._postings[term] = {doc_id: idf * wtf / (k1 + wtf) for doc_id, wtf in postings.items()}
+
+        # Отсортированный словарь для префиксов и индекс удалений для опечаток
+        self._vocabulary = sorted(self._postings)
+        self._deletes: Dict[str, List[str]] = defaultdict(list)
+        for term in self._vocabulary:
+            if len(term) > 3 and not term[0].isdigit():
+                for variant in _deletes(term):
+                    self._deletes[variant].append(term)
+
+    def _prefix_terms(self, prefix: str) -> List[str]:
+        start = bisect_left(self._vocabulary, prefix)
+        terms = []
+        for term in self._vocabulary[start:]:
+            if not term.startswith(prefix):
+                break
+            if term != prefix:
+                terms.append(term)
+        return terms
+
+    def _typo_terms(self, term: str) -> List[str]:
+        limit = 2 if len(term) >= 8 else 1
+        candidates = set(self._deletes.get(term, ()))
+        for variant in _deletes(term):
+            if variant in self._postings:
+                candidates.add(variant)
+            candidates.update(self._deletes.get(variant, ()))
+        candidates.discard(term)
+        return [candidate for candidate in candidates if _edit_distance(term, candidate, limit) <= limit]
+
+    def expand(self, word: str, prefix: bool = False) -> Dict[str, float]:
+        """
+        Подбирает термины индекса для слова запроса
+
+        Args:
+            word: Основа слова запроса
+            prefix: Искать ли также термины, начинающиеся с этого слова
+
+        Returns:
+            Термин -> коэффициент совпадения
+        """
+        matches = {}
+        if word in self._postings:
+            matches[word] = EXACT_MATCH
+        if prefix and len(word) >= 2:
+            for term in self._prefix_terms(word):
+                matches.setdefault(term, PREFIX_MATCH)
+        if not matches and len(word) > 3 and not word[0].isdigit():
+            for term in self._typo_terms(word):
+                matches[term] = TYPO_MATCH
+        return matches
+
+    def search(self, query: str, limit: Optional[int] = 10, category_id: Optional[str] = None) -> List[SearchHit]:
+        """
+        Ищет значки по запросу
+
+        Args:
+            query: Текст запроса
+            limit: Максимум результатов (None — все найденные)
+            category_id: Искать только в этой категории
+
+        Returns:
+            Результаты по убыванию оценки
+        """
+        words = list(iter_terms(query))
+        folded = fold(query)
+        scores: Dict[int, float] = defaultdict(float)
+        matched: Dict[int, set] = defaultdict(set)
+        for position, (start, end, term) in enumerate(words):
+            # Незаконченное последнее слово ищем как префикс — и по основе, и по слову целиком
+            is_last = position == len(words) - 1 and end == len(folded.rstrip())
+            expansions = self.expand(term, prefix=is_last)
+            if is_last and folded[start:end] != term:
+                for extra, weight in self.expand(folded[start:end], prefix=True).items():
+                    expansions.setdefault(extra, weight)
+            # Для каждого документа берём лучшее совпадение слова, а не сумму по всем вариантам
+            best: Dict[int, Tuple[float, str]] = {}
+            for candidate, weight in expansions.items():
+                for doc_id, contribution in self._postings[candidate].items():
+                    value = weight * contribution
+                    if doc_id not in best or value > best[doc_id][0]:
+                        best[doc_id] = (value, candidate)
+            for doc_id, (value, candidate) in best.items():
+                scores[doc_id] += value
+                matched[doc_id].add(candidate)
+
+        if category_id is not None:
+            scores = {doc_id: score for doc_id, score in scores.items() if self.badges[doc_id].categoryId == category_id}
+
+        order = lambda item: (-item[1], item[0])
+        ranked = sorted(scores.items(), key=order) if limit is None else heapq.nsmallest(limit, scores.items(), key=order)
+        return [SearchHit(self.badges[doc_id], score, frozenset(matched[doc_id])) for doc_id, score in ranked]
+
+    def stats(self) -> Dict:
+        """Размер индекса"""
+        return {
+            'documents': len(self.badges),
+            'terms': len(self._postings),
+            'postings': sum(len(postings) for postings in self._postings.values()),
+            'typo_variants': len(self._deletes)
+        }
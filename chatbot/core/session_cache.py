@@ -0,0 +1,142 @@
+"""
+Ограниченный кэш сессий пользователей в памяти
+LRU с вытеснением по простою, числу сессий и суммарному объёму
+"""
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+class SessionCache:
+    """
+    Кэш сессий с LRU-вытеснением
+
+    Сессия вытесняется, если она дольше idle_ttl не использовалась, если сессий
+    больше max_entries или их оценочный объём больше max_bytes. При вытеснении
+    вызывается on_evict(key, value, reason), чтобы владелец мог сохранить данные.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1000,
+        max_bytes: int = 64 * 1024 * 1024,
+        idle_ttl: float = 3600,
+        on_evict: Optional[Callable[[str, Any, str], None]] = None
+    ):
+        """
+        Инициализация кэша
+
+        Args:
+            max_entries: Максимальное количество сессий в памяти
+            max_bytes: Максимальный оценочный объём сессий в байтах
+            idle_ttl: Время простоя (сек), после которого сессия вытесняется
+            on_evict: Обработчик вытеснения
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.idle_ttl = idle_ttl
+        self.on_evict = on_evict
+        # Ключ -> (значение, оценка объёма, время последнего обращения); порядок — от давних к свежим
+        self._entries: "OrderedDict[str, Tuple[Any, int, float]]" = OrderedDict()
+        self._bytes = 0
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'evicted_idle': 0,
+            'evicted_lru': 0,
+            'evicted_bytes': 0,
+            'purged': 0
+        }
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries
+
+    def get(self, key: str) -> Optional[Any]:
+        """Возвращает сессию и отмечает обращение к ней"""
+        now = time.time()
+        self._evict_idle(now)
+        entry = self._entries.get(key)
+        if entry is None:
+            self._stats['misses'] += 1
+            return None
+        value, size, _ = entry
+        self._entries[key] = (value, size, now)
+        self._entries.move_to_end(key)
+        self._stats['hits'] += 1
+        return value
+
+    def put(self, key: str, value: Any, size: int = 0):
+        """Добавляет или заменяет сессию"""
+        now = time.time()
+        self._evict_idle(now)
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._bytes -= previous[1]
+        self._entries[key] = (value, size, now)
+        self._bytes += size
+        self._enforce_limits(keep=key)
+
+    def resize(self, key: str, size: int):
+        """Обновляет оценку объёма сессии после изменения"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return
+        value, old_size, last_access = entry
+        self._entries[key] = (value, size, last_access)
+        self._bytes += size - old_size
+        self._enforce_limits(keep=key)
+
+    def pop(self, key: str) -> Optional[Any]:
+        """Удаляет сессию без вызова обработчика вытеснения"""
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return None
+        self._bytes -= entry[1]
+        return entry[0]
+
+    def purge_older_than(self, cutoff: float) -> List[str]:
+        """
+        Удаляет сессии, к которым не обращались с момента cutoff (без обработчика вытеснения)
+
+        Returns:
+            Ключи удалённых сессий
+        """
+        purged = [key for key, (_, _, last_access) in self._entries.items() if last_access < cutoff]
+        for key in purged:
+            self.pop(key)
+        self._stats['purged'] += len(purged)
+        return purged
+
+    def _evict(self, key: str, reason: str):
+        value = self.pop(key)
+        self._stats[f'evicted_{reason}'] += 1
+        if self.on_evict:
+            self.on_evict(key, value, reason)
+
+    def _evict_idle(self, now: float):
+        # Самые давние — в начале, поэтому достаточно смотреть на первую запись
+        while self._entries:
+            key, (_, _, last_access) = next(iter(self._entries.items()))
+            if now - last_access <= self.idle_ttl:
+                break
+            self._evict(key, 'idle')
+
+    def _enforce_limits(self, keep: str):
+        while len(self._entries) > self.max_entries:
+            self._evict(next(iter(self._entries)), 'lru')
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            key = next(iter(self._entries))
+            if key == keep:
+                break
+            self._evict(key, 'bytes')
+
+    def stats(self) -> Dict:
+        """Метрики кэша"""
+        return {
+            **self._stats,
+            'resident': len(self._entries),
+            'resident_bytes': self._bytes,
+            'max_entries': self.max_entries,
+            'max_bytes': self.max_bytes,
+            'idle_ttl': self.idle_ttl
+        }
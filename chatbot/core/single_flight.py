@@ -0,0 +1,76 @@
+"""
+Объединение одинаковых одновременных запросов (single-flight)
+Пока запрос с данным ключом выполняется, повторные вызовы ждут его результат,
+а не отправляют ещё один такой же запрос
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+
+class _Flight:
+    """Выполняющийся запрос и число ожидающих его вызовов"""
+
+    def __init__(self, task: asyncio.Future):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Один вызов на ключ среди одновременных
+
+    Запрос выполняется отдельной задачей: если отменён вызов, который его начал
+    (например, пользователь закрыл поток), остальные ожидающие всё равно получат
+    результат. Задача отменяется, только когда ждать её больше некому. После
+    завершения ключ освобождается — результат не кэшируется, для этого есть
+    ResponseCache.
+    """
+
+    def __init__(self):
+        self._flights: Dict[Hashable, _Flight] = {}
+        self._calls = 0
+        self._coalesced = 0
+        self._max_waiters = 0
+
+    async def do(self, key: Hashable, call: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Выполняет call или присоединяется к уже выполняющемуся вызову с тем же ключом
+
+        Args:
+            key: Отпечаток запроса
+            call: Функция, выполняющая запрос
+
+        Returns:
+            (результат, получен ли он из чужого вызова)
+        """
+        flight = self._flights.get(key)
+        shared = flight is not None
+        if flight is None:
+            flight = _Flight(asyncio.ensure_future(call()))
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda _: self._release(key, flight))
+            self._calls += 1
+        else:
+            self._coalesced += 1
+        flight.waiters += 1
+        self._max_waiters = max(self._max_waiters, flight.waiters)
+        try:
+            return await asyncio.shield(flight.task), shared
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                flight.task.cancel()
+
+    def _release(self, key: Hashable, flight: _Flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    def stats(self) -> Dict[str, int]:
+        """Счётчики вызовов и ожидающих"""
+        return {
+            "calls": self._calls,
+            "coalesced": self._coalesced,
+            "in_flight": len(self._flights),
+            "waiters": sum(flight.waiters for flight in self._flights.values()),
+            "max_waiters": self._max_waiters
+        }
@@ -0,0 +1,123 @@
+"""
+Единый снимок базы знаний ai-data
+Вся папка public/ai-data компилируется в один JSON-файл, который читается за одно обращение к диску
+"""
+import hashlib
+import json
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Union
+
+SNAPSHOT_FORMAT = "ai-data-snapshot"
+SNAPSHOT_VERSION = 1
+
+
+def file_sha256(data: bytes) -> str:
+    """Хэш содержимого исходного файла"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def _combined_hash(source_hashes: Dict[str, str]) -> str:
+    """Общий хэш папки по хэшам файлов (путь относительно ai-data -> хэш)"""
+    return hashlib.sha256(
+        "\n".join(f"{path}:{digest}" for path, digest in sorted(source_hashes.items())).encode('utf-8')
+    ).hexdigest()
+
+
+def source_hash(ai_data_path: Union[str, Path]) -> str:
+    """
+    Хэш текущего содержимого папки ai-data — тот же, что sourceHash в снимке
+
+    Файлы только читаются и хэшируются, без разбора JSON, поэтому проверка
+    быстрее загрузки папки.
+
+    Args:
+        ai_data_path: Путь к папке ai-data (с MASTER_INDEX.json)
+    """
+    base_path = Path(ai_data_path)
+    master_path = base_path / "MASTER_INDEX.json"
+    master_raw = master_path.read_bytes()
+    source_hashes = {master_path.name: file_sha256(master_raw)}
+    for category_info in json.loads(master_raw).get('categories', []):
+        category_dir = base_path / category_info['path']
+        for path in [category_dir / "index.json", category_dir / "introduction.md", *category_dir.glob("*.json")]:
+            if path.name == "introduction.md" and not path.exists():
+                continue
+            source_hashes[path.relative_to(base_path).as_posix()] = file_sha256(path.read_bytes())
+    return _combined_hash(source_hashes)
+
+
+def build_snapshot(ai_data_path: Union[str, Path]) -> Dict[str, Any]:
+    """
+    Собирает снимок из папки ai-data
+
+    Args:
+        ai_data_path: Путь к папке ai-data (с MASTER_INDEX.json)
+
+    Returns:
+        Данные снимка: мастер-индекс, категории (index.json + introduction.md)
+        и все файлы значков/уровней с хэшами исходников
+    """
+    base_path = Path(ai_data_path)
+    source_hashes = {}
+
+    def read(path: Path) -> bytes:
+        data = path.read_bytes()
+        source_hashes[path.relative_to(base_path).as_posix()] = file_sha256(data)
+        return data
+
+    master_index = json.loads(read(base_path / "MASTER_INDEX.json"))
+    categories = {}
+    badges = {}
+
+    for category_info in master_index.get('categories', []):
+        category_dir = base_path / category_info['path']
+        introduction_path = category_dir / "introduction.md"
+        categories[category_info['id']] = {
+            'index': json.loads(read(category_dir / "index.json")),
+            'introduction': read(introduction_path).decode('utf-8') if introduction_path.exists() else None
+        }
+
+        # Файлы значков и отдельных уровней: N.X.json, N.X.Y.json
+        for badge_path in sorted(category_dir.glob("*.json")):
+            if badge_path.name == "index.json":
+                continue
+            raw = read(badge_path)
+            badges[badge_path.stem] = {
+                'data': json.loads(raw),
+                'sourceHash': file_sha256(raw)
+            }
+
+    return {
+        'format': SNAPSHOT_FORMAT,
+        'version': SNAPSHOT_VERSION,
+        'builtAt': datetime.now().isoformat(timespec='seconds'),
+        'sourceHash': _combined_hash(source_hashes),
+        'masterIndex': master_index,
+        'categories': categories,
+        'badges': badges
+    }
+
+
+def write_snapshot(snapshot: Dict[str, Any], output_path: Union[str, Path]):
+    """Записывает снимок компактным JSON (через временный файл)"""
+    output_path = Path(output_path)
+    tmp_path = output_path.with_name(output_path.name + ".tmp")
+    tmp_path.write_text(json.dumps(snapshot, ensure_ascii=False, separators=(',', ':')), encoding='utf-8')
+    tmp_path.replace(output_path)
+
+
+def read_snapshot(snapshot_path: Union[str, Path]) -> Dict[str, Any]:
+    """
+    Читает снимок одним обращением к диску
+
+    Raises:
+        ValueError: Файл не является снимком поддерживаемой версии
+    """
+    snapshot = json.loads(Path(snapshot_path).read_bytes())
+    if snapshot.get('format') != SNAPSHOT_FORMAT or snapshot.get('version') != SNAPSHOT_VERSION:
+        raise ValueError(
+            f"Неподдерживаемый снимок: {snapshot.get('format')} v{snapshot.get('version')}, "
+            f"ожидается {SNAPSHOT_FORMAT} v{SNAPSHOT_VERSION}"
+        )
+    return snapshot
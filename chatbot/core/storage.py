@@ -0,0 +1,352 @@
+"""
+Хранилища контекстов и диалогов пользователей
+JSON-файлы (как раньше) или SQLite; пользователи загружаются по требованию
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from models.conversation import UserContext, Conversation, Message
+
+logger = logging.getLogger(__name__)
+
+# Виды записей в пакете на сохранение
+CONTEXT = "context"
+CONVERSATION = "conversation"
+
+# Ключ записи: (вид, user_id)
+RecordKey = Tuple[str, str]
+
+
+def conversation_id_for(user_id: str) -> str:
+    """ID диалога пользователя"""
+    return f"conv_{user_id}"
+
+
+def _dumps(data: Any) -> str:
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'), default=str)
+
+
+class StorageBackend(ABC):
+    """Интерфейс хранилища контекстов и диалогов"""
+
+    @abstractmethod
+    def load_context(self, user_id: str) -> Optional[UserContext]:
+        """Загружает контекст пользователя (None — пользователя нет)"""
+
+    @abstractmethod
+    def load_conversation(self, user_id: str) -> Optional[Conversation]:
+        """Загружает диалог пользователя (None — диалога нет)"""
+
+    @abstractmethod
+    def save_batch(
+        self,
+        records: List[Tuple[RecordKey, Dict[str, Any]]],
+        touched_at: Optional[float] = None
+    ) -> List[RecordKey]:
+        """
+        Сохраняет пачку записей
+
+        Args:
+            records: Пары ((вид, user_id), данные модели в виде словаря)
+            touched_at: Время записи, которое затем вернёт version (по умолчанию — текущее)
+
+        Returns:
+            Ключи записей, которые сохранить не удалось
+        """
+
+    @abstractmethod
+    def iter_user_ids(self) -> Iterator[str]:
+        """Перебирает ID всех пользователей, у которых есть контекст или диалог"""
+
+    @abstractmethod
+    def version(self, user_id: str) -> float:
+        """
+        Время последней записи данных пользователя (0 — записей нет)
+
+        По нему процесс замечает, что данные пользователя изменил другой процесс.
+        """
+
+    @abstractmethod
+    def purge_older_than(self, cutoff: float) -> int:
+        """
+        Удаляет пользователей, данные которых не менялись с момента cutoff
+
+        Args:
+            cutoff: Граница (unix time)
+
+        Returns:
+            Количество удалённых пользователей
+        """
+
+    def close(self):
+        """Освобождает ресурсы"""
+
+
+class FileStorage(StorageBackend):
+    """Хранилище в JSON-файлах: context_<user_id>.json и conversation_conv_<user_id>.json"""
+
+    def __init__(self, storage_path: str):
+        """
+        Args:
+            storage_path: Папка с файлами
+        """
+        self.storage_path = storage_path
+        os.makedirs(storage_path, exist_ok=True)
+
+    def _path(self, kind: str, user_id: str) -> str:
+        if kind == CONTEXT:
+            return os.path.join(self.storage_path, f"context_{user_id}.json")
+        return os.path.join(self.storage_path, f"conversation_{conversation_id_for(user_id)}.json")
+
+    def _read(self, kind: str, user_id: str) -> Optional[Dict[str, Any]]:
+        file_path = self._path(kind, user_id)
+        if not os.path.exists(file_path):
+            return None
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"Ошибка загрузки {os.path.basename(file_path)}: {e}")
+            return None
+
+    def load_context(self, user_id: str) -> Optional[UserContext]:
+        data = self._read(CONTEXT, user_id)
+        return UserContext(**data) if data else None
+
+    def load_conversation(self, user_id: str) -> Optional[Conversation]:
+        data = self._read(CONVERSATION, user_id)
+        return Conversation(**data) if data else None
+
+    def save_batch(
+        self,
+        records: List[Tuple[RecordKey, Dict[str, Any]]],
+        touched_at: Optional[float] = None
+    ) -> List[RecordKey]:
+        failed = []
+        for (kind, user_id), data in records:
+            file_path = self._path(kind, user_id)
+            try:
+                # Через временный файл и переименование, чтобы не оставить файл недописанным
+                tmp_path = f"{file_path}.tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    f.write(_dumps(data))
+                if touched_at is not None:
+                    os.utime(tmp_path, (touched_at, touched_at))
+                os.replace(tmp_path, file_path)
+            except OSError as e:
+                logger.error(f"Не удалось записать {file_path}: {e}")
+                failed.append((kind, user_id))
+        return failed
+
+    def version(self, user_id: str) -> float:
+        latest = 0.0
+        for kind in (CONTEXT, CONVERSATION):
+            try:
+                latest = max(latest, os.stat(self._path(kind, user_id)).st_mtime)
+            except OSError:
+                pass
+        return latest
+
+    def iter_user_ids(self) -> Iterator[str]:
+        seen = set()
+        for filename in sorted(os.listdir(self.storage_path)):
+            if not filename.endswith(".json"):
+                continue
+            if filename.startswith("context_"):
+                user_id = filename[len("context_"):-len(".json")]
+            elif filename.startswith("conversation_conv_"):
+                user_id = filename[len("conversation_conv_"):-len(".json")]
+            else:
+                continue
+            if user_id not in seen:
+                seen.add(user_id)
+                yield user_id
+
+    def purge_older_than(self, cutoff: float) -> int:
+        purged = 0
+        for user_id in list(self.iter_user_ids()):
+            paths = [p for p in (self._path(CONTEXT, user_id), self._path(CONVERSATION, user_id)) if os.path.exists(p)]
+            if paths and max(os.path.getmtime(p) for p in paths) < cutoff:
+                for file_path in paths:
+                    os.remove(file_path)
+                purged += 1
+        return purged
+
+
+class SQLiteStorage(StorageBackend):
+    """
+    Хранилище в SQLite (режим WAL)
+
+    Контекст и заголовок диалога — JSON по первичному ключу user_id,
+    сообщения — отдельные строки с индексом по user_id.
+    """
+
+    def __init__(self, db_path: str):
+        """
+        Args:
+            db_path: Путь к файлу базы
+        """
+        self.db_path = db_path
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        # Чтение идёт из event loop, запись — из потока сброса
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS contexts (
+                user_id TEXT PRIMARY KEY,
+                data TEXT NOT NULL,
+                touched_at REAL NOT NULL DEFAULT 0
+            );
+            CREATE TABLE IF NOT EXISTS conversations (
+                user_id TEXT PRIMARY KEY,
+                data TEXT NOT NULL,
+                touched_at REAL NOT NULL DEFAULT 0
+            );
+            CREATE TABLE IF NOT EXISTS messages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id TEXT NOT NULL,
+                position INTEGER NOT NULL,
+                role TEXT NOT NULL,
+                content TEXT NOT NULL,
+                timestamp TEXT,
+                metadata TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_messages_user ON messages (user_id, position);
+            """
+        )
+        self._db.commit()
+
+    def load_context(self, user_id: str) -> Optional[UserContext]:
+        with self._lock:
+            row = self._db.execute("SELECT data FROM contexts WHERE user_id = ?", (user_id,)).fetchone()
+        return UserContext(**json.loads(row[0])) if row else None
+
+    def load_conversation(self, user_id: str) -> Optional[Conversation]:
+        with self._lock:
+            row = self._db.execute("SELECT data FROM conversations WHERE user_id = ?", (user_id,)).fetchone()
+            if not row:
+                return None
+            message_rows = self._db.execute(
+                "SELECT role, content, timestamp, metadata FROM messages WHERE user_id = ? ORDER BY position",
+                (user_id,)
+            ).fetchall()
+        data = json.loads(row[0])
+        data['messages'] = [
+            Message(
+                role=role,
+                content=content,
+                timestamp=timestamp,
+                metadata=json.loads(metadata) if metadata else None
+            )
+            for role, content, timestamp, metadata in message_rows
+        ]
+        return Conversation(**data)
+
+    def save_batch(
+        self,
+        records: List[Tuple[RecordKey, Dict[str, Any]]],
+        touched_at: Optional[float] = None
+    ) -> List[RecordKey]:
+        contexts = []
+        conversations = []
+        messages = []
+        if touched_at is None:
+            touched_at = time.time()
+        for (kind, user_id), data in records:
+            if kind == CONTEXT:
+                contexts.append((user_id, _dumps(data), touched_at))
+            else:
+                header = {k: v for k, v in data.items() if k != 'messages'}
+                conversations.append((user_id, _dumps(header), touched_at))
+                messages.extend(
+                    (user_id, position, m['role'], m['content'], str(m.get('timestamp') or ''),
+                     _dumps(m['metadata']) if m.get('metadata') is not None else None)
+                    for position, m in enumerate(data.get('messages') or [])
+                )
+
+        try:
+            with self._lock, self._db:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO contexts (user_id, data, touched_at) VALUES (?, ?, ?)",
+                    contexts
+                )
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO conversations (user_id, data, touched_at) VALUES (?, ?, ?)",
+                    conversations
+                )
+                # История диалога хранится целиком (она ограничена последними сообщениями)
+                self._db.executemany("DELETE FROM messages WHERE user_id = ?", [(c[0],) for c in conversations])
+                self._db.executemany(
+                    "INSERT INTO messages (user_id, position, role, content, timestamp, metadata) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    messages
+                )
+        except sqlite3.Error as e:
+            logger.error(f"Не удалось сохранить пачку в SQLite: {e}")
+            return [key for key, _ in records]
+        return []
+
+    def version(self, user_id: str) -> float:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT MAX(touched_at) FROM ("
+                "SELECT touched_at FROM contexts WHERE user_id = ? "
+                "UNION ALL SELECT touched_at FROM conversations WHERE user_id = ?)",
+                (user_id, user_id)
+            ).fetchone()
+        return row[0] or 0.0
+
+    def iter_user_ids(self) -> Iterator[str]:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT user_id FROM contexts UNION SELECT user_id FROM conversations"
+            ).fetchall()
+        for (user_id,) in rows:
+            yield user_id
+
+    def purge_older_than(self, cutoff: float) -> int:
+        with self._lock, self._db:
+            stale = self._db.execute(
+                "SELECT user_id FROM contexts WHERE touched_at < ? "
+                "AND user_id NOT IN (SELECT user_id FROM conversations WHERE touched_at >= ?) "
+                "UNION "
+                "SELECT user_id FROM conversations WHERE touched_at < ? "
+                "AND user_id NOT IN (SELECT user_id FROM contexts WHERE touched_at >= ?)",
+                (cutoff, cutoff, cutoff, cutoff)
+            ).fetchall()
+            for table in ("contexts", "conversations", "messages"):
+                self._db.executemany(f"DELETE FROM {table} WHERE user_id = ?", stale)
+        return len(stale)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def create_storage(backend: str, storage_path: str, db_path: str) -> StorageBackend:
+    """
+    Создаёт хранилище по имени
+
+    Args:
+        backend: "file" или "sqlite"
+        storage_path: Папка для JSON-файлов
+        db_path: Путь к базе SQLite
+
+    Returns:
+        Хранилище
+    """
+    if backend == "sqlite":
+        return SQLiteStorage(db_path)
+    if backend != "file":
+        raise ValueError(f"Неизвестное хранилище: {backend}")
+    return FileStorage(storage_path)
@@ -0,0 +1,81 @@
+"""
+Поиск множества подстрок за один проход по тексту (автомат Ахо-Корасик)
+"""
+from collections import deque
+from typing import Any, Dict, Iterator, List, Tuple
+
+
+class AhoCorasick:
+    """
+    Автомат Ахо-Корасик: находит все вхождения заранее известных шаблонов
+    за время, пропорциональное длине текста (плюс число совпадений)
+    """
+
+    def __init__(self):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        # Для каждого состояния — шаблоны, заканчивающиеся в нём: (длина, значение)
+        self._out: List[List[Tuple[int, Any]]] = [[]]
+        self._built = False
+
+    def add(self, pattern: str, value: Any):
+        """
+        Добавляет шаблон
+
+        Args:
+            pattern: Искомая подстрока (пустые шаблоны игнорируются)
+            value: Значение, возвращаемое при совпадении
+        """
+        if not pattern:
+            return
+        state = 0
+        for ch in pattern:
+            next_state = self._goto[state].get(ch)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][ch] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            state = next_state
+        self._out[state].append((len(pattern), value))
+        self._built = False
+
+    def build(self):
+        """Строит суффиксные ссылки (вызывается автоматически перед поиском)"""
+        queue = deque(self._goto[0].values())
+        for state in queue:
+            self._fail[state] = 0
+        while queue:
+            state = queue.popleft()
+            for ch, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(ch, 0)
+                self._fail[next_state] = target if target != next_state else 0
+                # Совпадения суффикса наследуются — выдаём их вместе с собственными
+                self._out[next_state] = self._out[next_state] + self._out[self._fail[next_state]]
+        self._built = True
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, int, Any]]:
+        """
+        Перебирает все вхождения шаблонов в текст
+
+        Args:
+            text: Текст для поиска
+
+        Returns:
+            Итератор кортежей (начало, конец, значение); конец не включается
+        """
+        if not self._built:
+            self.build()
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for index, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for length, value in out[state]:
+                yield index + 1 - length, index + 1, value
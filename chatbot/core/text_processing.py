@@ -0,0 +1,262 @@
+"""
+Очистка и постобработка текста ответов бота
+Пакетная версия для готового ответа и потоковая версия для стриминга
+"""
+import re
+from typing import List
+
+
+_BOLD_RE = re.compile(r'\*\*(.*?)\*\*')
+_ITALIC_RE = re.compile(r'\*(.*?)\*')
+_HEADER_RES = [
+    re.compile(r'^###\s*', re.MULTILINE),
+    re.compile(r'^##\s*', re.MULTILINE),
+    re.compile(r'^#\s*', re.MULTILINE),
+]
+_CODE_RE = re.compile(r'`(.*?)`')
+_BLANK_LINES_RE = re.compile(r'\n\s*\n\s*\n')
+_REPEATED_EMOJI_RE = re.compile(r'([✨💡🎉🚀😄👍💫💪🔥🧠😌🤩😎🤗🤔🥰🥹😅💋🐱])\1+')
+_EXTRA_NEWLINES_RE = re.compile(r'\n{3,}')
+
+# Эмодзи, повторы которых схлопываются в один
+COLLAPSIBLE_EMOJI = frozenset('✨💡🎉🚀😄👍💫💪🔥🧠😌🤩😎🤗🤔🥰🥹😅💋🐱')
+
+# Мягкий лимит длины ответа и символы, по которым его можно аккуратно обрезать
+MAX_RESPONSE_LENGTH = 2500
+MIN_CUT_POSITION = 200
+SENTENCE_BREAKS = '.!?\n'
+# Ближе к лимиту потоковая версия отдаёт текст только целыми предложениями,
+# раньше — сразу: отрезаться может лишь хвост после последнего конца предложения
+TRUNCATION_WINDOW = 300
+
+# Символы, после которых строку нельзя отдавать, пока она не завершится
+_MARKUP_CHARS = ('*', '`')
+
+
+def clean_markdown(text: str) -> str:
+    """Очищает текст от markdown форматирования"""
+    # Удаляем **жирный текст** и *курсив*
+    text = _BOLD_RE.sub(r'\1', text)
+    text = _ITALIC_RE.sub(r'\1', text)
+
+    # Удаляем заголовки ###, ## и #
+    for header_re in _HEADER_RES:
+        text = header_re.sub('', text)
+
+    # Удаляем `код`
+    text = _CODE_RE.sub(r'\1', text)
+
+    # Удаляем лишние переносы строк
+    text = _BLANK_LINES_RE.sub('\n\n', text)
+
+    return text.strip()
+
+
+def postprocess_response(text: str) -> str:
+    """Постобработка ответа: мягкая нормализация эмодзи и переносов, без жёсткого урезания."""
+    if not text:
+        return text
+
+    # Убираем повторяющиеся одинаковые эмодзи подряд (2+ -> 1)
+    text = _REPEATED_EMOJI_RE.sub(r'\1', text)
+
+    # Мягкая отсечка очень длинных простыней (оставляем простор для развёрнутых ответов)
+    if len(text) > MAX_RESPONSE_LENGTH:
+        snippet = text[:MAX_RESPONSE_LENGTH]
+        pivot = max(snippet.rfind(ch) for ch in SENTENCE_BREAKS)
+        if pivot > MIN_CUT_POSITION:
+            text = snippet[:pivot + 1]
+        else:
+            text = snippet + '…'
+
+    # Нормализуем лишние пустые строки
+    text = _EXTRA_NEWLINES_RE.sub('\n\n', text)
+    return text.strip()
+
+
+def _strip_headers(line: str, first_pass: int):
+    """
+    Применяет к одной строке проходы удаления заголовков, начиная с first_pass
+
+    Returns:
+        Строка без заголовка и номер прохода, съевшего её целиком (или None).
+        В пакетной версии такой проход через `\\s*` съедает и следующие
+        пробелы/переносы, а следующая строка обрабатывается уже оставшимися проходами.
+    """
+    for index in range(first_pass, len(_HEADER_RES)):
+        stripped = _HEADER_RES[index].sub('', line)
+        if not stripped and line:
+            return stripped, index
+        line = stripped
+    return line, None
+
+
+class IncrementalTextProcessor:
+    """
+    Потоковый аналог clean_markdown + postprocess_response
+
+    Принимает дельты модели в feed() и возвращает только тот текст, который
+    уже не изменится; finish() отдаёт остаток. Склейка всех возвращённых
+    кусков совпадает с postprocess_response(clean_markdown(полный_текст)),
+    кроме ответов длиннее лимита, где перед отсечкой больше TRUNCATION_WINDOW
+    символов идут без единого конца предложения.
+    """
+
+    def __init__(self, max_length: int = MAX_RESPONSE_LENGTH):
+        self.max_length = max_length
+        # Стадия 1: построчная markdown-очистка
+        self._line = ""
+        self._header_pass = 0          # с какого прохода заголовков обрабатывать строку
+        self._eat_after_pass = None    # проход заголовка, который "съедает" пробелы дальше
+        self._eaten_indent = False     # у текущей строки уже съеден отступ
+        # Стадия 2: обрезка пробелов в начале и схлопывание пустых строк
+        self._started = False
+        self._pending_ws = ""
+        # Стадия 3: схлопывание повторяющихся эмодзи
+        self._prev_char = ""
+        # Стадия 4: мягкое ограничение длины
+        self._count = 0
+        self._last_break = -1
+        self._tail = ""
+        self._truncated = False
+        # Стадия 5: удержание пробелов в конце
+        self._trailing_ws = ""
+        self._out: List[str] = []
+
+    def feed(self, chunk: str) -> str:
+        """Принимает очередную дельту и возвращает готовый к показу текст"""
+        if not chunk or self._truncated:
+            return ""
+        self._line += chunk
+
+        while '\n' in self._line:
+            line, self._line = self._line.split('\n', 1)
+            self._process_line(line, complete=True)
+
+        self._process_partial_line()
+        return self._drain()
+
+    def finish(self) -> str:
+        """Завершает поток и возвращает оставшийся текст"""
+        if not self._truncated:
+            if self._line:
+                line, self._line = self._line, ""
+                self._process_line(line, complete=False)
+            # Пробелы в конце отбрасываются (strip), хвост после последней точки — отпускаем
+            self._pending_ws = ""
+            if not self._truncated:
+                self._release(self._tail)
+                self._tail = ""
+        self._trailing_ws = ""
+        return self._drain()
+
+    def _drain(self) -> str:
+        text = "".join(self._out)
+        self._out.clear()
+        return text
+
+    def _resolve_eaten_whitespace(self, line: str) -> str:
+        """Съедает пробелы после строки-заголовка так же, как `\\s*` в пакетной версии"""
+        stripped = line.lstrip()
+        if stripped != line:
+            self._eaten_indent = True
+        if stripped:
+            # Без отступа строка остаётся началом строки для всех проходов,
+            # с отступом — попадает в начало строки только для следующих проходов
+            self._header_pass = self._eat_after_pass + 1 if self._eaten_indent else 0
+            self._eat_after_pass = None
+        return stripped
+
+    def _process_line(self, line: str, complete: bool):
+        line = _ITALIC_RE.sub(r'\1', _BOLD_RE.sub(r'\1', line))
+        if self._eat_after_pass is not None:
+            line = self._resolve_eaten_whitespace(line)
+        self._eaten_indent = False
+        if self._eat_after_pass is not None:
+            # Строка целиком из пробелов — съедается вместе с переносом
+            return
+
+        line, eaten_by = _strip_headers(line, self._header_pass)
+        self._header_pass = 0
+        if eaten_by is not None:
+            self._eat_after_pass = eaten_by
+            return
+        self._push(_CODE_RE.sub(r'\1', line) + ('\n' if complete else ''))
+
+    def _process_partial_line(self):
+        if self._eat_after_pass is not None:
+            # Разметка в начале строки может изменить то, что съест заголовок — ждём конца строки
+            if self._line.lstrip().startswith(_MARKUP_CHARS):
+                return
+            self._line = self._resolve_eaten_whitespace(self._line)
+        line = self._line
+        if not line or (self._header_pass < len(_HEADER_RES) and line.startswith('#')):
+            return
+
+        # Всё до первого символа разметки уже не изменится
+        safe_len = len(line)
+        for mark in _MARKUP_CHARS:
+            pos = line.find(mark)
+            if pos != -1:
+                safe_len = min(safe_len, pos)
+        if safe_len == 0:
+            return
+
+        self._push(line[:safe_len])
+        self._line = line[safe_len:]
+        self._header_pass = len(_HEADER_RES)
+
+    def _push(self, text: str):
+        """Стадии 2-3: пробелы и эмодзи"""
+        for ch in text:
+            if self._truncated:
+                return
+            if ch.isspace():
+                if self._started:
+                    self._pending_ws += ch
+                continue
+
+            self._started = True
+            if self._pending_ws:
+                ws = self._pending_ws
+                self._pending_ws = ""
+                if ws.count('\n') >= 3:
+                    first, last = ws.find('\n'), ws.rfind('\n')
+                    ws = ws[:first] + '\n\n' + ws[last + 1:]
+                for ws_ch in ws:
+                    self._accept(ws_ch)
+
+            if ch in COLLAPSIBLE_EMOJI and ch == self._prev_char:
+                continue
+            self._accept(ch)
+
+    def _accept(self, ch: str):
+        """Стадия 4: мягкое ограничение длины"""
+        if self._truncated:
+            return
+        self._prev_char = ch
+        if self._count >= self.max_length:
+            # Текст длиннее лимита: режем по последнему концу предложения, как в пакетной версии
+            self._truncated = True
+            if self._last_break <= MIN_CUT_POSITION:
+                self._release(self._tail + '…')
+            self._tail = ""
+            return
+
+        self._count += 1
+        self._tail += ch
+        if ch in SENTENCE_BREAKS:
+            self._last_break = self._count - 1
+        if ch in SENTENCE_BREAKS or self._count < self.max_length - TRUNCATION_WINDOW:
+            self._release(self._tail)
+            self._tail = ""
+
+    def _release(self, text: str):
+        """Стадия 5: пробелы в конце держим, пока за ними не появится текст"""
+        if not text:
+            return
+        text = self._trailing_ws + text
+        body = text.rstrip()
+        self._trailing_ws = text[len(body):]
+        if body:
+            self._out.append(body)
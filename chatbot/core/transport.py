@@ -0,0 +1,362 @@
+"""
+Надёжный транспорт к OpenAI-совместимому API
+Общий пул соединений httpx, дедлайн запроса, повторы с экспоненциальной
+задержкой и джиттером, автоматический выключатель (circuit breaker) на каждый
+адрес и дублирующие (hedged) запросы к запасным адресам
+"""
+import asyncio
+import logging
+import math
+import random
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Sequence
+
+import httpx
+import openai
+from openai import AsyncOpenAI
+
+logger = logging.getLogger(__name__)
+
+# Адрес API по умолчанию (публичный прокси для обхода региональных ограничений)
+DEFAULT_BASE_URL = "https://api.openai-proxy.com/v1"
+
+# Сколько последних запросов учитывать в процентилях задержки
+LATENCY_WINDOW = 2048
+
+# Ошибки, после которых запрос имеет смысл повторить (429, 5xx, сеть, таймаут)
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.InternalServerError,
+    openai.APIConnectionError,
+    asyncio.TimeoutError,
+)
+
+
+class CircuitOpenError(Exception):
+    """Все адреса API временно отключены выключателем"""
+
+
+class CircuitBreaker:
+    """
+    Выключатель для одного адреса API
+
+    После failure_threshold ошибок подряд адрес отключается на reset_timeout
+    секунд; затем пропускается один пробный запрос: успех включает адрес,
+    ошибка снова отключает.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        """
+        Args:
+            failure_threshold: Ошибок подряд до отключения
+            reset_timeout: Время отключения (сек)
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self.opened = 0
+
+    def allow(self) -> bool:
+        """Можно ли отправить запрос (в полуоткрытом состоянии — один пробный)"""
+        if self.state == "closed":
+            return True
+        if self.state == "open":
+            if time.monotonic() - self._opened_at < self.reset_timeout:
+                return False
+            self.state = "half_open"
+        if self._trial_in_flight:
+            return False
+        self._trial_in_flight = True
+        return True
+
+    def available(self) -> bool:
+        """Проверка без занятия пробного запроса"""
+        if self.state == "closed":
+            return True
+        if self.state == "open":
+            return time.monotonic() - self._opened_at >= self.reset_timeout
+        return not self._trial_in_flight
+
+    def record_success(self):
+        """Успешный ответ: адрес снова включён"""
+        self.state = "closed"
+        self._failures = 0
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        """Ошибка сервера или сети"""
+        self._trial_in_flight = False
+        self._failures += 1
+        if self.state == "half_open" or self._failures >= self.failure_threshold:
+            if self.state != "open":
+                self.opened += 1
+                logger.warning(f"⚠️ Адрес API отключён на {self.reset_timeout:.0f} с после {self._failures} ошибок")
+            self.state = "open"
+            self._opened_at = time.monotonic()
+
+    def release(self):
+        """Запрос отменён без результата (например, проиграл дублирующему)"""
+        self._trial_in_flight = False
+
+
+class Endpoint:
+    """Адрес API: клиент SDK на общем пуле соединений и его выключатель"""
+
+    def __init__(self, base_url: str, client: AsyncOpenAI, breaker: CircuitBreaker):
+        self.base_url = base_url
+        self.client = client
+        self.breaker = breaker
+        self.requests = 0
+        self.failures = 0
+
+
+def percentile(sorted_values: Sequence[float], q: float) -> float:
+    """Процентиль q (0..1) по отсортированным значениям (ближайший ранг)"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, math.ceil(q * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class ResilientTransport:
+    """
+    Вызовы API с дедлайном, повторами, выключателями и дублирующими запросами
+
+    Запрос отправляется на первый доступный адрес; если за hedge_delay секунд
+    ответа нет, тот же запрос уходит на следующий адрес, и берётся первый
+    успешный ответ. Ошибки 429/5xx/сети повторяются с задержкой
+    base_delay * 2^попытка (полный джиттер, не больше max_delay и с учётом
+    Retry-After), пока не исчерпан дедлайн. Повтор идёт на следующий адрес.
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        base_urls: Sequence[str] = (DEFAULT_BASE_URL,),
+        deadline: float = 30.0,
+        connect_timeout: float = 5.0,
+        max_retries: int = 2,
+        base_delay: float = 0.5,
+        max_delay: float = 4.0,
+        hedge_delay: float = 0.0,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 30.0,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0
+    ):
+        """
+        Args:
+            api_key: API ключ
+            base_urls: Адреса API в порядке приоритета
+            deadline: Общий дедлайн запроса вместе с повторами (сек)
+            connect_timeout: Таймаут установки соединения (сек)
+            max_retries: Повторов после первой попытки
+            base_delay: Начальная задержка повтора (сек)
+            max_delay: Максимальная задержка повтора (сек)
+            hedge_delay: Через сколько секунд дублировать запрос на следующий адрес (0 — не дублировать)
+            max_connections: Размер пула соединений
+            max_keepalive_connections: Сколько соединений держать открытыми
+            keepalive_expiry: Сколько держать простаивающее соединение (сек)
+            failure_threshold: Ошибок подряд до отключения адреса
+            reset_timeout: Время отключения адреса (сек)
+        """
+        if not base_urls:
+            raise ValueError("Не указан ни один адрес API")
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.hedge_delay = hedge_delay
+        # Один пул keep-alive соединений на все адреса; повторы делает транспорт, а не SDK
+        self.http_client = openai.DefaultAsyncHttpxClient(
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections,
+                keepalive_expiry=keepalive_expiry
+            ),
+            timeout=httpx.Timeout(deadline, connect=connect_timeout)
+        )
+        self.endpoints: List[Endpoint] = [
+            Endpoint(
+                base_url,
+                AsyncOpenAI(api_key=api_key, base_url=base_url, http_client=self.http_client, max_retries=0),
+                CircuitBreaker(failure_threshold, reset_timeout)
+            )
+            for base_url in base_urls
+        ]
+        self._latencies: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+        self._requests = 0
+        self._failures = 0
+        self._retries = 0
+        self._hedges = 0
+        self._hedge_wins = 0
+        self._rejected = 0
+
+    def _candidates(self, attempt: int) -> List[Endpoint]:
+        """Доступные адреса, начиная со сдвига на номер попытки"""
+        count = len(self.endpoints)
+        ordered = [self.endpoints[(attempt + i) % count] for i in range(count)]
+        return [endpoint for endpoint in ordered if endpoint.breaker.available()]
+
+    async def _call_endpoint(self, endpoint: Endpoint, call: Callable[[AsyncOpenAI], Awaitable[Any]], timeout: float) -> Any:
+        if not endpoint.breaker.allow():
+            raise CircuitOpenError(f"Адрес {endpoint.base_url} отключён")
+        endpoint.requests += 1
+        try:
+            result = await asyncio.wait_for(call(endpoint.client), timeout)
+        except RETRYABLE_ERRORS:
+            endpoint.failures += 1
+            endpoint.breaker.record_failure()
+            raise
+        except asyncio.CancelledError:
+            endpoint.breaker.release()
+            raise
+        except Exception:
+            # Ошибки запроса (400, 401...) не говорят о неисправности адреса
+            endpoint.breaker.record_success()
+            raise
+        endpoint.breaker.record_success()
+        return result
+
+    async def _attempt(self, call: Callable[[AsyncOpenAI], Awaitable[Any]], attempt: int, timeout: float) -> Any:
+        candidates = self._candidates(attempt)
+        if not candidates:
+            self._rejected += 1
+            raise CircuitOpenError("Все адреса API временно отключены")
+        if self.hedge_delay <= 0 or len(candidates) < 2 or timeout <= self.hedge_delay:
+            return await self._call_endpoint(candidates[0], call, timeout)
+
+        primary = asyncio.create_task(self._call_endpoint(candidates[0], call, timeout))
+        done, _ = await asyncio.wait({primary}, timeout=self.hedge_delay)
+        if done:
+            return primary.result()
+
+        self._hedges += 1
+        hedge = asyncio.create_task(self._call_endpoint(candidates[1], call, timeout - self.hedge_delay))
+        pending = {primary, hedge}
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                winners = [task for task in done if not task.cancelled() and task.exception() is None]
+                if winners:
+                    winner = hedge if hedge in winners else winners[0]
+                    if winner is hedge:
+                        self._hedge_wins += 1
+                    for task in winners:
+                        if task is not winner:
+                            await _close_result(task.result())
+                    return winner.result()
+                for task in done:
+                    error = task.exception() if not task.cancelled() else error
+            raise error or CircuitOpenError("Дублирующие запросы не выполнены")
+        finally:
+            for task in pending:
+                task.cancel()
+            # Проигравший запрос мог успеть вернуть поток — закрываем его после отмены
+            for task in pending:
+                try:
+                    await _close_result(await task)
+                except BaseException:
+                    pass
+
+    def _retry_delay(self, attempt: int, error: BaseException) -> float:
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        response = getattr(error, "response", None)
+        retry_after = response.headers.get("retry-after") if response is not None else None
+        if retry_after:
+            try:
+                delay = max(delay, min(float(retry_after), self.max_delay))
+            except ValueError:
+                pass
+        return delay
+
+    async def request(self, call: Callable[[AsyncOpenAI], Awaitable[Any]]) -> Any:
+        """
+        Выполняет вызов SDK с повторами в пределах дедлайна
+
+        Args:
+            call: Функция, делающая запрос через переданный клиент
+                (например, lambda client: client.chat.completions.create(...))
+
+        Returns:
+            Результат первого успешного вызова
+
+        Raises:
+            CircuitOpenError: Все адреса отключены
+            openai.OpenAIError, asyncio.TimeoutError: Запрос не выполнен
+        """
+        started = time.monotonic()
+        self._requests += 1
+        attempt = 0
+        while True:
+            remaining = self.deadline - (time.monotonic() - started)
+            try:
+                if remaining <= 0:
+                    raise asyncio.TimeoutError("Истёк дедлайн запроса к API")
+                result = await self._attempt(call, attempt, remaining)
+                self._latencies.append(time.monotonic() - started)
+                return result
+            except (*RETRYABLE_ERRORS, CircuitOpenError) as e:
+                delay = self._retry_delay(attempt, e)
+                remaining = self.deadline - (time.monotonic() - started)
+                if attempt >= self.max_retries or delay >= remaining or isinstance(e, CircuitOpenError) and not self._candidates(attempt + 1):
+                    self._failures += 1
+                    self._latencies.append(time.monotonic() - started)
+                    raise
+                attempt += 1
+                self._retries += 1
+                logger.warning(f"⚠️ Повтор запроса к API ({attempt}/{self.max_retries}) через {delay:.2f} с: {type(e).__name__}")
+                await asyncio.sleep(delay)
+            except Exception:
+                self._failures += 1
+                self._latencies.append(time.monotonic() - started)
+                raise
+
+    def stats(self) -> Dict[str, Any]:
+        """Задержки (процентили в мс), доля ошибок, повторы и состояние адресов"""
+        latencies = sorted(self._latencies)
+        return {
+            "requests": self._requests,
+            "failures": self._failures,
+            "error_rate": round(self._failures / self._requests, 4) if self._requests else 0.0,
+            "retries": self._retries,
+            "hedges": self._hedges,
+            "hedge_wins": self._hedge_wins,
+            "circuit_rejections": self._rejected,
+            "latency_ms": {
+                "p50": round(percentile(latencies, 0.5) * 1000, 1),
+                "p90": round(percentile(latencies, 0.9) * 1000, 1),
+                "p99": round(percentile(latencies, 0.99) * 1000, 1),
+                "max": round(latencies[-1] * 1000, 1) if latencies else 0.0,
+                "samples": len(latencies)
+            },
+            "endpoints": [
+                {
+                    "base_url": endpoint.base_url,
+                    "state": endpoint.breaker.state,
+                    "requests": endpoint.requests,
+                    "failures": endpoint.failures,
+                    "opened": endpoint.breaker.opened
+                }
+                for endpoint in self.endpoints
+            ]
+        }
+
+    async def aclose(self):
+        """Закрывает пул соединений"""
+        await self.http_client.aclose()
+
+
+async def _close_result(result: Any):
+    """Закрывает поток ответа, который не понадобился"""
+    close = getattr(result, "close", None)
+    if close is not None:
+        outcome = close()
+        if asyncio.iscoroutine(outcome):
+            await outcome
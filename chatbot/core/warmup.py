@@ -0,0 +1,142 @@
+"""
+Прогрев бота после запуска
+Всё, что иначе готовилось бы внутри первых запросов пользователей (индексы,
+матрица рекомендаций, проверка готовых ответов, токенизатор, кэш ответов),
+строится заранее; пока прогрев не закончен, /ready отвечает 503
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from core.context_manager import ContextManager
+from core.data_loader_new import DataLoaderNew
+from core.openai_client import OpenAIClient
+from core.response_generator import ResponseGenerator
+from prompts.system_prompt import get_static_system_prompt, get_system_prompt_fingerprint
+
+logger = logging.getLogger(__name__)
+
+# Сообщения для прогона маршрутизатора и поиска значков в тексте
+ROUTING_SAMPLES = (
+    "Расскажи про этот значок",
+    "Какие уровни у значка и как подтвердить?",
+    "Дай идеи, как получить значок",
+    "Что посоветуешь по моим интересам?",
+    "Где я сейчас?"
+)
+
+Step = Tuple[str, Callable[[], Any]]
+
+
+class Warmup:
+    """
+    Шаги прогрева и их ход
+
+    Шаги выполняются по порядку в отдельном потоке, чтобы /health и /ready
+    отвечали во время прогрева. Ошибка шага записывается и не останавливает
+    остальные: то, что не прогрелось, просто построится при первом запросе.
+    """
+
+    def __init__(self, steps: List[Step]):
+        """
+        Args:
+            steps: Пары (название шага, функция); результат функции попадает в статус
+        """
+        self.steps = steps
+        self.state = "pending"
+        self.current: Optional[str] = None
+        self._results: Dict[str, Dict[str, Any]] = {}
+        self._started_at: Optional[float] = None
+        self._seconds: Optional[float] = None
+
+    @property
+    def ready(self) -> bool:
+        """Прогрев закончен"""
+        return self.state == "ready"
+
+    def run(self):
+        """Выполняет все шаги"""
+        self.state = "running"
+        self._started_at = time.perf_counter()
+        for name, action in self.steps:
+            self.current = name
+            started = time.perf_counter()
+            try:
+                result = {"result": action()}
+            except Exception as e:
+                logger.warning(f"⚠️ Шаг прогрева {name} не выполнен: {e}")
+                result = {"error": f"{type(e).__name__}: {e}"}
+            result["seconds"] = round(time.perf_counter() - started, 3)
+            self._results[name] = result
+        self.current = None
+        self._seconds = round(time.perf_counter() - self._started_at, 3)
+        self.state = "ready"
+        logger.info(f"🔥 Прогрев завершён за {self._seconds} с")
+
+    async def run_in_thread(self):
+        """Выполняет шаги в отдельном потоке, не занимая event loop"""
+        await asyncio.to_thread(self.run)
+
+    def status(self) -> Dict[str, Any]:
+        """Состояние, пройденные шаги и их длительность"""
+        seconds = self._seconds
+        if seconds is None and self._started_at is not None:
+            seconds = round(time.perf_counter() - self._started_at, 3)
+        return {
+            "state": self.state,
+            "done": len(self._results),
+            "total": len(self.steps),
+            "current": self.current,
+            "seconds": seconds,
+            "errors": sum(1 for result in self._results.values() if "error" in result),
+            "steps": dict(self._results)
+        }
+
+
+def create_warmup(
+    data_loader: DataLoaderNew,
+    openai_client: OpenAIClient,
+    context_manager: ContextManager,
+    response_generator: ResponseGenerator,
+    response_cache_entries: int = 0
+) -> Warmup:
+    """
+    Прогрев для собранных компонентов бота
+
+    Args:
+        data_loader: Загрузчик данных значков
+        openai_client: Клиент OpenAI (токенизатор и кэш ответов)
+        context_manager: Менеджер контекста (матрица рекомендаций)
+        response_generator: Генератор ответов (маршрутизатор, готовые ответы)
+        response_cache_entries: Сколько последних ответов загрузить с диска в кэш (0 — не загружать)
+
+    Returns:
+        Прогрев, готовый к запуску
+    """
+    def catalog() -> int:
+        badges = data_loader.preload_all_categories()
+        data_loader.get_catalog()
+        return badges
+
+    def prompts() -> int:
+        get_system_prompt_fingerprint()
+        # Токены статической части считаются в каждом запросе — кладём в кэш счётчика
+        return openai_client.token_counter.count(get_static_system_prompt())
+
+    def routing() -> List[str]:
+        badge_index = data_loader.get_badge_index()
+        for message in ROUTING_SAMPLES:
+            badge_index.detect(message)
+        return [response_generator.intent_router.route(message) for message in ROUTING_SAMPLES]
+
+    steps: List[Step] = [
+        ("catalog", catalog),
+        ("recommender", context_manager.preload_recommender),
+        ("pregenerated", lambda: response_generator.pregenerated.validate(data_loader.get_all_badges())),
+        ("prompts", prompts),
+        ("routing", routing)
+    ]
+    if response_cache_entries > 0:
+        steps.append(("response_cache", lambda: openai_client.response_cache.prime(response_cache_entries)))
+    return Warmup(steps)
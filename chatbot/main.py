@@ -1,57 +1,188 @@
 """
 Основной файл чат-бота Путеводителя "Реальный Лагерь"
 """
+import asyncio
 import os
 import sys
+import json
 from pathlib import Path
 from typing import Dict, List, Optional
 from datetime import datetime
 
-from fastapi import FastAPI, HTTPException
+from fastapi import BackgroundTasks, FastAPI, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, StreamingResponse
+from starlette.background import BackgroundTask
 import uvicorn
 
 # Добавляем путь к модулям
 sys.path.append(str(Path(__file__).parent))
 
 from core.data_loader_new import DataLoaderNew
-from core.openai_client import OpenAIClient
+from core.catalog import etag_matches, make_etag
+from core.embeddings import create_embedding_model, load_or_build_semantic_index
+from core.openai_client import FALLBACK_ANSWER, OpenAIClient
+from core.response_cache import ResponseCache
 from core.context_manager import ContextManager
+from core.storage import create_storage
+from core.session_cache import SessionCache
 from core.response_generator import ResponseGenerator
+from core.prompt_assembly import ContextAssembler
+from core.conversation_summary import ConversationSummarizer
+from core.local_answers import LocalAnswerEngine
+from core.pregenerated import PregeneratedAnswers
+from core.warmup import Warmup, create_warmup
+from core import prefork
+from prompts.system_prompt import prompt_builder
 from models.conversation import ChatRequest, ChatResponse, Message, UserContext
 from models.badge import Badge, Category
 from contextlib import asynccontextmanager
+import config
 
 # Глобальные переменные для компонентов
 data_loader: Optional[DataLoaderNew] = None
+semantic_index = None
+pregenerated: Optional[PregeneratedAnswers] = None
 openai_client: Optional[OpenAIClient] = None
 context_manager: Optional[ContextManager] = None
 response_generator: Optional[ResponseGenerator] = None
+warmup: Optional[Warmup] = None
+
+
+def load_shared_data():
+    """
+    Загрузка данных значков, эмбеддингов и готовых ответов
+
+    Данные только читаются, поэтому при WORKERS > 1 загружаются один раз в
+    родительском процессе до fork и остаются общими для всех процессов.
+    Повторный вызов (lifespan процесса) ничего не загружает заново.
+    """
+    global data_loader, semantic_index, pregenerated
+
+    if data_loader is None:
+        print("Zagruzka dannyh znachkov...")
+        data_loader = DataLoaderNew(
+            use_ai_data=True,
+            snapshot_path=str(config.AI_DATA_SNAPSHOT_PATH),
+            pack_path=str(config.AI_DATA_BADGE_PACK_PATH)
+        )
+        data_loader.preload_all_categories()  # Все категории и индексы значков
+    if semantic_index is None:
+        print("Zagruzka embeddingov znachkov...")
+        semantic_index = load_or_build_semantic_index(
+            config.EMBEDDINGS_PATH,
+            data_loader.get_all_badges(),
+            create_embedding_model(config.EMBEDDING_MODEL),
+            nlist=config.EMBEDDING_IVF_LISTS
+        )
+        data_loader.attach_semantic_index(semantic_index)
+        print("Postroenie poiskovogo indeksa...")
+        data_loader.get_catalog()
+    if pregenerated is None:
+        pregenerated = PregeneratedAnswers.load(
+            config.PREGENERATED_PATH,
+            source_hash=data_loader.get_badge_source_hash,
+            model=config.OPENAI_MODEL,
+            allow_stub=config.PREGENERATED_ALLOW_STUB
+        )
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Инициализация компонентов при запуске"""
-    global data_loader, openai_client, context_manager, response_generator
+    global openai_client, context_manager, response_generator, warmup
+    warmup_task = None
     
     try:
         # Печать без эмодзи для совместимости с консолью Windows CP1251
         print("Zapusk chat-bota Putevoditelja...")
         
         # Инициализация компонентов
-        print("Zagruzka dannyh znachkov...")
-        data_loader = DataLoaderNew(use_ai_data=True)
-        data_loader.preload_popular_categories()  # Предзагружаем популярные категории
+        load_shared_data()
         
         print("Initsializacija OpenAI klienta...")
-        openai_client = OpenAIClient()
+        response_cache = ResponseCache(
+            max_entries=config.RESPONSE_CACHE_MAX_ENTRIES,
+            ttl_seconds=config.RESPONSE_CACHE_TTL,
+            disk_path=config.RESPONSE_CACHE_PATH or None
+        )
+        openai_client = OpenAIClient(
+            response_cache=response_cache,
+            transport_options={
+                "base_urls": config.OPENAI_BASE_URLS,
+                "deadline": config.OPENAI_TIMEOUT,
+                "connect_timeout": config.OPENAI_CONNECT_TIMEOUT,
+                "max_retries": config.OPENAI_MAX_RETRIES,
+                "base_delay": config.OPENAI_RETRY_BASE_DELAY,
+                "max_delay": config.OPENAI_RETRY_MAX_DELAY,
+                "hedge_delay": config.OPENAI_HEDGE_DELAY,
+                "max_connections": config.OPENAI_MAX_CONNECTIONS,
+                "max_keepalive_connections": config.OPENAI_MAX_KEEPALIVE,
+                "failure_threshold": config.OPENAI_CIRCUIT_FAILURES,
+                "reset_timeout": config.OPENAI_CIRCUIT_RESET
+            }
+        )
         
         print("Nastrojka sistemy konteksta...")
-        context_manager = ContextManager(data_loader)
+        storage_path = "chatbot/storage"
+        shared_storage = config.WORKERS > 1
+        storage_backend = config.STORAGE_BACKEND
+        if shared_storage and storage_backend != "sqlite":
+            # JSON-файлы не годятся для нескольких процессов: нет общей версии и блокировок
+            print(f"WORKERS={config.WORKERS}: hranilishhe {storage_backend} zameneno na sqlite")
+            storage_backend = "sqlite"
+        storage = create_storage(
+            storage_backend,
+            storage_path,
+            config.SESSION_DB_PATH or os.path.join(storage_path, "sessions.db")
+        )
+        context_manager = ContextManager(
+            data_loader,
+            storage_path=storage_path,
+            storage=storage,
+            flush_interval=config.PERSIST_FLUSH_INTERVAL,
+            session_cache=SessionCache(
+                max_entries=config.SESSION_CACHE_MAX_ENTRIES,
+                max_bytes=config.SESSION_CACHE_MAX_BYTES,
+                idle_ttl=config.SESSION_IDLE_TTL
+            ),
+            semantic_index=semantic_index,
+            shared_storage=shared_storage
+        )
+        if config.SESSION_RETENTION_DAYS > 0:
+            purged = context_manager.clear_old_contexts(config.SESSION_RETENTION_DAYS)
+            print(f"Udaleno neaktivnyh polzovatelej: {purged['storage']}")
+        context_manager.writer.start()
         
         print("Initsializacija generatora otvetov...")
-        response_generator = ResponseGenerator(openai_client, data_loader, context_manager)
+        response_generator = ResponseGenerator(
+            openai_client,
+            data_loader,
+            context_manager,
+            ContextAssembler(openai_client.token_counter, budget=config.PROMPT_KNOWLEDGE_TOKENS),
+            ConversationSummarizer(
+                openai_client,
+                openai_client.token_counter,
+                history_budget=config.HISTORY_TOKEN_BUDGET,
+                summary_max_tokens=config.SUMMARY_MAX_TOKENS,
+                batch_messages=config.SUMMARY_BATCH_MESSAGES,
+                batch_tokens=config.SUMMARY_BATCH_TOKENS
+            ),
+            LocalAnswerEngine(data_loader, openai_client.token_counter, intents=config.LOCAL_ANSWER_INTENTS),
+            pregenerated
+        )
+        
+        # Прогрев идёт в фоне: /health отвечает сразу, /ready — после прогрева
+        print("Progrev...")
+        warmup = create_warmup(
+            data_loader,
+            openai_client,
+            context_manager,
+            response_generator,
+            response_cache_entries=config.WARMUP_RESPONSE_CACHE
+        )
+        warmup_task = asyncio.create_task(warmup.run_in_thread())
         
         print("Chat-bot gotov k rabote!")
         
@@ -62,8 +193,15 @@ async def lifespan(app: FastAPI):
     
     yield  # Приложение работает
     
-    # Cleanup (если нужно)
+    # Cleanup: сбрасываем на диск накопленные контексты и диалоги
     print("Chat-bot zavershaet rabotu...")
+    if warmup_task:
+        await warmup_task
+    if context_manager:
+        await context_manager.writer.stop()
+        context_manager.storage.close()
+    if openai_client:
+        await openai_client.transport.aclose()
 
 # Инициализация приложения
 app = FastAPI(
@@ -135,30 +273,63 @@ async def root():
     return HTMLResponse(content=html_content)
 
 
+async def _prepare_chat(request: ChatRequest) -> List[Message]:
+    """Обновляет веб-контекст и историю перед генерацией ответа"""
+    if not response_generator:
+        raise HTTPException(status_code=500, detail="Бот не инициализирован")
+    
+    # Несколько процессов: подхватываем изменения пользователя из других процессов
+    await response_generator.context_manager.refresh_session(request.user_id)
+    
+    # Обрабатываем веб-контекст
+    if request.context:
+        # Обновляем контекст пользователя на основе веб-интерфейса
+        await response_generator.context_manager.update_web_context(
+            user_id=request.user_id,
+            web_context=request.context
+        )
+    
+    # Получаем историю сообщений пользователя
+    conversation_history = response_generator.context_manager.get_conversation_history(request.user_id)
+    
+    # Добавляем новое сообщение пользователя в историю
+    user_message = Message(role="user", content=request.message, metadata={})
+    await response_generator.context_manager.add_message_to_history(request.user_id, user_message)
+    
+    return conversation_history
+
+
+def _error_response(request: ChatRequest, error: Exception) -> ChatResponse:
+    """Дружелюбный ответ вместо 500, чтобы фронтенд не падал"""
+    try:
+        user_ctx = response_generator.context_manager.get_user_context(request.user_id) if response_generator else None
+    except Exception:
+        user_ctx = None
+    # Текст ошибки (адреса, ключи, ответы API) пишем только в лог
+    print(f"Oshibka obrabotki soobshhenija {request.user_id}: {type(error).__name__}: {error}")
+    return ChatResponse(
+        response=FALLBACK_ANSWER,
+        suggestions=[
+            "Покажи все категории значков",
+            "Рекомендуй значки по моим интересам",
+            "Объясни философию системы значков"
+        ],
+        context_updates=user_ctx,
+        metadata={
+            "error": type(error).__name__,
+            "timestamp": datetime.now().isoformat()
+        }
+    )
+
+
 @app.post("/chat", response_model=ChatResponse)
-async def chat(request: ChatRequest):
+async def chat(request: ChatRequest, background_tasks: BackgroundTasks):
     """Основной endpoint для общения с ботом"""
     try:
-        if not response_generator:
-            raise HTTPException(status_code=500, detail="Бот не инициализирован")
-        
-        # Обрабатываем веб-контекст
-        if request.context:
-            # Обновляем контекст пользователя на основе веб-интерфейса
-            response_generator.context_manager.update_web_context(
-                user_id=request.user_id,
-                web_context=request.context
-            )
-        
-        # Получаем историю сообщений пользователя
-        conversation_history = response_generator.context_manager.get_conversation_history(request.user_id)
-        
-        # Добавляем новое сообщение пользователя в историю
-        user_message = Message(role="user", content=request.message, metadata={})
-        response_generator.context_manager.add_message_to_history(request.user_id, user_message)
+        conversation_history = await _prepare_chat(request)
         
         # Генерируем ответ
-        response = response_generator.generate_response(
+        response = await response_generator.generate_response(
             user_message=request.message,
             user_id=request.user_id,
             conversation_history=conversation_history
@@ -166,29 +337,60 @@ async def chat(request: ChatRequest):
         
         # Добавляем ответ бота в историю
         bot_message = Message(role="assistant", content=response.response, metadata=response.metadata)
-        response_generator.context_manager.add_message_to_history(request.user_id, bot_message)
+        await response_generator.context_manager.add_message_to_history(request.user_id, bot_message)
+        # Краткое содержание ранних сообщений обновляется после отправки ответа
+        background_tasks.add_task(response_generator.update_conversation_summary, request.user_id)
         
         return response
         
     except Exception as e:
-        # Возвращаем дружелюбное сообщение вместо 500, чтобы фронтенд не падал
+        return _error_response(request, e)
+
+
+def _sse_event(payload: Dict) -> str:
+    """Форматирует событие Server-Sent Events"""
+    return f"data: {json.dumps(payload, ensure_ascii=False, default=str)}\n\n"
+
+
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """
+    Потоковый endpoint: ответ приходит по мере генерации (Server-Sent Events)
+    
+    События: {"type": "delta", "content"} — очередной кусок текста,
+    {"type": "replace", "content"} — заменить весь текст,
+    {"type": "done", ...ChatResponse} — финальный ответ с подсказками.
+    """
+    async def event_stream():
         try:
-            user_ctx = response_generator.context_manager.get_user_context(request.user_id) if response_generator else None
-        except Exception:
-            user_ctx = None
-        return ChatResponse(
-            response=f"Извини, сейчас не получилось ответить: {str(e)}",
-            suggestions=[
-                "Покажи все категории значков",
-                "Рекомендуй значки по моим интересам",
-                "Объясни философию системы значков"
-            ],
-            context_updates=user_ctx,
-            metadata={
-                "error": str(e),
-                "timestamp": datetime.now().isoformat()
-            }
-        )
+            conversation_history = await _prepare_chat(request)
+            
+            async for event in response_generator.stream_response(
+                user_message=request.message,
+                user_id=request.user_id,
+                conversation_history=conversation_history
+            ):
+                if event["type"] != "done":
+                    yield _sse_event(event)
+                    continue
+                
+                response = event["response"]
+                bot_message = Message(role="assistant", content=response.response, metadata=response.metadata)
+                await response_generator.context_manager.add_message_to_history(request.user_id, bot_message)
+                yield _sse_event({"type": "done", **response.dict()})
+        
+        except Exception as e:
+            response = _error_response(request, e)
+            yield _sse_event({"type": "replace", "content": response.response})
+            yield _sse_event({"type": "done", **response.dict()})
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(response_generator.update_conversation_summary, request.user_id)
+        if response_generator else None
+    )
 
 
 @app.get("/categories")
@@ -286,18 +488,123 @@ async def get_badge_info(badge_id: str):
         raise HTTPException(status_code=500, detail=f"Ошибка получения значка: {str(e)}")
 
 
+def _etag_response(request: Request, response: Response, etag: str) -> Optional[Response]:
+    """Ставит ETag; если клиент прислал тот же ETag, возвращает ответ 304"""
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    return None
+
+
+@app.get("/search")
+async def search_badges(
+    request: Request,
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=200, description="Поисковый запрос"),
+    page: int = Query(1, ge=1),
+    per_page: int = Query(10, ge=1, le=50),
+    category: Optional[str] = Query(None, description="Фильтр по категории"),
+    levels: Optional[int] = Query(None, ge=0, description="Фильтр по количеству уровней"),
+    mode: str = Query("text", pattern="^(text|semantic)$", description="text — по словам, semantic — по смыслу")
+):
+    """Полнотекстовый поиск значков с фасетами и подсветкой"""
+    if not data_loader:
+        raise HTTPException(status_code=500, detail="Загрузчик данных не инициализирован")
+    
+    catalog = data_loader.get_catalog()
+    etag = make_etag("search", catalog.version, q, page, per_page, category, levels, mode)
+    not_modified = _etag_response(request, response, etag)
+    if not_modified:
+        return not_modified
+    return catalog.search(q, page=page, per_page=per_page, category_id=category, levels_count=levels, mode=mode)
+
+
+@app.get("/recommend")
+async def recommend_badges(
+    request: Request,
+    response: Response,
+    user_id: str = Query(..., min_length=1, description="ID пользователя"),
+    limit: int = Query(5, ge=1, le=20)
+):
+    """Персональные рекомендации значков по контексту пользователя"""
+    if not context_manager:
+        raise HTTPException(status_code=500, detail="Менеджер контекста не инициализирован")
+    
+    catalog = data_loader.get_catalog()
+    await context_manager.refresh_session(user_id)
+    context = context_manager.get_user_context(user_id)
+    # Рекомендации зависят только от данных значков и этих полей контекста
+    etag = make_etag("recommend", catalog.version, context.interests, context.current_category, context.level, limit)
+    not_modified = _etag_response(request, response, etag)
+    if not_modified:
+        return not_modified
+    
+    recommendations = context_manager.get_personalized_recommendations(user_id, limit=limit)
+    return {
+        "user_id": user_id,
+        "recommendations": [
+            {
+                **(catalog.card(item["badge"].id) or {"id": item["badge"].id, "title": item["badge"].title}),
+                "score": item["score"],
+                "reason": item["reason"]
+            }
+            for item in recommendations
+        ]
+    }
+
+
 @app.get("/health")
 async def health_check():
     """Проверка состояния бота"""
     return {
-        "status": "healthy",
+        "status": "healthy" if warmup and warmup.ready else "warming_up",
         "timestamp": datetime.now().isoformat(),
         "components": {
             "data_loader": data_loader is not None,
             "openai_client": openai_client is not None,
             "context_manager": context_manager is not None,
             "response_generator": response_generator is not None
-        }
+        },
+        "warmup": warmup.status() if warmup else None
+    }
+
+
+@app.get("/ready")
+async def readiness_check(response: Response):
+    """Готовность принимать трафик: 503, пока не закончен прогрев"""
+    ready = warmup is not None and warmup.ready
+    if not ready:
+        response.status_code = 503
+    return {
+        "ready": ready,
+        "warmup": warmup.status() if warmup else None
+    }
+
+
+@app.get("/metrics")
+async def metrics():
+    """Метрики работы бота"""
+    if not openai_client:
+        raise HTTPException(status_code=503, detail="Бот не инициализирован")
+    return {
+        "response_cache": openai_client.response_cache.stats(),
+        "prompt_cache": openai_client.prompt_cache_stats(),
+        "transport": openai_client.transport.stats(),
+        "single_flight": openai_client.single_flight.stats(),
+        "prompt_builder": prompt_builder.stats(),
+        "pregenerated": response_generator.pregenerated.stats() if response_generator else None,
+        "local_answers": response_generator.local_answers.stats() if response_generator else None,
+        "conversation_summary": response_generator.summarizer.stats() if response_generator else None,
+        "persistence": context_manager.writer.stats() if context_manager else None,
+        "sessions": {
+            "pid": os.getpid(),
+            **context_manager.stats(),
+            **context_manager.sessions.stats()
+        } if context_manager else None,
+        "prompt_tokens": {
+            "tokenizer": openai_client.token_counter.backend,
+            **response_generator.context_assembler.stats.stats()
+        } if response_generator else None
     }
 
 
@@ -307,6 +614,18 @@ if __name__ == "__main__":
     print("🔧 API документация: http://localhost:8000/docs")
     
     port = int(os.environ.get("PORT", 8000))
+    if config.WORKERS > 1:
+        # Процессы запускаются через fork после загрузки данных, а не через
+        # uvicorn --workers: там процессы стартуют заново и грузят всё сами
+        prefork.serve(
+            app,
+            host="0.0.0.0",
+            port=port,
+            workers=config.WORKERS,
+            preload=load_shared_data,
+            log_level="info"
+        )
+        sys.exit(0)
     uvicorn.run(
         "main:app",
         host="0.0.0.0",
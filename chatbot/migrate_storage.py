@@ -0,0 +1,71 @@
+"""
+Однократный перенос контекстов и диалогов из JSON-файлов в SQLite
+
+Запуск:
+    python chatbot/migrate_storage.py --source chatbot/storage --target chatbot/storage/sessions.db
+"""
+import argparse
+import sys
+from pathlib import Path
+
+# Добавляем путь к модулям
+sys.path.append(str(Path(__file__).parent))
+
+from core.storage import CONTEXT, CONVERSATION, FileStorage, SQLiteStorage
+
+
+def migrate(source: str, target: str, batch_size: int = 500) -> int:
+    """
+    Переносит всех пользователей из папки с JSON-файлами в базу SQLite
+
+    Args:
+        source: Папка с context_*.json и conversation_*.json
+        target: Путь к базе SQLite
+        batch_size: Сколько записей сохранять одной транзакцией
+
+    Returns:
+        Количество перенесённых пользователей
+    """
+    files = FileStorage(source)
+    db = SQLiteStorage(target)
+    batch = []
+    users = 0
+    failed = 0
+
+    def flush():
+        nonlocal failed
+        failed += len(db.save_batch(batch))
+        batch.clear()
+
+    try:
+        for user_id in files.iter_user_ids():
+            context = files.load_context(user_id)
+            conversation = files.load_conversation(user_id)
+            if context is not None:
+                batch.append(((CONTEXT, user_id), context.dict()))
+            if conversation is not None:
+                batch.append(((CONVERSATION, user_id), conversation.dict()))
+            users += 1
+            if len(batch) >= batch_size:
+                flush()
+        flush()
+    finally:
+        db.close()
+
+    if failed:
+        print(f"Не удалось перенести записей: {failed}")
+    return users
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Перенос контекстов и диалогов из JSON в SQLite")
+    parser.add_argument("--source", default="chatbot/storage", help="Папка с JSON-файлами")
+    parser.add_argument("--target", default="chatbot/storage/sessions.db", help="Путь к базе SQLite")
+    args = parser.parse_args()
+
+    users = migrate(args.source, args.target)
+    print(f"Перенесено пользователей: {users} -> {args.target}")
+
+
+if __name__ == "__main__":
+    main()
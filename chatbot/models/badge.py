@@ -2,7 +2,7 @@
 Модель данных для значка из Путеводителя
 """
 from typing import List, Optional, Dict, Any, Union
-from pydantic import BaseModel, Field, validator
+from pydantic import BaseModel, Field, SerializeAsAny, validator
 
 
 class BadgeLevel(BaseModel):
@@ -62,7 +62,8 @@ class Category(BaseModel):
     title: str = Field(..., description="Название категории")
     emoji: str = Field(..., description="Эмодзи категории")
     path: str = Field(..., description="Путь к папке категории")
-    badges: List[Badge] = Field(default_factory=list, description="Значки в категории")
+    # SerializeAsAny: значки из упакованного хранилища сериализуют свои ленивые поля сами
+    badges: List[SerializeAsAny[Badge]] = Field(default_factory=list, description="Значки в категории")
     introduction: Optional[str] = Field(None, description="Введение в категорию")
     philosophy: Optional[str] = Field(None, description="Философия категории")
 
@@ -29,6 +29,8 @@ class Conversation(BaseModel):
     conversation_id: str = Field(..., description="ID диалога")
     user_context: UserContext = Field(..., description="Контекст пользователя")
     messages: List[Message] = Field(default_factory=list, description="Сообщения диалога")
+    summary: str = Field(default="", description="Краткое содержание ранних сообщений")
+    summary_until: Optional[datetime] = Field(None, description="Время последнего сообщения, учтённого в summary")
     created_at: datetime = Field(default_factory=datetime.now, description="Время создания")
     updated_at: datetime = Field(default_factory=datetime.now, description="Время обновления")
     is_active: bool = Field(default=True, description="Активен ли диалог")
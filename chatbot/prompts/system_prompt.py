@@ -1,87 +1,67 @@
 """
 Системный промпт для чат-бота Путеводителя
+Статическая часть собирается один раз (и заново — при изменении facts.json),
+секции контекста запоминаются по набору параметров в ограниченном LRU
 """
 
 from .putevoditel_system_prompt_optimized import get_system_prompt_optimized
+from collections import OrderedDict
 from pathlib import Path
+from typing import Dict, Optional, Sequence, Tuple
+import hashlib
 import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
 
 # Используем оптимизированный системный промпт
 SYSTEM_PROMPT = get_system_prompt_optimized()
 
-# Загружаем актуальные факты (адрес, контакты, текущая смена) из файла, если он есть
-_FACTS_PATH = Path(__file__).parent / 'facts.json'
-try:
-    _FACTS = json.loads(_FACTS_PATH.read_text(encoding='utf-8')) if _FACTS_PATH.exists() else None
-except Exception:
-    _FACTS = None
+# Актуальные факты (адрес, контакты, текущая смена); файл перечитывается при изменении
+FACTS_PATH = Path(__file__).parent / 'facts.json'
+# Как часто проверять время изменения facts.json (сек)
+FACTS_CHECK_INTERVAL = 2.0
+# Сколько вариантов секции контекста держать в памяти
+CONTEXT_SECTIONS_MAX_ENTRIES = 1024
 
-def get_system_prompt_with_context(
-    current_category: str = None,
-    current_badge: str = None,
-    user_level: str = "beginner",
-    user_interests: list = None,
-    current_view: str = None,
-    current_level: str = None,
-    current_level_badge_title: str = None
-) -> str:
-    """
-    Получает системный промпт с дополнительным контекстом
-    
-    Args:
-        current_category: Текущая категория пользователя
-        current_badge: Текущий значок пользователя
-        user_level: Уровень пользователя
-        user_interests: Интересы пользователя
-        current_view: Текущий экран приложения
-        current_level: Текущий уровень значка
-        current_level_badge_title: Название конкретного уровня значка
-        
-    Returns:
-        Системный промпт с контекстом
-    """
-    context_parts = []
-    
-    if current_category:
-        context_parts.append(f"Пользователь сейчас изучает категорию: {current_category}")
-    
-    if current_badge:
-        context_parts.append(f"Пользователь интересуется значком: {current_badge}")
-    
-    if user_level:
-        context_parts.append(f"Уровень пользователя: {user_level}")
-    
-    if user_interests:
-        context_parts.append(f"Интересы пользователя: {', '.join(user_interests)}")
-    
-    if current_view:
-        view_names = {
-            'intro': 'Главная страница',
-            'categories': 'Список категорий',
-            'category': 'Категория значков',
-            'badge': 'Страница значка',
-            'badge-level': 'Уровень значка',
-            'introduction': 'Введение в путеводитель',
-            'additional-material': 'Дополнительные материалы',
-            'about-camp': 'Информация о лагере',
-            'registration-form': 'Форма регистрации'
-        }
-        view_name = view_names.get(current_view, current_view)
-        context_parts.append(f"Пользователь находится на экране: {view_name}")
-    
-    if current_level:
-        context_parts.append(f"Текущий уровень значка: {current_level}")
-    
-    if current_level_badge_title:
-        context_parts.append(f"Название конкретного уровня значка: {current_level_badge_title}")
-    
-    # Формируем секцию с актуальными фактами (если доступны)
+# Названия экранов приложения
+VIEW_NAMES = {
+    'intro': 'Главная страница',
+    'categories': 'Список категорий',
+    'category': 'Категория значков',
+    'badge': 'Страница значка',
+    'badge-level': 'Уровень значка',
+    'introduction': 'Введение в путеводитель',
+    'additional-material': 'Дополнительные материалы',
+    'about-camp': 'Информация о лагере',
+    'registration-form': 'Форма регистрации'
+}
+
+# Параметры контекста и шаблоны строк секции в порядке вывода
+_CONTEXT_LINES = (
+    ('current_category', "Пользователь сейчас изучает категорию: {}"),
+    ('current_badge', "Пользователь интересуется значком: {}"),
+    ('user_level', "Уровень пользователя: {}"),
+    ('user_interests', "Интересы пользователя: {}"),
+    ('current_view', "Пользователь находится на экране: {}"),
+    ('current_level', "Текущий уровень значка: {}"),
+    ('current_level_badge_title', "Название конкретного уровня значка: {}"),
+)
+
+ContextKey = Tuple[Optional[str], Optional[str], Optional[str], Tuple[str, ...], Optional[str], Optional[str], Optional[str]]
+
+
+def _build_facts_section(facts: Optional[Dict]) -> str:
+    """Собирает секцию с актуальными фактами (адрес, контакты, текущая смена)"""
     facts_section = ""
-    if _FACTS:
+    if facts:
         facts_lines = []
-        addr = _FACTS.get('address') or {}
-        contacts = _FACTS.get('contacts') or {}
-        season = _FACTS.get('currentSeason') or {}
+        addr = facts.get('address') or {}
+        contacts = facts.get('contacts') or {}
+        season = facts.get('currentSeason') or {}
 
         # Адрес и маршрут
         if any(addr.get(k) for k in ('campName','base','address','route')):
@@ -118,30 +98,223 @@ def get_system_prompt_with_context(
         if facts_lines:
             facts_section = "\n\n" + "\n".join(facts_lines)
 
-    # Формируем секцию контекста экрана/объектов
-    context_section = ""
-    if context_parts:
-        context_section = "\n\n## Текущий контекст:\n" + "\n".join(f"- {part}" for part in context_parts)
+    return facts_section
+
+
+class SystemPromptBuilder:
+    """
+    Сборка системного промпта
+
+    Статическая часть (персона + факты) и её хэш собираются при загрузке фактов.
+    facts.json проверяется не чаще раза в check_interval секунд: если файл
+    изменился, он перечитывается, а промпт собирается заново. Пока один поток
+    перечитывает файл, остальные запросы получают прежнюю версию без ожидания.
+    Секции контекста запоминаются по кортежу параметров.
+    """
+
+    def __init__(
+        self,
+        base_prompt: str,
+        facts_path: Path,
+        check_interval: float = FACTS_CHECK_INTERVAL,
+        max_entries: int = CONTEXT_SECTIONS_MAX_ENTRIES
+    ):
+        """
+        Args:
+            base_prompt: Персона бота
+            facts_path: Путь к facts.json
+            check_interval: Интервал проверки изменения facts.json (сек)
+            max_entries: Лимит запомненных секций контекста
+        """
+        self.base_prompt = base_prompt
+        self.facts_path = Path(facts_path)
+        self.check_interval = check_interval
+        self.max_entries = max_entries
+        self._reload_lock = threading.Lock()
+        self._next_check = 0.0
+        self._facts_mtime: Optional[int] = None
+        self.facts_reloads = 0
+        self._sections: "OrderedDict[ContextKey, str]" = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+        self._load_facts(self._stat_facts())
+
+    def _stat_facts(self) -> Optional[int]:
+        try:
+            return os.stat(self.facts_path).st_mtime_ns
+        except OSError:
+            return None
 
-    return SYSTEM_PROMPT + facts_section + context_section
+    def _load_facts(self, mtime: Optional[int]) -> bool:
+        facts = None
+        if mtime is not None:
+            try:
+                facts = json.loads(self.facts_path.read_text(encoding='utf-8'))
+            except (OSError, ValueError) as e:
+                if self._facts_mtime is not None:
+                    # В файле ошибка — оставляем прежние факты до следующего изменения файла
+                    logger.warning(f"⚠️ facts.json не перечитан: {e}")
+                    self._facts_mtime = mtime
+                    return False
+                logger.warning(f"⚠️ facts.json не загружен: {e}")
+        static_prompt = self.base_prompt + _build_facts_section(facts)
+        # Промпт и хэш заменяются одним присваиванием, чтобы читатели видели согласованную пару
+        self._static = (static_prompt, hashlib.sha256(static_prompt.encode('utf-8')).hexdigest())
+        self._facts_mtime = mtime
+        return True
 
-    return SYSTEM_PROMPT
+    def _refresh(self):
+        """Перечитывает facts.json, если он изменился (не чаще check_interval)"""
+        now = time.monotonic()
+        if now < self._next_check or not self._reload_lock.acquire(blocking=False):
+            return
+        try:
+            self._next_check = now + self.check_interval
+            mtime = self._stat_facts()
+            if mtime != self._facts_mtime and self._load_facts(mtime):
+                self.facts_reloads += 1
+                logger.info("🔄 facts.json изменился, системный промпт пересобран")
+        finally:
+            self._reload_lock.release()
 
+    def static_prompt(self) -> str:
+        """Статическая часть системного промпта"""
+        self._refresh()
+        return self._static[0]
 
-def get_badge_explanation_prompt(badge_info: str) -> str:
+    def fingerprint(self) -> str:
+        """Хэш статической части системного промпта"""
+        self._refresh()
+        return self._static[1]
+
+    def context_section(self, key: ContextKey) -> str:
+        """Секция контекста для кортежа параметров (см. get_context_section)"""
+        section = self._sections.get(key)
+        if section is not None:
+            self._hits += 1
+            self._sections.move_to_end(key)
+            return section
+        self._misses += 1
+        section = self._render_context(key)
+        self._sections[key] = section
+        if len(self._sections) > self.max_entries:
+            self._sections.popitem(last=False)
+        return section
+
+    @staticmethod
+    def _render_context(key: ContextKey) -> str:
+        values = list(key)
+        interests = values[3]
+        values[3] = ', '.join(interests) if interests else None
+        if values[4]:
+            values[4] = VIEW_NAMES.get(values[4], values[4])
+        context_parts = [
+            template.format(value)
+            for (_, template), value in zip(_CONTEXT_LINES, values) if value
+        ]
+        if not context_parts:
+            return ""
+        return "## Текущий контекст:\n" + "\n".join(f"- {part}" for part in context_parts)
+
+    def stats(self) -> Dict:
+        """Попадания в запомненные секции и перезагрузки фактов"""
+        total = self._hits + self._misses
+        return {
+            "context_hits": self._hits,
+            "context_misses": self._misses,
+            "context_entries": len(self._sections),
+            "context_hit_rate": round(self._hits / total, 4) if total else 0.0,
+            "facts_reloads": self.facts_reloads,
+            "fingerprint": self._static[1][:16]
+        }
+
+
+prompt_builder = SystemPromptBuilder(SYSTEM_PROMPT, FACTS_PATH)
+
+
+def get_static_system_prompt() -> str:
+    """
+    Статическая часть системного промпта (персона + факты)
+    
+    Одна и та же строка для всех запросов: с неё начинается каждый запрос к модели,
+    чтобы кэширование промптов на стороне провайдера срабатывало стабильно.
+    """
+    return prompt_builder.static_prompt()
+
+
+def get_context_section(
+    current_category: str = None,
+    current_badge: str = None,
+    user_level: str = "beginner",
+    user_interests: Sequence[str] = None,
+    current_view: str = None,
+    current_level: str = None,
+    current_level_badge_title: str = None
+) -> str:
+    """
+    Секция текущего контекста пользователя (меняется от запроса к запросу)
+    
+    Args:
+        current_category: Текущая категория пользователя
+        current_badge: Текущий значок пользователя
+        user_level: Уровень пользователя
+        user_interests: Интересы пользователя
+        current_view: Текущий экран приложения
+        current_level: Текущий уровень значка
+        current_level_badge_title: Название конкретного уровня значка
+        
+    Returns:
+        Секция "## Текущий контекст" или пустая строка
+    """
+    return prompt_builder.context_section((
+        current_category or None,
+        current_badge or None,
+        user_level or None,
+        tuple(user_interests or ()),
+        current_view or None,
+        current_level or None,
+        current_level_badge_title or None
+    ))
+
+
+def get_system_prompt_with_context(**context) -> str:
+    """
+    Системный промпт одной строкой: статическая часть и секция контекста
+    
+    Args:
+        context: Аргументы get_context_section
+        
+    Returns:
+        Системный промпт с контекстом
+    """
+    context_section = get_context_section(**context)
+    static_part = get_static_system_prompt()
+    return f"{static_part}\n\n{context_section}" if context_section else static_part
+
+
+def get_system_prompt_fingerprint() -> str:
+    """
+    Хэш статической части системного промпта (персона + факты)
+    
+    Меняется при правке промпта или facts.json, поэтому подходит для ключей кэша ответов.
+    """
+    return prompt_builder.fingerprint()
+
+
+def get_badge_explanation_prompt(badge_title: str) -> str:
     """
     Получает промпт для объяснения значка
     
+    Сведения о значке передаются отдельным сообщением-справкой (см. build_prompt_messages).
+    
     Args:
-        badge_info: Информация о значке
+        badge_title: Название значка
         
     Returns:
         Промпт для объяснения
     """
     return f"""
-Объясни этот значок простыми и понятными словами:
-
-{badge_info}
+Объясни значок «{badge_title}» простыми и понятными словами, опираясь на справку о нём.
 
 Твое объяснение должно:
 - Быть понятным для детей и подростков
@@ -154,21 +327,21 @@ def get_badge_explanation_prompt(badge_info: str) -> str:
 """
 
 
-def get_creative_ideas_prompt(badge_info: str, user_context: str = "") -> str:
+def get_creative_ideas_prompt(badge_title: str, user_context: str = "") -> str:
     """
     Получает промпт для генерации креативных идей
     
+    Сведения о значке передаются отдельным сообщением-справкой (см. build_prompt_messages).
+    
     Args:
-        badge_info: Информация о значке
+        badge_title: Название значка
         user_context: Контекст пользователя
         
     Returns:
         Промпт для генерации идей
     """
     return f"""
-Придумай 3-5 креативных и практических идей для получения этого значка:
-
-{badge_info}
+Придумай 3-5 креативных и практических идей для получения значка «{badge_title}» (сведения о нём — в справке).
 
 {f"Контекст пользователя: {user_context}" if user_context else ""}
 
@@ -208,3 +381,35 @@ def get_recommendation_prompt(user_interests: list, user_level: str) -> str:
 
 Будь конкретной и мотивирующей! 🌟
 """
+
+
+# Задача для краткого содержания диалога (без персоны: это служебный запрос)
+CONVERSATION_SUMMARY_SYSTEM_PROMPT = """
+Ты ведёшь краткое содержание разговора чат-бота-вожатого НейроВалюши с пользователем.
+Обнови содержание, добавив в него новые реплики. Сохрани главное: интересы и цели
+пользователя, о каких значках и категориях шла речь, что уже объяснено и о чём договорились.
+Пиши по-русски, сжато, в третьем лице, без приветствий и эмодзи.
+""".strip()
+
+
+def get_conversation_summary_prompt(summary: str, transcript: str, max_words: int) -> str:
+    """
+    Получает промпт для обновления краткого содержания диалога
+    
+    Args:
+        summary: Текущее краткое содержание (пусто — ещё не составлялось)
+        transcript: Новые реплики, вышедшие из окна истории
+        max_words: Ограничение длины содержания
+        
+    Returns:
+        Промпт для обновления содержания
+    """
+    return f"""
+Текущее краткое содержание:
+{summary or "—"}
+
+Новые реплики:
+{transcript}
+
+Верни обновлённое краткое содержание целиком, не длиннее {max_words} слов.
+"""
@@ -42,7 +42,7 @@ async function sendMessage(message = null) {
     const loadingId = addMessage('Думаю... 🤔', 'bot');
     
     try {
-        const response = await fetch('/chat', {
+        const response = await fetch('/chat/stream', {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
@@ -53,16 +53,11 @@ async function sendMessage(message = null) {
             })
         });
         
-        const data = await response.json();
-        
-        // Удаляем индикатор загрузки
-        removeMessage(loadingId);
-        
-        // Добавляем ответ бота
-        addMessage(data.response, 'bot');
+        if (!response.ok || !response.body) {
+            throw new Error('stream unavailable');
+        }
         
-        // Обновляем предложения
-        updateSuggestions(data.suggestions || []);
+        await readChatStream(response.body, loadingId);
         
     } catch (error) {
         removeMessage(loadingId);
@@ -70,6 +65,42 @@ async function sendMessage(message = null) {
     }
 }
 
+// Читает поток Server-Sent Events от /chat/stream и дописывает ответ по мере прихода токенов
+async function readChatStream(body, messageId) {
+    const reader = body.getReader();
+    const decoder = new TextDecoder('utf-8');
+    const messageElement = document.getElementById(messageId);
+    const container = document.getElementById('chatContainer');
+    let buffer = '';
+    let text = '';
+    
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        
+        // События разделены пустой строкой
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const rawEvent = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+            if (!rawEvent.startsWith('data: ')) continue;
+            
+            const event = JSON.parse(rawEvent.slice(6));
+            if (event.type === 'delta') {
+                text += event.content;
+            } else if (event.type === 'replace') {
+                text = event.content;
+            } else if (event.type === 'done') {
+                text = event.response;
+                updateSuggestions(event.suggestions || []);
+            }
+            messageElement.textContent = text;
+            container.scrollTop = container.scrollHeight;
+        }
+    }
+}
+
 function addMessage(text, sender) {
     const container = document.getElementById('chatContainer');
     const messageDiv = document.createElement('div');
@@ -0,0 +1,114 @@
+"""
+Общие фикстуры тестов
+Тесты запускаются из chatbot/ или из корня репозитория: python -m pytest chatbot
+"""
+import asyncio
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import config
+from core.context_manager import ContextManager
+from core.data_loader_new import DataLoaderNew
+from core.openai_client import OpenAIClient
+from core.prompt_assembly import get_token_counter
+from core.storage import FileStorage
+
+
+@pytest.fixture(scope="session")
+def data_loader() -> DataLoaderNew:
+    """Загрузчик настоящей папки public/ai-data, без снимка и хранилища"""
+    return DataLoaderNew(ai_data_path=str(config.AI_DATA_PATH))
+
+
+@pytest.fixture(scope="session")
+def counter():
+    """Счётчик токенов модели бота"""
+    return get_token_counter("gpt-4o-mini")
+
+
+class FakeStream:
+    """Поток чанков chat.completions (stream=True): дельты и в конце usage"""
+
+    def __init__(self, deltas, usage):
+        self._chunks = [
+            SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=delta))], usage=None)
+            for delta in deltas
+        ]
+        self._chunks.append(SimpleNamespace(choices=[], usage=usage))
+        self.closed = False
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for chunk in self._chunks:
+            await asyncio.sleep(0)
+            yield chunk
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeCompletions:
+    """
+    Заглушка client.chat.completions: отвечает reply (потоком — кусками по chunk_size)
+    после delay секунд и запоминает параметры запросов
+    """
+
+    def __init__(self, reply: str = "Ответ модели.", delay: float = 0.0, chunk_size: int = 5):
+        self.reply = reply
+        self.delay = delay
+        self.chunk_size = chunk_size
+        self.calls = []
+        self.usage = SimpleNamespace(prompt_tokens=100, prompt_tokens_details=SimpleNamespace(cached_tokens=64))
+
+    async def create(self, **kwargs):
+        self.calls.append(kwargs)
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        reply = self.reply(kwargs) if callable(self.reply) else self.reply
+        if kwargs.get("stream"):
+            deltas = [reply[i:i + self.chunk_size] for i in range(0, len(reply), self.chunk_size)]
+            return FakeStream(deltas, self.usage)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=reply))],
+            usage=self.usage
+        )
+
+
+class FakeTransport:
+    """Транспорт без сети: вызов SDK выполняется на заглушке"""
+
+    def __init__(self, completions: FakeCompletions):
+        self.client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+
+    async def request(self, call):
+        return await call(self.client)
+
+    def stats(self):
+        return {}
+
+    async def aclose(self):
+        pass
+
+
+@pytest.fixture
+def make_openai_client():
+    """Фабрика OpenAIClient на заглушке API: make_openai_client(**параметры FakeCompletions)"""
+    def make(response_cache=None, **options):
+        client = OpenAIClient(api_key="test", response_cache=response_cache)
+        client.completions = FakeCompletions(**options)
+        client.transport = FakeTransport(client.completions)
+        return client
+    return make
+
+
+@pytest.fixture
+def context_manager(data_loader, tmp_path) -> ContextManager:
+    """Менеджер контекста с файловым хранилищем во временной папке"""
+    return ContextManager(data_loader, storage=FileStorage(str(tmp_path / "storage")))
@@ -0,0 +1,80 @@
+"""
+BadgeIndex: распознавание значков и категорий совпадает с прежним перебором,
+поиск по названию — с прежним сравнением названий
+"""
+import re
+
+import pytest
+
+from core.badge_index import BadgeIndex, normalize_title
+
+
+def _mentions(message: str, title: str, emoji: str, entity_id: str, prefixes) -> bool:
+    """Прежняя проверка из detect_context_from_message (номер — с границей: "1.1" не часть "1.12")"""
+    message_lower = message.lower()
+    if title.lower() == message_lower or f" {title.lower()} " in f" {message_lower} " or emoji in message:
+        return True
+    return any(re.search(rf"{prefix}{re.escape(entity_id)}(?!\d)", message_lower) for prefix in prefixes)
+
+
+def _legacy_detect(categories, badges, message):
+    category = next((c for c in categories if _mentions(message, c.title, c.emoji, c.id, ("категория ", "категории "))), None)
+    badge = next((b for b in badges if _mentions(message, b.title, b.emoji, b.id, ("значок ", "значка "))), None)
+    return category, badge
+
+
+@pytest.fixture(scope="module")
+def index(data_loader):
+    return BadgeIndex(data_loader.get_all_categories(), data_loader.get_all_badges())
+
+
+def _messages(data_loader):
+    badges = data_loader.get_all_badges()
+    categories = data_loader.get_all_categories()
+    messages = ["привет", "что посоветуешь?", "значок 1.12345", "категория 99"]
+    for badge in badges:
+        messages.append(f"расскажи про {badge.title.lower()}, пожалуйста")
+        messages.append(badge.title)
+        messages.append(f"что за {badge.emoji} такой?")
+        messages.append(f"как получить значок {badge.id}?")
+    for category in categories:
+        messages.append(f"Что есть в категории {category.id}?")
+        messages.append(f"хочу в {category.title} и {badges[-1].title}")
+    return messages
+
+
+def test_detect_matches_legacy_scan(index, data_loader):
+    categories = data_loader.get_all_categories()
+    badges = data_loader.get_all_badges()
+    for message in _messages(data_loader):
+        expected = _legacy_detect(categories, badges, message)
+        category, badge = index.detect(message)
+        assert (category and category.id, badge and badge.id) == (
+            expected[0] and expected[0].id, expected[1] and expected[1].id
+        ), message
+
+
+def test_badge_id_needs_boundary(index, data_loader):
+    badge = data_loader.get_all_badges()[0]
+    _, found = index.detect(f"значок {badge.id}9")
+    assert found is None or found.id == f"{badge.id}9"
+
+
+def test_normalize_title():
+    assert normalize_title('  «Ёлочный»   ЗНАЧОК ') == "елочный значок"
+
+
+def test_badge_by_title_matches_linear_search(index, data_loader):
+    badges = data_loader.get_all_badges()
+    for badge in badges:
+        expected = next(b for b in badges if normalize_title(b.title) == normalize_title(badge.title))
+        assert index.badge_by_title(f' "{badge.title.upper()}" ') is expected
+    assert index.badge_by_title("нет такого значка") is None
+
+
+def test_level_by_title(index, data_loader):
+    for badge in data_loader.get_all_badges():
+        for level in badge.levels:
+            found = index.level_by_title(level.title.lower())
+            assert found is not None
+            assert normalize_title(found.title) == normalize_title(level.title)
@@ -0,0 +1,93 @@
+"""
+BadgePack: те же данные, что и папка, с ленивым чтением тяжёлых полей
+"""
+import json
+import shutil
+
+import pytest
+
+import config
+
+from core.ai_data_loader import AIDataLoader
+from core.badge_store import HEAVY_FIELDS, BadgePack, LazyBadge, build_badge_pack
+from core.snapshot import build_snapshot
+from test_snapshot import ai_data, dump_loader  # noqa: F401 (фикстура)
+
+
+@pytest.fixture(scope="module")
+def pack_path(ai_data, tmp_path_factory):
+    path = tmp_path_factory.mktemp("pack") / "badges.pack"
+    build_badge_pack(build_snapshot(ai_data), path)
+    return path
+
+
+def test_pack_matches_folder(ai_data, pack_path):
+    from_pack = AIDataLoader(str(ai_data), pack_path=str(pack_path))
+    assert from_pack.snapshot_info is not None
+    assert dump_loader(from_pack) == dump_loader(AIDataLoader(str(ai_data)))
+
+
+def test_source_hashes_match_folder(ai_data, pack_path):
+    from_pack = AIDataLoader(str(ai_data), pack_path=str(pack_path))
+    from_folder = AIDataLoader(str(ai_data))
+    for info in from_folder.get_all_categories():
+        for badge in from_folder.get_category(info['id']).badges:
+            assert from_pack.get_badge_source_hash(badge.id) == from_folder.get_badge_source_hash(badge.id)
+
+
+def test_heavy_fields_are_read_on_access(pack_path):
+    pack = BadgePack(pack_path)
+    try:
+        badge_id = next(iter(pack.level_badge_ids().values()))
+        badge = pack.get_badge(badge_id)
+        assert isinstance(badge, LazyBadge)
+        assert not set(HEAVY_FIELDS) & set(badge.__dict__)
+        reads = pack.stats()['heavy_reads']
+
+        badge.skillTips
+        badge.skillTips
+        assert pack.stats()['heavy_reads'] == reads + 2
+
+        # Уровни декодируются один раз и остаются в объекте
+        levels = badge.levels
+        assert levels
+        assert badge.levels is levels
+        assert pack.stats()['heavy_reads'] == reads + 3
+    finally:
+        pack.close()
+
+
+def test_lazy_badge_serializes_all_fields(ai_data, pack_path):
+    pack = BadgePack(pack_path)
+    try:
+        folder = AIDataLoader(str(ai_data))
+        badge_id = next(iter(pack.level_badge_ids().values()))
+        assert pack.get_badge(badge_id).model_dump() == folder.get_badge(badge_id).model_dump()
+    finally:
+        pack.close()
+
+
+def test_unknown_badge(pack_path):
+    pack = BadgePack(pack_path)
+    try:
+        assert pack.get_badge("999.999") is None
+        assert "999.999" not in pack
+    finally:
+        pack.close()
+
+
+def test_stale_pack_falls_back_to_folder(tmp_path, caplog):
+    ai_data = tmp_path / "ai-data"
+    shutil.copytree(config.AI_DATA_PATH, ai_data)
+    pack_path = tmp_path / "badges.pack"
+    build_badge_pack(build_snapshot(ai_data), pack_path)
+
+    badge_path = next(ai_data.rglob("1.1.json"))
+    data = json.loads(badge_path.read_text(encoding='utf-8'))
+    data['title'] = "Изменённое название"
+    badge_path.write_text(json.dumps(data, ensure_ascii=False), encoding='utf-8')
+
+    loader = AIDataLoader(str(ai_data), pack_path=str(pack_path))
+    assert loader.snapshot_info is None
+    assert loader.get_badge("1.1").title == "Изменённое название"
+    assert "изменилась после сборки" in caplog.text
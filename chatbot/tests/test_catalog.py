@@ -0,0 +1,89 @@
+"""
+Каталог значков: ETag, фасеты и пагинация поиска
+"""
+import pytest
+
+from core.catalog import BadgeCatalog, etag_matches, make_etag
+from core.embeddings import HashingEmbedding, SemanticIndex
+
+
+def test_etag_depends_on_every_part():
+    etag = make_etag("search", "v1", "спорт", 1)
+    assert etag.startswith('W/"') and etag.endswith('"')
+    assert etag == make_etag("search", "v1", "спорт", 1)
+    assert etag != make_etag("search", "v2", "спорт", 1)
+    assert etag != make_etag("search", "v1", "спорт", 2)
+
+
+def test_etag_matches_weak_list_and_star():
+    etag = make_etag("x")
+    assert etag_matches(etag, etag)
+    assert etag_matches(etag[2:], etag)
+    assert etag_matches(f'W/"other", {etag}', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches(None, etag)
+    assert not etag_matches('W/"other"', etag)
+
+
+@pytest.fixture(scope="module")
+def catalog(data_loader) -> BadgeCatalog:
+    return BadgeCatalog(data_loader.get_all_categories(), data_loader.get_search_index())
+
+
+def test_cards_match_badges(catalog, data_loader):
+    badge = data_loader.get_badge("1.1")
+    card = catalog.card("1.1")
+    assert card["title"] == badge.title
+    assert card["category_id"] == badge.categoryId
+    assert card["levels_count"] == len(badge.levels) == catalog.levels_count("1.1")
+    assert catalog.card("999.999") is None
+
+
+def test_pages_cover_all_hits(catalog):
+    first = catalog.search("значок", page=1, per_page=5)
+    assert first["total"] > 5
+    assert first["pages"] == (first["total"] + 4) // 5
+    ids = []
+    for page in range(1, first["pages"] + 1):
+        ids.extend(result["id"] for result in catalog.search("значок", page=page, per_page=5)["results"])
+    assert len(ids) == len(set(ids)) == first["total"]
+    assert catalog.search("значок", page=first["pages"] + 1, per_page=5)["results"] == []
+
+
+def test_facets_are_counted_before_filters(catalog):
+    full = catalog.search("значок", per_page=5)
+    categories = {facet["id"]: facet["count"] for facet in full["facets"]["categories"]}
+    assert sum(categories.values()) == full["total"]
+    assert sum(facet["count"] for facet in full["facets"]["levels_count"]) == full["total"]
+
+    category_id, count = next(iter(categories.items()))
+    filtered = catalog.search("значок", per_page=5, category_id=category_id)
+    assert filtered["total"] == count
+    assert all(result["category_id"] == category_id for result in filtered["results"])
+    assert filtered["facets"] == full["facets"]
+
+    levels = full["facets"]["levels_count"][0]
+    by_levels = catalog.search("значок", per_page=100, levels_count=levels["levels_count"])
+    assert by_levels["total"] == levels["count"]
+    assert all(result["levels_count"] == levels["levels_count"] for result in by_levels["results"])
+
+
+def test_results_are_highlighted(catalog):
+    result = catalog.search("Валюша")["results"][0]
+    assert result["id"] == "1.1"
+    assert "<mark>" in result["highlight"]["title"]
+
+
+def test_semantic_mode_without_index_falls_back_to_text(catalog):
+    assert catalog.search("спорт", mode="semantic")["mode"] == "text"
+
+
+def test_semantic_mode(data_loader):
+    badges = data_loader.get_all_badges()
+    semantic_index = SemanticIndex.build(badges, HashingEmbedding())
+    catalog = BadgeCatalog(data_loader.get_all_categories(), data_loader.get_search_index(), semantic_index)
+    response = catalog.search("Валюша", mode="semantic")
+    assert response["mode"] == "semantic"
+    assert response["results"][0]["id"] == "1.1"
+    # Версия каталога учитывает модель эмбеддингов
+    assert catalog.version.endswith(":hashing-512")
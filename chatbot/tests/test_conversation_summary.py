@@ -0,0 +1,142 @@
+"""
+Краткое содержание диалога: окно истории и обновление содержания пачками
+"""
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from core.conversation_summary import MAX_WINDOW_MESSAGES, ConversationSummarizer
+from models.conversation import Message
+
+START = datetime(2026, 1, 1, 12, 0)
+
+
+def _message(i: int, content: str = "") -> Message:
+    return Message(
+        role="user" if i % 2 == 0 else "assistant",
+        content=content or f"реплика {i}",
+        timestamp=START + timedelta(seconds=i),
+        metadata={}
+    )
+
+
+def _summarizer(client, counter, **options) -> ConversationSummarizer:
+    options.setdefault("history_budget", 10_000)
+    options.setdefault("batch_tokens", 10_000)
+    return ConversationSummarizer(client, counter, **options)
+
+
+def _transcripts(client):
+    """Новые реплики из каждого запроса на обновление содержания"""
+    return [
+        [
+            line.split(": ", 1)[1]
+            for line in call["messages"][1]["content"].splitlines()
+            if line.startswith(("Пользователь: ", "Бот: "))
+        ]
+        for call in client.completions.calls
+    ]
+
+
+def test_window_respects_budget_and_message_limit(counter, make_openai_client):
+    summarizer = _summarizer(make_openai_client(), counter, history_budget=60)
+    messages = [_message(i, "слово " * 10) for i in range(6)]
+    start = summarizer.window_start(messages)
+    assert 0 < start < len(messages)
+    assert sum(counter.count(message.content) + 4 for message in messages[start:]) <= 60
+    # Последнее сообщение входит в окно, даже если длиннее бюджета
+    assert summarizer.window([_message(0, "слово " * 500)])
+    many = [_message(i) for i in range(30)]
+    assert len(_summarizer(make_openai_client(), counter).window(many)) == MAX_WINDOW_MESSAGES
+
+
+def test_summary_is_updated_in_batches(counter, context_manager, make_openai_client):
+    client = make_openai_client(reply="Содержание")
+    summarizer = _summarizer(client, counter, batch_messages=6)
+
+    async def run():
+        for i in range(30):
+            await context_manager.add_message_to_history("u", _message(i))
+            await summarizer.update(context_manager, "u")
+
+    asyncio.run(run())
+    # Вне окна сообщения появляются с 11-го, содержание дописывается на 16-м, 22-м и 28-м
+    assert len(client.completions.calls) == 3
+    assert _transcripts(client) == [[f"реплика {i}" for i in range(first, first + 6)] for first in (0, 6, 12)]
+    conversation = context_manager.get_conversation("u")
+    assert conversation.summary == "Содержание"
+    assert conversation.summary_until == START + timedelta(seconds=17)
+    stats = summarizer.stats()
+    assert stats["updates"] == 3
+    assert stats["deferred"] == 30 - MAX_WINDOW_MESSAGES - 3
+
+
+def test_long_messages_trigger_batch_by_tokens(counter, context_manager, make_openai_client):
+    client = make_openai_client(reply="Содержание")
+    summarizer = _summarizer(client, counter, batch_messages=100, batch_tokens=50)
+
+    async def run():
+        for i in range(MAX_WINDOW_MESSAGES + 1):
+            await context_manager.add_message_to_history("u", _message(i, "длинное сообщение " * 20))
+        return await summarizer.update(context_manager, "u")
+
+    assert asyncio.run(run()) is True
+    assert len(client.completions.calls) == 1
+
+
+def test_previous_summary_is_extended(counter, context_manager, make_openai_client):
+    client = make_openai_client(reply="Новое содержание")
+    summarizer = _summarizer(client, counter, batch_messages=1)
+
+    async def run():
+        for i in range(MAX_WINDOW_MESSAGES + 1):
+            await context_manager.add_message_to_history("u", _message(i))
+        await context_manager.update_conversation_summary("u", "Старое содержание", START - timedelta(seconds=1))
+        await summarizer.update(context_manager, "u")
+
+    asyncio.run(run())
+    prompt = client.completions.calls[0]["messages"][1]["content"]
+    assert "Старое содержание" in prompt
+    assert context_manager.get_conversation("u").summary == "Новое содержание"
+    assert summarizer.summary_section(context_manager.get_conversation("u")).endswith("\nНовое содержание")
+
+
+def test_model_error_keeps_summary(counter, context_manager, make_openai_client):
+    client = make_openai_client()
+
+    async def fail(**kwargs):
+        raise RuntimeError("сеть недоступна")
+
+    client.completions.create = fail
+    summarizer = _summarizer(client, counter, batch_messages=1)
+
+    async def run():
+        for i in range(MAX_WINDOW_MESSAGES + 1):
+            await context_manager.add_message_to_history("u", _message(i))
+        return await summarizer.update(context_manager, "u")
+
+    assert asyncio.run(run()) is False
+    conversation = context_manager.get_conversation("u")
+    assert conversation.summary == "" and conversation.summary_until is None
+    assert summarizer.stats()["errors"] == 1
+
+
+def test_concurrent_update_for_same_user_is_skipped(counter, context_manager, make_openai_client):
+    client = make_openai_client(reply="Содержание", delay=0.05)
+    summarizer = _summarizer(client, counter, batch_messages=1)
+
+    async def run():
+        for i in range(MAX_WINDOW_MESSAGES + 1):
+            await context_manager.add_message_to_history("u", _message(i))
+        return await asyncio.gather(summarizer.update(context_manager, "u"), summarizer.update(context_manager, "u"))
+
+    assert sorted(asyncio.run(run())) == [False, True]
+    assert len(client.completions.calls) == 1
+    assert summarizer.stats()["skipped"] == 1
+
+
+def test_batch_tokens_default_to_half_budget(counter, make_openai_client):
+    summarizer = ConversationSummarizer(make_openai_client(), counter, history_budget=1000)
+    assert summarizer.batch_tokens == 500
+    assert not summarizer.batch_ready([])
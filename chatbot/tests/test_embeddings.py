@@ -0,0 +1,127 @@
+"""
+Эмбеддинги значков: модель, индекс ближайших соседей и файл build_embeddings.py
+"""
+import numpy as np
+import pytest
+
+from core.embeddings import (
+    EmbeddingModel, HashingEmbedding, SemanticIndex, VectorIndex, create_embedding_model,
+    embedding_source_hash, load_or_build_semantic_index, write_embeddings
+)
+
+
+def test_embedding_model_is_abstract():
+    with pytest.raises(TypeError):
+        EmbeddingModel()
+
+
+def test_hashing_embedding_is_deterministic_and_normalized():
+    model = HashingEmbedding(dim=64)
+    vectors = model.embed(["Спортивные игры", "спорт", ""])
+    assert vectors.shape == (3, 64) and vectors.dtype == np.float32
+    np.testing.assert_allclose(np.linalg.norm(vectors[:2], axis=1), 1.0, rtol=1e-6)
+    assert not vectors[2].any()
+    np.testing.assert_array_equal(vectors, HashingEmbedding(dim=64).embed(["Спортивные игры", "спорт", ""]))
+
+
+def test_related_words_are_closer():
+    model = HashingEmbedding()
+    sport, sporty, music = model.embed(["спорт", "спортивный", "музыка"])
+    assert sport @ sporty > sport @ music
+
+
+def test_create_embedding_model():
+    assert create_embedding_model("hashing").name == "hashing-512"
+    assert create_embedding_model("hashing-128").dim == 128
+    with pytest.raises(ValueError):
+        create_embedding_model("unknown")
+
+
+def _random_vectors(count: int, dim: int = 16) -> np.ndarray:
+    vectors = np.random.default_rng(1).normal(size=(count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def test_vector_index_exact_search():
+    vectors = _random_vectors(50)
+    index = VectorIndex([str(i) for i in range(50)], vectors)
+    results = index.search(vectors[7], k=5)
+    assert results[0][0] == "7"
+    assert results[0][1] == pytest.approx(1.0, abs=1e-5)
+    assert [score for _, score in results] == sorted((score for _, score in results), reverse=True)
+    expected = np.argsort(-(vectors @ vectors[7]), kind='stable')[:5]
+    assert [badge_id for badge_id, _ in results] == [str(i) for i in expected]
+
+
+def test_ivf_probing_all_clusters_matches_exact():
+    vectors = _random_vectors(200)
+    ids = [str(i) for i in range(200)]
+    exact = VectorIndex(ids, vectors)
+    ivf = VectorIndex(ids, vectors, nlist=8, nprobe=2)
+    assert ivf.centroids is not None
+    assert sum(len(rows) for rows in ivf._lists) == 200
+    query = vectors[3]
+    assert ivf.search(query, k=1)[0][0] == "3"
+    assert [badge_id for badge_id, _ in ivf.search(query, k=10, nprobe=8)] == \
+        [badge_id for badge_id, _ in exact.search(query, k=10)]
+
+
+@pytest.fixture(scope="module")
+def badges(data_loader):
+    return data_loader.get_all_badges()
+
+
+def test_semantic_search_finds_badge_by_its_text(badges):
+    index = SemanticIndex.build(badges, HashingEmbedding())
+    badge = badges[10]
+    assert index.search(f"{badge.title} {badge.description}", k=1)[0][0] == badge.id
+    assert index.source_hash == embedding_source_hash(badges)
+
+
+def test_embeddings_file_round_trip(badges, tmp_path):
+    path = tmp_path / "embeddings.npz"
+    model = HashingEmbedding()
+    size = write_embeddings(path, badges, model)
+    assert size == len(badges) * model.dim * 2
+
+    loaded = SemanticIndex.load(path, model)
+    built = SemanticIndex.build(badges, model)
+    assert loaded.index.ids == built.index.ids
+    np.testing.assert_allclose(loaded.index.vectors, built.index.vectors, atol=1e-6)
+    assert loaded.source_hash == built.source_hash
+
+    with pytest.raises(ValueError):
+        SemanticIndex.load(path, HashingEmbedding(dim=64))
+
+
+def test_load_or_build_uses_fresh_file(badges, tmp_path):
+    path = tmp_path / "embeddings.npz"
+    model = HashingEmbedding()
+    write_embeddings(path, badges, model)
+    # Портим порядок векторов: так видно, что индекс взят из файла, а не построен заново
+    with np.load(path) as data:
+        arrays = dict(data)
+    arrays['vectors'] = arrays['vectors'][::-1].copy()
+    np.savez(path, **arrays)
+    index = load_or_build_semantic_index(path, badges, model)
+    np.testing.assert_array_equal(index.index.vectors[0], SemanticIndex.load(path, model).index.vectors[0])
+
+
+def test_load_or_build_rebuilds_stale_file(badges, tmp_path, caplog):
+    path = tmp_path / "embeddings.npz"
+    model = HashingEmbedding()
+    write_embeddings(path, badges[:-1], model)
+    index = load_or_build_semantic_index(path, badges, model)
+    assert len(index.index.ids) == len(badges)
+    assert index.source_hash == embedding_source_hash(badges)
+    assert "собраны по другим данным" in caplog.text
+
+
+def test_load_or_build_without_file(badges, tmp_path, caplog):
+    index = load_or_build_semantic_index(tmp_path / "missing.npz", badges, HashingEmbedding())
+    assert len(index.index.ids) == len(badges)
+    broken = tmp_path / "broken.npz"
+    broken.write_bytes(b"not a zip")
+    index = load_or_build_semantic_index(broken, badges, HashingEmbedding())
+    assert len(index.index.ids) == len(badges)
+    assert "не загружены" in caplog.text
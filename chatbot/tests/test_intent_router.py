@@ -0,0 +1,54 @@
+"""
+IntentRouter: таблица правил даёт те же типы запросов, что прежние цепочки any()
+"""
+import itertools
+
+from benchmarks.intent_routing import LEGACY_RULES, legacy_analyze_request_type
+from core.intent_router import INTENT_RULES, IntentRouter
+from models.conversation import UserContext
+
+VIEWS = ("", "intro", "introduction", "category", "badge", "badge-level", "categories", "chat")
+
+
+def _contexts():
+    for view, level, badge, category in itertools.product(VIEWS, ("", "2"), (None, "7.1"), (None, "7")):
+        session_data = {"current_view": view}
+        if level:
+            session_data["current_level"] = level
+        yield UserContext(user_id="test", current_category=category, current_badge=badge, session_data=session_data)
+
+
+def _messages():
+    keywords = sorted({keyword for rule in INTENT_RULES for keyword in rule.keywords})
+    messages = ["привет!", "мне нравится рисовать", "ИИ и нейросети", ""]
+    messages += [f"Скажи, {keyword}?" for keyword in keywords]
+    messages += [keyword.upper() for keyword in keywords]
+    # Пары слов разных правил: важен приоритет
+    messages += [f"{first} и {second}" for first, second in zip(keywords, reversed(keywords))]
+    return messages
+
+
+def _route(router: IntentRouter, message: str, context: UserContext) -> str:
+    context_flags = (
+        bool(context.session_data.get('current_level', '')),
+        bool(context.current_badge),
+        bool(context.current_category)
+    )
+    return router.route(message, context.session_data.get('current_view', ''), context_flags)
+
+
+def test_router_matches_legacy_chains():
+    router = IntentRouter(LEGACY_RULES)
+    contexts = list(_contexts())
+    for message in _messages():
+        for context in contexts:
+            assert _route(router, message, context) == legacy_analyze_request_type(message, context), (
+                message, context.session_data, context.current_badge, context.current_category
+            )
+
+
+def test_overlapping_keywords_are_all_found():
+    # "что это за значок" содержит "что это" и "что за значок": сработать должно правило значка
+    router = IntentRouter()
+    assert router.route("что это за значок?", "badge", (False, True, True)) == "badge_explanation"
+    assert router.route("что это за значок?", "intro", (False, False, False)) == "philosophy"
@@ -0,0 +1,124 @@
+"""
+Шаблонные ответы: состав категорий и уровни значков без обращения к модели
+"""
+import asyncio
+
+import pytest
+
+from core.intent_router import IntentRouter
+from core.local_answers import LocalAnswerEngine, plural
+from core.response_generator import ResponseGenerator
+from models.conversation import UserContext, WebContext
+
+CATEGORY = (False, False, True)
+NOTHING = (False, False, False)
+
+
+@pytest.mark.parametrize("count, expected", [
+    (1, "1 значок"), (2, "2 значка"), (5, "5 значков"), (11, "11 значков"),
+    (21, "21 значок"), (22, "22 значка"), (112, "112 значков")
+])
+def test_plural(count, expected):
+    assert plural(count, ("значок", "значка", "значков")) == expected
+
+
+@pytest.mark.parametrize("message, view, flags, intent", [
+    ("Какие значки есть в категории?", "category", CATEGORY, "category_list"),
+    ("Перечисли значки", "category", CATEGORY, "category_list"),
+    ("Расскажи про эту категорию", "category", CATEGORY, "category_info"),
+    ("Объясни, зачем эта категория", "category", CATEGORY, "category_info"),
+    ("Сколько всего значков?", "intro", NOTHING, "category_list"),
+    ("Покажи список категорий", "intro", NOTHING, "category_list"),
+])
+def test_composition_questions_route_to_category_list(message, view, flags, intent):
+    assert IntentRouter().route(message, view, flags) == intent
+
+
+@pytest.fixture
+def engine(data_loader, counter) -> LocalAnswerEngine:
+    return LocalAnswerEngine(data_loader, counter)
+
+
+def test_catalog_overview_counts_real_data(engine, data_loader):
+    categories = data_loader.get_all_categories()
+    total = sum(len(category.badges) for category in categories)
+    answer = engine.catalog_overview()
+    assert answer.splitlines()[0].startswith(f"В Путеводителе {plural(len(categories), ('категория', 'категории', 'категорий'))}")
+    assert str(total) in answer.splitlines()[0]
+    assert len(answer.splitlines()) == len(categories) + 2
+
+
+def test_category_info_lists_every_badge(engine, data_loader):
+    category = data_loader.get_category("1")
+    answer = engine.category_info(category)
+    for badge in category.badges:
+        assert f"• {badge.emoji} {badge.title}" in answer
+    # Устаревшее число значков из введения не попадает в ответ
+    assert answer.splitlines()[0].endswith(f"{plural(len(category.badges), ('значок', 'значка', 'значков'))}.")
+
+
+def test_badge_levels_and_single_level(engine, data_loader):
+    badge = data_loader.get_badge("1.1")
+    answer = engine.badge_levels(badge)
+    for level in badge.levels:
+        assert level.criteria.strip().splitlines()[0] in answer
+    level = badge.levels[0]
+    single = engine.badge_level(badge, level, "Особое название")
+    assert "Особое название" in single
+    assert "Как подтвердить:" in single
+    assert engine.stats()["answers"] == {"badge_levels_explanation": 1, "badge_level_explanation": 1}
+
+
+def test_default_intents(engine):
+    assert engine.handles("category_list")
+    assert engine.handles("badge_levels_explanation")
+    assert not engine.handles("category_info")
+
+
+def _generator(make_openai_client, data_loader, context_manager) -> ResponseGenerator:
+    return ResponseGenerator(make_openai_client(reply="Рассказ модели о категории."), data_loader, context_manager)
+
+
+def _ask(generator: ResponseGenerator, message: str, web_context: WebContext, user_id: str = "u"):
+    async def run():
+        await generator.context_manager.update_web_context(user_id, web_context)
+        return await generator.generate_response(message, user_id, [])
+    return asyncio.run(run())
+
+
+CATEGORY_SCREEN = WebContext(current_view="category", current_category={"id": "1"})
+
+
+def test_category_list_is_answered_locally(make_openai_client, data_loader, context_manager):
+    generator = _generator(make_openai_client, data_loader, context_manager)
+    response = _ask(generator, "Какие значки есть в категории?", CATEGORY_SCREEN)
+    assert response.metadata["request_type"] == "category_list"
+    assert data_loader.get_category("1").badges[0].title in response.response
+    assert generator.openai_client.completions.calls == []
+
+
+def test_category_explanation_goes_to_model(make_openai_client, data_loader, context_manager):
+    generator = _generator(make_openai_client, data_loader, context_manager)
+    response = _ask(generator, "Расскажи про эту категорию", CATEGORY_SCREEN)
+    assert response.metadata["request_type"] == "category_info"
+    assert "Рассказ модели" in response.response
+    assert len(generator.openai_client.completions.calls) == 1
+
+
+def test_catalog_overview_without_category(make_openai_client, data_loader, context_manager):
+    generator = _generator(make_openai_client, data_loader, context_manager)
+    response = _ask(generator, "Сколько всего значков?", WebContext(current_view="intro"))
+    assert response.metadata["request_type"] == "category_list"
+    assert response.response.startswith("В Путеводителе")
+    assert generator.openai_client.completions.calls == []
+
+
+def test_where_am_i(engine, data_loader):
+    context = UserContext(
+        user_id="u", current_category="1", current_badge="1.1",
+        session_data={"current_view": "badge", "current_level": "1"}
+    )
+    answer = engine.where_am_i(context)
+    assert "Страница значка" in answer
+    assert data_loader.get_badge("1.1").title in answer
+    assert "Уровень: 1." in answer
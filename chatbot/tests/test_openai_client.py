@@ -0,0 +1,58 @@
+"""
+OpenAIClient: запросы к модели не блокируют event loop
+"""
+import asyncio
+import time
+
+from models.conversation import Message
+
+
+def _ask(client, text: str):
+    return client.generate_response([Message(role="user", content=text, metadata={})])
+
+
+def test_concurrent_requests_overlap(make_openai_client):
+    client = make_openai_client(delay=0.2)
+
+    async def run():
+        started = time.perf_counter()
+        answers = await asyncio.gather(*(_ask(client, f"вопрос {i}") for i in range(5)))
+        return answers, time.perf_counter() - started
+
+    answers, elapsed = asyncio.run(run())
+    assert answers == ["Ответ модели."] * 5
+    assert len(client.completions.calls) == 5
+    # Пять запросов по 0.2 с идут одновременно, а не друг за другом
+    assert elapsed < 0.6
+
+
+def test_event_loop_serves_other_tasks_while_waiting(make_openai_client):
+    client = make_openai_client(delay=0.2)
+
+    async def run():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        task = asyncio.create_task(ticker())
+        await _ask(client, "вопрос")
+        task.cancel()
+        return ticks
+
+    assert asyncio.run(run()) >= 10
+
+
+def test_api_error_becomes_fallback_answer(make_openai_client):
+    client = make_openai_client()
+
+    async def fail(**kwargs):
+        raise RuntimeError("секретный адрес и ключ")
+
+    client.completions.create = fail
+    answer = asyncio.run(_ask(client, "вопрос"))
+    assert "секретный" not in answer
+    assert answer
@@ -0,0 +1,96 @@
+"""
+WriteBehindWriter: изменения копятся, схлопываются и пишутся пачкой
+"""
+import asyncio
+
+from core.persistence import WriteBehindWriter
+from core.storage import CONTEXT, CONVERSATION, StorageBackend
+from models.conversation import UserContext
+
+
+class RecordingStorage(StorageBackend):
+    """Хранилище в памяти, которое запоминает пачки и может отказать в записи"""
+
+    def __init__(self):
+        self.batches = []
+        self.fail = set()
+
+    def load_context(self, user_id):
+        return None
+
+    def load_conversation(self, user_id):
+        return None
+
+    def save_batch(self, records, touched_at=None):
+        self.batches.append(records)
+        return [key for key, _ in records if key in self.fail]
+
+    def iter_user_ids(self):
+        return iter(())
+
+    def version(self, user_id):
+        return 0.0
+
+    def purge_older_than(self, cutoff):
+        return 0
+
+
+def test_repeated_changes_are_coalesced():
+    storage = RecordingStorage()
+    writer = WriteBehindWriter(storage)
+    context = UserContext(user_id="u")
+    for level in ("beginner", "advanced", "expert"):
+        context.level = level
+        writer.mark_dirty((CONTEXT, "u"), context)
+
+    asyncio.run(writer.flush())
+    assert len(storage.batches) == 1
+    [(key, data)] = storage.batches[0]
+    assert key == (CONTEXT, "u")
+    # Сериализуется состояние на момент сброса
+    assert data["level"] == "expert"
+    assert writer.stats()["coalesced"] == 2
+    assert writer.stats()["pending"] == 0
+
+
+def test_pending_object_is_visible_before_flush():
+    writer = WriteBehindWriter(RecordingStorage())
+    context = UserContext(user_id="u")
+    writer.mark_dirty((CONTEXT, "u"), context)
+    assert writer.pending((CONTEXT, "u")) is context
+    writer.discard((CONTEXT, "u"))
+    assert writer.pending((CONTEXT, "u")) is None
+
+
+def test_failed_records_are_retried():
+    storage = RecordingStorage()
+    storage.fail = {(CONTEXT, "bad")}
+    writer = WriteBehindWriter(storage)
+    writer.mark_dirty((CONTEXT, "good"), UserContext(user_id="good"))
+    writer.mark_dirty((CONTEXT, "bad"), UserContext(user_id="bad"))
+
+    asyncio.run(writer.flush())
+    assert writer.pending((CONTEXT, "good")) is None
+    assert writer.pending((CONTEXT, "bad")) is not None
+    assert writer.stats()["errors"] == 1
+
+    storage.fail.clear()
+    asyncio.run(writer.flush())
+    assert writer.stats()["pending"] == 0
+    assert [key for key, _ in storage.batches[-1]] == [(CONTEXT, "bad")]
+
+
+def test_timer_flushes_and_stop_writes_the_rest():
+    storage = RecordingStorage()
+    writer = WriteBehindWriter(storage, flush_interval=0.01)
+
+    async def run():
+        writer.start()
+        writer.mark_dirty((CONTEXT, "u"), UserContext(user_id="u"))
+        await asyncio.sleep(0.05)
+        assert len(storage.batches) == 1
+        writer.mark_dirty((CONVERSATION, "u"), UserContext(user_id="u"))
+        await writer.stop()
+
+    asyncio.run(run())
+    assert [key for key, _ in storage.batches[-1]] == [(CONVERSATION, "u")]
@@ -0,0 +1,147 @@
+"""
+Готовые ответы о значках: отбор актуальных ответов и повторное использование при сборке
+"""
+import pytest
+
+from core import pregenerated
+from core.pregenerated import (
+    GENERATOR_BATCH, GENERATOR_STUB, PregeneratedAnswers, answer_key, default_kinds, interest_bucket,
+    merge_answers, pregeneration_requests, prompt_fingerprint, read_answers, run_stub, write_answers
+)
+from core.prompt_assembly import ContextAssembler
+from models.conversation import UserContext
+
+MODEL = "gpt-4o-mini"
+
+
+@pytest.fixture(scope="module")
+def badges(data_loader):
+    return [data_loader.get_badge("1.1"), data_loader.get_badge("1.2")]
+
+
+@pytest.fixture
+def hashes(badges):
+    return {badge.id: f"hash-{badge.id}" for badge in badges}
+
+
+def _requests(badges, hashes, assembler, existing=None, generator=GENERATOR_BATCH):
+    return pregeneration_requests(
+        badges, assembler, hashes.get, kinds=("explanation",), user_levels=("beginner",),
+        buckets=("спорт", "general"), existing=existing, generator=generator, fingerprint=prompt_fingerprint(MODEL)
+    )
+
+
+def _build(badges, hashes, assembler, existing=None, generator=GENERATOR_BATCH):
+    requests = _requests(badges, hashes, assembler, existing, generator)
+    texts = {request.custom_id: f"Ответ {request.custom_id}" for request in requests}
+    data = merge_answers(existing, badges, requests, texts, hashes.get, MODEL, generator, prompt_fingerprint(MODEL))
+    return data, requests
+
+
+@pytest.fixture(scope="module")
+def assembler(counter):
+    return ContextAssembler(counter)
+
+
+def _context(interests=()):
+    return UserContext(user_id="u", level="beginner", interests=list(interests))
+
+
+def test_requests_cover_every_combination(badges, hashes, assembler):
+    requests = _requests(badges, hashes, assembler)
+    assert [request.custom_id for request in requests] == [
+        f"{badge.id}|explanation|beginner|{bucket}" for badge in badges for bucket in ("спорт", "general")
+    ]
+    # Запрос собирается так же, как живой: статический префикс, справка, контекст, вопрос
+    assert requests[0].messages[-1]["role"] == "user"
+    assert badges[0].title in requests[0].messages[-1]["content"]
+
+
+def test_answers_are_served_by_level_and_interest(badges, hashes, assembler):
+    data, _ = _build(badges, hashes, assembler)
+    answers = PregeneratedAnswers(data, hashes.get, MODEL)
+    assert answers.validate(badges) == 2
+    assert answers.get("explanation", badges[0], _context(["спорт"])) == "Ответ 1.1|explanation|beginner|спорт"
+    # Группы без своего ответа получают общий
+    assert answers.get("explanation", badges[0], _context(["наука"])) == "Ответ 1.1|explanation|beginner|general"
+    assert answers.get("ideas", badges[0], _context()) is None
+    assert answers.stats()["hits"] == 2 and answers.stats()["misses"] == 1
+
+
+def test_changed_badge_is_not_served(badges, hashes, assembler):
+    data, _ = _build(badges, hashes, assembler)
+    changed = dict(hashes, **{"1.1": "new-hash"})
+    answers = PregeneratedAnswers(data, changed.get, MODEL)
+    assert answers.get("explanation", badges[0], _context()) is None
+    assert answers.get("explanation", badges[1], _context()) is not None
+    assert answers.stats()["stale"] == 1
+    # Без хэшей исходных файлов ответы не проверить — они не отдаются
+    assert PregeneratedAnswers(data, None, MODEL).validate(badges) == 0
+
+
+def test_prompt_change_invalidates_answers(badges, hashes, assembler, monkeypatch):
+    data, _ = _build(badges, hashes, assembler)
+    answers = PregeneratedAnswers(data, hashes.get, MODEL)
+    assert answers.validate(badges) == 2
+    # Правка facts.json меняет отпечаток системного промпта
+    monkeypatch.setattr(pregenerated, "get_system_prompt_fingerprint", lambda: "другие факты")
+    assert answers.validate(badges) == 0
+    # Другая модель — тоже другой отпечаток
+    monkeypatch.undo()
+    assert PregeneratedAnswers(data, hashes.get, "gpt-4o").validate(badges) == 0
+
+
+def test_stub_answers_need_allow_stub(badges, hashes, assembler):
+    data, _ = _build(badges, hashes, assembler, generator=GENERATOR_STUB)
+    assert PregeneratedAnswers(data, hashes.get, MODEL).validate(badges) == 0
+    assert PregeneratedAnswers(data, hashes.get, MODEL, allow_stub=True).validate(badges) == 2
+
+
+def test_rebuild_requests_only_missing_answers(badges, hashes, assembler):
+    data, _ = _build(badges, hashes, assembler)
+    assert _requests(badges, hashes, assembler, existing=data) == []
+
+    changed = dict(hashes, **{"1.2": "new-hash"})
+    rebuilt, requests = _build(badges, changed, assembler, existing=data)
+    assert {request.badge_id for request in requests} == {"1.2"}
+    assert rebuilt["badges"]["1.1"]["answers"] == data["badges"]["1.1"]["answers"]
+    assert rebuilt["badges"]["1.2"]["sourceHash"] == "new-hash"
+
+    # Ответы-заглушки не переиспользуются при сборке настоящих
+    stub, _ = _build(badges, hashes, assembler, generator=GENERATOR_STUB)
+    assert len(_requests(badges, hashes, assembler, existing=stub)) == 4
+
+
+def test_removed_badge_is_dropped(badges, hashes, assembler):
+    data, _ = _build(badges, hashes, assembler)
+    rebuilt, requests = _build(badges[:1], hashes, assembler, existing=data)
+    assert requests == []
+    assert set(rebuilt["badges"]) == {"1.1"}
+
+
+def test_file_round_trip(badges, hashes, assembler, tmp_path):
+    data, _ = _build(badges, hashes, assembler)
+    path = tmp_path / "pregenerated.json"
+    write_answers(data, path)
+    assert read_answers(path) == data
+    loaded = PregeneratedAnswers.load(path, hashes.get, MODEL)
+    assert loaded.validate(badges) == 2
+    assert read_answers(tmp_path / "missing.json") is None
+    assert PregeneratedAnswers.load(None).stats()["badges"] == 0
+
+
+def test_stub_texts_come_from_badge_data(badges, hashes, assembler):
+    requests = _requests(badges, hashes, assembler)
+    texts = run_stub(requests, {badge.id: badge for badge in badges})
+    assert texts[requests[0].custom_id].startswith(f"{badges[0].emoji} {badges[0].title}")
+
+
+def test_default_kinds_skip_local_intents():
+    assert default_kinds(()) == ("explanation", "ideas", "levels")
+    assert default_kinds(("badge_levels_explanation", "category_list")) == ("explanation", "ideas")
+
+
+def test_interest_bucket_and_key():
+    assert interest_bucket(["unknown"]) == "general"
+    assert interest_bucket(["спорт", "наука", "unknown"]) == "наука"
+    assert answer_key("ideas", "advanced", "спорт") == "ideas|advanced|спорт"
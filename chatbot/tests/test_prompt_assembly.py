@@ -0,0 +1,94 @@
+"""
+Сборка знаний для промпта: бюджет токенов, выбор фрагментов и обрезка текста
+"""
+import pytest
+
+from core.prompt_assembly import ContextAssembler, TokenCounter, collect_prompt_report
+from models.badge import Badge, BadgeLevel
+
+
+def test_truncate_keeps_whole_sentences(counter):
+    text = "Первое предложение. Второе предложение подлиннее. Третье."
+    assert counter.truncate(text, 1000) == text
+    short = counter.truncate(text, counter.count("Первое предложение.") + 3)
+    assert short == "Первое предложение.…"
+    assert counter.truncate(text, 0) == ""
+
+
+def test_truncate_cuts_long_sentence_by_words(counter):
+    text = " ".join(["слово"] * 100)
+    result = counter.truncate(text, 20)
+    assert result.endswith("…")
+    assert counter.count(result) <= 20
+    assert set(result.rstrip("…").split()) == {"слово"}
+
+
+def test_heuristic_counter_overestimates():
+    counter = TokenCounter.__new__(TokenCounter)
+    counter._encoding = None
+    assert counter._count("") == 0
+    assert counter._count("кот") == 1
+    assert counter._count("значок") == 2
+    assert counter._count("badge 2024!") == 2 + 2 + 1
+
+
+@pytest.fixture(scope="module")
+def assembler(counter) -> ContextAssembler:
+    return ContextAssembler(counter)
+
+
+@pytest.mark.parametrize("budget", [60, 150, 400, 900])
+@pytest.mark.parametrize("query", ["", "как подтвердить уровень", "советы по выполнению"])
+def test_badge_context_fits_budget(assembler, counter, data_loader, budget, query):
+    for badge in data_loader.get_all_badges():
+        assert counter.count(assembler.badge_context(badge, query, budget)) <= budget, badge.id
+        assert counter.count(assembler.levels_context(badge, query, budget)) <= budget, badge.id
+
+
+@pytest.mark.parametrize("budget", [60, 300])
+def test_category_context_fits_budget(assembler, counter, data_loader, budget):
+    for category in data_loader.get_all_categories():
+        assert counter.count(assembler.category_context(category, "", budget)) <= budget, category.id
+
+
+def _badge() -> Badge:
+    return Badge(
+        id="1.1", title="Костровой", emoji="🔥", categoryId="1",
+        description="Отвечает за костёр в отряде.",
+        skillTips="Готовь дрова заранее. " * 20,
+        philosophy="Огонь собирает отряд вместе. " * 20,
+        levels=[
+            BadgeLevel(id=f"1.1.{i}", level=str(i), title=f"Костровой {i}", emoji="🔥",
+                       criteria=f"Разжечь костёр {i} раз", confirmation="Отзыв вожатого")
+            for i in (1, 2, 3)
+        ]
+    )
+
+
+def test_description_goes_first_and_fields_keep_order(assembler):
+    text = assembler.badge_context(_badge(), budget=120, include_levels=False)
+    assert text.startswith("🔥 Костровой\n\nОписание: Отвечает за костёр")
+    labels = [label for label in ("Описание:", "Советы:", "Философия:") if label in text]
+    assert len(labels) >= 2
+    assert [text.index(label) for label in labels] == sorted(text.index(label) for label in labels)
+
+
+def test_query_pulls_matching_field(assembler):
+    badge = _badge()
+    plain = assembler.badge_context(badge, budget=80, include_levels=False)
+    about_fire = assembler.badge_context(badge, "зачем огонь отряду", budget=80, include_levels=False)
+    assert "Философия" not in plain
+    assert "Философия" in about_fire
+
+
+def test_current_level_is_preferred(assembler, counter):
+    badge = _badge()
+    budget = counter.count(assembler._level_text(badge.levels[0])) + 10
+    assert "Костровой 3" in assembler.levels_context(badge, budget=budget, current_level="3")
+    assert "Костровой 1" in assembler.levels_context(badge, budget=budget)
+
+
+def test_knowledge_is_reported(assembler, counter):
+    with collect_prompt_report() as report:
+        text = assembler.badge_context(_badge(), budget=100)
+    assert report.as_dict()['knowledge'] == counter.count(text)
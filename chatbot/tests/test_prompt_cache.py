@@ -0,0 +1,81 @@
+"""
+Кэширование промпта у провайдера: общий статический префикс во всех запросах
+"""
+import asyncio
+
+from core.openai_client import build_request_messages
+from models.conversation import Message, UserContext
+from prompts.system_prompt import get_context_section, get_static_system_prompt
+
+
+def _messages(text: str):
+    return [Message(role="user", content=text, metadata={})]
+
+
+def test_static_prefix_is_first_and_identical():
+    first = build_request_messages(_messages("Привет"))
+    second = build_request_messages(
+        _messages("Расскажи про значок"),
+        get_context_section(current_category="1", current_badge="1.1", user_level="advanced",
+                            user_interests=["спорт"], current_view="badge"),
+        "🔥 Костровой\n\nОписание: следит за костром"
+    )
+    assert first[0] == second[0] == {"role": "system", "content": get_static_system_prompt()}
+
+
+def test_static_prefix_has_no_user_data():
+    prefix = get_static_system_prompt()
+    assert "Контекст пользователя" not in prefix
+    assert "## Текущий контекст" not in prefix
+
+
+def test_variable_parts_follow_prefix_in_order():
+    context_section = get_context_section(current_category="1", user_interests=["рисование"])
+    api_messages = build_request_messages(_messages("Вопрос"), context_section, "Справка")
+    assert [message["role"] for message in api_messages] == ["system", "system", "system", "user"]
+    assert api_messages[1]["content"].endswith("Справка")
+    assert api_messages[2]["content"] == context_section
+    assert "рисование" in context_section
+    # Секция контекста одна: отдельного блока «Контекст пользователя» больше нет
+    assert sum("Контекст пользователя" in message["content"] for message in api_messages) == 0
+
+
+def test_history_is_limited_to_last_ten():
+    messages = [Message(role="user", content=f"сообщение {i}", metadata={}) for i in range(15)]
+    api_messages = build_request_messages(messages)
+    assert [message["content"] for message in api_messages[1:]] == [f"сообщение {i}" for i in range(5, 15)]
+
+
+def test_all_request_kinds_share_prefix(make_openai_client):
+    client = make_openai_client(reply="💡 Идея")
+
+    async def run():
+        await client.generate_response(_messages("Вопрос"), get_context_section(user_interests=["спорт"]))
+        await client.generate_creative_ideas("1.1", "Справка", UserContext(user_id="u", interests=["игры"]))
+        await client.explain_philosophy("1", "Справка о категории", UserContext(user_id="u"))
+
+    asyncio.run(run())
+    prefixes = {call["messages"][0]["content"] for call in client.completions.calls}
+    assert prefixes == {get_static_system_prompt()}
+    stats = client.prompt_cache_stats()
+    assert list(stats["prefix_variants"].values()) == [3]
+    assert stats["prefix_hash"] in stats["prefix_variants"]
+
+
+def test_summary_usage_is_counted_separately(make_openai_client):
+    client = make_openai_client(reply="Краткое содержание")
+
+    async def run():
+        await client.generate_response(_messages("Вопрос"))
+        await client.summarize_conversation("", "user: Привет\nassistant: Здравствуй")
+        await client.summarize_conversation("Краткое содержание", "user: Ещё вопрос")
+
+    asyncio.run(run())
+    stats = client.prompt_cache_stats()
+    assert stats["requests"] == 1
+    assert stats["prompt_tokens"] == 100 and stats["cached_tokens"] == 64
+    assert stats["cached_ratio"] == 0.64
+    assert stats["summary"]["requests"] == 2
+    assert stats["summary"]["prompt_tokens"] == 200
+    # Запросы содержания не считаются отдельным вариантом префикса
+    assert list(stats["prefix_variants"].values()) == [1]
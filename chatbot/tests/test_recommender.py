@@ -0,0 +1,101 @@
+"""
+Рекомендации значков: матричный расчёт совпадает с прежним перебором значков
+"""
+import numpy as np
+import pytest
+
+from core.embeddings import HashingEmbedding, SemanticIndex
+from core.recommender import BadgeRecommender
+from models.conversation import UserContext
+
+
+def legacy_score(badge, context: UserContext) -> float:
+    """Оценка значка из прежнего ContextManager._calculate_badge_score"""
+    score = 1.0
+    if context.interests:
+        badge_text = f"{badge.title} {badge.description}".lower()
+        for interest in context.interests:
+            if interest.lower() in badge_text:
+                score += 2.0
+    if context.current_category and badge.categoryId == context.current_category:
+        score += 1.5
+    if context.level == "beginner" and len(badge.levels) <= 2:
+        score += 1.0
+    elif context.level == "advanced" and len(badge.levels) >= 3:
+        score += 1.0
+    return score
+
+
+def legacy_recommend(categories, context: UserContext, limit: int):
+    """Прежний перебор: оценка каждого значка и устойчивая сортировка"""
+    recommendations = [
+        (badge.id, legacy_score(badge, context))
+        for category in categories for badge in category.badges
+    ]
+    recommendations.sort(key=lambda item: item[1], reverse=True)
+    return recommendations[:limit]
+
+
+CONTEXTS = [
+    UserContext(user_id="new"),
+    UserContext(user_id="advanced", level="advanced"),
+    UserContext(user_id="other", level="expert"),
+    UserContext(user_id="category", current_category="3", level="advanced"),
+    UserContext(user_id="interests", interests=["Спорт", "игр", "вожат"]),
+    UserContext(user_id="repeated", interests=["игр", "игр"], current_category="1"),
+    UserContext(user_id="unknown", interests=["несуществующее"], current_category="999"),
+]
+
+
+@pytest.fixture(scope="module")
+def categories(data_loader):
+    return data_loader.get_all_categories()
+
+
+@pytest.fixture(scope="module")
+def recommender(categories) -> BadgeRecommender:
+    return BadgeRecommender(categories)
+
+
+@pytest.mark.parametrize("context", CONTEXTS, ids=lambda context: context.user_id)
+@pytest.mark.parametrize("limit", [1, 5, 50])
+def test_matches_legacy_scoring(recommender, categories, context, limit):
+    results = recommender.recommend(context, limit)
+    assert [(item["badge"].id, item["score"]) for item in results] == legacy_recommend(categories, context, limit)
+
+
+def test_batch_matches_single(recommender):
+    batch = recommender.recommend_many(CONTEXTS, limit=10)
+    for context, results in zip(CONTEXTS, batch):
+        single = recommender.recommend(context, limit=10)
+        assert [(item["badge"].id, item["score"]) for item in results] == \
+            [(item["badge"].id, item["score"]) for item in single]
+    assert recommender.recommend_many([]) == []
+
+
+def test_reasons(recommender):
+    context = UserContext(user_id="u", interests=["Валюш"], current_category="1", level="beginner")
+    top = recommender.recommend(context, limit=1)[0]
+    assert top["badge"].id == "1.1"
+    assert top["reason"].startswith("соответствует вашему интересу к Валюш")
+    assert "из вашей текущей категории" in top["reason"]
+    assert recommender.recommend(UserContext(user_id="u", level="expert"), 1)[0]["reason"] == "может быть интересен"
+
+
+def test_top_k_is_stable():
+    scores = np.array([1.0, 3.0, 2.0, 3.0, 1.0, 2.0])
+    assert BadgeRecommender.top_k(scores, 3).tolist() == [1, 3, 2]
+    assert BadgeRecommender.top_k(scores, 4).tolist() == [1, 3, 2, 5]
+    assert BadgeRecommender.top_k(scores, 10).tolist() == [1, 3, 2, 5, 0, 4]
+    assert BadgeRecommender.top_k(scores, 0).tolist() == []
+
+
+def test_semantic_interest_adds_neighbours(categories, data_loader):
+    semantic_index = SemanticIndex.build(data_loader.get_all_badges(), HashingEmbedding())
+    recommender = BadgeRecommender(categories, semantic_index, semantic_top_k=3, semantic_min_similarity=0.0)
+    context = UserContext(user_id="u", interests=["несуществующее слово"], level="expert")
+    plain = BadgeRecommender(categories).recommend(context, limit=3)
+    assert all(item["score"] == 1.0 for item in plain)
+    # Ни одна подстрока не совпала, но три ближайших по смыслу значка получают бонус интереса
+    semantic = recommender.recommend(context, limit=4)
+    assert [item["score"] for item in semantic] == [3.0, 3.0, 3.0, 1.0]
@@ -0,0 +1,87 @@
+"""
+ResponseCache: ключи, LRU, TTL, дисковое хранилище и кэширование ответов модели
+"""
+import asyncio
+
+from core.response_cache import ResponseCache, make_cache_key
+from models.conversation import Message
+
+
+def test_cache_key_ignores_interest_order_and_case():
+    first = make_cache_key("prompt", "badge_explanation", "1.1", "Beginner", ["Спорт", " наука "], "gpt")
+    second = make_cache_key("prompt", "badge_explanation", "1.1", "beginner", ["наука", "спорт"], "gpt")
+    assert first == second
+
+
+def test_cache_key_changes_with_prompt_subject_and_model():
+    base = make_cache_key("prompt", "badge_explanation", "1.1", "beginner", [], "gpt")
+    assert make_cache_key("prompt2", "badge_explanation", "1.1", "beginner", [], "gpt") != base
+    assert make_cache_key("prompt", "badge_explanation", "1.2", "beginner", [], "gpt") != base
+    assert make_cache_key("prompt", "badge_explanation", "1.1", "beginner", [], "gpt2") != base
+
+
+def test_lru_eviction():
+    cache = ResponseCache(max_entries=2)
+    cache.set("a", "A")
+    cache.set("b", "B")
+    assert cache.get("a") == "A"
+    cache.set("c", "C")
+    assert cache.get("b") is None
+    assert cache.get("a") == "A"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_ttl_expiry():
+    cache = ResponseCache(ttl_seconds=-1)
+    cache.set("a", "A")
+    assert cache.get("a") is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_empty_response_is_not_stored():
+    cache = ResponseCache()
+    cache.set("a", "")
+    assert cache.get("a") is None
+
+
+def test_disk_cache_survives_restart_and_primes(tmp_path):
+    path = str(tmp_path / "responses.db")
+    cache = ResponseCache(disk_path=path)
+    for key in ("a", "b", "c"):
+        cache.set(key, key.upper())
+
+    restarted = ResponseCache(disk_path=path)
+    assert restarted.get("b") == "B"
+    assert restarted.stats()["disk_hits"] == 1
+
+    primed = ResponseCache(max_entries=2, disk_path=path)
+    assert primed.prime() == 2
+    # В память попадают самые свежие ответы
+    assert primed.stats()["entries"] == 2
+    assert primed.get("c") == "C"
+    assert primed.stats()["disk_hits"] == 0
+
+
+def test_generate_response_uses_cache(make_openai_client):
+    client = make_openai_client()
+    messages = [Message(role="user", content="объясни значок", metadata={})]
+
+    async def run():
+        first = await client.generate_response(messages, cache_key="key")
+        second = await client.generate_response(messages, cache_key="key")
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert first == second == "Ответ модели."
+    assert len(client.completions.calls) == 1
+
+
+def test_fallback_answer_is_not_cached(make_openai_client):
+    client = make_openai_client()
+
+    async def fail(**kwargs):
+        raise RuntimeError("нет сети")
+
+    client.completions.create = fail
+    asyncio.run(client.generate_response([Message(role="user", content="вопрос", metadata={})], cache_key="key"))
+    assert client.response_cache.get("key") is None
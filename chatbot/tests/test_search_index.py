@@ -0,0 +1,120 @@
+"""
+Полнотекстовый поиск значков: ранжирование, префиксы, опечатки и подсветка
+"""
+import pytest
+
+from core.search_index import SearchIndex, fold, highlight, iter_terms, stem
+from models.badge import Badge, BadgeLevel, Category
+
+
+def _badge(badge_id: str, title: str, description: str, category_id: str = "1", **fields) -> Badge:
+    return Badge(
+        id=badge_id, title=title, emoji="🏅", categoryId=category_id, description=description,
+        levels=[BadgeLevel(id=f"{badge_id}.1", level="1", title=title, emoji="🥉",
+                           criteria="Выполнить задание", confirmation="Рассказ вожатому")],
+        **fields
+    )
+
+
+@pytest.fixture(scope="module")
+def index() -> SearchIndex:
+    categories = [
+        Category(id="1", title="Лагерная жизнь", emoji="🏕", path="1"),
+        Category(id="2", title="Творчество", emoji="🎨", path="2"),
+    ]
+    badges = [
+        _badge("1.1", "Костровой", "Разводит костёр и следит за огнём"),
+        _badge("1.2", "Походник", "Ходит в походы и ставит палатку", skillTips="Костёр разводи только на кострище"),
+        _badge("2.1", "Художник", "Рисует стенгазету отряда"),
+        _badge("2.2", "Музыкант", "Играет на гитаре, пока горит костёр", category_id="2"),
+    ]
+    return SearchIndex(categories, badges)
+
+
+def test_stem_and_fold():
+    assert fold("Ёлка") == "елка"
+    assert stem("походами") == stem("походы")
+    assert stem("собираться") == stem("собирать") == stem("собирался")
+    # Слова с цифрами и короткие слова не меняются
+    assert stem("1.12") == "1.12"
+    assert stem("дом") == "дом"
+
+
+def test_iter_terms_skips_stop_words_and_keeps_positions():
+    text = "Как развести Костёр?"
+    terms = list(iter_terms(text))
+    assert [text[start:end] for start, end, _ in terms] == ["развести", "Костёр"]
+    assert terms[1][2] == stem("костер")
+
+
+def test_title_outranks_description(index):
+    hits = index.search("костровой", limit=None)
+    assert hits[0].badge.id == "1.1"
+    hits = index.search("костёр ", limit=None)
+    # Слово в описании весит больше, чем в советах
+    ids = [hit.badge.id for hit in hits]
+    assert ids.index("1.1") < ids.index("1.2")
+
+
+def test_all_words_add_up(index):
+    hits = index.search("костёр гитара ")
+    assert hits[0].badge.id == "2.2"
+    assert hits[0].terms == {stem("костер"), stem("гитара")}
+
+
+def test_last_word_is_prefix(index):
+    assert [hit.badge.id for hit in index.search("худож")] == ["2.1"]
+    # Слово не последнее — префиксом не ищется
+    assert [hit.badge.id for hit in index.search("худож гитара")] == ["2.2"]
+    assert index.expand("худож") == {}
+    assert index.expand("худож", prefix=True) == {stem("художник"): 0.8}
+
+
+def test_typo_tolerance(index):
+    assert [hit.badge.id for hit in index.search("музфкант ")] == ["2.2"]
+    assert [hit.badge.id for hit in index.search("хуложник ")] == ["2.1"]
+    # Опечатка весит меньше точного совпадения
+    exact = index.search("музыкант ")[0].score
+    assert index.search("музфкант ")[0].score < exact
+
+
+def test_badge_id_and_category(index):
+    assert [hit.badge.id for hit in index.search("2.1")] == ["2.1"]
+    assert {hit.badge.id for hit in index.search("лагерная ")} == {"1.1", "1.2", "2.1"}
+
+
+def test_category_filter_and_limit(index):
+    assert [hit.badge.id for hit in index.search("костёр ", category_id="2")] == ["2.2"]
+    assert len(index.search("выполнить ", limit=2)) == 2
+    assert len(index.search("выполнить ", limit=None)) == 4
+
+
+def test_equal_scores_keep_badge_order(index):
+    assert [hit.badge.id for hit in index.search("выполнить ", limit=None)] == ["1.1", "1.2", "2.1", "2.2"]
+
+
+def test_highlight_escapes_and_marks(index):
+    hit = index.search("костёр ")[0]
+    assert highlight("<b>Костёр</b> горит", hit.terms) == "&lt;b&gt;<mark>Костёр</mark>&lt;/b&gt; горит"
+
+
+def test_highlight_cuts_around_first_match():
+    text = "а " * 100 + "костёр" + " б" * 100
+    fragment = highlight(text, frozenset({stem("костер")}), max_length=40)
+    assert fragment.startswith("…") and fragment.endswith("…")
+    assert "<mark>костёр</mark>" in fragment
+
+
+def test_fingerprint_follows_texts():
+    category = Category(id="1", title="Лагерь", emoji="🏕", path="1")
+    first = SearchIndex([category], [_badge("1.1", "Костровой", "Разводит костёр")])
+    same = SearchIndex([category], [_badge("1.1", "Костровой", "Разводит костёр")])
+    changed = SearchIndex([category], [_badge("1.1", "Костровой", "Следит за костром")])
+    assert first.fingerprint == same.fingerprint != changed.fingerprint
+
+
+def test_real_data_title_search(data_loader):
+    index = data_loader.get_search_index()
+    assert index.search("Валюша")[0].badge.id == "1.1"
+    assert index.search("валюща ")[0].badge.id == "1.1"
+    assert index.stats()['documents'] == len(data_loader.get_all_badges())
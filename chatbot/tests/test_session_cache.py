@@ -0,0 +1,100 @@
+"""
+SessionCache: вытеснение по числу сессий, объёму и простою
+"""
+import asyncio
+
+import pytest
+
+from core import session_cache
+from core.session_cache import SessionCache
+from models.conversation import Message
+
+
+class Clock:
+    """Подменяемое время для session_cache"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(session_cache.time, "time", clock.time)
+    return clock
+
+
+def _recording_cache(**limits):
+    evicted = []
+    cache = SessionCache(on_evict=lambda key, value, reason: evicted.append((key, reason)), **limits)
+    return cache, evicted
+
+
+def test_lru_eviction_by_entries(clock):
+    cache, evicted = _recording_cache(max_entries=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+    assert evicted == [("b", "lru")]
+    assert "a" in cache and "c" in cache
+
+
+def test_eviction_by_bytes_keeps_the_new_session(clock):
+    cache, evicted = _recording_cache(max_bytes=100)
+    cache.put("a", 1, size=60)
+    cache.put("b", 2, size=30)
+    cache.put("c", 3, size=200)
+    assert evicted == [("a", "bytes"), ("b", "bytes")]
+    assert "c" in cache
+    assert cache.stats()["resident_bytes"] == 200
+
+
+def test_resize_enforces_bytes(clock):
+    cache, evicted = _recording_cache(max_bytes=100)
+    cache.put("a", 1, size=40)
+    cache.put("b", 2, size=40)
+    cache.resize("b", 80)
+    assert evicted == [("a", "bytes")]
+    assert cache.stats()["resident_bytes"] == 80
+
+
+def test_idle_eviction(clock):
+    cache, evicted = _recording_cache(idle_ttl=60)
+    cache.put("a", 1)
+    clock.now += 30
+    cache.put("b", 2)
+    clock.now += 40
+    assert cache.get("b") == 2
+    assert evicted == [("a", "idle")]
+
+
+def test_pop_and_purge_do_not_call_on_evict(clock):
+    cache, evicted = _recording_cache()
+    cache.put("a", 1)
+    cache.put("b", 2)
+    clock.now += 100
+    cache.put("c", 3)
+    assert cache.pop("a") == 1
+    assert cache.purge_older_than(clock.now - 50) == ["b"]
+    assert evicted == []
+    assert cache.stats()["purged"] == 1
+
+
+def test_evicted_session_is_reloaded_with_its_history(data_loader, context_manager):
+    context_manager.sessions = SessionCache(max_entries=1, on_evict=context_manager._on_session_evicted)
+
+    async def run():
+        await context_manager.add_message_to_history("alice", Message(role="user", content="привет", metadata={}))
+        await context_manager.update_user_context("alice", level="expert")
+        # Вторая сессия вытесняет первую, пока та ещё не записана
+        context_manager.get_user_context("bob")
+        assert "alice" not in context_manager.sessions
+        return context_manager.get_user_context("alice"), context_manager.get_conversation_history("alice")
+
+    context, history = asyncio.run(run())
+    assert context.level == "expert"
+    assert [message.content for message in history] == ["привет"]
@@ -0,0 +1,128 @@
+"""
+Общее хранилище нескольких процессов: запись сразу и перечитывание изменённых сессий
+"""
+import asyncio
+
+import pytest
+
+from core.context_manager import ContextManager
+from core.persistence import WriteBehindWriter
+from core.storage import CONTEXT, CONVERSATION, SQLiteStorage
+from models.conversation import Message, UserContext
+from test_persistence import RecordingStorage
+
+
+def test_flush_keys_writes_only_given_records():
+    storage = RecordingStorage()
+    writer = WriteBehindWriter(storage)
+    writer.mark_dirty((CONTEXT, "a"), UserContext(user_id="a"))
+    writer.mark_dirty((CONTEXT, "b"), UserContext(user_id="b"))
+
+    assert asyncio.run(writer.flush_keys([(CONTEXT, "a"), (CONVERSATION, "a")])) == []
+    assert [key for key, _ in storage.batches[0]] == [(CONTEXT, "a")]
+    assert writer.pending((CONTEXT, "a")) is None
+    assert writer.pending((CONTEXT, "b")) is not None
+    # Нечего записывать — хранилище не трогаем
+    asyncio.run(writer.flush_keys([(CONTEXT, "a")]))
+    assert len(storage.batches) == 1
+
+
+def test_flush_keys_returns_failed_records_to_queue():
+    storage = RecordingStorage()
+    storage.fail.add((CONTEXT, "a"))
+    writer = WriteBehindWriter(storage)
+    writer.mark_dirty((CONTEXT, "a"), UserContext(user_id="a"))
+    assert asyncio.run(writer.flush_keys([(CONTEXT, "a")])) == [(CONTEXT, "a")]
+    assert writer.pending((CONTEXT, "a")) is not None
+
+
+class CountingStorage(SQLiteStorage):
+    """SQLite, который считает запросы версии"""
+
+    def __init__(self, db_path):
+        super().__init__(db_path)
+        self.version_calls = 0
+
+    def version(self, user_id):
+        self.version_calls += 1
+        return super().version(user_id)
+
+
+@pytest.fixture
+def processes(data_loader, tmp_path):
+    """Два менеджера контекста («процесса») на одной базе SQLite"""
+    db_path = str(tmp_path / "shared.db")
+    managers = [
+        ContextManager(data_loader, storage=CountingStorage(db_path), shared_storage=True)
+        for _ in range(2)
+    ]
+    yield managers
+    for manager in managers:
+        manager.storage.close()
+
+
+def _message(text: str) -> Message:
+    return Message(role="user", content=text, metadata={})
+
+
+def test_change_in_one_process_is_seen_by_another(processes):
+    first, second = processes
+
+    async def run():
+        await first.refresh_session("u")
+        await second.refresh_session("u")
+        assert second.get_user_context("u").level == "beginner"
+
+        await first.refresh_session("u")
+        await first.update_user_context("u", level="advanced")
+        await first.add_message_to_history("u", _message("привет"))
+
+        await second.refresh_session("u")
+        return second.get_user_context("u"), second.get_conversation_history("u")
+
+    context, history = asyncio.run(run())
+    assert context.level == "advanced"
+    assert [message.content for message in history] == ["привет"]
+    assert second.stats()["reloads"] == 1
+
+
+def test_own_writes_do_not_cause_reload(processes):
+    first, _ = processes
+
+    async def run():
+        for i in range(3):
+            await first.refresh_session("u")
+            await first.add_message_to_history("u", _message(f"сообщение {i}"))
+
+    asyncio.run(run())
+    assert first.stats()["reloads"] == 0
+    # Версия читается один раз на запрос, запись её не перечитывает
+    assert first.storage.version_calls == 3
+    assert len(first.get_conversation_history("u")) == 3
+
+
+def test_writes_are_not_left_in_queue(processes):
+    first, _ = processes
+
+    async def run():
+        await first.refresh_session("u")
+        await first.update_user_context("u", level="expert")
+
+    asyncio.run(run())
+    assert first.writer.stats()["pending"] == 0
+    assert first.storage.load_context("u").level == "expert"
+
+
+def test_private_storage_is_not_checked(data_loader, tmp_path):
+    storage = CountingStorage(str(tmp_path / "private.db"))
+    manager = ContextManager(data_loader, storage=storage)
+
+    async def run():
+        await manager.refresh_session("u")
+        await manager.update_user_context("u", level="advanced")
+
+    asyncio.run(run())
+    assert storage.version_calls == 0
+    # Без общего хранилища запись остаётся отложенной
+    assert manager.writer.stats()["pending"] == 1
+    storage.close()
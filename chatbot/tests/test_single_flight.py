@@ -0,0 +1,144 @@
+"""
+SingleFlight: одинаковые одновременные запросы выполняются один раз
+"""
+import asyncio
+
+import pytest
+
+from core.openai_client import stream_deltas
+from core.single_flight import SingleFlight
+from models.conversation import Message
+
+
+def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight()
+    calls = []
+
+    async def call():
+        calls.append(1)
+        await asyncio.sleep(0.02)
+        return "результат"
+
+    async def run():
+        return await asyncio.gather(*(flight.do("ключ", call) for _ in range(5)))
+
+    results = asyncio.run(run())
+    assert len(calls) == 1
+    assert [value for value, _ in results] == ["результат"] * 5
+    assert [shared for _, shared in results] == [False, True, True, True, True]
+    stats = flight.stats()
+    assert stats["calls"] == 1 and stats["coalesced"] == 4 and stats["max_waiters"] == 5
+    assert stats["in_flight"] == 0 and stats["waiters"] == 0
+
+
+def test_different_keys_and_sequential_calls_are_not_shared():
+    flight = SingleFlight()
+    calls = []
+
+    async def call():
+        calls.append(1)
+        await asyncio.sleep(0)
+        return len(calls)
+
+    async def run():
+        await asyncio.gather(flight.do("a", call), flight.do("b", call))
+        # Результат не кэшируется: следующий вызов выполняется заново
+        return await flight.do("a", call)
+
+    assert asyncio.run(run()) == (3, False)
+    assert len(calls) == 3
+
+
+def test_error_reaches_every_waiter():
+    flight = SingleFlight()
+
+    async def call():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("ошибка")
+
+    async def run():
+        return await asyncio.gather(*(flight.do("ключ", call) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_cancelled_starter_does_not_cancel_others():
+    flight = SingleFlight()
+
+    async def run():
+        event = asyncio.Event()
+
+        async def call():
+            event.set()
+            await asyncio.sleep(0.05)
+            return "результат"
+
+        first = asyncio.create_task(flight.do("ключ", call))
+        await event.wait()
+        second = asyncio.create_task(flight.do("ключ", call))
+        await asyncio.sleep(0)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(run()) == ("результат", True)
+
+
+def test_call_is_cancelled_when_nobody_waits():
+    flight = SingleFlight()
+    cancelled = []
+
+    async def run():
+        async def call():
+            try:
+                await asyncio.sleep(1)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+
+        tasks = [asyncio.create_task(flight.do("ключ", call)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await asyncio.sleep(0)
+
+    asyncio.run(run())
+    assert cancelled == [True]
+    assert flight.stats()["in_flight"] == 0
+
+
+def _ask(client, text: str):
+    return client.generate_response([Message(role="user", content=text, metadata={})])
+
+
+def test_client_coalesces_identical_requests(make_openai_client):
+    client = make_openai_client(delay=0.05)
+
+    async def run():
+        return await asyncio.gather(_ask(client, "вопрос"), _ask(client, "вопрос"), _ask(client, "другой вопрос"))
+
+    assert asyncio.run(run()) == ["Ответ модели."] * 3
+    assert len(client.completions.calls) == 2
+    assert client.single_flight.stats()["coalesced"] == 1
+
+
+def test_joined_stream_receives_whole_text(make_openai_client):
+    client = make_openai_client(reply="Длинный ответ модели.", delay=0.02, chunk_size=4)
+    received = {"first": [], "second": []}
+
+    async def ask(name):
+        with stream_deltas(received[name].append):
+            return await _ask(client, "вопрос")
+
+    async def run():
+        return await asyncio.gather(ask("first"), ask("second"))
+
+    assert asyncio.run(run()) == ["Длинный ответ модели."] * 2
+    assert len(client.completions.calls) == 1
+    # Первый получает дельты потока, присоединившийся — текст одним куском
+    assert len(received["first"]) > 1 and "".join(received["first"]) == "Длинный ответ модели."
+    assert received["second"] == ["Длинный ответ модели."]
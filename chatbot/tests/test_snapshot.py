@@ -0,0 +1,82 @@
+"""
+Снимок ai-data: те же данные, что и папка, и откат к папке, если снимок устарел
+"""
+import json
+import shutil
+
+import pytest
+
+import config
+from core.ai_data_loader import AIDataLoader
+from core.snapshot import build_snapshot, read_snapshot, source_hash, write_snapshot
+
+
+def dump_loader(loader: AIDataLoader):
+    """Все категории, значки, уровни и введения загрузчика в виде словарей"""
+    categories = {}
+    for info in loader.get_all_categories():
+        category = loader.get_category(info['id'])
+        categories[info['id']] = {
+            'category': category.model_dump(),
+            'introduction': loader.get_category_introduction(info['id'])
+        }
+        for badge in category.badges:
+            for level in badge.levels:
+                level_data = loader.get_badge_level(level.id)
+                categories[info['id']].setdefault('levels', {})[level.id] = level_data and level_data.model_dump()
+    return categories
+
+
+@pytest.fixture(scope="module")
+def ai_data(tmp_path_factory):
+    """Копия public/ai-data, которую тесты могут менять"""
+    path = tmp_path_factory.mktemp("ai") / "ai-data"
+    shutil.copytree(config.AI_DATA_PATH, path)
+    return path
+
+
+@pytest.fixture
+def snapshot_path(ai_data, tmp_path):
+    path = tmp_path / "snapshot.json"
+    write_snapshot(build_snapshot(ai_data), path)
+    return path
+
+
+def test_snapshot_matches_folder(ai_data, snapshot_path):
+    from_snapshot = AIDataLoader(str(ai_data), snapshot_path=str(snapshot_path))
+    assert from_snapshot.snapshot_info is not None
+    assert dump_loader(from_snapshot) == dump_loader(AIDataLoader(str(ai_data)))
+
+
+def test_source_hash_matches_snapshot(ai_data, snapshot_path):
+    assert source_hash(ai_data) == read_snapshot(snapshot_path)['sourceHash']
+
+
+def test_missing_snapshot_reads_folder(ai_data, tmp_path):
+    loader = AIDataLoader(str(ai_data), snapshot_path=str(tmp_path / "missing.json"))
+    assert loader.snapshot_info is None
+    assert loader.get_all_categories()
+
+
+def test_unsupported_snapshot_is_rejected(tmp_path):
+    path = tmp_path / "snapshot.json"
+    path.write_text(json.dumps({'format': 'other', 'version': 1}), encoding='utf-8')
+    with pytest.raises(ValueError):
+        read_snapshot(path)
+
+
+def test_stale_snapshot_falls_back_to_folder(tmp_path, caplog):
+    ai_data = tmp_path / "ai-data"
+    shutil.copytree(config.AI_DATA_PATH, ai_data)
+    snapshot_path = tmp_path / "snapshot.json"
+    write_snapshot(build_snapshot(ai_data), snapshot_path)
+
+    badge_path = next(ai_data.rglob("1.1.json"))
+    data = json.loads(badge_path.read_text(encoding='utf-8'))
+    data['title'] = "Изменённое название"
+    badge_path.write_text(json.dumps(data, ensure_ascii=False), encoding='utf-8')
+
+    loader = AIDataLoader(str(ai_data), snapshot_path=str(snapshot_path))
+    assert loader.snapshot_info is None
+    assert loader.get_badge("1.1").title == "Изменённое название"
+    assert "изменилась после сборки" in caplog.text
@@ -0,0 +1,125 @@
+"""
+Хранилища контекстов и диалогов: FileStorage и SQLiteStorage ведут себя одинаково
+"""
+import time
+from datetime import datetime
+
+import pytest
+
+from core.storage import CONTEXT, CONVERSATION, FileStorage, SQLiteStorage, StorageBackend, create_storage
+from migrate_storage import migrate
+from models.conversation import Conversation, Message, UserContext
+
+
+@pytest.fixture(params=["file", "sqlite"])
+def storage(request, tmp_path):
+    backend = create_storage(request.param, str(tmp_path / "files"), str(tmp_path / "sessions.db"))
+    yield backend
+    backend.close()
+
+
+def _context(user_id: str) -> UserContext:
+    return UserContext(
+        user_id=user_id,
+        current_category="7",
+        current_badge="7.1",
+        interests=["спорт", "наука"],
+        level="advanced",
+        session_data={"current_view": "badge", "current_level": "2"}
+    )
+
+
+def _conversation(user_id: str) -> Conversation:
+    return Conversation(
+        conversation_id=f"conv_{user_id}",
+        user_context=_context(user_id),
+        messages=[
+            Message(role="user", content="Привет! Расскажи про значок", metadata={}),
+            Message(role="assistant", content="Конечно 😄", metadata={"request_type": "badge_explanation"}),
+            Message(role="user", content="Без метаданных")
+        ],
+        summary="Пользователь спрашивал про спорт",
+        summary_until=datetime(2024, 5, 1, 12, 30)
+    )
+
+
+def _save(storage: StorageBackend, user_id: str, touched_at=None, conversation=None):
+    failed = storage.save_batch([
+        ((CONTEXT, user_id), _context(user_id).dict()),
+        ((CONVERSATION, user_id), (conversation or _conversation(user_id)).dict())
+    ], touched_at)
+    assert failed == []
+
+
+def test_storage_backends_are_abstract():
+    with pytest.raises(TypeError):
+        StorageBackend()
+
+
+def test_round_trip(storage):
+    expected = _conversation("alice")
+    _save(storage, "alice", conversation=expected)
+    assert storage.load_context("alice") == _context("alice")
+    loaded = storage.load_conversation("alice")
+    assert loaded.summary == expected.summary
+    assert loaded.summary_until == expected.summary_until
+    assert loaded.user_context == expected.user_context
+    assert [(m.role, m.content, m.metadata) for m in loaded.messages] == [
+        (m.role, m.content, m.metadata) for m in expected.messages
+    ]
+    assert [m.timestamp for m in loaded.messages] == [m.timestamp for m in expected.messages]
+
+
+def test_missing_user(storage):
+    assert storage.load_context("nobody") is None
+    assert storage.load_conversation("nobody") is None
+    assert storage.version("nobody") == 0.0
+
+
+def test_resave_replaces_messages(storage):
+    _save(storage, "alice")
+    conversation = _conversation("alice")
+    conversation.messages = conversation.messages[-1:]
+    storage.save_batch([((CONVERSATION, "alice"), conversation.dict())])
+    assert [m.content for m in storage.load_conversation("alice").messages] == ["Без метаданных"]
+
+
+def test_iter_user_ids(storage):
+    _save(storage, "alice")
+    storage.save_batch([((CONTEXT, "bob"), _context("bob").dict())])
+    assert sorted(storage.iter_user_ids()) == ["alice", "bob"]
+
+
+def test_version_follows_writes(storage):
+    _save(storage, "alice", touched_at=1000.0)
+    assert storage.version("alice") == pytest.approx(1000.0)
+    _save(storage, "alice", touched_at=2000.0)
+    assert storage.version("alice") == pytest.approx(2000.0)
+
+
+def test_purge_older_than(storage):
+    now = time.time()
+    _save(storage, "old", touched_at=now - 10 * 86400)
+    _save(storage, "fresh", touched_at=now)
+    # Пользователь, у которого свежий хотя бы контекст, остаётся
+    storage.save_batch([((CONVERSATION, "mixed"), _conversation("mixed").dict())], now - 10 * 86400)
+    storage.save_batch([((CONTEXT, "mixed"), _context("mixed").dict())], now)
+
+    assert storage.purge_older_than(now - 86400) == 1
+    assert sorted(storage.iter_user_ids()) == ["fresh", "mixed"]
+    assert storage.load_context("old") is None
+    assert storage.load_conversation("old") is None
+
+
+def test_migrate_files_to_sqlite(tmp_path):
+    files = FileStorage(str(tmp_path / "files"))
+    _save(files, "alice")
+    _save(files, "bob")
+
+    assert migrate(str(tmp_path / "files"), str(tmp_path / "sessions.db")) == 2
+    db = SQLiteStorage(str(tmp_path / "sessions.db"))
+    try:
+        assert db.load_context("bob") == _context("bob")
+        assert len(db.load_conversation("alice").messages) == 3
+    finally:
+        db.close()
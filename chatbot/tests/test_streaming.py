@@ -0,0 +1,44 @@
+"""
+ResponseGenerator.stream_response: склейка дельт совпадает с итоговым ответом
+"""
+import asyncio
+
+from core.response_generator import ResponseGenerator
+
+MARKDOWN_REPLY = (
+    "### Привет!\n\n\n\nЯ **Нейровалюша** 😄😄 и помогу *выбрать* значок.\n"
+    "## Что умею\n* объяснять `значки`\n* придумывать идеи ✨✨\n\n\n\nПиши!   "
+)
+
+
+def _collect(generator: ResponseGenerator, message: str, user_id: str = "stream-user"):
+    async def run():
+        history = generator.context_manager.get_conversation_history(user_id)
+        return [event async for event in generator.stream_response(message, user_id, history)]
+    return asyncio.run(run())
+
+
+def test_model_deltas_join_into_final_response(make_openai_client, data_loader, context_manager):
+    client = make_openai_client(reply=MARKDOWN_REPLY, chunk_size=3)
+    generator = ResponseGenerator(client, data_loader, context_manager)
+
+    events = _collect(generator, "привет, как дела?")
+    deltas = [event["content"] for event in events if event["type"] == "delta"]
+    done = events[-1]
+
+    assert done["type"] == "done"
+    assert [event["type"] for event in events[:-1]] == ["delta"] * (len(events) - 1)
+    assert len(deltas) > 1
+    assert "".join(deltas) == done["response"].response
+    assert "**" not in done["response"].response
+    assert client.completions.calls[0]["stream"] is True
+
+
+def test_answer_without_model_arrives_in_one_piece(make_openai_client, data_loader, context_manager):
+    client = make_openai_client()
+    generator = ResponseGenerator(client, data_loader, context_manager)
+
+    events = _collect(generator, "где я сейчас нахожусь?")
+    assert [event["type"] for event in events] == ["delta", "done"]
+    assert events[0]["content"] == events[1]["response"].response
+    assert client.completions.calls == []
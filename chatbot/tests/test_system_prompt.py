@@ -0,0 +1,91 @@
+"""
+Сборка системного промпта: статическая часть запоминается и пересобирается при изменении facts.json
+"""
+import json
+import os
+
+import pytest
+
+from prompts.system_prompt import SystemPromptBuilder
+
+
+def _write_facts(path, facts, mtime_ns):
+    path.write_text(json.dumps(facts, ensure_ascii=False), encoding='utf-8')
+    # Явное время изменения: грубые часы файловой системы не спрячут правку
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+@pytest.fixture
+def facts_path(tmp_path):
+    path = tmp_path / "facts.json"
+    _write_facts(path, {"contacts": {"phone": "+7 000"}}, 1_000_000_000)
+    return path
+
+
+def _context_key(category="1", interests=()):
+    return (category, None, "beginner", tuple(interests), None, None, None)
+
+
+def test_static_prompt_is_built_once(facts_path):
+    builder = SystemPromptBuilder("Персона", facts_path, check_interval=0)
+    first = builder.static_prompt()
+    assert first.startswith("Персона")
+    assert "- phone: +7 000" in first
+    assert builder.static_prompt() is first
+    assert builder.facts_reloads == 0
+
+
+def test_facts_change_rebuilds_prompt_and_fingerprint(facts_path):
+    builder = SystemPromptBuilder("Персона", facts_path, check_interval=0)
+    fingerprint = builder.fingerprint()
+    _write_facts(facts_path, {"contacts": {"phone": "+7 111"}}, 2_000_000_000)
+    assert "+7 111" in builder.static_prompt()
+    assert builder.fingerprint() != fingerprint
+    assert builder.facts_reloads == 1
+
+
+def test_facts_are_checked_not_more_often_than_interval(facts_path):
+    builder = SystemPromptBuilder("Персона", facts_path, check_interval=3600)
+    builder.static_prompt()
+    _write_facts(facts_path, {"contacts": {"phone": "+7 111"}}, 2_000_000_000)
+    assert "+7 000" in builder.static_prompt()
+
+
+def test_broken_facts_keep_previous_prompt(facts_path, caplog):
+    builder = SystemPromptBuilder("Персона", facts_path, check_interval=0)
+    prompt = builder.static_prompt()
+    facts_path.write_text("{ не json", encoding='utf-8')
+    os.utime(facts_path, ns=(2_000_000_000, 2_000_000_000))
+    assert builder.static_prompt() == prompt
+    assert "не перечитан" in caplog.text
+    # Исправленный файл подхватывается
+    _write_facts(facts_path, {"contacts": {"phone": "+7 222"}}, 3_000_000_000)
+    assert "+7 222" in builder.static_prompt()
+
+
+def test_missing_facts_file(tmp_path):
+    builder = SystemPromptBuilder("Персона", tmp_path / "missing.json", check_interval=0)
+    assert builder.static_prompt() == "Персона"
+
+
+def test_context_sections_are_memoized_with_lru(facts_path):
+    builder = SystemPromptBuilder("Персона", facts_path, max_entries=2)
+    section = builder.context_section(_context_key(interests=("спорт", "музыка")))
+    assert section.startswith("## Текущий контекст:")
+    assert "- Интересы пользователя: спорт, музыка" in section
+    assert builder.context_section(_context_key(interests=("спорт", "музыка"))) is section
+
+    builder.context_section(_context_key("2"))
+    builder.context_section(_context_key("3"))
+    stats = builder.stats()
+    assert stats["context_hits"] == 1
+    assert stats["context_misses"] == 3
+    assert stats["context_entries"] == 2
+    # Самая давняя секция вытеснена и строится заново
+    builder.context_section(_context_key(interests=("спорт", "музыка")))
+    assert builder.stats()["context_misses"] == 4
+
+
+def test_empty_context_section(facts_path):
+    builder = SystemPromptBuilder("Персона", facts_path)
+    assert builder.context_section((None, None, None, (), None, None, None)) == ""
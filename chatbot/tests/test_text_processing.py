@@ -0,0 +1,65 @@
+"""
+IncrementalTextProcessor: потоковая очистка совпадает с пакетной
+"""
+import random
+
+import pytest
+
+from core.text_processing import IncrementalTextProcessor, clean_markdown, postprocess_response
+
+SAMPLES = [
+    "Привет! 😄😄😄 Это **значок** про *творчество*.",
+    "### Заголовок\n\n\n\nТекст после заголовка с `кодом` и ✨✨ блёстками.",
+    "   \n## Сразу заголовок\n#Ещё один\nобычная строка\n\n\n\n\nконец  ",
+    "* пункт списка\n* второй **жирный** пункт\n\n1. нумерация",
+    "Незакрытая *разметка и `код без конца",
+    "Строка\n   ### заголовок с отступом\n\n\nхвост 🚀🚀",
+    "Первое предложение. " * 200,
+    ("Очень длинный текст без точек " * 120) + "и наконец точка.",
+    "",
+    "\n\n\n",
+]
+
+
+def _batch(text: str) -> str:
+    return postprocess_response(clean_markdown(text))
+
+
+def _stream(text: str, rng: random.Random) -> str:
+    processor = IncrementalTextProcessor()
+    parts = []
+    position = 0
+    while position < len(text):
+        size = rng.randint(1, 12)
+        parts.append(processor.feed(text[position:position + size]))
+        position += size
+    parts.append(processor.finish())
+    return "".join(parts)
+
+
+@pytest.mark.parametrize("text", SAMPLES)
+def test_stream_matches_batch(text):
+    rng = random.Random(len(text))
+    for _ in range(20):
+        assert _stream(text, rng) == _batch(text)
+
+
+def test_stream_matches_batch_char_by_char():
+    for text in SAMPLES:
+        processor = IncrementalTextProcessor()
+        streamed = "".join(processor.feed(char) for char in text) + processor.finish()
+        assert streamed == _batch(text)
+
+
+def test_feed_releases_text_before_finish():
+    processor = IncrementalTextProcessor()
+    released = processor.feed("Первая строка готова.\nВторая")
+    assert released.startswith("Первая строка готова.")
+
+
+def test_feed_after_truncation_is_ignored():
+    processor = IncrementalTextProcessor(max_length=300)
+    text = "Предложение номер один. " * 50
+    streamed = processor.feed(text)
+    assert processor.feed("ещё текст") == ""
+    assert len(streamed + processor.finish()) <= 300
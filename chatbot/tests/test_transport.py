@@ -0,0 +1,207 @@
+"""
+ResilientTransport: повторы, выключатель и дублирующие запросы без сети
+"""
+import asyncio
+import time
+
+import httpx
+import openai
+import pytest
+
+from core.transport import CircuitBreaker, CircuitOpenError, ResilientTransport, percentile
+
+
+def _connection_error() -> openai.APIConnectionError:
+    return openai.APIConnectionError(request=httpx.Request("POST", "http://test/v1/chat/completions"))
+
+
+def _host(client) -> str:
+    return httpx.URL(str(client.base_url)).host
+
+
+def _transport(**options) -> ResilientTransport:
+    options.setdefault("base_urls", ("http://a/v1", "http://b/v1"))
+    options.setdefault("base_delay", 0.001)
+    options.setdefault("max_delay", 0.001)
+    return ResilientTransport("test", **options)
+
+
+def _run(transport: ResilientTransport, call):
+    async def run():
+        try:
+            return await transport.request(call)
+        finally:
+            await transport.aclose()
+    return asyncio.run(run())
+
+
+def test_breaker_opens_after_threshold_and_recovers():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+    breaker.record_failure()
+    assert breaker.state == "closed" and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open" and breaker.opened == 1
+    assert not breaker.allow() and not breaker.available()
+
+    time.sleep(0.06)
+    assert breaker.available()
+    # После паузы пропускается ровно один пробный запрос
+    assert breaker.allow()
+    assert breaker.state == "half_open"
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.allow()
+
+
+def test_failed_trial_reopens_breaker():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.01)
+    breaker.record_failure()
+    time.sleep(0.02)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open" and breaker.opened == 2
+
+
+def test_released_trial_can_be_retried():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.0)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.release()
+    assert breaker.allow()
+
+
+def test_retry_goes_to_next_address():
+    transport = _transport()
+    hosts = []
+
+    async def call(client):
+        hosts.append(_host(client))
+        if len(hosts) == 1:
+            raise _connection_error()
+        return "ответ"
+
+    assert _run(transport, call) == "ответ"
+    assert hosts == ["a", "b"]
+    stats = transport.stats()
+    assert stats["retries"] == 1 and stats["failures"] == 0
+    assert [endpoint["failures"] for endpoint in stats["endpoints"]] == [1, 0]
+
+
+def test_retries_are_limited():
+    transport = _transport(max_retries=2)
+    calls = []
+
+    async def call(client):
+        calls.append(_host(client))
+        raise _connection_error()
+
+    with pytest.raises(openai.APIConnectionError):
+        _run(transport, call)
+    assert calls == ["a", "b", "a"]
+    assert transport.stats()["failures"] == 1
+
+
+def test_client_errors_are_not_retried():
+    transport = _transport()
+    calls = []
+
+    async def call(client):
+        calls.append(_host(client))
+        raise ValueError("неверный запрос")
+
+    with pytest.raises(ValueError):
+        _run(transport, call)
+    assert calls == ["a"]
+    assert transport.endpoints[0].breaker.state == "closed"
+
+
+def test_open_breaker_skips_address():
+    transport = _transport(failure_threshold=1, reset_timeout=60, max_retries=3)
+    hosts = []
+
+    async def call(client):
+        hosts.append(_host(client))
+        if _host(client) == "a":
+            raise _connection_error()
+        return "ответ"
+
+    async def run():
+        try:
+            return [await transport.request(call) for _ in range(3)]
+        finally:
+            await transport.aclose()
+
+    assert asyncio.run(run()) == ["ответ"] * 3
+    # После первой ошибки адрес a отключён, и запросы сразу идут на b
+    assert hosts == ["a", "b", "b", "b"]
+    assert transport.stats()["endpoints"][0]["state"] == "open"
+
+
+def test_all_addresses_open():
+    transport = _transport(failure_threshold=1, reset_timeout=60, max_retries=5)
+
+    async def call(client):
+        raise _connection_error()
+
+    with pytest.raises(CircuitOpenError):
+        _run(transport, call)
+    assert all(endpoint.breaker.state == "open" for endpoint in transport.endpoints)
+    stats = transport.stats()
+    assert stats["requests"] == 1 and stats["circuit_rejections"] == 1
+
+
+def test_deadline_stops_slow_call():
+    transport = _transport(deadline=0.05, max_retries=0)
+
+    async def call(client):
+        await asyncio.sleep(1)
+
+    started = time.perf_counter()
+    with pytest.raises(asyncio.TimeoutError):
+        _run(transport, call)
+    assert time.perf_counter() - started < 0.5
+
+
+def test_hedge_wins_when_primary_is_slow():
+    transport = _transport(hedge_delay=0.02)
+    cancelled = []
+
+    async def call(client):
+        if _host(client) == "a":
+            try:
+                await asyncio.sleep(1)
+            except asyncio.CancelledError:
+                cancelled.append("a")
+                raise
+        return _host(client)
+
+    started = time.perf_counter()
+    assert _run(transport, call) == "b"
+    assert time.perf_counter() - started < 0.5
+    assert cancelled == ["a"]
+    stats = transport.stats()
+    assert stats["hedges"] == 1 and stats["hedge_wins"] == 1
+    # Отменённый запрос не считается ошибкой адреса
+    assert transport.endpoints[0].breaker.state == "closed" and stats["endpoints"][0]["failures"] == 0
+
+
+def test_fast_primary_is_not_hedged():
+    transport = _transport(hedge_delay=0.05)
+
+    async def call(client):
+        return _host(client)
+
+    assert _run(transport, call) == "a"
+    assert transport.stats()["hedges"] == 0
+
+
+def test_percentile():
+    values = [0.1, 0.2, 0.3, 0.4]
+    assert percentile([], 0.5) == 0.0
+    assert percentile(values, 0.5) == 0.2
+    assert percentile(values, 0.99) == 0.4
+
+
+def test_no_addresses():
+    with pytest.raises(ValueError):
+        ResilientTransport("test", base_urls=())
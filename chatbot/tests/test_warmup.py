@@ -0,0 +1,119 @@
+"""
+Прогрев: шаги выполняются в потоке, ошибки не мешают готовности
+"""
+import asyncio
+import threading
+
+from core.response_cache import ResponseCache
+from core.response_generator import ResponseGenerator
+from core.warmup import ROUTING_SAMPLES, Warmup, create_warmup
+
+
+def test_steps_run_in_order_and_report_results():
+    order = []
+    warmup = Warmup([
+        ("first", lambda: order.append("first") or 1),
+        ("second", lambda: order.append("second") or "готово"),
+    ])
+    assert warmup.status()["state"] == "pending" and not warmup.ready
+    warmup.run()
+    assert order == ["first", "second"]
+    status = warmup.status()
+    assert warmup.ready
+    assert status["done"] == status["total"] == 2
+    assert status["errors"] == 0 and status["current"] is None
+    assert status["steps"]["first"]["result"] == 1
+    assert status["steps"]["second"]["result"] == "готово"
+    assert all(step["seconds"] >= 0 for step in status["steps"].values())
+
+
+def test_failed_step_does_not_block_readiness(caplog):
+    def broken():
+        raise RuntimeError("нет файла")
+
+    warmup = Warmup([("broken", broken), ("next", lambda: True)])
+    warmup.run()
+    status = warmup.status()
+    assert warmup.ready
+    assert status["errors"] == 1
+    assert status["steps"]["broken"]["error"] == "RuntimeError: нет файла"
+    assert "result" not in status["steps"]["broken"]
+    assert status["steps"]["next"]["result"] is True
+    assert "broken не выполнен" in caplog.text
+
+
+def test_status_while_running():
+    release = threading.Event()
+    warmup = Warmup([("slow", release.wait)])
+
+    async def run():
+        task = asyncio.create_task(warmup.run_in_thread())
+        # Event loop свободен: статус доступен, пока шаг выполняется в потоке
+        while warmup.current != "slow":
+            await asyncio.sleep(0.005)
+        status = warmup.status()
+        release.set()
+        await task
+        return status
+
+    status = asyncio.run(run())
+    assert status["state"] == "running"
+    assert status["current"] == "slow" and status["done"] == 0
+    assert status["seconds"] is not None
+    assert warmup.ready
+
+
+def test_create_warmup_prepares_components(make_openai_client, data_loader, context_manager, tmp_path):
+    cache_path = str(tmp_path / "responses.db")
+    previous = ResponseCache(disk_path=cache_path)
+    for key in ("a", "b", "c"):
+        previous.set(key, key.upper())
+
+    client = make_openai_client(response_cache=ResponseCache(disk_path=cache_path))
+    generator = ResponseGenerator(client, data_loader, context_manager)
+    warmup = create_warmup(data_loader, client, context_manager, generator, response_cache_entries=2)
+    warmup.run()
+
+    steps = warmup.status()["steps"]
+    assert warmup.status()["errors"] == 0, steps
+    assert list(steps) == ["catalog", "recommender", "pregenerated", "prompts", "routing", "response_cache"]
+    assert steps["catalog"]["result"] == len(data_loader.get_all_badges())
+    assert len(steps["routing"]["result"]) == len(ROUTING_SAMPLES)
+    assert steps["response_cache"]["result"] == 2
+    assert client.completions.calls == []
+
+
+def test_response_cache_step_is_optional(make_openai_client, data_loader, context_manager):
+    client = make_openai_client()
+    generator = ResponseGenerator(client, data_loader, context_manager)
+    warmup = create_warmup(data_loader, client, context_manager, generator)
+    assert "response_cache" not in [name for name, _ in warmup.steps]
+
+
+def test_prime_keeps_answers_written_meanwhile(tmp_path):
+    path = str(tmp_path / "responses.db")
+    previous = ResponseCache(disk_path=path)
+    for i in range(200):
+        previous.set(f"old-{i}", f"старый {i}")
+
+    cache = ResponseCache(max_entries=500, disk_path=path)
+    errors = []
+
+    def serve():
+        # Запросы пользователей во время прогрева
+        try:
+            for i in range(200):
+                cache.set(f"new-{i}", f"новый {i}")
+                cache.get(f"old-{i}")
+        except Exception as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=serve)
+    thread.start()
+    cache.prime()
+    thread.join()
+
+    assert errors == []
+    assert all(cache.get(f"new-{i}") == f"новый {i}" for i in range(200))
+    assert all(cache.get(f"old-{i}") == f"старый {i}" for i in range(200))
+    assert cache.stats()["entries"] == 400